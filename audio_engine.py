@@ -0,0 +1,387 @@
+# audio_engine.py
+"""
+Motore audio dei segnali sonori dell'app, indipendente dal thread della GUI.
+
+Tutti i segnali vengono caricati all'avvio come PCM float32 alla frequenza dell'uscita. trigger()
+(chiamabile da qualsiasi thread, costo trascurabile) mette il segnale in una coda a priorità; un
+thread dedicato lo preleva, lo miscela con quelli ancora in riproduzione a blocchi di pochi
+millisecondi e scrive i blocchi sull'uscita. I segnali sovrapposti si sommano invece di
+interrompersi, lo stesso segnale già in coda non viene duplicato, ognuno ha un intervallo
+minimo tra due riproduzioni (dall'avvio effettivo della precedente) e quelli rimasti in coda oltre max_delay vengono scartati.
+La latenza trigger -> suono (attesa in coda + audio già accodato nell'uscita) viene misurata per
+ogni segnale riprodotto: con il mixer fuori dalla GUI non dipende dal costo dell'inferenza.
+
+Uscite, in ordine di preferenza: sounddevice (PortAudio, se installato), QAudioSink di
+PyQt6.QtMultimedia, uscita nulla che scandisce il tempo come una scheda audio (ambienti senza
+dispositivo, benchmark).
+"""
+import heapq
+import threading
+import time
+import wave
+from collections import deque
+
+import numpy as np
+
+SAMPLE_RATE = 44100
+BLOCK_FRAMES = 256  # ~6 ms a 44.1 kHz
+OUTPUT_BUFFER_S = 0.03  # Audio accodato nell'uscita oltre il blocco corrente
+FADE_S = 0.02  # Dissolvenza in chiusura dei segnali troncati
+
+# nome: file, priorità (0 = massima), intervallo minimo tra due riproduzioni (s), volume,
+# durata massima (s, None = intero)
+CUES = {
+    'target': {'path': 'sounds/obbiettivo.wav', 'priority': 0, 'min_interval': 2.0, 'gain': 0.8, 'max_duration': None},
+    'error': {'path': 'sounds/redflag.wav', 'priority': 1, 'min_interval': 1.0, 'gain': 0.8, 'max_duration': None},
+    'rep': {'path': 'sounds/oneRep.wav', 'priority': 2, 'min_interval': 0.25, 'gain': 0.8, 'max_duration': None},
+    'start': {'path': 'sounds/start.wav', 'priority': 2, 'min_interval': 1.0, 'gain': 0.8, 'max_duration': None},
+    'countdown': {'path': 'sounds/jump.wav', 'priority': 3, 'min_interval': 0.5, 'gain': 0.6, 'max_duration': None},
+    'visibility_lost': {'path': 'sounds/rumore.wav', 'priority': 4, 'min_interval': 3.0, 'gain': 0.4, 'max_duration': 0.8},
+}
+
+
+def load_pcm(path, sample_rate=SAMPLE_RATE):
+    """Legge un WAV PCM (8/16/32 bit) come float32 mono in [-1, 1] alla frequenza indicata."""
+    with wave.open(path, 'rb') as f:
+        channels, width, rate = f.getnchannels(), f.getsampwidth(), f.getframerate()
+        raw = f.readframes(f.getnframes())
+    if width == 1:
+        samples = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif width == 2:
+        samples = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+    elif width == 4:
+        samples = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648.0
+    else:
+        raise ValueError(f"Formato WAV non supportato ({8 * width} bit): {path}")
+    samples = samples.reshape(-1, channels).mean(axis=1)
+    return resample(samples, rate, sample_rate)
+
+
+def resample(samples, rate, sample_rate):
+    # Interpolazione lineare: sufficiente per segnali brevi, eseguita una sola volta al caricamento
+    if rate == sample_rate or len(samples) == 0:
+        return np.ascontiguousarray(samples, dtype=np.float32)
+    n = max(1, int(round(len(samples) * sample_rate / rate)))
+    positions = np.arange(n) * (rate / sample_rate)
+    return np.interp(positions, np.arange(len(samples)), samples).astype(np.float32)
+
+
+def _prepare_cue(samples, gain, max_duration, sample_rate):
+    samples = samples * np.float32(gain)
+    if max_duration is not None and len(samples) > max_duration * sample_rate:
+        samples = samples[:int(max_duration * sample_rate)].copy()
+        fade = min(len(samples), int(FADE_S * sample_rate))
+        samples[len(samples) - fade:] *= np.linspace(1.0, 0.0, fade, dtype=np.float32)
+    return samples
+
+
+class NullAudioOutput:
+    """
+    Uscita senza dispositivo: scarta i campioni ma rispetta i tempi di una scheda audio con
+    OUTPUT_BUFFER_S di buffer, così ritmo del mixer e latenze misurate restano realistici.
+    """
+    name = 'null'
+
+    def __init__(self, sample_rate=SAMPLE_RATE, buffer_s=OUTPUT_BUFFER_S):
+        self.sample_rate = sample_rate
+        self.buffer_s = buffer_s
+        self._play_end = None  # Istante in cui finirà l'audio già scritto
+
+    def open(self):
+        self._play_end = time.perf_counter()
+
+    def latency(self):
+        # Audio ancora da riprodurre prima del prossimo blocco scritto
+        return max(0.0, self._play_end - time.perf_counter())
+
+    def write(self, block):
+        now = time.perf_counter()
+        if self._play_end < now:
+            self._play_end = now  # Buffer vuoto (nessun segnale in corso)
+        ahead = self._play_end - now - self.buffer_s
+        if ahead > 0:
+            time.sleep(ahead)
+        self._play_end += len(block) / self.sample_rate
+
+    def close(self):
+        pass
+
+
+class SoundDeviceOutput:
+    """Flusso PortAudio a bassa latenza (sounddevice); write() si blocca finché c'è spazio."""
+    name = 'sounddevice'
+
+    def __init__(self, sample_rate=SAMPLE_RATE, block_frames=BLOCK_FRAMES):
+        import sounddevice
+        self.sample_rate = sample_rate
+        self.stream = sounddevice.OutputStream(samplerate=sample_rate, channels=1, dtype='float32',
+                                               blocksize=block_frames, latency='low')
+
+    def open(self):
+        self.stream.start()
+
+    def latency(self):
+        return self.stream.latency
+
+    def write(self, block):
+        self.stream.write(block.reshape(-1, 1))
+
+    def close(self):
+        self.stream.stop()
+        self.stream.close()
+
+
+class QtAudioOutput:
+    """
+    QAudioSink in modalità push, creato e usato dal thread del mixer (nessun passaggio dalla
+    GUI). Converte il mix mono float32 nel formato accettato dal dispositivo.
+    """
+    name = 'qt'
+
+    def __init__(self, sample_rate=SAMPLE_RATE, buffer_s=OUTPUT_BUFFER_S):
+        from PyQt6.QtMultimedia import QAudioFormat, QMediaDevices
+        self._device = QMediaDevices.defaultAudioOutput()
+        if self._device.isNull():
+            raise RuntimeError("Nessun dispositivo audio di uscita")
+        fmt = QAudioFormat()
+        fmt.setSampleRate(sample_rate)
+        fmt.setChannelCount(1)
+        fmt.setSampleFormat(QAudioFormat.SampleFormat.Int16)
+        if not self._device.isFormatSupported(fmt):
+            fmt = self._device.preferredFormat()
+        if fmt.sampleFormat() not in (QAudioFormat.SampleFormat.Int16, QAudioFormat.SampleFormat.Float):
+            raise RuntimeError(f"Formato audio del dispositivo non supportato: {fmt.sampleFormat()}")
+        self._format = fmt
+        self._float = fmt.sampleFormat() == QAudioFormat.SampleFormat.Float
+        self._channels = fmt.channelCount()
+        self.sample_rate = fmt.sampleRate()
+        self._bytes_per_second = self.sample_rate * fmt.bytesPerFrame()
+        self.buffer_s = buffer_s
+        self.sink = None
+        self._io = None
+
+    def open(self):
+        from PyQt6.QtMultimedia import QAudioSink
+        self.sink = QAudioSink(self._device, self._format)
+        self.sink.setBufferSize(int(self._bytes_per_second * self.buffer_s))
+        self._io = self.sink.start()
+
+    def latency(self):
+        return (self.sink.bufferSize() - self.sink.bytesFree()) / self._bytes_per_second
+
+    def write(self, block):
+        if self._float:
+            data = block
+        else:
+            data = (np.clip(block, -1.0, 1.0) * 32767.0).astype(np.int16)
+        if self._channels > 1:
+            data = np.repeat(data, self._channels)
+        data = data.tobytes()
+        while data:
+            free = self.sink.bytesFree()
+            if free <= 0:
+                time.sleep(self.buffer_s / 8)
+                continue
+            written = self._io.write(data[:free])
+            if written < 0:
+                raise IOError("Scrittura sul dispositivo audio fallita")
+            data = data[written:]
+
+    def close(self):
+        if self.sink is not None:
+            self.sink.stop()
+            self.sink = None
+
+
+def create_audio_output(kind='auto', sample_rate=SAMPLE_RATE):
+    """Uscita 'sounddevice', 'qt' o 'null'; 'auto' prova nell'ordine e ripiega sull'uscita nulla."""
+    if kind not in ('auto', 'sounddevice', 'qt', 'null'):
+        raise ValueError(f"Uscita audio non supportata: {kind}")
+    if kind in ('auto', 'sounddevice'):
+        try:
+            return SoundDeviceOutput(sample_rate)
+        except (ImportError, OSError) as e:
+            if kind == 'sounddevice':
+                raise
+            error = e
+    if kind in ('auto', 'qt'):
+        try:
+            return QtAudioOutput(sample_rate)
+        except (ImportError, RuntimeError) as e:
+            if kind == 'qt':
+                raise
+            error = e
+    if kind == 'auto':
+        print(f"Audio: nessuna uscita disponibile ({error}), segnali sonori disattivati.")
+    return NullAudioOutput(sample_rate)
+
+
+class AudioEngine:
+    """
+    Coda a priorità dei segnali, mixer e thread di uscita.
+    - cues: {nome: specifica} come CUES
+    - output: 'auto' | 'sounddevice' | 'qt' | 'null' o un'uscita già costruita
+    - max_voices: segnali miscelati insieme; un segnale più importante toglie il posto al meno
+      importante in riproduzione
+    - max_delay: attesa massima in coda (s) oltre la quale un segnale non viene più riprodotto
+    """
+    def __init__(self, cues=None, output='auto', sample_rate=SAMPLE_RATE, block_frames=BLOCK_FRAMES,
+                 max_voices=4, max_delay=0.15, latency_window=512):
+        self.cues = dict(CUES if cues is None else cues)
+        self.output_kind = output
+        self.sample_rate = sample_rate
+        self.block_frames = block_frames
+        self.max_voices = max_voices
+        self.max_delay = max_delay
+
+        self._pcm = {}
+        for name, spec in self.cues.items():
+            try:
+                samples = load_pcm(spec['path'], sample_rate)
+            except (OSError, EOFError, ValueError, wave.Error) as e:
+                print(f"Errore: File audio non caricato ({spec['path']}): {e}")
+                continue
+            self._pcm[name] = _prepare_cue(samples, spec.get('gain', 1.0), spec.get('max_duration'), sample_rate)
+
+        self._cond = threading.Condition()
+        self._queue = []  # Heap di (priorità, sequenza, nome, istante del trigger)
+        self._pending = set()
+        self._seq = 0
+        self._last_started = {}  # Ultimo avvio della riproduzione per nome
+        self._voices = []  # [campioni, posizione, priorità]
+        self._running = False
+        self._thread = None
+        self.output = None
+        self._mix = np.zeros(block_frames, dtype=np.float32)
+        self.latencies = deque(maxlen=latency_window)
+        self.counts = {'triggered': 0, 'played': 0, 'deduplicated': 0, 'rate_limited': 0,
+                       'stale': 0, 'preempted': 0}
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name='audio-engine', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+            self._thread = None
+
+    def trigger(self, name):
+        """Richiede un segnale. False se sconosciuto, già in coda o entro il suo intervallo minimo."""
+        if name not in self._pcm:
+            return False
+        now = time.perf_counter()
+        with self._cond:
+            self.counts['triggered'] += 1
+            if name in self._pending:
+                self.counts['deduplicated'] += 1
+                return False
+            if now - self._last_started.get(name, float('-inf')) < self.cues[name].get('min_interval', 0.0):
+                self.counts['rate_limited'] += 1
+                return False
+            self._pending.add(name)
+            heapq.heappush(self._queue, (self.cues[name].get('priority', 0), self._seq, name, now))
+            self._seq += 1
+            self._cond.notify()
+        return True
+
+    def _open_output(self):
+        output = self.output_kind
+        if isinstance(output, str):
+            try:
+                output = create_audio_output(output, self.sample_rate)
+            except Exception as e:
+                print(f"Audio: uscita '{self.output_kind}' non disponibile ({e}), segnali sonori disattivati.")
+                output = NullAudioOutput(self.sample_rate)
+        try:
+            output.open()
+        except Exception as e:
+            print(f"Audio: apertura dell'uscita {output.name} fallita ({e}), segnali sonori disattivati.")
+            output = NullAudioOutput(self.sample_rate)
+            output.open()
+        if output.sample_rate != self.sample_rate:
+            # Il dispositivo impone un'altra frequenza: i segnali vengono convertiti una volta sola
+            self._pcm = {name: resample(pcm, self.sample_rate, output.sample_rate)
+                         for name, pcm in self._pcm.items()}
+            self.sample_rate = output.sample_rate
+        self.output = output
+
+    def _run(self):
+        self._open_output()
+        try:
+            while True:
+                with self._cond:
+                    while self._running and not self._queue and not self._voices:
+                        self._cond.wait()
+                    if not self._running:
+                        break
+                    started = self._start_voices()
+                self._write_block(started)
+        finally:
+            self.output.close()
+
+    def _start_voices(self):
+        # Chiamato con il lock: dalla coda ai segnali in riproduzione, in ordine di priorità
+        now = time.perf_counter()
+        started = []
+        while self._queue:
+            priority, _, name, t = heapq.heappop(self._queue)
+            self._pending.discard(name)
+            if now - t > self.max_delay:
+                self.counts['stale'] += 1
+                continue
+            if len(self._voices) >= self.max_voices:
+                weakest = max(range(len(self._voices)), key=lambda i: self._voices[i][2])
+                if self._voices[weakest][2] < priority:
+                    self.counts['preempted'] += 1  # Tutti più importanti: si rinuncia al nuovo
+                    continue
+                del self._voices[weakest]
+                self.counts['preempted'] += 1
+            self._voices.append([self._pcm[name], 0, priority])
+            # L'intervallo minimo conta dall'avvio: un segnale scartato non blocca il successivo
+            self._last_started[name] = now
+            started.append(t)
+        return started
+
+    def _write_block(self, started):
+        mix = self._mix
+        mix.fill(0.0)
+        n = self.block_frames
+        remaining = []
+        for voice in self._voices:
+            samples, pos = voice[0], voice[1]
+            chunk = samples[pos:pos + n]
+            mix[:len(chunk)] += chunk
+            voice[1] = pos + n
+            if voice[1] < len(samples):
+                remaining.append(voice)
+        self._voices = remaining
+        np.clip(mix, -1.0, 1.0, out=mix)
+        if started:
+            # Il primo campione dei nuovi segnali suona dopo l'audio già accodato nell'uscita
+            now = time.perf_counter()
+            queued = self.output.latency()
+            with self._cond:
+                self.latencies.extend(now - t + queued for t in started)
+                self.counts['played'] += len(started)
+        self.output.write(mix)
+
+    def stats(self):
+        # Copie prese con il lock: il thread del mixer continua ad aggiungere latenze
+        with self._cond:
+            latencies = list(self.latencies)
+            counts = dict(self.counts)
+        latencies = np.array(latencies or [0.0]) * 1000.0
+        return {
+            **counts,
+            'output': getattr(self.output, 'name', None),
+            'latency_p50_ms': float(np.percentile(latencies, 50)),
+            'latency_p95_ms': float(np.percentile(latencies, 95)),
+            'latency_max_ms': float(latencies.max()),
+        }
@@ -0,0 +1,194 @@
+# benchmark_app.py
+"""
+Benchmark end-to-end dell'intera applicazione: FitnessCoachApp completa (lettura, gate, posa,
+analisi, overlay, etichette, disegno) sotto la piattaforma Qt offscreen, alimentata da una
+sorgente di frame. Riporta FPS sostenuti (frame analizzati al secondo), latenza movimento ->
+display (dall'istante di cattura del frame, per le sorgenti in tempo reale quello previsto, alla
+consegna al widget), tempo CPU di processo per frame, picco di memoria e latenza trigger -> suono
+dei segnali audio. --extra-load-ms aggiunge a ogni frame un carico Python che tiene il GIL, per
+verificare che la latenza audio resti limitata anche con un'inferenza molto più pesante.
+Con --pacing fast nessun frame viene scartato e la latenza comprende l'attesa dei frame in coda
+(misura di throughput); la latenza movimento -> display si misura con --pacing realtime.
+
+Esempi:
+    python benchmark_app.py --source synthetic:Squat --pacing fast --duration 20
+    python benchmark_app.py --source sessione.mp4 --pacing realtime --tracemalloc
+    python benchmark_app.py --source synthetic:Squat --pacing realtime --extra-load-ms 40
+"""
+import argparse
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+from PyQt6.QtCore import QTimer
+from PyQt6.QtWidgets import QApplication
+
+from exercise_definitions import exercise_names
+from frame_sources import create_frame_source
+from main import FitnessCoachApp
+
+
+class AppBenchmark:
+    """Pilota FitnessCoachApp raccogliendo dopo ogni aggiornamento del display i tempi dei frame analizzati."""
+    def __init__(self, source_spec, pacing='fast', loop=False, exercise=None, target_reps=0,
+                 duration_s=20.0, max_frames=None, warmup_frames=30, trace_memory=False,
+                 extra_load_ms=0.0, live_server=None):
+        self.source_spec = source_spec
+        self.pacing = pacing
+        self.loop = loop
+        if exercise is None and str(source_spec).startswith('synthetic:'):
+            exercise = str(source_spec).split(':', 1)[1]
+        self.exercise = exercise or 'Squat'
+        self.target_reps = target_reps
+        self.duration_s = duration_s
+        self.max_frames = max_frames
+        self.warmup_frames = warmup_frames
+        self.trace_memory = trace_memory
+        self.extra_load_ms = extra_load_ms
+        self.live_server = live_server
+
+        self.source = None
+        self._seq = 0  # Ultimo risultato della pipeline già raccolto
+        self._cpu_mark = None
+        self.latencies = []  # Cattura -> consegna al widget dei frame mostrati
+        self.cpu_times = []
+        self.frame_times = []  # Istante in cui ogni frame analizzato è arrivato alla GUI
+
+    def _create_source(self):
+        self.source = create_frame_source(self.source_spec, pacing=self.pacing, loop=self.loop)
+        return self.source
+
+    def _tick(self):
+        records = self.window.pipeline.timings_since(self._seq)
+        if not records:
+            return
+        self._seq = records[-1][0]
+        if self.extra_load_ms:
+            busy_until = time.perf_counter() + self.extra_load_ms * len(records) / 1000.0
+            while time.perf_counter() < busy_until:
+                pass
+        # CPU di tutti i thread del processo, ripartita sui frame arrivati da un tick all'altro
+        cpu = time.process_time()
+        cpu_per_frame = (cpu - self._cpu_mark) / len(records) if self._cpu_mark is not None else None
+        self._cpu_mark = cpu
+        for _, captured, _, presented, displayed in records:
+            self.frame_times.append(presented)
+            if cpu_per_frame is not None:
+                self.cpu_times.append(cpu_per_frame)
+            if displayed is not None:
+                self.latencies.append(displayed - captured)
+        if self.max_frames and len(self.frame_times) >= self.max_frames:
+            self._finish()
+
+    def _poll(self):
+        # La sorgente finita ferma l'app da sola: si chiude il ciclo degli eventi
+        if not self.window.timer.isActive():
+            self._finish()
+
+    def _finish(self):
+        if self.window.timer.isActive():
+            self.window.stop_exercise()
+        self.app.quit()
+
+    def run(self):
+        self.app = QApplication.instance() or QApplication(sys.argv[:1])
+        if self.trace_memory:
+            tracemalloc.start()
+        self.window = FitnessCoachApp(self._create_source, countdown_seconds=0, review_errors_on_stop=False,
+                                      live_server=self.live_server)
+        self.window.exercise_selector.setCurrentText(self.exercise)
+        self.window.target_reps_input.setValue(self.target_reps)
+        self.window.show()
+
+        # I tempi dei frame analizzati si raccolgono dopo ogni aggiornamento del display
+        self.window.frame_updated.connect(self._tick)
+        poll = QTimer()
+        poll.timeout.connect(self._poll)
+        poll.start(100)
+        QTimer.singleShot(int(self.duration_s * 1000), self._finish)
+
+        start = time.perf_counter()
+        QTimer.singleShot(0, self.window.start_exercise)
+        self.app.exec()
+        wall = time.perf_counter() - start
+        poll.stop()
+
+        traced_peak = None
+        if self.trace_memory:
+            traced_peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.window.close()
+        return self.report(wall, traced_peak)
+
+    def report(self, wall, traced_peak):
+        n = len(self.frame_times)
+        warmup = min(self.warmup_frames, max(0, n - 2))
+        times = self.frame_times[warmup:]
+        sustained = (len(times) - 1) / (times[-1] - times[0]) if len(times) > 1 and times[-1] > times[0] else 0.0
+        latencies = np.array(self.latencies[warmup:] or [0.0]) * 1000.0
+        cpu = np.array(self.cpu_times[warmup:] or [0.0]) * 1000.0
+        # ru_maxrss è in kB su Linux e in byte su macOS
+        scale = 1 if sys.platform == 'darwin' else 1024
+        audio = self.window.audio.stats()
+        return {
+            'frames': n,
+            'displayed': len(self.latencies),
+            'skipped': getattr(self.source, 'frames_skipped', 0),
+            'wall_s': wall,
+            'sustained_fps': sustained,
+            'latency_p50_ms': float(np.percentile(latencies, 50)),
+            'latency_p95_ms': float(np.percentile(latencies, 95)),
+            'latency_max_ms': float(latencies.max()),
+            'cpu_ms_per_frame': float(cpu.mean()),
+            'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20,
+            'peak_traced_mb': None if traced_peak is None else traced_peak / 2**20,
+            'reps': self.window.ex_analyzer.get_rep_count(),
+            'audio_cues': audio['played'],
+            'audio_latency_p95_ms': audio['latency_p95_ms'],
+            'audio_latency_max_ms': audio['latency_max_ms'],
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end di FitnessCoachApp (Qt offscreen).")
+    parser.add_argument('--source', default='synthetic:Squat',
+                        help="webcam:N, file video, cartella/glob di immagini o synthetic:Squat|Lunge")
+    parser.add_argument('--pacing', choices=('realtime', 'fast'), default='fast')
+    parser.add_argument('--loop', action='store_true')
+    parser.add_argument('--exercise', choices=exercise_names(), default=None)
+    parser.add_argument('--target-reps', type=int, default=0)
+    parser.add_argument('--duration', type=float, default=20.0, help="Durata massima in secondi")
+    parser.add_argument('--max-frames', type=int, default=None)
+    parser.add_argument('--warmup', type=int, default=30, help="Frame iniziali esclusi dalle statistiche")
+    parser.add_argument('--extra-load-ms', type=float, default=0.0,
+                        help="Carico aggiuntivo per frame (ms) che simula un'inferenza più pesante")
+    parser.add_argument('--tracemalloc', action='store_true', help="Misura anche il picco di memoria Python (più lento)")
+    args = parser.parse_args()
+
+    bench = AppBenchmark(args.source, pacing=args.pacing, loop=args.loop, exercise=args.exercise,
+                         target_reps=args.target_reps, duration_s=args.duration,
+                         max_frames=args.max_frames, warmup_frames=args.warmup,
+                         trace_memory=args.tracemalloc, extra_load_ms=args.extra_load_ms)
+    stats = bench.run()
+    print(f"Sorgente: {args.source} ({args.pacing}), esercizio {bench.exercise}")
+    print(f"Frame: {stats['frames']} in {stats['wall_s']:.1f} s (saltati dalla sorgente: {stats['skipped']}), "
+          f"ripetizioni contate: {stats['reps']}")
+    print(f"FPS sostenuti: {stats['sustained_fps']:.1f}")
+    print(f"Frame mostrati: {stats['displayed']} (gli altri analizzati tra due refresh del display)")
+    print(f"Latenza movimento -> display: p50 {stats['latency_p50_ms']:.2f} ms, p95 {stats['latency_p95_ms']:.2f} ms, "
+          f"max {stats['latency_max_ms']:.2f} ms; CPU {stats['cpu_ms_per_frame']:.2f} ms/frame")
+    line = f"Picco memoria: RSS {stats['peak_rss_mb']:.1f} MB"
+    if stats['peak_traced_mb'] is not None:
+        line += f", Python {stats['peak_traced_mb']:.1f} MB"
+    print(line)
+    print(f"Audio: {stats['audio_cues']} segnali, latenza trigger -> suono p95 {stats['audio_latency_p95_ms']:.1f} ms, "
+          f"max {stats['audio_latency_max_ms']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,135 @@
+# benchmark_backends.py
+"""
+Confronta i backend di inferenza della posa (latenza e throughput) sulle stesse fixture.
+
+Esempi:
+    python benchmark_backends.py --video sessione.mp4 --max-frames 300
+    python benchmark_backends.py --images "fixtures/*.jpg" --onnx-model pose_landmark_full.onnx --onnx-threads 1 2 4
+"""
+import argparse
+import glob
+import time
+
+import cv2
+import numpy as np
+
+from pose_backends import MediaPipeBackend, OnnxPoseBackend
+
+
+def load_fixtures(video=None, images=None, max_frames=300, width=None):
+    """Carica in memoria i frame (RGB) da un video o da un insieme di immagini."""
+    frames = []
+    if video:
+        cap = cv2.VideoCapture(video)
+        while len(frames) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            frames.append(frame)
+        cap.release()
+    elif images:
+        for path in sorted(glob.glob(images))[:max_frames]:
+            frame = cv2.imread(path)
+            if frame is not None:
+                frames.append(frame)
+    if not frames:
+        raise SystemExit("Nessun frame caricato: indicare --video o --images.")
+    result = []
+    for frame in frames:
+        frame = cv2.flip(frame, 1)
+        # Stessa area video usata dall'app (80% sinistro del frame)
+        frame = frame[:, :int(frame.shape[1] * 0.8)]
+        if width and frame.shape[1] != width:
+            scale = width / frame.shape[1]
+            frame = cv2.resize(frame, (width, int(round(frame.shape[0] * scale))))
+        result.append(np.ascontiguousarray(cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)))
+    return result
+
+
+def run_backend(backend, frames, warmup=10, repeat=1):
+    """Esegue il backend su tutti i frame e misura la latenza di ogni chiamata."""
+    for frame in frames[:warmup]:
+        backend.process(frame)
+    latencies = []
+    outputs = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for frame in frames:
+            t0 = time.perf_counter()
+            lm = backend.process(frame)
+            latencies.append(time.perf_counter() - t0)
+            outputs.append(None if lm is None else lm.copy())
+    total = time.perf_counter() - start
+    latencies = np.array(latencies) * 1000.0
+    detected = sum(o is not None for o in outputs)
+    return {
+        'p50_ms': float(np.percentile(latencies, 50)),
+        'p95_ms': float(np.percentile(latencies, 95)),
+        'mean_ms': float(latencies.mean()),
+        'fps': len(latencies) / total,
+        'detection_rate': detected / len(outputs),
+        'outputs': outputs[:len(frames)],
+    }
+
+
+def landmark_deviation(outputs, reference):
+    """Scostamento medio (coordinate normalizzate) dei landmark visibili rispetto al riferimento."""
+    errors = []
+    for out, ref in zip(outputs, reference):
+        if out is None or ref is None:
+            continue
+        visible = (ref[:, 3] > 0.5) & (out[:, 3] > 0.5)
+        if visible.any():
+            errors.append(np.linalg.norm(out[visible, :2] - ref[visible, :2], axis=1).mean())
+    return float(np.mean(errors)) if errors else float('nan')
+
+
+def build_backends(args):
+    backends = []
+    for complexity in args.mediapipe_complexity:
+        backends.append((f'mediapipe c={complexity}',
+                         lambda c=complexity: MediaPipeBackend(model_complexity=c)))
+    if args.onnx_model:
+        for threads in args.onnx_threads:
+            label = f'onnx/{args.onnx_runtime} t={threads}'
+            backends.append((label, lambda t=threads: OnnxPoseBackend(
+                args.onnx_model, input_size=(args.onnx_input, args.onnx_input),
+                runtime=args.onnx_runtime, num_threads=t)))
+    return backends
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark dei backend di inferenza della posa.")
+    parser.add_argument('--video', help="Video di fixture")
+    parser.add_argument('--images', help="Glob di immagini di fixture")
+    parser.add_argument('--max-frames', type=int, default=300)
+    parser.add_argument('--width', type=int, default=None, help="Larghezza dell'area video (ridimensiona)")
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--mediapipe-complexity', type=int, nargs='*', default=[0, 1])
+    parser.add_argument('--onnx-model', help="Modello di posa esportato in ONNX")
+    parser.add_argument('--onnx-runtime', default='auto', choices=['auto', 'onnxruntime', 'opencv'])
+    parser.add_argument('--onnx-threads', type=int, nargs='*', default=[1, 2, 4])
+    parser.add_argument('--onnx-input', type=int, default=256)
+    args = parser.parse_args()
+
+    frames = load_fixtures(args.video, args.images, args.max_frames, args.width)
+    h, w = frames[0].shape[:2]
+    print(f"Fixture: {len(frames)} frame {w}x{h}")
+    print(f"{'backend':<28}{'p50 ms':>9}{'p95 ms':>9}{'FPS':>9}{'rilev.':>9}{'scost.':>9}")
+
+    reference = None
+    for label, factory in build_backends(args):
+        backend = factory()
+        try:
+            stats = run_backend(backend, frames, repeat=args.repeat)
+        finally:
+            backend.close()
+        if reference is None:
+            reference = stats['outputs']
+        deviation = landmark_deviation(stats['outputs'], reference)
+        print(f"{label:<28}{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['fps']:>9.1f}"
+              f"{stats['detection_rate']:>9.0%}{deviation:>9.4f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,243 @@
+# error_clips.py
+"""
+Clip degli errori di forma: gli ultimi pre_seconds di video prima dell'errore e post_seconds
+dopo, con i landmark di ogni frame, per rivedere il movimento che ha portato all'errore.
+
+Il ciclo di cattura chiama push() a ogni frame: fps volte al secondo il frame viene
+ridotto a max_width in un buffer di un FramePool dedicato e messo in un buffer circolare.
+trigger() congela il buffer circolare (i buffer vengono trattenuti, nessuna copia) e continua a
+raccogliere i frame successivi; a clip completa un thread separato la codifica in JPEG e
+restituisce i buffer al pool. La memoria resta fissa comunque vadano le cose: il pool ha un
+numero massimo di buffer (buffer circolare più al massimo max_pending clip in attesa di
+codifica; gli errori oltre vengono ignorati) e si tengono solo le ultime max_clips clip codificate.
+"""
+import threading
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+
+from frame_pool import FramePool
+from pose_backends import NUM_LANDMARKS
+
+
+class ErrorClip:
+    """Clip codificata: JPEG per frame (decodificati solo quando servono), landmark e tempi."""
+    def __init__(self, feedback, jpegs, landmarks, timestamps, event_index, fps):
+        self.feedback = feedback
+        self.jpegs = jpegs
+        self.landmarks = landmarks      # (n, 33, 4), NaN dove mancava la persona
+        self.timestamps = timestamps    # Secondi relativi al frame dell'errore
+        self.event_index = event_index
+        self.fps = fps
+
+    def __len__(self):
+        return len(self.jpegs)
+
+    def frame(self, index):
+        """Frame BGR 'index' decodificato al momento."""
+        return cv2.imdecode(np.frombuffer(self.jpegs[index], dtype=np.uint8), cv2.IMREAD_COLOR)
+
+    @property
+    def nbytes(self):
+        return sum(len(jpeg) for jpeg in self.jpegs) + self.landmarks.nbytes + self.timestamps.nbytes
+
+
+class ErrorClipRecorder:
+    """
+    Buffer circolare dei frame recenti e codifica delle clip degli errori.
+    - pre_seconds/post_seconds: durata della clip prima e dopo l'errore
+    - fps: frame al secondo conservati (la cattura può andare più veloce)
+    - max_width: larghezza dei frame conservati
+    - max_clips: clip codificate tenute in memoria (le più vecchie vengono scartate)
+    - max_pending: clip in raccolta o in attesa di codifica contemporaneamente
+    """
+    def __init__(self, pre_seconds=3.0, post_seconds=1.0, fps=15.0, max_width=480, quality=80,
+                 max_clips=20, max_pending=2):
+        self.pre_seconds = pre_seconds
+        self.post_seconds = post_seconds
+        self.fps = fps
+        self.max_width = max_width
+        self.quality = quality
+        self.max_pending = max_pending
+        self.pre_frames = max(1, int(round(pre_seconds * fps)))
+        self.post_frames = int(round(post_seconds * fps))
+        clip_frames = self.pre_frames + self.post_frames
+        self.pool = FramePool(capacity=self.pre_frames + 1,
+                              max_capacity=self.pre_frames + 1 + max_pending * clip_frames)
+        self._ring = deque()      # (FrameBuffer, landmark, tempo)
+        self._collecting = []     # Clip in raccolta dei frame successivi all'errore
+        self._last_push = None
+        self._input_shape = None
+        self._size = None
+
+        self.clips = deque(maxlen=max_clips)
+        self._jobs = deque()
+        self._cond = threading.Condition()
+        self._busy = 0            # Clip consegnate al thread e non ancora finite
+        self._generation = 0      # Cambia a ogni reset: le clip di un allenamento precedente si scartano
+        self._running = False
+        self._thread = None
+        self.counts = {'frames': 0, 'triggered': 0, 'encoded': 0, 'dropped_events': 0, 'dropped_frames': 0}
+        self.encode_seconds = 0.0
+
+    def start(self):
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._encode_loop, name='error-clips', daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.reset()
+        if not self._running:
+            return
+        with self._cond:
+            self._running = False
+            self._cond.notify_all()
+        self._thread.join(timeout=2.0)
+        self._thread = None
+
+    # --- Lato cattura (thread della GUI) ---
+
+    def push(self, frame, landmarks, timestamp=None):
+        """Frame BGR completo (pulito) e landmark (33, 4) o None. Costo: una riduzione a fps frame al secondo."""
+        timestamp = time.monotonic() if timestamp is None else timestamp
+        if self._last_push is not None and timestamp - self._last_push < 0.999 / self.fps:
+            return
+        self._last_push = timestamp
+        if self._input_shape != frame.shape:
+            h, w = frame.shape[:2]
+            scale = min(1.0, self.max_width / w)
+            self._size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+            self._input_shape = frame.shape
+            self._clear_ring()
+            self.pool.resize((self._size[1], self._size[0], 3))
+        try:
+            buf = self.pool.acquire()
+        except RuntimeError:
+            # Tutti i buffer trattenuti da clip non ancora codificate: si salta il frame
+            self.counts['dropped_frames'] += 1
+            return
+        if frame.shape[1] == self._size[0]:
+            np.copyto(buf.array, frame)
+        else:
+            cv2.resize(frame, self._size, dst=buf.array, interpolation=cv2.INTER_AREA)
+        lm = landmarks.astype(np.float32) if landmarks is not None else \
+            np.full((NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+        sample = (buf, lm, timestamp)
+        self.counts['frames'] += 1
+
+        self._ring.append(sample)
+        if len(self._ring) > self.pre_frames:
+            self._ring.popleft()[0].release()
+        for clip in self._collecting:
+            clip['samples'].append((buf.retain(), lm, timestamp))
+        ready = [clip for clip in self._collecting if len(clip['samples']) >= clip['length']]
+        for clip in ready:
+            self._collecting.remove(clip)
+            self._submit(clip)
+
+    def trigger(self, feedback):
+        """Errore al frame più recente: congela i secondi precedenti e raccoglie quelli successivi."""
+        if not self._ring:
+            return False
+        with self._cond:
+            pending = self._busy + len(self._jobs)
+        if pending + len(self._collecting) >= self.max_pending:
+            self.counts['dropped_events'] += 1
+            return False
+        self.counts['triggered'] += 1
+        samples = [(buf.retain(), lm, t) for buf, lm, t in self._ring]
+        clip = {'feedback': feedback, 'samples': samples, 'event_index': len(samples) - 1,
+                'length': len(samples) + self.post_frames, 'generation': self._generation}
+        if self.post_frames == 0:
+            self._submit(clip)
+        else:
+            self._collecting.append(clip)
+        return True
+
+    def finish(self, timeout=2.0):
+        """
+        Fine dell'allenamento: le clip in raccolta vengono chiuse con i frame che hanno e si
+        attende la codifica (al massimo timeout secondi). Restituisce le clip disponibili.
+        """
+        for clip in self._collecting:
+            self._submit(clip)
+        self._collecting = []
+        self._clear_ring()
+        with self._cond:
+            self._cond.wait_for(lambda: not self._jobs and not self._busy, timeout)
+            return list(self.clips)
+
+    def reset(self):
+        """Nuovo allenamento: svuota buffer circolare, clip in raccolta e clip codificate."""
+        for clip in self._collecting:
+            self._release(clip)
+        self._collecting = []
+        self._clear_ring()
+        self._last_push = None
+        with self._cond:
+            self._generation += 1
+            while self._jobs:
+                self._release(self._jobs.popleft())
+            self.clips.clear()
+
+    def _clear_ring(self):
+        while self._ring:
+            self._ring.popleft()[0].release()
+
+    @staticmethod
+    def _release(clip):
+        for buf, _, _ in clip['samples']:
+            buf.release()
+        clip['samples'] = []
+
+    def _submit(self, clip):
+        with self._cond:
+            if self._running:
+                self._jobs.append(clip)
+                self._cond.notify()
+                return
+        self._release(clip)
+
+    # --- Codifica ---
+
+    def _encode_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._jobs or not self._running)
+                if not self._running:
+                    return
+                clip = self._jobs.popleft()
+                self._busy += 1
+            encoded = None
+            try:
+                t0 = time.perf_counter()
+                samples = clip['samples']
+                params = [cv2.IMWRITE_JPEG_QUALITY, self.quality]
+                jpegs = [cv2.imencode('.jpg', buf.array, params)[1].tobytes() for buf, _, _ in samples]
+                event_time = samples[clip['event_index']][2]
+                encoded = ErrorClip(clip['feedback'], jpegs, np.stack([lm for _, lm, _ in samples]),
+                                    np.array([t - event_time for _, _, t in samples]), clip['event_index'],
+                                    self.fps)
+                self.encode_seconds += time.perf_counter() - t0
+            except Exception as e:
+                print(f"Errore nella codifica della clip: {e}")
+            finally:
+                self._release(clip)
+            with self._cond:
+                if encoded is not None and clip['generation'] == self._generation:
+                    self.clips.append(encoded)
+                    self.counts['encoded'] += 1
+                self._busy -= 1
+                self._cond.notify_all()
+
+    def stats(self):
+        encoded = self.counts['encoded']
+        with self._cond:
+            clip_bytes = sum(clip.nbytes for clip in self.clips)
+        return {**self.counts, 'clips': len(self.clips), 'clip_kb': clip_bytes / 1024,
+                'buffers': self.pool.stats()['buffers'],
+                'encode_ms': self.encode_seconds / encoded * 1000.0 if encoded else 0.0}
@@ -0,0 +1,155 @@
+# exercise_definitions.py
+"""
+Esercizi descritti come dati e registro degli esercizi disponibili.
+
+Formato di una definizione (compilata da exercise_engine.compile_exercise):
+- required: landmark che devono essere visibili (tutti quelli usati più sotto)
+- thresholds: soglie di default (angoli in gradi), sovrascrivibili in ExerciseAnalyzer
+- points: punti derivati in pixel, ('mid', a, b)
+- angles: angoli al vertice centrale, (a, vertice, b) con id di landmark o nomi di punti
+- values: grandezze derivate, ('mean' | 'min' | 'max', nome, nome, ...)
+- states: stati della macchina a stati (oltre allo stato iniziale None)
+- rules: regole in ordine, vince la prima la cui condizione 'when' è vera (senza 'when' = sempre).
+  'state' imposta lo stato (assente = invariato); 'count_from' completa una ripetizione se lo
+  stato precedente è quello indicato; 'feedback' e 'ok' possono dipendere dallo stato precedente
+  ({stato: valore, '*': altrimenti}); 'feedback' può avere 'count' per la ripetizione completata,
+  con {reps} sostituito dal contatore
+- overrides: correzioni finali applicate se lo stato dopo le regole è 'state' e 'when' è vera
+- depth_widget: coppie di landmark (y normalizzata) per il widget di profondità e frazioni dei
+  limiti tra 'top' e 'bottom'
+Condizioni: ('gt' | 'ge' | 'lt' | 'le', a, b), ('between', x, min, max), ('and', ...),
+('or', ...), ('not', c); gli operandi sono nomi di grandezze, nomi di soglie o numeri.
+"""
+from exercise_engine import STABILITY_THRESHOLDS, compile_exercise
+
+SQUAT = {
+    'name': 'Squat',
+    'required': [11, 12, 23, 24, 25, 26, 27, 28],
+    'thresholds': {
+        'squat_up_angle': 160,        # Ginocchio oltre: posizione "su"
+        'squat_min_angle': 110,       # Zona di squat valido: [min, max]
+        'squat_max_angle': 130,
+        'squat_torso_warning': 45,    # Busto troppo piegato nella zona valida
+        'squat_torso_limit': 40,      # Busto troppo piegato in posizione "giù"
+    },
+    'points': {
+        'shoulder_mid': ('mid', 11, 12),
+        'hip_mid': ('mid', 23, 24),
+        'knee_mid': ('mid', 26, 25),
+    },
+    'angles': {
+        'knee_r': ('hip_mid', 26, 28),
+        'knee_l': ('hip_mid', 25, 27),
+        'torso': ('shoulder_mid', 'hip_mid', 'knee_mid'),
+    },
+    'values': {
+        'knee': ('mean', 'knee_r', 'knee_l'),
+    },
+    'states': ['up', 'down'],
+    'rules': [
+        # Ginocchio quasi dritto: posizione "su", ripetizione completata se si era "giù"
+        {'when': ('gt', 'knee', 'squat_up_angle'), 'state': 'up', 'count_from': 'down',
+         'feedback': {'count': 'Ottimo! Ripetizione {reps} completata.',
+                      '*': 'Piega le ginocchia per iniziare lo squat.'}},
+        # Zona di squat valido
+        {'when': ('and', ('between', 'knee', 'squat_min_angle', 'squat_max_angle'),
+                  ('lt', 'torso', 'squat_torso_warning')),
+         'state': 'down', 'ok': False,
+         'feedback': 'Tieni la schiena più dritta, non piegare troppo il busto.'},
+        {'when': ('between', 'knee', 'squat_min_angle', 'squat_max_angle'), 'state': 'down',
+         'feedback': 'Ottima posizione per lo squat!'},
+        # Squat troppo profondo: comunque "giù"
+        {'when': ('lt', 'knee', 'squat_min_angle'), 'state': 'down', 'ok': False,
+         'feedback': 'Squat troppo profondo, risali fino alla zona corretta.'},
+        # Non abbastanza in basso: lo stato non cambia, per non convalidare un mezzo squat
+        {'when': ('and', ('gt', 'knee', 'squat_max_angle'), ('le', 'knee', 'squat_up_angle')),
+         'feedback': {'up': 'Scendi di più per un squat valido.',
+                      'down': 'Scendi ancora un po\' per completare il movimento.',
+                      '*': 'Scendi di più per raggiungere la posizione corretta.'}},
+        # Stati intermedi o non riconosciuti
+        {'feedback': {'up': 'Scendi controllando il movimento.',
+                      'down': 'Completa il movimento salendo correttamente.',
+                      '*': 'Preparati per lo squat.'}},
+    ],
+    'overrides': [
+        {'when': ('lt', 'torso', 'squat_torso_limit'), 'state': 'down',
+         'feedback': 'Attenzione alla schiena! Tienila più dritta.'},
+    ],
+    'default_feedback': 'Continua...',
+    # Limiti relativi all'altezza spalle -> caviglie: 35% inizio, 50% profondità ideale, 65% fine
+    'depth_widget': {
+        'current': (23, 24),
+        'top': (11, 12),
+        'bottom': (27, 28),
+        'min_height': 0.1,
+        'bounds': {'upper_bound_y': 0.35, 'correct_bound_y': 0.5, 'lower_bound_y': 0.65},
+    },
+}
+
+LUNGE = {
+    'name': 'Lunge',
+    'required': [23, 24, 25, 26, 27, 28],
+    'thresholds': {
+        'lunge_up_angle': 160,        # Entrambe le ginocchia oltre: posizione "su"
+        'lunge_front_min': 75,        # Ginocchio anteriore nell'affondo: [min, max]
+        'lunge_front_max': 115,
+        'lunge_back_min': 65,         # Ginocchio posteriore nell'affondo: [min, max]
+        'lunge_back_max': 150,
+        'lunge_too_deep': 65,         # Entrambe le ginocchia sotto: affondo troppo profondo
+    },
+    'angles': {
+        'knee_r': (24, 26, 28),
+        'knee_l': (23, 25, 27),
+    },
+    'states': ['up', 'down'],
+    'rules': [
+        {'when': ('and', ('gt', 'knee_r', 'lunge_up_angle'), ('gt', 'knee_l', 'lunge_up_angle')),
+         'state': 'up', 'count_from': 'down',
+         'feedback': {'count': 'Ottimo! Ripetizione {reps} completata.',
+                      '*': 'Fai un passo per iniziare l\'affondo.'}},
+        # Una gamba anteriore e l'altra posteriore, in entrambi i versi
+        {'when': ('or',
+                  ('and', ('between', 'knee_r', 'lunge_front_min', 'lunge_front_max'),
+                   ('between', 'knee_l', 'lunge_back_min', 'lunge_back_max')),
+                  ('and', ('between', 'knee_l', 'lunge_front_min', 'lunge_front_max'),
+                   ('between', 'knee_r', 'lunge_back_min', 'lunge_back_max'))),
+         'state': 'down', 'feedback': 'Buona posizione di affondo!'},
+        {'when': ('and', ('lt', 'knee_r', 'lunge_too_deep'), ('lt', 'knee_l', 'lunge_too_deep')),
+         'state': 'down', 'ok': False,
+         'feedback': "Affondo troppo profondo o posizione errata, risali un po'."},
+        {'feedback': {'down': "Stai risalendo o correggendo la tua forma...",
+                      '*': 'Scendi nell\'affondo...'},
+         'ok': {'down': True, '*': False}},
+    ],
+    'default_feedback': "Continua l'affondo...",
+}
+
+EXERCISES = {}
+
+
+def register_exercise(definition):
+    """Compila una definizione e la rende disponibile all'app e all'analizzatore."""
+    exercise = compile_exercise(definition)
+    EXERCISES[exercise.name] = exercise
+    return exercise
+
+
+def get_exercise(name):
+    return EXERCISES.get(name)
+
+
+def exercise_names():
+    return list(EXERCISES)
+
+
+def exercise_thresholds():
+    """Soglie di default di tutti gli esercizi registrati, più quelle di stabilità."""
+    thresholds = {}
+    for exercise in EXERCISES.values():
+        thresholds.update(exercise.thresholds)
+    thresholds.update(STABILITY_THRESHOLDS)
+    return thresholds
+
+
+register_exercise(SQUAT)
+register_exercise(LUNGE)
@@ -0,0 +1,454 @@
+# exercise_engine.py
+"""
+Motore delle definizioni dichiarative degli esercizi (vedi exercise_definitions.py).
+
+Una definizione descrive punti richiesti, punti derivati, angoli e grandezze, stati, regole
+con il feedback, correzioni finali e limiti del widget di profondità. compile_exercise() la
+traduce in funzioni che operano indifferentemente su scalari (un frame dal vivo, con
+CompiledExercise.step) o su array (una sessione o un batch, con CompiledExercise.evaluate):
+aggiungere un esercizio non aggiunge codice Python al percorso di ogni frame.
+
+La valutazione di una sessione è interamente vettorizzata nel tempo: ogni regola imposta uno
+stato costante oppure lo lascia invariato, quindi la sequenza degli stati è un riempimento in
+avanti degli eventi; stabilità e ripetizioni sono lunghezze di serie e somme cumulative.
+"""
+import operator
+
+import numpy as np
+
+VISIBILITY_THRESHOLD = 0.3  # Come landmarks_to_positions
+
+# Soglie comuni a tutti gli esercizi
+STABILITY_THRESHOLDS = {
+    'req_stable_frames': 20,      # Frame necessari per la stabilità
+    'max_unstable_frames': 15,    # Max frame instabili tollerati
+}
+
+# Messaggi comuni di visibilità e stabilità
+MSG_NOT_VISIBLE = "Non sei visibile alla telecamera. Posizionati di fronte per iniziare."
+MSG_PARTIALLY_VISIBLE = "Alcuni punti del corpo non sono visibili. Assicurati di essere interamente nell'inquadratura."
+MSG_VISIBILITY_LOST = "Visibilità persa, riposizionati."
+MSG_LOST_TOO_LONG = "Visibilità persa troppo a lungo. Riposizionati e mantieni la stabilità."
+MSG_STABLE = "Stabile. Puoi iniziare l'esercizio!"
+MSG_HOLD_STILL = "Mantieni una posizione stabile ({stable}/{required})..."
+COMMON_MESSAGES = (MSG_NOT_VISIBLE, MSG_PARTIALLY_VISIBLE, MSG_VISIBILITY_LOST, MSG_LOST_TOO_LONG, MSG_HOLD_STILL)
+_ID_NOT_VISIBLE, _ID_PARTIALLY_VISIBLE, _ID_VISIBILITY_LOST, _ID_LOST_TOO_LONG, _ID_HOLD_STILL = range(5)
+
+_COMPARISONS = {'gt': operator.gt, 'ge': operator.ge, 'lt': operator.lt, 'le': operator.le}
+_REDUCTIONS = {'mean', 'min', 'max'}
+
+
+def joint_angle(p1, p2, p3):
+    """Angolo (gradi, 0-180) in p2 tra p1 e p3; punti (x, y) scalari o array."""
+    radians = np.arctan2(p3[1] - p2[1], p3[0] - p2[0]) - np.arctan2(p1[1] - p2[1], p1[0] - p2[0])
+    angle = np.abs(radians * 180.0 / np.pi)
+    if np.ndim(angle):
+        return np.where(angle > 180.0, 360 - angle, angle)
+    return 360 - angle if angle > 180.0 else angle
+
+
+def _run_length(mask, initial):
+    # Lunghezza della serie di True consecutivi che termina in ogni frame (ultimo asse);
+    # 'initial' è la lunghezza della serie già in corso prima del primo frame
+    idx = np.arange(mask.shape[-1])
+    last_break = np.maximum.accumulate(np.where(mask, -1, idx), axis=-1)
+    return np.where(last_break >= 0, idx - last_break, idx + 1 + initial)
+
+
+def _forward_fill(event, values, initial):
+    # Valore dell'ultimo evento fino a ogni frame (ultimo asse), 'initial' prima del primo
+    idx = np.arange(event.shape[-1])
+    last = np.maximum.accumulate(np.where(event, idx, -1), axis=-1)
+    filled = np.take_along_axis(values, np.maximum(last, 0), axis=-1)
+    return np.where(last >= 0, filled, initial)
+
+
+def _shift(array, first):
+    # Valore al frame precedente (ultimo asse), 'first' al primo frame
+    shifted = np.empty_like(array)
+    shifted[..., 0] = first
+    shifted[..., 1:] = array[..., :-1]
+    return shifted
+
+
+class _Rule:
+    def __init__(self, condition, state, count_from, outcomes, count_message):
+        self.condition = condition      # Funzione (env, soglie) -> bool / array, None = sempre
+        self.state = state              # Codice dello stato impostato, None = invariato
+        self.count_from = count_from    # Codici degli stati precedenti che completano una ripetizione
+        self.outcomes = outcomes        # Per codice dello stato precedente: (id messaggio, esito)
+        self.count_message = count_message
+
+
+class _Override:
+    def __init__(self, condition, state, message, ok):
+        self.condition = condition
+        self.state = state  # Si applica solo se lo stato dopo le regole è questo
+        self.message = message
+        self.ok = ok
+
+
+class CompiledExercise:
+    """Esercizio compilato: valutazione di un frame (step) o di array di frame (evaluate)."""
+    def __init__(self, definition):
+        self.name = definition['name']
+        self.required = list(definition['required'])
+        self.thresholds = dict(definition.get('thresholds', {}))
+        # Coppie di soglie (minimo, massimo) di un intervallo 'between': vincoli per le ricerche
+        self.threshold_ranges = []
+        self.state_names = [None] + list(definition['states'])
+        self.state_codes = {name: code for code, name in enumerate(self.state_names)}
+        self.messages = list(COMMON_MESSAGES)
+        self._message_ids = {}
+
+        known_thresholds = set(self.thresholds) | set(STABILITY_THRESHOLDS)
+        self._features = []  # (nome, funzione env -> valore), in ordine di dipendenza
+        self.measure_names = list(definition.get('angles', {})) + list(definition.get('values', {}))
+        names = set()
+        for name, (op, a, b) in definition.get('points', {}).items():
+            if op != 'mid':
+                raise ValueError(f"{self.name}: punto derivato '{name}' non supportato ({op})")
+            self._features.append((name, self._midpoint(a, b)))
+            names.add(name)
+        for name, (a, b, c) in definition.get('angles', {}).items():
+            self._features.append((name, lambda env, a=a, b=b, c=c: joint_angle(env[a], env[b], env[c])))
+            names.add(name)
+        for name, (op, *args) in definition.get('values', {}).items():
+            if op not in _REDUCTIONS:
+                raise ValueError(f"{self.name}: grandezza '{name}' non supportata ({op})")
+            self._features.append((name, self._reduction(op, args)))
+            names.add(name)
+        self.point_ids = sorted({ref for _, spec in definition.get('points', {}).items() for ref in spec[1:]}
+                                | {ref for spec in definition.get('angles', {}).values() for ref in spec
+                                   if isinstance(ref, int)})
+        missing = set(self.point_ids) - set(self.required)
+        if missing:
+            raise ValueError(f"{self.name}: punti usati ma non richiesti: {sorted(missing)}")
+
+        self.rules = [self._compile_rule(rule, names, known_thresholds) for rule in definition['rules']]
+        self.default_message = self._message(definition.get('default_feedback', 'Continua...'))
+        self.overrides = [
+            _Override(self._condition(o['when'], names, known_thresholds), self.state_codes[o['state']],
+                      self._message(o['feedback']), o.get('ok', False))
+            for o in definition.get('overrides', [])]
+        self.depth_widget = definition.get('depth_widget')
+        if self.depth_widget is not None:
+            ids = set(self.depth_widget['current']) | set(self.depth_widget['top']) | set(self.depth_widget['bottom'])
+            if ids - set(self.required):
+                raise ValueError(f"{self.name}: punti del widget non richiesti: {sorted(ids - set(self.required))}")
+        self._build_tables()
+
+    # --- Compilazione ---
+
+    def _message(self, text):
+        if text not in self._message_ids:
+            self._message_ids[text] = len(self.messages)
+            self.messages.append(text)
+        return self._message_ids[text]
+
+    @staticmethod
+    def _midpoint(a, b):
+        return lambda env: ((env[a][0] + env[b][0]) / 2, (env[a][1] + env[b][1]) / 2)
+
+    @staticmethod
+    def _reduction(op, args):
+        if op == 'mean':
+            def mean(env):
+                total = env[args[0]]
+                for name in args[1:]:
+                    total = total + env[name]
+                return total / len(args)
+            return mean
+        combine = np.minimum if op == 'min' else np.maximum
+        def reduce(env):
+            result = env[args[0]]
+            for name in args[1:]:
+                result = combine(result, env[name])
+            return result
+        return reduce
+
+    def _operand(self, ref, names, known_thresholds):
+        if isinstance(ref, (int, float)):
+            return lambda env, t: ref
+        if ref in names:
+            return lambda env, t: env[ref]
+        if ref in known_thresholds:
+            return lambda env, t: t[ref]
+        raise ValueError(f"{self.name}: nome sconosciuto '{ref}'")
+
+    def _condition(self, expr, names, known_thresholds):
+        if expr is None:
+            return None
+        op, *args = expr
+        if op in ('and', 'or'):
+            parts = [self._condition(arg, names, known_thresholds) for arg in args]
+            combine = operator.and_ if op == 'and' else operator.or_
+            def logical(env, t):
+                result = parts[0](env, t)
+                for part in parts[1:]:
+                    result = combine(result, part(env, t))
+                return result
+            return logical
+        if op == 'not':
+            part = self._condition(args[0], names, known_thresholds)
+            return lambda env, t: np.logical_not(part(env, t))
+        if op == 'between':
+            if args[1] in known_thresholds and args[2] in known_thresholds \
+                    and (args[1], args[2]) not in self.threshold_ranges:
+                self.threshold_ranges.append((args[1], args[2]))
+            x, lo, hi = (self._operand(arg, names, known_thresholds) for arg in args)
+            return lambda env, t: (lo(env, t) <= x(env, t)) & (x(env, t) <= hi(env, t))
+        if op in _COMPARISONS:
+            compare = _COMPARISONS[op]
+            a, b = (self._operand(arg, names, known_thresholds) for arg in args)
+            return lambda env, t: compare(a(env, t), b(env, t))
+        raise ValueError(f"{self.name}: operatore sconosciuto '{op}'")
+
+    def _by_state(self, value, default):
+        # Valore per ogni codice di stato precedente: costante, oppure {stato: valore, '*': altrimenti}
+        if not isinstance(value, dict):
+            return [value] * len(self.state_names)
+        fallback = value.get('*', default)
+        return [value.get(name, fallback) for name in self.state_names]
+
+    def _compile_rule(self, rule, names, known_thresholds):
+        feedback = rule['feedback']
+        count_message = None
+        if isinstance(feedback, dict) and 'count' in feedback:
+            count_message = self._message(feedback['count'])
+            feedback = {k: v for k, v in feedback.items() if k != 'count'}
+        messages = [self._message(text) for text in self._by_state(feedback, None)]
+        oks = self._by_state(rule.get('ok', True), True)
+        count_from = rule.get('count_from', ())
+        count_from = (count_from,) if isinstance(count_from, str) else tuple(count_from)
+        state = rule.get('state')
+        return _Rule(self._condition(rule.get('when'), names, known_thresholds),
+                     None if state is None else self.state_codes[state],
+                     frozenset(self.state_codes[s] for s in count_from),
+                     list(zip(messages, oks)), count_message)
+
+    def _build_tables(self):
+        # Tabelle per la valutazione vettorizzata: riga = regola (l'ultima = nessuna regola)
+        n_rules, n_states = len(self.rules) + 1, len(self.state_names)
+        self._set_state = np.full(n_rules, -1, dtype=np.int8)
+        self._counts = np.zeros((n_rules, n_states), dtype=bool)
+        self._message_table = np.full((n_rules, n_states), self.default_message, dtype=np.int32)
+        self._ok_table = np.ones((n_rules, n_states), dtype=bool)
+        self._count_message = np.full(n_rules, -1, dtype=np.int32)
+        for r, rule in enumerate(self.rules):
+            if rule.state is not None:
+                self._set_state[r] = rule.state
+            for code in rule.count_from:
+                self._counts[r, code] = True
+            for code, (message, ok) in enumerate(rule.outcomes):
+                self._message_table[r, code] = message
+                self._ok_table[r, code] = ok
+            if rule.count_message is not None:
+                self._count_message[r] = rule.count_message
+
+    # --- Un frame (percorso dal vivo) ---
+
+    def step(self, landmarks, pos_state, thresholds):
+        """
+        Applica le regole a un frame già stabile. landmarks è il dizionario di
+        landmarks_to_positions. Restituisce (esito, messaggio da formattare con reps,
+        nuovo stato, ripetizione completata, informazioni del widget di profondità o None).
+        """
+        env = {i: (landmarks[i][0], landmarks[i][1]) for i in self.point_ids}
+        for name, feature in self._features:
+            env[name] = feature(env)
+        prev = self.state_codes[pos_state]
+        new_state, counted = prev, False
+        message, ok = self.default_message, True
+        for rule in self.rules:
+            if rule.condition is None or rule.condition(env, thresholds):
+                if rule.state is not None:
+                    new_state = rule.state
+                counted = prev in rule.count_from
+                message, ok = rule.outcomes[prev]
+                if counted and rule.count_message is not None:
+                    message = rule.count_message
+                break
+        for override in self.overrides:
+            if new_state == override.state and override.condition(env, thresholds):
+                message, ok = override.message, override.ok
+                break
+        depth = self._depth_info(lambda i: landmarks[i][5]) if self.depth_widget is not None else None
+        return bool(ok), self.messages[message], self.state_names[new_state], counted, depth
+
+    def _depth_info(self, norm_y):
+        widget = self.depth_widget
+        mid = lambda pair: (norm_y(pair[0]) + norm_y(pair[1])) / 2
+        top, bottom = mid(widget['top']), mid(widget['bottom'])
+        height = bottom - top
+        if not height > widget['min_height']:
+            return {'current_hip_y': None, 'upper_bound_y': None, 'lower_bound_y': None}
+        info = {'current_hip_y': mid(widget['current'])}
+        for key, fraction in widget['bounds'].items():
+            info[key] = top + height * fraction
+        return info
+
+    # --- Array di frame (sessioni e batch) ---
+
+    def evaluate(self, landmarks, frame_size, thresholds=None, state=None):
+        """
+        Valuta le regole su landmark normalizzati (..., n, 33, 4) con NaN dove manca la persona,
+        come una sequenza di analyze_frame a partire da 'state' (formato di get_state, default
+        contatore azzerato). Le soglie possono essere scalari o array estesi sulle dimensioni di
+        batch (es. forma (C, 1) per C configurazioni). Restituisce un ExerciseEvaluation.
+        """
+        t = {**self.thresholds, **STABILITY_THRESHOLDS, **(thresholds or {})}
+        state = state or {'rep_count': 0, 'pos_state': None, 'landmarks_stable': False,
+                          'stable_frames': 0, 'unstable_frames': 0, 'feedback': ''}
+        lm = np.asarray(landmarks, dtype=np.float64)
+        with np.errstate(invalid='ignore'):
+            visible_points = lm[..., 3] > VISIBILITY_THRESHOLD
+            required_visible = visible_points[..., self.required]
+            visible = required_visible.all(axis=-1)
+            none_visible = ~required_visible.any(axis=-1)
+            env = self._env(lm, frame_size)
+            conditions = [rule.condition(env, t) if rule.condition is not None else True for rule in self.rules]
+            override_conditions = [o.condition(env, t) for o in self.overrides]
+
+        req, max_unstable = t['req_stable_frames'], t['max_unstable_frames']
+        shape = np.broadcast_shapes(visible.shape, np.shape(req), np.shape(max_unstable),
+                                    *(np.shape(c) for c in conditions + override_conditions))
+        visible = np.broadcast_to(visible, shape)
+        stable_count = _run_length(visible, state['stable_frames'])
+        unstable_count = _run_length(~visible, state['unstable_frames'])
+        stable = visible & (stable_count >= req)
+        prev_stable = _shift(stable, state['landmarks_stable'])
+
+        zone = np.broadcast_to(np.select([np.broadcast_to(c, shape) for c in conditions],
+                                         np.arange(len(self.rules)), default=len(self.rules)), shape)
+        set_state = self._set_state[zone]
+        reset = ~visible & prev_stable
+        event = (stable & (set_state >= 0)) | reset
+        pos = _forward_fill(event, np.where(reset, 0, set_state), self.state_codes[state['pos_state']])
+        prev_pos = _shift(pos, self.state_codes[state['pos_state']])
+
+        counted = stable & self._counts[zone, prev_pos]
+        rep_count = state['rep_count'] + np.cumsum(counted, axis=-1)
+        message = self._message_table[zone, prev_pos]
+        ok = self._ok_table[zone, prev_pos]
+        count_message = self._count_message[zone]
+        message = np.where(counted & (count_message >= 0), count_message, message)
+        applied = np.zeros(shape, dtype=bool)
+        for override, condition in zip(self.overrides, override_conditions):
+            hit = ~applied & (pos == override.state) & np.broadcast_to(condition, shape)
+            message = np.where(hit, override.message, message)
+            ok = np.where(hit, override.ok, ok)
+            applied |= hit
+
+        lost = np.where(unstable_count >= max_unstable, _ID_LOST_TOO_LONG,
+                        np.where(none_visible, _ID_NOT_VISIBLE, _ID_PARTIALLY_VISIBLE))
+        message = np.where(stable, message, np.where(visible, _ID_HOLD_STILL, lost))
+        success = stable & ok
+
+        depth = None
+        if self.depth_widget is not None:
+            depth = self._depth_arrays(lm, stable)
+        present = np.broadcast_to(visible_points.any(axis=-1), shape)
+        return ExerciseEvaluation(self, shape, success, stable, rep_count, pos, message, stable_count,
+                                  unstable_count, prev_stable, present, np.broadcast_to(req, shape), depth, state)
+
+    def _env(self, lm, frame_size):
+        # Coordinate in pixel troncate come in landmarks_to_positions, poi punti, angoli e grandezze
+        width, height = frame_size
+        env = {i: (np.trunc(lm[..., i, 0] * width), np.trunc(lm[..., i, 1] * height)) for i in self.point_ids}
+        for name, feature in self._features:
+            env[name] = feature(env)
+        return env
+
+    def measure(self, landmarks, frame_size):
+        """
+        Angoli e grandezze della definizione (measure_names) per landmark normalizzati
+        (..., 33, 4), calcolati come nelle regole: {nome: array (...)}. I punti poco visibili
+        contano come mancanti (come in landmarks_to_positions) e danno NaN.
+        """
+        lm = np.asarray(landmarks, dtype=np.float64)
+        with np.errstate(invalid='ignore'):
+            lm = np.where((lm[..., 3] > VISIBILITY_THRESHOLD)[..., None], lm, np.nan)
+            env = self._env(lm, frame_size)
+        return {name: env[name] for name in self.measure_names}
+
+    def _depth_arrays(self, lm, stable):
+        widget = self.depth_widget
+        mid = lambda pair: (lm[..., pair[0], 1] + lm[..., pair[1], 1]) / 2
+        top, bottom = mid(widget['top']), mid(widget['bottom'])
+        height = bottom - top
+        with np.errstate(invalid='ignore'):
+            valid = stable & (height > widget['min_height'])
+        depth = {'current_hip_y': np.where(valid, mid(widget['current']), np.nan)}
+        for key, fraction in widget['bounds'].items():
+            depth[key] = np.where(valid, top + height * fraction, np.nan)
+        return depth
+
+
+class ExerciseEvaluation:
+    """
+    Risultati per frame di CompiledExercise.evaluate: esito, stabilità, contatore, stato
+    (codici di exercise.state_names) e id dei messaggi; i testi si formattano su richiesta.
+    """
+    def __init__(self, exercise, shape, success, stable, rep_count, pos_state, message_ids, stable_frames,
+                 unstable_frames, prev_stable, present, req_stable_frames, depth, initial_state):
+        self.exercise = exercise
+        self.shape = shape
+        self.success = success
+        self.stable = stable
+        self.rep_count = rep_count
+        self.pos_state = pos_state
+        self.message_ids = message_ids
+        self.stable_frames = stable_frames
+        self.unstable_frames = unstable_frames
+        self.depth = depth  # Limiti del widget di profondità per frame (NaN se assenti) o None
+        self._prev_stable = prev_stable
+        self._present = present
+        self._req = req_stable_frames
+        self._initial_state = initial_state
+
+    def feedback(self, index):
+        """Testo del feedback restituito al frame 'index' (tupla per i batch)."""
+        index = index if isinstance(index, tuple) else (index,)
+        return self.exercise.messages[self.message_ids[index]].format(
+            reps=int(self.rep_count[index]), stable=int(self.stable_frames[index]), required=int(self._req[index]))
+
+    def final_state(self):
+        """Stato dell'analizzatore dopo l'ultimo frame (sessione singola, formato di get_state)."""
+        if len(self.shape) != 1:
+            raise ValueError("final_state è disponibile solo per una sessione singola")
+        last = self.shape[0] - 1
+        # Senza landmark l'analizzatore aggiorna il feedback solo quando perde la stabilità
+        touched = np.flatnonzero(self._present | self._prev_stable)
+        if len(touched) == 0:
+            feedback = self._initial_state['feedback']
+        elif self._present[touched[-1]]:
+            feedback = self.feedback(int(touched[-1]))
+        else:
+            feedback = MSG_VISIBILITY_LOST
+
+        reset_info = {'current_hip_y': None, 'upper_bound_y': None, 'lower_bound_y': None}
+        if not self.stable[last]:
+            range_info = reset_info
+        elif self.depth is not None:
+            values = {k: float(v[last]) for k, v in self.depth.items()}
+            range_info = reset_info if np.isnan(values['current_hip_y']) else values
+        elif (~self.stable).any():
+            range_info = reset_info
+        else:
+            range_info = dict(self._initial_state.get('squat_range_info', reset_info))
+        return {
+            'rep_count': int(self.rep_count[last]),
+            'pos_state': self.exercise.state_names[int(self.pos_state[last])],
+            'feedback': feedback,
+            'landmarks_stable': bool(self.stable[last]),
+            'stable_frames': int(self.stable_frames[last]),
+            'unstable_frames': int(self.unstable_frames[last]),
+            'squat_range_info': range_info,
+            'target_pose_landmarks': {} if self._present.any() else
+                                     dict(self._initial_state.get('target_pose_landmarks', {})),
+        }
+
+
+def compile_exercise(definition):
+    return CompiledExercise(definition)
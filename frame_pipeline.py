@@ -0,0 +1,263 @@
+# frame_pipeline.py
+"""
+Ciclo dei frame della postazione su thread separati: cattura, riconoscimento della posa e
+presentazione procedono ognuno al proprio ritmo, invece di essere eseguiti in sequenza a ogni
+tick di un timer.
+
+- Il thread di cattura legge i frame (in buffer del FramePool) e li lascia in una casella a un
+  posto: se il riconoscimento è in ritardo il frame non ancora preso viene sostituito dal più
+  recente, come farebbe una camera. Con lossless=True (sorgenti 'fast', benchmark) la cattura
+  attende invece che il frame venga preso: nessun frame va perso.
+- Il thread di elaborazione prende l'ultimo frame, esegue process(item) (gate, posa, filtro) e
+  accoda il risultato insieme al frame da cui è stato ottenuto: frame e landmark viaggiano
+  insieme con lo stesso istante di cattura, così lo scheletro non resta indietro rispetto al video.
+- Il thread della GUI, a ogni aggiornamento del display, prende con take_results() tutti i
+  risultati arrivati, li analizza in ordine e disegna solo l'ultimo.
+
+Per ogni risultato si registrano gli istanti (perf_counter) di cattura, fine elaborazione,
+presa in carico dalla GUI e consegna al widget: la latenza movimento -> display è misurata
+frame per frame.
+"""
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class FrameMailbox:
+    """
+    Casella a un posto tra cattura ed elaborazione. put() sostituisce l'elemento non ancora
+    preso (il suo frame viene rilasciato) oppure, con block=True, attende che venga preso.
+    """
+    def __init__(self):
+        self._item = None
+        self._closed = False
+        self._cond = threading.Condition()
+        self.replaced = 0
+
+    def put(self, item, block=False):
+        with self._cond:
+            if block:
+                self._cond.wait_for(lambda: self._item is None or self._closed)
+            if self._closed:
+                item['frame'].release()
+                return False
+            if self._item is not None:
+                self._item['frame'].release()
+                self.replaced += 1
+            self._item = item
+            self._cond.notify_all()
+            return True
+
+    def take(self):
+        """Elemento più recente; None a casella chiusa e vuota."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._item is not None or self._closed)
+            item, self._item = self._item, None
+            self._cond.notify_all()
+            return item
+
+    def close(self, discard=False):
+        """Chiude la casella: take() restituisce ancora l'ultimo elemento, salvo discard=True."""
+        with self._cond:
+            self._closed = True
+            if discard and self._item is not None:
+                self._item['frame'].release()
+                self._item = None
+            self._cond.notify_all()
+
+
+class FramePipeline:
+    """
+    Cattura ed elaborazione su due thread, risultati consumati dal thread della GUI.
+    - read_frame(): (FrameBuffer, timestamp, istante di cattura) oppure None a fine sorgente
+    - process(item): completa item (dict con 'frame', 'timestamp', 'captured') sul thread di elaborazione
+    - capture_interval(): secondi minimi tra due letture (cattura rallentata in idle), o None
+    - on_result(): chiamata dal thread di elaborazione a ogni risultato e a fine sorgente (es. l'emit
+      di un segnale Qt, consegnato al thread della GUI)
+    - max_results: risultati in attesa della GUI oltre i quali l'elaborazione attende. I frame in
+      circolazione sono al massimo 2 * max_results + 4 (in attesa, presi dalla GUI, casella,
+      elaborazione e lettura): il FramePool deve poterli contenere
+    - history: risultati di cui si conservano i tempi (statistiche di latenza)
+    """
+    def __init__(self, max_results=4, history=2048):
+        self.max_results = max_results
+        self._read_frame = None
+        self._process = None
+        self._capture_interval = None
+        self._on_result = None
+        self._lossless = False
+        self._mailbox = None
+        self._results = deque()
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._threads = []
+        self._capture_done = False
+        self._processing_done = False
+        self._seq = 0
+        # (seq, cattura, fine elaborazione, presa dalla GUI, consegna al widget o None)
+        self.timings = deque(maxlen=history)
+        self.counts = {'captured': 0, 'processed': 0, 'presented': 0, 'displayed': 0,
+                       'replaced': 0, 'errors': 0}
+
+    @property
+    def running(self):
+        return bool(self._threads)
+
+    def start(self, read_frame, process, capture_interval=None, lossless=False, on_result=None):
+        if self.running:
+            self.stop()
+        self._read_frame = read_frame
+        self._process = process
+        self._capture_interval = capture_interval
+        self._on_result = on_result
+        self._lossless = lossless
+        self._mailbox = FrameMailbox()
+        self._stop.clear()
+        self._capture_done = False
+        self._processing_done = False
+        self.counts = dict.fromkeys(self.counts, 0)
+        self.timings.clear()
+        self._threads = [threading.Thread(target=self._capture_loop, name='frame-capture', daemon=True),
+                         threading.Thread(target=self._processing_loop, name='frame-processing', daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout=5.0):
+        """Ferma i thread e restituisce al pool i frame non ancora consegnati."""
+        if not self.running:
+            return
+        self._stop.set()
+        self._mailbox.close(discard=True)
+        with self._cond:
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+            if thread.is_alive():
+                print(f"Attenzione: il thread {thread.name} non si è fermato entro {timeout:g} s")
+        self._threads = []
+        self.counts['replaced'] = self._mailbox.replaced
+        for item in self.take_results():
+            item['frame'].release()
+
+    @property
+    def pending(self):
+        """Risultati pronti e non ancora presi dalla GUI."""
+        return len(self._results)
+
+    @property
+    def finished(self):
+        """True quando la sorgente è esaurita e tutti i risultati sono stati presi dalla GUI."""
+        with self._cond:
+            return self._processing_done and not self._results
+
+    def thread_ids(self):
+        return {thread.ident: thread.name for thread in self._threads if thread.ident is not None}
+
+    # --- Thread di cattura ---
+
+    def _capture_loop(self):
+        last_read = None
+        try:
+            while not self._stop.is_set():
+                interval = self._capture_interval() if self._capture_interval is not None else None
+                if interval and last_read is not None:
+                    wait = last_read + interval - time.perf_counter()
+                    if wait > 0 and self._stop.wait(wait):
+                        break
+                last_read = time.perf_counter()
+                captured = self._read_frame()
+                if captured is None:
+                    break
+                frame, timestamp, capture_time = captured
+                self.counts['captured'] += 1
+                item = {'frame': frame, 'timestamp': timestamp, 'captured': capture_time}
+                if not self._mailbox.put(item, block=self._lossless):
+                    break
+        except Exception as e:
+            print(f"Errore nella cattura dei frame: {e}")
+        finally:
+            self._capture_done = True
+            self._mailbox.close()
+
+    # --- Thread di elaborazione ---
+
+    def _processing_loop(self):
+        try:
+            while True:
+                item = self._mailbox.take()
+                if item is None or self._stop.is_set():
+                    if item is not None:
+                        item['frame'].release()
+                    break
+                try:
+                    self._process(item)
+                except Exception as e:
+                    # Il frame resta mostrabile: senza landmark, come se nessuno fosse inquadrato
+                    self.counts['errors'] += 1
+                    item['error'] = e
+                    print(f"Errore nell'elaborazione del frame: {e}")
+                item['processed'] = time.perf_counter()
+                self.counts['processed'] += 1
+                with self._cond:
+                    self._cond.wait_for(lambda: len(self._results) < self.max_results or self._stop.is_set())
+                    if self._stop.is_set():
+                        item['frame'].release()
+                        break
+                    self._results.append(item)
+                if self._on_result is not None:
+                    self._on_result()
+        finally:
+            with self._cond:
+                self._processing_done = True
+            if self._on_result is not None and not self._stop.is_set():
+                self._on_result()
+
+    # --- Thread della GUI ---
+
+    def take_results(self):
+        """Tutti i risultati pronti, dal più vecchio; i loro frame passano al chiamante."""
+        with self._cond:
+            results = list(self._results)
+            self._results.clear()
+            self._cond.notify_all()
+        presented = time.perf_counter()
+        for item in results:
+            item['presented'] = presented
+        return results
+
+    def record(self, item, displayed=None):
+        """Tempi di un risultato preso dalla GUI; displayed = istante di consegna al widget, se mostrato."""
+        self._seq += 1
+        self.counts['presented'] += 1
+        if displayed is not None:
+            self.counts['displayed'] += 1
+        self.timings.append((self._seq, item['captured'], item['processed'], item['presented'], displayed))
+
+    def timings_since(self, seq):
+        """Tempi dei risultati successivi al numero di sequenza seq (fino a 'history')."""
+        recent = []
+        for record in reversed(self.timings):
+            if record[0] <= seq:
+                break
+            recent.append(record)
+        recent.reverse()
+        return recent
+
+    def stats(self):
+        timings = list(self.timings)
+        shown = [t for t in timings if t[4] is not None]
+        display = np.array([t[4] - t[1] for t in shown] or [0.0]) * 1000.0
+        processed = np.array([t[2] - t[1] for t in timings] or [0.0]) * 1000.0
+        waited = np.array([t[3] - t[2] for t in timings] or [0.0]) * 1000.0
+        replaced = self._mailbox.replaced if self._mailbox is not None else 0
+        return {
+            **self.counts,
+            'replaced': replaced,
+            'capture_to_result_p50_ms': float(np.percentile(processed, 50)),
+            'result_wait_p50_ms': float(np.percentile(waited, 50)),
+            'display_latency_p50_ms': float(np.percentile(display, 50)),
+            'display_latency_p95_ms': float(np.percentile(display, 95)),
+            'display_latency_max_ms': float(display.max()),
+        }
@@ -0,0 +1,135 @@
+# frame_pool.py
+import threading
+import numpy as np
+
+class FrameBuffer:
+    """
+    Buffer preallocato appartenente a un FramePool.
+    Il buffer torna nel pool solo quando tutti i detentori (display, cattura errori, ...)
+    hanno chiamato release(): finché il contatore di riferimenti è > 0 non viene riutilizzato.
+    """
+    __slots__ = ('array', '_pool', '_refs')
+
+    def __init__(self, array, pool):
+        self.array = array
+        self._pool = pool
+        self._refs = 0
+
+    def retain(self):
+        # Un nuovo detentore (es. la cattura di un errore) prende possesso del buffer
+        with self._pool._lock:
+            if self._refs <= 0:
+                raise RuntimeError("FrameBuffer già restituito al pool: impossibile trattenerlo.")
+            self._refs += 1
+        return self
+
+    def release(self):
+        # Rilascia il possesso; all'ultimo rilascio il buffer torna disponibile
+        self._pool._release(self)
+
+    @property
+    def in_use(self):
+        return self._refs > 0
+
+    def __enter__(self):
+        return self.array
+
+    def __exit__(self, exc_type, exc, tb):
+        self.release()
+        return False
+
+
+class FramePool:
+    """
+    Pool di buffer video preallocati, dimensionato sulla risoluzione della camera.
+    Evita che ogni tick di update_frame allochi nuovi frame completi: flip, conversione
+    colore e disegno vengono eseguiti in place (parametri dst=) nei buffer riutilizzati.
+    """
+    def __init__(self, shape=None, dtype=np.uint8, capacity=6, max_capacity=16):
+        self.dtype = np.dtype(dtype)
+        self.capacity = capacity  # Buffer preallocati a ogni (ri)dimensionamento
+        self.max_capacity = max_capacity  # Limite oltre il quale acquire() fallisce
+        self.shape = None
+        self._free = []
+        self._all = []
+        self._lock = threading.Lock()
+        # Statistiche per verificare l'assenza di allocazioni a regime
+        self.allocations = 0
+        self.reuses = 0
+        if shape is not None:
+            self.resize(shape)
+
+    def _allocate(self):
+        buf = FrameBuffer(np.empty(self.shape, dtype=self.dtype), self)
+        self._all.append(buf)
+        self.allocations += 1
+        return buf
+
+    def resize(self, shape):
+        """
+        (Ri)dimensiona il pool per una nuova risoluzione. I buffer ancora in uso restano
+        validi per i loro detentori ma non verranno più reinseriti nel pool.
+        """
+        shape = tuple(shape)
+        with self._lock:
+            if shape == self.shape:
+                return
+            self.shape = shape
+            self._all = [b for b in self._all if b._refs > 0]
+            for b in self._all:
+                b._pool = _DetachedPool
+            self._all = []
+            self._free = [self._allocate() for _ in range(self.capacity)]
+
+    def ensure_shape(self, shape):
+        if self.shape != tuple(shape):
+            self.resize(shape)
+
+    def acquire(self):
+        """Restituisce un buffer libero con un riferimento già acquisito dal chiamante."""
+        with self._lock:
+            if self.shape is None:
+                raise RuntimeError("FramePool non dimensionato: chiamare resize() prima di acquire().")
+            if self._free:
+                buf = self._free.pop()
+                self.reuses += 1
+            elif len(self._all) < self.max_capacity:
+                buf = self._allocate()
+            else:
+                raise RuntimeError(f"FramePool esaurito: {self.max_capacity} buffer tutti in uso.")
+            buf._refs = 1
+            return buf
+
+    def _release(self, buf):
+        with self._lock:
+            if buf._refs <= 0:
+                raise RuntimeError("FrameBuffer rilasciato più volte.")
+            buf._refs -= 1
+            if buf._refs == 0 and buf._pool is self and buf.array.shape == self.shape:
+                self._free.append(buf)
+
+    def in_use_count(self):
+        with self._lock:
+            return sum(1 for b in self._all if b._refs > 0)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'shape': self.shape,
+                'buffers': len(self._all),
+                'free': len(self._free),
+                'allocations': self.allocations,
+                'reuses': self.reuses,
+            }
+
+
+class _DetachedPoolType:
+    """Segnaposto per i buffer sopravvissuti a un resize(): il rilascio non li reinserisce."""
+    _lock = threading.Lock()
+
+    def _release(self, buf):
+        with self._lock:
+            buf._refs = max(0, buf._refs - 1)
+
+
+_DetachedPool = _DetachedPoolType()
@@ -0,0 +1,282 @@
+# frame_sources.py
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from pose_backends import NUM_LANDMARKS, POSE_CONNECTIONS, PoseBackend
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.webm', '.m4v', '.mpg', '.mpeg')
+
+
+class FrameSource:
+    """
+    Sorgente di frame con la stessa interfaccia di cv2.VideoCapture usata dall'app
+    (isOpened, read(image), release). I frame sono come quelli della camera: l'app li specchia.
+    pacing = 'realtime' rispetta gli FPS della sorgente (attende se in anticipo, salta frame se in
+    ritardo, come una camera dal vivo); 'fast' restituisce i frame il più velocemente possibile.
+    """
+    name = 'base'
+
+    def __init__(self, fps=30.0, pacing='realtime', loop=False):
+        if pacing not in ('realtime', 'fast'):
+            raise ValueError(f"Pacing non supportato: {pacing}")
+        self.fps = fps
+        self.pacing = pacing
+        self.loop = loop
+        self.finished = False  # True quando una sorgente finita è esaurita
+        self.frames_read = 0
+        self.frames_skipped = 0
+        # Istante (s) dell'ultimo frame letto sulla scala della sorgente: cresce anche quando
+        # la sorgente riparte da capo, così i filtri temporali vedono il tempo trascorso
+        self.timestamp = None
+        # Istante (perf_counter) in cui l'ultimo frame è stato catturato: in tempo reale quello in
+        # cui era previsto (un frame letto in ritardo è già "vecchio"), altrimenti quello della lettura
+        self.capture_time = None
+        self._index = 0  # Indice del prossimo frame (riparte da 0 quando la sorgente ricomincia)
+        self._clock = 0  # Frame trascorsi, letti o saltati: il ritmo si misura su questo, che non riparte
+        self._t0 = None
+
+    def isOpened(self):
+        return True
+
+    def create_pose_backend(self):
+        """Backend di posa abbinato alla sorgente (None = backend di default)."""
+        return None
+
+    def _frames_to_skip(self):
+        if self.pacing != 'realtime':
+            return 0
+        now = time.perf_counter()
+        if self._t0 is None:
+            self._t0 = now - self._clock / self.fps
+            return 0
+        due = (now - self._t0) * self.fps
+        ahead = self._clock - due
+        if ahead > 0:
+            time.sleep(ahead / self.fps)
+            return 0
+        return int(due - self._clock)
+
+    def read(self, image=None):
+        skip = self._frames_to_skip()
+        if skip:
+            self.frames_skipped += skip
+            self._skip(skip)
+        due = self._t0 + self._clock / self.fps if self._t0 is not None else None
+        frame = self._next_frame(image)
+        if frame is None:
+            self.finished = True
+            return False, None
+        self._index += 1
+        self._clock += 1
+        self.frames_read += 1
+        self.timestamp = (self.frames_read + self.frames_skipped - 1) / self.fps
+        now = time.perf_counter()
+        self.capture_time = min(due, now) if due is not None else now
+        return True, frame
+
+    def _skip(self, count):
+        self._index += count
+        self._clock += count
+
+    def _next_frame(self, image):
+        raise NotImplementedError
+
+    @staticmethod
+    def _into(image, frame):
+        # Come cv2.VideoCapture.read(image): riusa il buffer se la forma coincide
+        if image is not None and image.shape == frame.shape and image.dtype == frame.dtype:
+            np.copyto(image, frame)
+            return image
+        return frame
+
+    def release(self):
+        pass
+
+
+class WebcamSource(FrameSource):
+    """Webcam tramite cv2.VideoCapture: il ritmo è quello della camera."""
+    name = 'webcam'
+
+    def __init__(self, index=0):
+        super().__init__()  # Tempo reale: è la camera a scandire i frame, nessuna attesa qui
+        self.cap = cv2.VideoCapture(index)
+        self.fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.0
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def read(self, image=None):
+        ret, frame = self.cap.read(image) if image is not None else self.cap.read()
+        if ret:
+            self.frames_read += 1
+            self.timestamp = time.monotonic()
+            self.capture_time = time.perf_counter()
+        return ret, frame
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class VideoFileSource(FrameSource):
+    """File video decodificato con OpenCV."""
+    name = 'video'
+
+    def __init__(self, path, pacing='realtime', loop=False):
+        self.path = path
+        self.cap = cv2.VideoCapture(path)
+        super().__init__(fps=self.cap.get(cv2.CAP_PROP_FPS) or 30.0, pacing=pacing, loop=loop)
+
+    def isOpened(self):
+        return self.cap is not None and self.cap.isOpened()
+
+    def _skip(self, count):
+        super()._skip(count)
+        for _ in range(count):
+            self.cap.grab()
+
+    def _next_frame(self, image):
+        ret, frame = self.cap.read(image) if image is not None else self.cap.read()
+        if not ret and self.loop and self.frames_read:
+            self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+            ret, frame = self.cap.read(image) if image is not None else self.cap.read()
+        return frame if ret else None
+
+    def release(self):
+        if self.cap is not None:
+            self.cap.release()
+            self.cap = None
+
+
+class ImageSequenceSource(FrameSource):
+    """Sequenza di immagini (glob o cartella), riprodotta agli FPS indicati."""
+    name = 'images'
+
+    def __init__(self, pattern, fps=30.0, pacing='realtime', loop=False):
+        if os.path.isdir(pattern):
+            pattern = os.path.join(pattern, '*')
+        self.paths = sorted(p for p in glob.glob(pattern)
+                            if p.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp')))
+        super().__init__(fps=fps, pacing=pacing, loop=loop)
+
+    def isOpened(self):
+        return bool(self.paths)
+
+    def _next_frame(self, image):
+        if self._index >= len(self.paths):
+            if not self.loop:
+                return None
+            self._index %= len(self.paths)
+        frame = cv2.imread(self.paths[self._index])
+        return None if frame is None else self._into(image, frame)
+
+
+class SyntheticSource(FrameSource):
+    """
+    Frame generati da SyntheticLandmarkGenerator: una figura stilizzata disegnata dai landmark
+    sintetici. Non è adatta a un modello di posa reale: create_pose_backend() restituisce un
+    backend che riporta i landmark di verità del frame (riconosciuto dal timestamp tra gli ultimi
+    letti, perché la cattura può precedere l'inferenza), così l'intera pipeline dell'app (analisi,
+    overlay, interfaccia) gira senza camera né modello.
+    """
+    name = 'synthetic'
+
+    def __init__(self, exercise_type='Squat', num_reps=20, fps=30.0, pacing='realtime', loop=True,
+                 video_size=(512, 480), seed=0, **generate_kwargs):
+        from synthetic_landmarks import SyntheticLandmarkGenerator
+        super().__init__(fps=fps, pacing=pacing, loop=loop)
+        generator = SyntheticLandmarkGenerator(exercise_type, frame_width=video_size[0],
+                                               frame_height=video_size[1], fps=fps, seed=seed)
+        self.session = generator.generate(num_reps=num_reps, **generate_kwargs)
+        video_w, video_h = video_size
+        # Frame della "camera": l'area video dell'app è l'80% sinistro del frame specchiato
+        self.frame_size = (int(round(video_w / 0.8)), video_h)
+        frame_w, frame_h = self.frame_size
+        gradient = np.linspace(70, 40, frame_h, dtype=np.float32)[:, None, None]
+        self._background = np.broadcast_to(gradient, (frame_h, frame_w, 3)).astype(np.uint8)
+        self._connections = np.array(sorted(POSE_CONNECTIONS), dtype=np.intp)
+        self.current_landmarks = None  # Landmark (33, 4) dell'ultimo frame letto
+        self._recent = {}  # timestamp -> landmark degli ultimi frame letti
+
+    def create_pose_backend(self):
+        return SyntheticPoseBackend(self)
+
+    def read(self, image=None):
+        ret, frame = super().read(image)
+        if ret:
+            self._recent[self.timestamp] = self.current_landmarks
+            if len(self._recent) > 64:
+                del self._recent[next(iter(self._recent))]
+        return ret, frame
+
+    def landmarks_at(self, timestamp):
+        """Landmark del frame con questo timestamp (o dell'ultimo letto, se non è tra i recenti)."""
+        return self._recent.get(timestamp, self.current_landmarks)
+
+    def _next_frame(self, image):
+        n = len(self.session)
+        if self._index >= n:
+            if not self.loop:
+                return None
+            self._index %= n
+        row = self.session.frames[self._index]
+        frame_w, frame_h = self.frame_size
+        frame = image if image is not None and image.shape == (frame_h, frame_w, 3) else \
+            np.empty((frame_h, frame_w, 3), dtype=np.uint8)
+        np.copyto(frame, self._background)
+
+        # Il frame verrà specchiato dall'app: si disegna già specchiato
+        pts = np.column_stack((frame_w - 1 - row[:, 0], row[:, 1])).astype(np.int32)
+        visible = row[:, 3] > 0.3
+        for a, b in self._connections:
+            if visible[a] and visible[b]:
+                cv2.line(frame, tuple(pts[a]), tuple(pts[b]), (200, 190, 180), 12, cv2.LINE_AA)
+        if visible[0]:
+            cv2.circle(frame, tuple(pts[0]), 22, (200, 190, 180), -1, cv2.LINE_AA)
+
+        lm = np.empty((NUM_LANDMARKS, 4), dtype=np.float32)
+        lm[:, 0], lm[:, 1], lm[:, 2], lm[:, 3] = row[:, 4], row[:, 5], row[:, 2], row[:, 3]
+        self.current_landmarks = lm
+        return frame
+
+
+class SyntheticPoseBackend(PoseBackend):
+    """Backend che restituisce i landmark di verità dei frame di una SyntheticSource."""
+    name = 'synthetic'
+
+    def __init__(self, source):
+        self.source = source
+
+    def process(self, img_rgb, timestamp=None):
+        lm = self.source.current_landmarks if timestamp is None else self.source.landmarks_at(timestamp)
+        if lm is None or not (lm[:, 3] > 0.3).any():
+            return None
+        return lm
+
+    def settings(self):
+        return {'backend': self.name, 'exercise': self.source.session.exercise_type}
+
+
+def create_frame_source(spec='webcam:0', pacing='realtime', loop=False, **kwargs):
+    """
+    Crea una sorgente da una descrizione testuale:
+    'webcam:N' (o un intero), un file video, una cartella o un glob di immagini,
+    'synthetic:Squat' / 'synthetic:Lunge'.
+    """
+    spec = str(spec)
+    if spec.isdigit() or spec.startswith('webcam'):
+        index = int(spec.split(':', 1)[1]) if ':' in spec else int(spec) if spec.isdigit() else 0
+        return WebcamSource(index)
+    if spec.startswith('synthetic'):
+        exercise = spec.split(':', 1)[1] if ':' in spec else 'Squat'
+        return SyntheticSource(exercise, pacing=pacing, loop=loop, **kwargs)
+    if os.path.isdir(spec) or any(ch in spec for ch in '*?['):
+        return ImageSequenceSource(spec, pacing=pacing, loop=loop, **kwargs)
+    if spec.lower().endswith(VIDEO_EXTENSIONS) or os.path.isfile(spec):
+        return VideoFileSource(spec, pacing=pacing, loop=loop)
+    raise ValueError(f"Sorgente non riconosciuta: {spec}")
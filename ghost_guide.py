@@ -7,6 +7,7 @@ class GhostGuide:
         self.animation_frame = 0
         self.animation_speed = animation_speed
         self.frame_counter = 0
+        self.keyframes = {}  # Pose chiave (inizio, fine) per esercizio, usate anche dal generatore sintetico
         self.animations = {
             'Squat': self._create_squat_animation(),
             'Lunge': self._create_lunge_animation()
@@ -81,6 +82,8 @@ class GhostGuide:
             31: [0.35, 0.95, 0], 32: [0.65, 0.95, 0]
         }
         
+        self.keyframes['Squat'] = (pose_up, pose_down)
+
         animation_frames = []
         num_frames = 30
         
@@ -170,6 +173,8 @@ class GhostGuide:
             32: [0.65, 0.9, 0]   # Punta piede sinistro indietro
         }
         
+        self.keyframes['Lunge'] = (pose_start, pose_lunge)
+
         animation_frames = []
         num_frames = 30
         
@@ -200,6 +205,21 @@ class GhostGuide:
         body_height = np.linalg.norm(head_top - ankle_center)
         return {"anchor_center": ankle_center, "body_height": body_height}
 
+    def get_keyframes_array(self, exercise_type, num_landmarks=33):
+        """
+        Restituisce le due pose chiave dell'esercizio come array (2, num_landmarks, 3).
+        I landmark non definiti nella pose iniziale valgono NaN.
+        """
+        if exercise_type not in self.keyframes:
+            return None
+        pose_a, pose_b = self.keyframes[exercise_type]
+        keyframes = np.full((2, num_landmarks, 3), np.nan)
+        for lm in pose_a:
+            if lm < num_landmarks and lm in pose_b:
+                keyframes[0, lm] = pose_a[lm]
+                keyframes[1, lm] = pose_b[lm]
+        return keyframes
+
     def update_animation_frame(self):
         self.frame_counter += 1
         if self.frame_counter % self.animation_speed == 0:
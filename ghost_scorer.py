@@ -0,0 +1,277 @@
+# ghost_scorer.py
+from collections import deque
+
+import numpy as np
+
+# Landmark usati per il confronto: naso, spalle, gomiti, polsi, anche, ginocchia, caviglie.
+# Il resto della testa e le mani sono troppo rumorosi (e incompleti nelle pose del fantasma).
+SCORE_LANDMARKS = (0, 11, 12, 13, 14, 15, 16, 23, 24, 25, 26, 27, 28)
+
+
+class GhostSimilarityScorer:
+    """
+    Confronta in streaming la posa dell'utente con l'animazione di riferimento di GhostGuide.
+    Ogni frame dell'utente viene normalizzato nel sistema del fantasma (ancora alle caviglie e
+    altezza del corpo, come in get_reference_metrics), allineato con Procrustes (rotazione +
+    traslazione, in forma chiusa e vettorizzata) e accodato a un DTW incrementale limitato a una
+    banda di celle vive (fascio attorno ai cammini migliori): il costo per frame è O(band_width * max_step),
+    con array grandi quanto la banda.
+    Una ripetizione si chiude quando l'allineamento raggiunge la fine del riferimento oppure quando
+    l'utente completa il proprio ciclo su-giù-su (anche senza arrivare al fondo del fantasma); allo
+    score si aggiunge il costo della profondità mancata rispetto al fondo del riferimento.
+    """
+    MAX_FRAME_HISTORY = 9000  # Score per frame conservati (5 minuti a 30 FPS)
+    def __init__(self, ghost_guide, exercise_type, band_width=None, aspect_ratio=512 / 480,
+                 tolerance=0.08, min_rep_frames=20, max_step=3, landmark_ids=SCORE_LANDMARKS,
+                 min_landmarks=8, beam=0.05, down_depth=0.025, up_depth=0.012):
+        self.exercise_type = exercise_type
+        self.beam = beam  # Distanza massima (costo accumulato) dal migliore delle celle che restano vive
+        self.aspect_ratio = aspect_ratio  # Larghezza/altezza dell'area video (coordinate isotrope)
+        self.tolerance = tolerance  # Costo medio (in altezze del corpo) che corrisponde a score ~37
+        self.min_landmarks = min_landmarks
+        self.min_rep_frames = min_rep_frames  # Durata minima di una ripetizione (frame)
+        self.max_step = max_step  # Avanzamento massimo nel riferimento per frame (tempo fino a max_step x)
+        # Ciclo dell'utente (altezza anche -> caviglie, in altezze del corpo): discesa minima dal
+        # punto più alto della ripetizione, poi risalita entro up_depth da quel punto
+        self.down_depth = down_depth
+        self.up_depth = up_depth
+
+        animation = ghost_guide.animations.get(exercise_type)
+        if not animation:
+            raise ValueError(f"Nessuna animazione di riferimento per {exercise_type}")
+        # In piedi gli ultimi frame del riferimento sono indistinguibili: tolleranza sulla fine
+        self.end_margin = max(1, len(animation) // 20)
+        # Celle vive al massimo tra un frame e l'altro (default: mezzo riferimento). Deve coprire la
+        # parte del riferimento che l'utente può non raggiungere: in uno squat meno profondo del
+        # fantasma la risalita comincia ben prima del fondo del riferimento
+        self.band_width = band_width if band_width is not None else max(2 * max_step, len(animation) // 2)
+        self.landmark_ids = np.array([lm for lm in landmark_ids if lm in animation[0]])
+        self.reference = np.array([[frame[lm][:2] for lm in self.landmark_ids] for frame in animation], dtype=float)
+        self.reference[..., 0] *= aspect_ratio
+        metrics = ghost_guide.reference_metrics
+        self.ghost_anchor = np.array(metrics['anchor_center'][:2], dtype=float) * [aspect_ratio, 1.0]
+        self.ghost_height = float(metrics['body_height'])
+        # Posizione dei landmark di ancoraggio (caviglie) e del naso nel vettore dei landmark
+        self._ankle_pos = [int(np.flatnonzero(self.landmark_ids == lm)[0]) for lm in (27, 28)]
+        self._nose_pos = int(np.flatnonzero(self.landmark_ids == 0)[0]) if 0 in self.landmark_ids else None
+        self._hip_pos = [int(np.flatnonzero(self.landmark_ids == lm)[0]) for lm in (23, 24)]
+        # Fondo del riferimento: la posa con le anche più basse. bottom_cost è il costo tra la posa
+        # iniziale e il fondo, pagato per intero da chi resta in piedi e in proporzione da chi scende meno
+        ref_hip_height = self._hip_height(self.reference)
+        bottom = int(np.argmin(ref_hip_height))
+        self.ref_depth = float(ref_hip_height[0] - ref_hip_height[bottom])
+        self.bottom_cost = float(self._procrustes_cost(self.reference[0], np.ones(len(self.landmark_ids), dtype=bool),
+                                                       np.array([bottom]))[0])
+        self.reset()
+
+    def reset(self):
+        """Azzera allineamento, statistiche e calibrazione dell'altezza dell'utente."""
+        self.user_height = None  # Altezza in piedi dell'utente (massimo osservato)
+        self.rep_scores = []
+        self.frame_scores = deque(maxlen=self.MAX_FRAME_HISTORY)
+        self._start_rep()
+
+    def _start_rep(self):
+        self._cost = None  # Costi accumulati del DTW sulle celle vive della banda
+        self._lo = 0  # Indice di riferimento della prima cella di _cost
+        self._rep_frames = 0  # Frame dell'utente allineati nella ripetizione corrente
+        self._best = 0  # Indice di riferimento allineato all'ultimo frame
+        self._max_best = 0
+        self._rep_frame_scores = []
+        self._top = None  # Altezza massima delle anche nella ripetizione
+        self._depth = 0.0  # Discesa massima dal punto più alto
+
+    # --- Normalizzazione e Procrustes ---
+
+    def normalize(self, landmarks):
+        """
+        Porta i landmark dell'utente (formato find_position) nel sistema del fantasma.
+        Restituisce (punti (k, 2), maschera dei landmark presenti) oppure (None, None).
+        """
+        present = np.array([lm in landmarks for lm in self.landmark_ids])
+        if present.sum() < self.min_landmarks or not all(present[p] for p in self._ankle_pos):
+            return None, None
+        points = np.zeros((len(self.landmark_ids), 2))
+        for i, lm in enumerate(self.landmark_ids):
+            if present[i]:
+                points[i] = landmarks[lm][4:6]
+        points[:, 0] *= self.aspect_ratio
+        anchor = points[self._ankle_pos].mean(axis=0)
+        if self._nose_pos is not None and present[self._nose_pos]:
+            height = np.linalg.norm(points[self._nose_pos] - anchor)
+            # L'altezza in piedi è il massimo osservato: durante lo squat il corpo si accorcia
+            if self.user_height is None or height > self.user_height:
+                self.user_height = height
+        if not self.user_height:
+            return None, None
+        points = (points - anchor) * (self.ghost_height / self.user_height) + self.ghost_anchor
+        return points, present
+
+    def _hip_height(self, points):
+        # Distanza anche -> caviglie in altezze del corpo, per punti (..., k, 2) nel sistema del fantasma
+        hips = points[..., self._hip_pos, :].mean(axis=-2)
+        ankles = points[..., self._ankle_pos, :].mean(axis=-2)
+        return np.linalg.norm(hips - ankles, axis=-1) / self.ghost_height
+
+    def _procrustes_cost(self, points, present, ref_indices):
+        """
+        Distanza RMS residua dopo l'allineamento rigido ottimo (rotazione + traslazione) tra i
+        punti dell'utente e ciascun frame di riferimento indicato, calcolata per tutti insieme.
+        In 2D la rotazione ottima ha forma chiusa: max_theta tr(R H) = |(a + d, c - b)|.
+        """
+        user = points[present]
+        ref = self.reference[ref_indices][:, present]
+        user_c = user - user.mean(axis=0)
+        ref_c = ref - ref.mean(axis=1, keepdims=True)
+        # Matrici di covarianza incrociata 2x2 per ogni frame di riferimento
+        h = np.einsum('ki,rkj->rij', user_c, ref_c)
+        best_trace = np.hypot(h[:, 0, 0] + h[:, 1, 1], h[:, 1, 0] - h[:, 0, 1])
+        residual = (user_c ** 2).sum() + (ref_c ** 2).sum(axis=(1, 2)) - 2.0 * best_trace
+        return np.sqrt(np.maximum(residual, 0.0) / len(user)) / self.ghost_height
+
+    def align_to_ghost(self, landmarks, ref_index=None):
+        """
+        Restituisce i landmark dell'utente allineati al frame di riferimento indicato
+        (o all'ultimo allineato), come {id: [x, y]} in coordinate normalizzate del fantasma.
+        """
+        points, present = self.normalize(landmarks)
+        if points is None:
+            return {}
+        ref = self.reference[self._best if ref_index is None else ref_index][present]
+        user = points[present]
+        user_mean, ref_mean = user.mean(axis=0), ref.mean(axis=0)
+        h = (user - user_mean).T @ (ref - ref_mean)
+        theta = np.arctan2(h[1, 0] - h[0, 1], h[0, 0] + h[1, 1])
+        rot = np.array([[np.cos(theta), -np.sin(theta)], [np.sin(theta), np.cos(theta)]])
+        aligned = (user - user_mean) @ rot.T + ref_mean
+        aligned[:, 0] /= self.aspect_ratio
+        ids = self.landmark_ids[present]
+        return {int(lm): aligned[i].tolist() for i, lm in enumerate(ids)}
+
+    # --- DTW incrementale ---
+
+    def _score(self, mean_cost):
+        return float(100.0 * np.exp(-mean_cost / self.tolerance))
+
+    def update(self, landmarks):
+        """
+        Elabora un nuovo frame dell'utente. Restituisce None se la posa non è utilizzabile,
+        altrimenti un dizionario con 'frame_score', 'ref_index', 'rep_complete' e 'rep_score'.
+        """
+        points, present = self.normalize(landmarks)
+        if points is None:
+            return None
+
+        drop = None
+        if present[self._hip_pos].all():
+            hip_height = float(self._hip_height(points))
+            self._top = hip_height if self._top is None else max(self._top, hip_height)
+            drop = self._top - hip_height
+            self._depth = max(self._depth, drop)
+
+        n_ref = len(self.reference)
+        # La banda contiene le celle vive del frame precedente più quelle raggiungibili in un passo
+        if self._cost is None:
+            lo, hi = 0, 1  # Primo frame della ripetizione: il cammino parte da i = 0
+        else:
+            lo, hi = self._lo, min(n_ref, self._lo + len(self._cost) + self.max_step)
+        local_cost = self._procrustes_cost(points, present, np.arange(lo, hi))
+
+        # Ogni frame dell'utente corrisponde a un solo frame di riferimento e l'indice avanza di
+        # 0..max_step: tutti i cammini fino al frame j hanno lo stesso numero di celle, quindi i
+        # costi accumulati sono confrontabili direttamente, senza normalizzazione
+        if self._cost is None:
+            new_cost = local_cost
+        else:
+            prev = self._cost
+            reach = np.full(hi - lo, np.inf)
+            for step in range(self.max_step + 1):
+                n = min(len(prev), hi - lo - step)
+                if n > 0:
+                    reach[step:step + n] = np.minimum(reach[step:step + n], prev[:n])
+            new_cost = reach + local_cost
+        self._rep_frames += 1
+        mean_cost = new_cost / self._rep_frames
+        best = int(np.argmin(new_cost))
+        self._best = lo + best
+        self._max_best = max(self._max_best, self._best)
+        frame_score = self._score(local_cost[best])
+        self.frame_scores.append(frame_score)
+        self._rep_frame_scores.append(frame_score)
+        # Profondità mancata rispetto al fondo del riferimento (0 per chi lo raggiunge)
+        shortfall = 1.0 - min(1.0, self._depth / self.ref_depth) if self.ref_depth > 0 else 0.0
+        rep_score = self._score(mean_cost[best] + shortfall * self.bottom_cost)
+
+        # Fascio: restano vive le celle con costo accumulato entro beam dal migliore (al più
+        # band_width dal migliore in avanti). La banda non si ricentra sul migliore: i cammini che
+        # attraversano pose non raggiunte dall'utente (il fondo di uno squat meno profondo) restano
+        # vivi e portano l'allineamento fino alla risalita. Celle calcolate per frame: al più band_width + max_step
+        live = np.flatnonzero(new_cost <= new_cost[best] + self.beam)
+        first, last = int(live[0]), int(live[-1]) + 1
+        if last - first > self.band_width:
+            first = max(first, min(best, last - self.band_width))
+            last = first + self.band_width
+        self._lo = lo + first
+        self._cost = new_cost[first:last]
+
+        result = {'frame_score': frame_score, 'ref_index': self._best,
+                  'rep_complete': False, 'rep_score': None}
+        # La ripetizione è completa quando l'allineamento raggiunge la fine del riferimento, oppure
+        # quando l'utente è sceso ed è tornato su (un mezzo squat non arriva mai al fondo del fantasma)
+        reached_end = self._best >= n_ref - 1 - self.end_margin and self._max_best >= n_ref // 2
+        turned_up = self._depth >= self.down_depth and drop is not None and drop <= self.up_depth
+        if (reached_end or turned_up) and self._rep_frames >= self.min_rep_frames:
+            result['rep_complete'] = True
+            result['rep_score'] = rep_score
+            self.rep_scores.append(rep_score)
+            self._start_rep()
+        return result
+
+    def current_rep_score(self):
+        """Score provvisorio della ripetizione in corso (media degli score per frame)."""
+        if not self._rep_frame_scores:
+            return None
+        return float(np.mean(self._rep_frame_scores))
+
+
+if __name__ == '__main__':
+    # Verifica su sessioni sintetiche: ogni ripetizione (pulita o mezza) deve ricevere uno score e
+    # le ripetizioni pulite devono somigliare al fantasma più delle mezze ripetizioni
+    import argparse
+    import sys
+    import time
+    from ghost_guide import GhostGuide
+    from synthetic_landmarks import FAULT_HALF_REP, FAULT_NONE, SyntheticLandmarkGenerator
+
+    parser = argparse.ArgumentParser(description="Verifica di GhostSimilarityScorer su ripetizioni sintetiche.")
+    parser.add_argument('--reps', type=int, default=20)
+    parser.add_argument('--seeds', type=int, default=3)
+    args = parser.parse_args()
+
+    ghost_guide = GhostGuide()
+    failed = False
+    for exercise in ghost_guide.animations:
+        means = {}
+        for fault, label in ((FAULT_NONE, 'pulite'), (FAULT_HALF_REP, 'mezze')):
+            scores = []
+            for seed in range(args.seeds):
+                session = SyntheticLandmarkGenerator(exercise, seed=seed, ghost_guide=ghost_guide).generate(
+                    num_reps=args.reps, faults=[fault] * args.reps)
+                scorer = GhostSimilarityScorer(ghost_guide, exercise)
+                t0 = time.perf_counter()
+                for landmarks in session.iter_landmarks():
+                    scorer.update(landmarks)
+                elapsed = time.perf_counter() - t0
+                ok = len(scorer.rep_scores) == args.reps
+                failed |= not ok
+                scores += scorer.rep_scores
+                mean = f"{np.mean(scorer.rep_scores):.1f}" if scorer.rep_scores else '-'
+                print(f"{exercise} {label} (seme {seed}): {len(scorer.rep_scores)} ripetizioni con score su "
+                      f"{args.reps}, score medio {mean}, {elapsed / len(session) * 1e6:.0f} us/frame "
+                      f"{'OK' if ok else 'ERRORE'}")
+            means[fault] = np.mean(scores) if scores else float('nan')
+        ok = means[FAULT_NONE] > means[FAULT_HALF_REP]
+        failed |= not ok
+        print(f"{exercise}: score medio pulite {means[FAULT_NONE]:.1f} > mezze {means[FAULT_HALF_REP]:.1f} "
+              f"{'OK' if ok else 'ERRORE'}")
+    sys.exit(1 if failed else 0)
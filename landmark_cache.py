@@ -0,0 +1,182 @@
+# landmark_cache.py
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+from pose_backends import NUM_LANDMARKS
+
+CACHE_FORMAT_VERSION = 1
+
+
+def _atomic_write(path, write):
+    # Scrive in un file temporaneo nella stessa cartella e lo rinomina: lettori e altri
+    # processi vedono il file completo oppure niente
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def settings_key(settings):
+    """Chiave breve e stabile di un dizionario di impostazioni."""
+    payload = json.dumps({'format': CACHE_FORMAT_VERSION, 'settings': settings}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:16]
+
+
+class LandmarkCache:
+    """
+    Cache persistente dei risultati di inferenza della posa, indirizzata per contenuto:
+    root/<hash del video>/<chiave delle impostazioni>/ contiene meta.json e segmenti immutabili
+    seg_<inizio>_<fine>.npz con i landmark (33, 4) dei frame [inizio, fine). Le impostazioni
+    comprendono backend, modello e preparazione del frame: cambiandole cambia la chiave.
+    """
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self._hash_index_path = os.path.join(root, 'video_hashes.json')
+
+    def video_hash(self, video_path):
+        """
+        SHA-256 del contenuto del video. Il risultato è memorizzato per (percorso, dimensione,
+        data di modifica), così il file viene riletto solo se cambia.
+        """
+        stat = os.stat(video_path)
+        ident = f"{os.path.abspath(video_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+        index = {}
+        if os.path.exists(self._hash_index_path):
+            try:
+                with open(self._hash_index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+            except (OSError, ValueError):
+                index = {}
+        if ident in index:
+            return index[ident]
+        digest = hashlib.sha256()
+        with open(video_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 22), b''):
+                digest.update(block)
+        index[ident] = digest.hexdigest()
+        _atomic_write(self._hash_index_path, lambda f: f.write(json.dumps(index, indent=1).encode('utf-8')))
+        return index[ident]
+
+    def entry(self, video_hash, settings, drop_stale=True):
+        """
+        Voce della cache per un video e un insieme di impostazioni. Con drop_stale le voci dello
+        stesso video create con impostazioni diverse vengono invalidate (rimosse).
+        """
+        key = settings_key(settings)
+        if drop_stale:
+            self.invalidate(video_hash, keep=key)
+        return CacheEntry(os.path.join(self.root, video_hash, key), settings)
+
+    def invalidate(self, video_hash=None, keep=None):
+        """Rimuove le voci di un video (o di tutti i video), tranne quella con chiave 'keep'."""
+        video_dirs = [video_hash] if video_hash else [d for d in os.listdir(self.root)
+                                                       if os.path.isdir(os.path.join(self.root, d))]
+        removed = 0
+        for video in video_dirs:
+            video_dir = os.path.join(self.root, video)
+            if not os.path.isdir(video_dir):
+                continue
+            for key in os.listdir(video_dir):
+                if key != keep:
+                    shutil.rmtree(os.path.join(video_dir, key), ignore_errors=True)
+                    removed += 1
+        return removed
+
+    def size_bytes(self):
+        total = 0
+        for dirpath, _, filenames in os.walk(self.root):
+            total += sum(os.path.getsize(os.path.join(dirpath, name)) for name in filenames)
+        return total
+
+
+class CacheEntry:
+    """
+    Landmark di un video per una combinazione di impostazioni. I segmenti sono scritti una sola
+    volta e in modo atomico, quindi più worker possono riempire la stessa voce in parallelo.
+    """
+    def __init__(self, directory, settings):
+        self.directory = directory
+        self.settings = settings
+        os.makedirs(directory, exist_ok=True)
+        self._meta_path = os.path.join(directory, 'meta.json')
+
+    @property
+    def frame_size(self):
+        if not os.path.exists(self._meta_path):
+            return None
+        with open(self._meta_path, 'r', encoding='utf-8') as f:
+            return tuple(json.load(f)['frame_size'])
+
+    def _segments(self):
+        segments = []
+        for name in os.listdir(self.directory):
+            if name.startswith('seg_') and name.endswith('.npz'):
+                start, end = name[4:-4].split('_')
+                segments.append((int(start), int(end), os.path.join(self.directory, name)))
+        return sorted(segments)
+
+    def covered(self, start, end):
+        """True se tutti i frame [start, end) sono in cache."""
+        mask = np.zeros(end - start, dtype=bool)
+        for seg_start, seg_end, _ in self._segments():
+            lo, hi = max(start, seg_start), min(end, seg_end)
+            if lo < hi:
+                mask[lo - start:hi - start] = True
+        return bool(mask.all())
+
+    def get(self, start, end):
+        """
+        Landmark (n, 33, 4) float32 dei frame [start, end), con NaN dove non c'è una persona.
+        Restituisce None se l'intervallo non è interamente in cache.
+        """
+        if self.frame_size is None:
+            return None
+        landmarks = np.full((end - start, NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+        mask = np.zeros(end - start, dtype=bool)
+        for seg_start, seg_end, path in self._segments():
+            lo, hi = max(start, seg_start), min(end, seg_end)
+            if lo >= hi or mask[lo - start:hi - start].all():
+                continue
+            try:
+                seg = self._load_segment(path, seg_end - seg_start)
+            except (OSError, ValueError, KeyError):
+                continue  # Segmento illeggibile: trattato come assente
+            landmarks[lo - start:hi - start] = seg[lo - seg_start:hi - seg_start]
+            mask[lo - start:hi - start] = True
+        return landmarks if mask.all() else None
+
+    @staticmethod
+    def _load_segment(path, length):
+        with np.load(path) as data:
+            detected = np.unpackbits(data['detected'], count=length).astype(bool)
+            landmarks = np.full((length, NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+            landmarks[detected] = data['landmarks']
+        return landmarks
+
+    def put(self, start, landmarks, frame_size):
+        """
+        Salva i landmark (n, 33, 4) dei frame [start, start + n). Formato compatto: maschera
+        di bit dei frame con una persona e solo le relative righe float32 (valori esatti, così
+        l'analisi dai dati in cache è identica a quella con l'inferenza).
+        """
+        if len(landmarks) == 0:
+            return
+        if not os.path.exists(self._meta_path):
+            meta = {'settings': self.settings, 'frame_size': list(frame_size)}
+            _atomic_write(self._meta_path, lambda f: f.write(json.dumps(meta, indent=1, default=str).encode('utf-8')))
+        detected = ~np.isnan(landmarks[:, :, 3]).all(axis=1)
+        path = os.path.join(self.directory, f"seg_{start:09d}_{start + len(landmarks):09d}.npz")
+        _atomic_write(path, lambda f: np.savez_compressed(f, detected=np.packbits(detected),
+                                                          landmarks=landmarks[detected].astype(np.float32)))
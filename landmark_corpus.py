@@ -0,0 +1,562 @@
+# landmark_corpus.py
+"""
+Archivio colonnare dei landmark di molte sessioni, interrogabile senza caricarlo in memoria.
+
+Struttura su disco (root/):
+    corpus.json               manifesto: esercizi, stati, colonne, shard e indice delle sessioni
+    shard_<n>_<gen>/          blocco immutabile di al massimo shard_frames frame
+        landmarks.npy         (n, 33, 4) float32 [x, y, z, visibility] normalizzati, NaN se mancanti
+        session.npy ...       colonne per frame: session, frame, rep, state, stable, success, exercise
+        col_<nome>.npy        angoli e grandezze dell'esercizio (CompiledExercise.measure), NaN se
+                              non calcolabili o non definiti per l'esercizio del frame
+        idx_<nome>.npy        righe ordinate per (esercizio, valore): indice delle interrogazioni
+        val_<nome>.npy        valori nello stesso ordine (per searchsorted)
+        reps.npy              indice delle ripetizioni: session, rep, riga iniziale, riga finale, completa
+        meta.json             frame, colonne e intervalli dei valori validi per esercizio
+
+'rep' di un frame è il numero di ripetizioni completate prima del frame: i frame della
+ripetizione k (da 0) hanno rep = k, compreso quello che la completa. Una sessione sta sempre in
+un solo shard. Le interrogazioni aprono i file con mmap e leggono solo gli intervalli trovati con la
+ricerca binaria e le righe candidate: il costo dipende dai risultati, non dalla dimensione
+dell'archivio. Un solo processo alla volta scrive (CorpusWriter); i lettori vedono sempre uno
+stato completo, perché shard e manifesto vengono sostituiti con rinomine atomiche.
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+
+from exercise_definitions import get_exercise
+from exercise_analyzer import ExerciseAnalyzer
+from pose_backends import NUM_LANDMARKS
+
+CORPUS_FORMAT_VERSION = 1
+SHARD_FRAMES = 1 << 16  # ~36 minuti a 30 FPS, ~35 MB di landmark
+MANIFEST = 'corpus.json'
+BASE_COLUMNS = {
+    'session': np.int32,
+    'frame': np.int32,
+    'rep': np.int32,
+    'state': np.int8,
+    'stable': np.bool_,
+    'success': np.bool_,
+    'exercise': np.int8,
+}
+
+
+def positions_to_landmarks(positions):
+    """Dizionario di find_position {id: [cx, cy, z, visibility, x, y]} -> array (33, 4) con NaN."""
+    landmarks = np.full((NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+    for point_id, (_, _, z, visibility, x, y) in (positions or {}).items():
+        landmarks[point_id] = (x, y, z, visibility)
+    return landmarks
+
+
+def _read_manifest(root):
+    path = os.path.join(root, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('version') != CORPUS_FORMAT_VERSION:
+        raise ValueError(f"{path}: formato {manifest.get('version')} non supportato")
+    return manifest
+
+
+def _write_json(path, data):
+    # File temporaneo nella stessa cartella e rinomina: i lettori vedono il vecchio o il nuovo
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class CorpusWriter:
+    """
+    Aggiunge sessioni all'archivio in root (creato se manca).
+    - dal vivo: begin_session, add_frame a ogni frame (output di find_position e stato di
+      ExerciseAnalyzer dopo l'analisi), end_session
+    - da registrazioni: add_session con i landmark (n, 33, 4) di un'intera sessione
+    Le sessioni restano in memoria fino a flush() (chiamato anche quando lo shard si riempie e
+    da close()); lo shard aperto viene riscritto per intero a ogni flush.
+    """
+    def __init__(self, root, shard_frames=SHARD_FRAMES):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+        self.manifest = _read_manifest(root) or {
+            'version': CORPUS_FORMAT_VERSION, 'shard_frames': shard_frames,
+            'exercises': [], 'states': {}, 'columns': [], 'shards': [], 'sessions': []}
+        self.shard_frames = self.manifest['shard_frames']
+        self._blocks = []          # Blocchi di righe dello shard aperto (dict di array)
+        self._pending = []         # Sessioni non ancora nel manifesto
+        self._open_shard = len(self.manifest['shards'])
+        self._live = None
+        last = self.manifest['shards'][-1] if self.manifest['shards'] else None
+        if last is not None and last['frames'] < self.shard_frames:
+            # L'ultimo shard ha ancora posto: lo si riapre e verrà riscritto con le nuove sessioni
+            self._open_shard -= 1
+            self._blocks.append(self._load_block(os.path.join(root, last['dir'])))
+
+    @property
+    def open_frames(self):
+        return sum(len(block['session']) for block in self._blocks)
+
+    # --- Sessioni dal vivo ---
+
+    def begin_session(self, exercise, frame_size, fps=30.0, source=''):
+        if self._live is not None:
+            self.end_session()
+        self._live = {'exercise': exercise, 'frame_size': tuple(frame_size), 'fps': fps, 'source': source,
+                      'landmarks': [], 'rep_count': [], 'state': [], 'stable': [], 'success': []}
+
+    def add_frame(self, positions, analyzer, success=False):
+        """Un frame della sessione in corso: dizionario di find_position (anche vuoto) e analizzatore."""
+        live = self._live
+        if live is None:
+            return
+        live['landmarks'].append(positions_to_landmarks(positions))
+        live['rep_count'].append(analyzer.rep_count)
+        live['state'].append(get_exercise(live['exercise']).state_codes.get(analyzer.pos_state, 0))
+        live['stable'].append(analyzer.landmarks_stable)
+        live['success'].append(bool(success) and analyzer.landmarks_stable)
+
+    def end_session(self):
+        """Chiude la sessione dal vivo: restituisce l'id della sessione, o None se era vuota."""
+        live, self._live = self._live, None
+        if live is None or not live['landmarks']:
+            return None
+        return self._append(live['exercise'], np.stack(live['landmarks']), np.array(live['rep_count']),
+                            np.array(live['state'], dtype=np.int8), np.array(live['stable']),
+                            np.array(live['success']), live['frame_size'], live['fps'], live['source'])
+
+    # --- Sessioni registrate ---
+
+    def add_session(self, exercise, landmarks, frame_size, fps=30.0, source='', evaluation=None):
+        """
+        Sessione intera da landmark normalizzati (n, 33, 4) con NaN dove manca la persona.
+        Senza evaluation (ExerciseEvaluation) l'analisi viene ripetuta da un contatore azzerato.
+        """
+        landmarks = np.asarray(landmarks, dtype=np.float32)
+        if evaluation is None:
+            evaluation = ExerciseAnalyzer().analyze_sequence(exercise, landmarks, frame_size)
+        return self._append(exercise, landmarks, evaluation.rep_count, evaluation.pos_state, evaluation.stable,
+                            evaluation.success, frame_size, fps, source)
+
+    def _append(self, exercise, landmarks, rep_count, state, stable, success, frame_size, fps, source):
+        compiled = get_exercise(exercise)
+        if compiled is None:
+            raise ValueError(f"Esercizio sconosciuto: {exercise}")
+        n = len(landmarks)
+        if self._blocks and self.open_frames + n > self.shard_frames:
+            self.flush()
+            self._blocks = []
+            self._open_shard += 1
+
+        if exercise not in self.manifest['exercises']:
+            self.manifest['exercises'].append(exercise)
+            self.manifest['states'][exercise] = compiled.state_names
+        for name in compiled.measure_names:
+            if name not in self.manifest['columns']:
+                self.manifest['columns'].append(name)
+
+        session_id = len(self.manifest['sessions']) + len(self._pending)
+        rep_count = np.asarray(rep_count, dtype=np.int32)
+        block = {
+            'landmarks': landmarks,
+            'session': np.full(n, session_id, dtype=np.int32),
+            'frame': np.arange(n, dtype=np.int32),
+            'rep': np.concatenate(([0], rep_count[:-1])).astype(np.int32),
+            'state': np.asarray(state, dtype=np.int8),
+            'stable': np.asarray(stable, dtype=bool),
+            'success': np.asarray(success, dtype=bool),
+            'exercise': np.full(n, self.manifest['exercises'].index(exercise), dtype=np.int8),
+        }
+        for name, values in compiled.measure(landmarks, frame_size).items():
+            block['col_' + name] = values.astype(np.float32)
+        self._blocks.append(block)
+        self._pending.append({'id': session_id, 'exercise': exercise, 'shard': self._open_shard,
+                              'start': self.open_frames - n, 'stop': self.open_frames,
+                              'reps': int(rep_count[-1]) if n else 0, 'frame_size': list(frame_size),
+                              'fps': fps, 'source': source, 'recorded': time.strftime('%Y-%m-%d %H:%M:%S')})
+        return session_id
+
+    # --- Scrittura ---
+
+    @staticmethod
+    def _load_block(path):
+        # Lo shard aperto torna in memoria come un unico blocco (senza gli indici, ricalcolati)
+        with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        names = ['landmarks'] + list(BASE_COLUMNS) + ['col_' + name for name in meta['columns']]
+        return {name: np.load(os.path.join(path, name + '.npy')) for name in names}
+
+    def _build_shard(self, path):
+        n = self.open_frames
+        exercises = self.manifest['exercises']
+        columns = sorted({key[4:] for block in self._blocks for key in block if key.startswith('col_')},
+                         key=self.manifest['columns'].index)
+        data = {name: np.concatenate([block[name] for block in self._blocks])
+                for name in ['landmarks'] + list(BASE_COLUMNS)}
+        for name, value in data.items():
+            np.save(os.path.join(path, name + '.npy'), value)
+
+        ranges = {}
+        exercise = data['exercise']
+        for name in columns:
+            values = np.concatenate([block.get('col_' + name, np.full(len(block['session']), np.nan, np.float32))
+                                     for block in self._blocks])
+            # Ordine per (esercizio, valore): per ogni esercizio i valori validi sono contigui e
+            # ordinati, i NaN in coda al blocco dell'esercizio
+            order = np.lexsort((values, exercise)).astype(np.int32)
+            ordered = values[order]
+            ranges[name] = {}
+            for code in np.unique(exercise).tolist():
+                start, stop = np.searchsorted(exercise[order], [code, code + 1])
+                valid = int(start + np.count_nonzero(~np.isnan(ordered[start:stop])))
+                ranges[name][exercises[code]] = [int(start), valid]
+            np.save(os.path.join(path, 'col_' + name + '.npy'), values)
+            np.save(os.path.join(path, 'idx_' + name + '.npy'), order)
+            np.save(os.path.join(path, 'val_' + name + '.npy'), ordered)
+
+        # Indice delle ripetizioni: cambi di sessione o di contatore
+        session, rep = data['session'], data['rep']
+        starts = np.flatnonzero(np.diff(session, prepend=-1) | np.diff(rep, prepend=-1))
+        stops = np.append(starts[1:], n)
+        final = {s['id']: s['reps'] for s in self.manifest['sessions'] + self._pending}
+        complete = np.array([rep[i] < final[int(session[i])] for i in starts], dtype=np.int32)
+        reps = np.column_stack((session[starts], rep[starts], starts, stops, complete)).astype(np.int32)
+        np.save(os.path.join(path, 'reps.npy'), reps.reshape(-1, 5))
+        with open(os.path.join(path, 'meta.json'), 'w', encoding='utf-8') as f:
+            json.dump({'frames': n, 'columns': columns, 'ranges': ranges}, f, indent=1)
+
+    def flush(self):
+        """Scrive lo shard aperto e aggiorna il manifesto."""
+        if not self._pending:
+            return
+        shards = self.manifest['shards']
+        previous = shards[self._open_shard]['dir'] if self._open_shard < len(shards) else None
+        generation = int(previous.rsplit('_', 1)[1]) + 1 if previous else 0
+        name = f"shard_{self._open_shard:05d}_{generation:04d}"
+        tmp_path = tempfile.mkdtemp(dir=self.root, prefix='.tmp_')
+        try:
+            self._build_shard(tmp_path)
+            os.rename(tmp_path, os.path.join(self.root, name))
+        except BaseException:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            raise
+        entry = {'dir': name, 'frames': self.open_frames}
+        if previous:
+            shards[self._open_shard] = entry
+        else:
+            shards.append(entry)
+        self.manifest['sessions'].extend(self._pending)
+        self._pending = []
+        _write_json(os.path.join(self.root, MANIFEST), self.manifest)
+        if previous:
+            # I lettori che lo hanno già aperto con mmap continuano a vederlo fino alla chiusura
+            shutil.rmtree(os.path.join(self.root, previous), ignore_errors=True)
+
+    def close(self):
+        self.end_session()
+        self.flush()
+
+
+class LandmarkCorpus:
+    """
+    Lettura e interrogazioni dell'archivio. I file degli shard vengono mappati in memoria al
+    primo uso; refresh() rilegge il manifesto per vedere le sessioni aggiunte nel frattempo.
+    """
+    def __init__(self, root):
+        self.root = root
+        self.refresh()
+
+    def refresh(self):
+        self.manifest = _read_manifest(self.root)
+        if self.manifest is None:
+            raise IOError(f"Nessun archivio di landmark in {self.root}")
+        self.exercises = self.manifest['exercises']
+        self.columns = self.manifest['columns']
+        self.sessions = self.manifest['sessions']
+        self._shards = {}
+        # Indice dell'esercizio: sessioni di ogni esercizio per shard
+        self._exercise_sessions = {}
+        for s in self.sessions:
+            self._exercise_sessions.setdefault(s['exercise'], {}).setdefault(s['shard'], []).append(s)
+
+    @property
+    def frames(self):
+        return sum(shard['frames'] for shard in self.manifest['shards'])
+
+    def __len__(self):
+        return self.frames
+
+    def _shard(self, index):
+        shard = self._shards.get(index)
+        if shard is None:
+            path = os.path.join(self.root, self.manifest['shards'][index]['dir'])
+            with open(os.path.join(path, 'meta.json'), 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            shard = self._shards[index] = {'path': path, 'meta': meta, 'arrays': {}}
+        return shard
+
+    def array(self, index, name):
+        """Array 'name' dello shard 'index', mappato in sola lettura (None se lo shard non l'ha)."""
+        shard = self._shard(index)
+        arrays = shard['arrays']
+        if name not in arrays:
+            path = os.path.join(shard['path'], name + '.npy')
+            arrays[name] = np.load(path, mmap_mode='r') if os.path.exists(path) else None
+        return arrays[name]
+
+    def state_code(self, exercise, state):
+        return self.manifest['states'][exercise].index(state)
+
+    # --- Interrogazioni ---
+
+    def query(self, exercise=None, sessions=None, stable=None, success=None, state=None, **ranges):
+        """
+        Frame che soddisfano tutti i filtri: esercizio (nome o lista), sessioni (id), stable,
+        success, stato della macchina a stati (es. 'down') e intervalli sulle colonne,
+        nome=(min, max) con estremi compresi e None per un lato aperto, es.
+        query('Squat', torso=(None, 40), knee=(110, 130)). Restituisce una CorpusSelection.
+        """
+        unknown = set(ranges) - set(self.columns)
+        if unknown:
+            raise ValueError(f"Colonne sconosciute: {', '.join(sorted(unknown))}")
+        names = [exercise] if isinstance(exercise, str) else exercise
+        names = [name for name in (names or self.exercises) if name in self.exercises]
+        wanted_sessions = None if sessions is None else set(int(s) for s in sessions)
+        state_codes = None
+        if state is not None:
+            # Lo stesso nome può avere codici diversi nei vari esercizi
+            state_codes = np.array([self.manifest['states'][name].index(state)
+                                    if state in self.manifest['states'][name] else -2
+                                    for name in self.exercises], dtype=np.int16)
+
+        # Righe per shard delle sessioni ammesse (indice delle sessioni del manifesto)
+        session_spans = {}
+        if sessions is not None:
+            for s in (self.sessions[i] for i in sorted(wanted_sessions) if 0 <= i < len(self.sessions)):
+                if s['exercise'] in names:
+                    session_spans.setdefault(s['shard'], []).append((s['start'], s['stop']))
+        elif exercise is not None:
+            for name in names:
+                for shard, listed in self._exercise_sessions.get(name, {}).items():
+                    session_spans.setdefault(shard, []).extend((s['start'], s['stop']) for s in listed)
+        parts = []
+        for index, shard in enumerate(self.manifest['shards']):
+            if (exercise is not None or sessions is not None) and index not in session_spans:
+                continue
+            rows = self._shard_rows(index, names, session_spans.get(index, [(0, shard['frames'])]),
+                                    wanted_sessions, ranges)
+            if len(rows) == 0:
+                continue
+            for name, wanted in (('stable', stable), ('success', success)):
+                if wanted is not None:
+                    rows = rows[self.array(index, name)[rows] == bool(wanted)]
+            if state_codes is not None:
+                rows = rows[self.array(index, 'state')[rows] == state_codes[self.array(index, 'exercise')[rows]]]
+            if len(rows):
+                parts.append((index, rows))
+        return CorpusSelection(self, parts)
+
+    def _shard_rows(self, index, names, spans, wanted_sessions, ranges):
+        # Candidati dal filtro più selettivo (intervallo di una colonna o righe delle sessioni),
+        # poi gli altri filtri solo sulle righe candidate
+        meta = self._shard(index)['meta']
+        best = (sum(stop - start for start, stop in spans), None, None)
+        for column, (low, high) in ranges.items():
+            if column not in meta['columns']:
+                return np.empty(0, dtype=np.int64)  # Colonna mai calcolata in questo shard
+            values = self.array(index, 'val_' + column)
+            found = []
+            for name in names:
+                start, stop = meta['ranges'][column].get(name, (0, 0))
+                lo = start if low is None else start + int(np.searchsorted(values[start:stop], low, 'left'))
+                hi = stop if high is None else start + int(np.searchsorted(values[start:stop], high, 'right'))
+                if hi > lo:
+                    found.append((lo, hi))
+            count = sum(hi - lo for lo, hi in found)
+            if count < best[0]:
+                best = (count, column, found)
+        count, chosen, found = best
+        if count == 0:
+            return np.empty(0, dtype=np.int64)
+
+        if chosen is None:
+            rows = np.concatenate([np.arange(start, stop) for start, stop in spans])
+        else:
+            order = self.array(index, 'idx_' + chosen)
+            rows = np.sort(np.concatenate([order[lo:hi] for lo, hi in found])).astype(np.int64)
+            if wanted_sessions is not None:
+                rows = rows[np.isin(self.array(index, 'session')[rows], list(wanted_sessions))]
+        for column, (low, high) in ranges.items():
+            if column == chosen or len(rows) == 0:
+                continue
+            values = self.array(index, 'col_' + column)[rows]
+            keep = ~np.isnan(values)
+            if low is not None:
+                keep &= values >= low
+            if high is not None:
+                keep &= values <= high
+            rows = rows[keep]
+        return rows
+
+    def session_rows(self, session_id):
+        """(shard, inizio, fine) delle righe di una sessione."""
+        s = self.sessions[session_id]
+        return s['shard'], s['start'], s['stop']
+
+    def session_landmarks(self, session_id, start=0, stop=None):
+        """Landmark (n, 33, 4) dei frame [start, stop) di una sessione."""
+        shard, first, last = self.session_rows(session_id)
+        stop = last - first if stop is None else min(stop, last - first)
+        return np.asarray(self.array(shard, 'landmarks')[first + start:first + stop])
+
+    def rep_index(self, session_id=None):
+        """
+        Ripetizioni (m, 5): sessione, ripetizione, primo frame, frame finale (escluso), completa.
+        I frame sono relativi alla sessione.
+        """
+        out = []
+        for index in range(len(self.manifest['shards'])):
+            reps = np.asarray(self.array(index, 'reps'))
+            if session_id is not None:
+                reps = reps[reps[:, 0] == session_id]
+            starts = np.array([self.sessions[s]['start'] for s in reps[:, 0]], dtype=np.int32).reshape(-1)
+            out.append(np.column_stack((reps[:, :2], reps[:, 2:4] - starts[:, None], reps[:, 4])))
+        return np.concatenate(out) if out else np.empty((0, 5), dtype=np.int32)
+
+
+class CorpusSelection:
+    """Risultato di LandmarkCorpus.query: righe per shard, lette dai file mappati solo su richiesta."""
+    def __init__(self, corpus, parts):
+        self.corpus = corpus
+        self.parts = parts  # [(shard, righe ordinate)]
+
+    def __len__(self):
+        return sum(len(rows) for _, rows in self.parts)
+
+    def column(self, name):
+        """Valori di una colonna (base o misura) per i frame selezionati."""
+        prefix = '' if name in BASE_COLUMNS else 'col_'
+        out = []
+        for index, rows in self.parts:
+            values = self.corpus.array(index, prefix + name)
+            out.append(values[rows] if values is not None else np.full(len(rows), np.nan, np.float32))
+        dtype = BASE_COLUMNS.get(name, np.float32)
+        return np.concatenate(out) if out else np.empty(0, dtype=dtype)
+
+    def landmarks(self):
+        out = [self.corpus.array(index, 'landmarks')[rows] for index, rows in self.parts]
+        return np.concatenate(out) if out else np.empty((0, NUM_LANDMARKS, 4), dtype=np.float32)
+
+    def reps(self, complete_only=True):
+        """
+        Ripetizioni con almeno un frame selezionato (m, 5): sessione, ripetizione, primo frame,
+        frame finale (escluso) e numero di frame selezionati. Con complete_only solo quelle
+        completate (non l'ultima in corso di una sessione).
+        """
+        out = []
+        for index, rows in self.parts:
+            reps = self.corpus.array(index, 'reps')
+            # Ogni riga cade nella ripetizione con l'ultimo inizio <= riga
+            which = np.searchsorted(reps[:, 2], rows, 'right') - 1
+            unique, counts = np.unique(which, return_counts=True)
+            found = np.asarray(reps[unique])
+            if complete_only:
+                keep = found[:, 4] == 1
+                found, counts = found[keep], counts[keep]
+            starts = np.array([self.corpus.sessions[s]['start'] for s in found[:, 0]], dtype=np.int32).reshape(-1)
+            out.append(np.column_stack((found[:, :2], found[:, 2:4] - starts[:, None], counts)))
+        return np.concatenate(out) if out else np.empty((0, 5), dtype=np.int32)
+
+
+def _build_synthetic(root, sessions, reps, seed):
+    from synthetic_landmarks import SUPPORTED_FAULTS, SyntheticLandmarkGenerator
+
+    writer = CorpusWriter(root)
+    rng = np.random.default_rng(seed)
+    generators = {name: SyntheticLandmarkGenerator(name, seed=seed + i) for i, name in enumerate(SUPPORTED_FAULTS)}
+    t0 = time.perf_counter()
+    frames = 0
+    for i in range(sessions):
+        name = list(generators)[i % len(generators)]
+        fault_probs = {f: 0.1 for f in SUPPORTED_FAULTS[name][1:]}
+        session = generators[name].generate(num_reps=int(rng.integers(reps // 2, reps + 1)),
+                                            fault_probs=fault_probs, occlusion_rate=0.002)
+        writer.add_session(name, session.frames[:, :, [4, 5, 2, 3]], session.frame_size, session.fps,
+                           source=f"synthetic:{name}:{i}")
+        frames += len(session)
+    writer.close()
+    elapsed = time.perf_counter() - t0
+    print(f"Aggiunte {sessions} sessioni, {frames} frame in {elapsed:.1f}s ({frames / elapsed:,.0f} frame/s)")
+
+
+def _parse_range(text):
+    # "nome=min:max", con un lato vuoto per un intervallo aperto
+    name, _, bounds = text.partition('=')
+    low, _, high = bounds.partition(':')
+    return name, (float(low) if low else None, float(high) if high else None)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Archivio dei landmark: costruzione e interrogazioni.")
+    parser.add_argument('root', help="Cartella dell'archivio")
+    sub = parser.add_subparsers(dest='command', required=True)
+    build = sub.add_parser('synthetic', help="Aggiunge sessioni sintetiche (prove di scala)")
+    build.add_argument('--sessions', type=int, default=20)
+    build.add_argument('--reps', type=int, default=50, help="Ripetizioni massime per sessione")
+    build.add_argument('--seed', type=int, default=0)
+    query = sub.add_parser('query', help="Interroga l'archivio")
+    query.add_argument('--exercise', default=None)
+    query.add_argument('--state', default=None)
+    query.add_argument('--stable', action='store_true', help="Solo frame con landmark stabili")
+    query.add_argument('--errors', action='store_true', help="Solo frame stabili con errore di forma")
+    query.add_argument('--range', action='append', default=[], type=_parse_range,
+                       help="Intervallo su una colonna, es. torso=:40 o knee=110:130 (ripetibile)")
+    query.add_argument('--repeat', type=int, default=5, help="Ripetizioni della misura del tempo")
+    sub.add_parser('info', help="Riepilogo dell'archivio")
+    args = parser.parse_args()
+
+    if args.command == 'synthetic':
+        _build_synthetic(args.root, args.sessions, args.reps, args.seed)
+        return
+    corpus = LandmarkCorpus(args.root)
+    if args.command == 'info':
+        print(f"{len(corpus.sessions)} sessioni, {corpus.frames} frame in {len(corpus.manifest['shards'])} shard")
+        print(f"Esercizi: {', '.join(corpus.exercises)}; colonne: {', '.join(corpus.columns)}")
+        return
+
+    filters = {'exercise': args.exercise, 'state': args.state, **dict(args.range)}
+    if args.stable or args.errors:
+        filters['stable'] = True
+    if args.errors:
+        filters['success'] = False
+    times = []
+    for _ in range(max(args.repeat, 1)):
+        t0 = time.perf_counter()
+        selection = corpus.query(**filters)
+        reps = selection.reps()
+        times.append(time.perf_counter() - t0)
+    print(f"{len(selection)} frame su {corpus.frames}, {len(reps)} ripetizioni complete "
+          f"in {min(times) * 1000:.2f} ms (migliore di {len(times)})")
+    for session, rep, start, stop, count in reps[:20].tolist():
+        print(f"  sessione {session} ({corpus.sessions[session]['exercise']}) ripetizione {rep + 1}: "
+              f"frame {start}-{stop}, {count} frame selezionati")
+    if len(reps) > 20:
+        print("  ...")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+# landmark_filter.py
+"""
+Filtro temporale dei landmark (One Euro) tra l'inferenza della posa e l'analizzatore.
+
+Il filtro One Euro è un passa-basso con frequenza di taglio adattiva: da fermi la taglia è
+bassa (niente tremolio attorno alle soglie degli angoli), in movimento cresce con la velocità
+(ritardo contenuto). Qui un aggiornamento filtra tutti i 33 landmark insieme (e più sessioni
+se l'array ha dimensioni di batch), usa gli istanti reali dei frame e pesa ogni misura con la
+sua visibilità: i punti poco affidabili vengono smussati di più, quelli non visibili non
+aggiornano lo stato e dopo un'assenza più lunga di reset_after ripartono dalla misura grezza.
+La visibilità non viene modificata: l'analizzatore vede gli stessi punti mancanti.
+"""
+import numpy as np
+
+
+def _alpha(cutoff, dt):
+    # Coefficiente di smorzamento esponenziale per una frequenza di taglio (Hz) e un passo (s)
+    tau = 1.0 / (2.0 * np.pi * cutoff)
+    return 1.0 / (1.0 + tau / dt)
+
+
+class OneEuroFilter:
+    """
+    Filtro in streaming per array di landmark (..., 33, 4) [x, y, z, visibility] normalizzati.
+    - min_cutoff: frequenza di taglio (Hz) da fermi; più bassa = più liscio
+    - beta: aumento della frequenza di taglio con la velocità (unità normalizzate al secondo)
+    - d_cutoff: frequenza di taglio della stima della velocità
+    - min_visibility / full_confidence: sotto la prima il punto non aggiorna lo stato, tra le
+      due il peso della misura cresce linearmente (non scende sotto min_weight)
+    - reset_after: secondi di assenza dopo i quali un punto riparte dalla misura grezza
+    """
+    def __init__(self, min_cutoff=1.0, beta=1.5, d_cutoff=1.0, min_visibility=0.3,
+                 full_confidence=0.8, min_weight=0.2, reset_after=0.5):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.min_visibility = min_visibility
+        self.full_confidence = full_confidence
+        self.min_weight = min_weight
+        self.reset_after = reset_after
+        self.reset()
+
+    def reset(self):
+        self._x = None          # Posizioni filtrate (..., 33, 3)
+        self._dx = None         # Velocità filtrate (..., 33, 3)
+        self._last_seen = None  # Ultimo istante con una misura valida (..., 33)
+        self._t = None          # Istante dell'ultimo aggiornamento (... o scalare)
+
+    def update(self, landmarks, timestamp):
+        """
+        Filtra i landmark di un istante (secondi; scalare o un valore per elemento del batch).
+        None (nessuna persona) restituisce None senza toccare lo stato. Restituisce un nuovo
+        array dello stesso tipo con x, y, z filtrati.
+        """
+        if landmarks is None:
+            return None
+        lm = np.asarray(landmarks)
+        pos = lm[..., :3].astype(np.float64)
+        vis = lm[..., 3].astype(np.float64)
+        t = np.asarray(timestamp, dtype=np.float64)
+        with np.errstate(invalid='ignore'):
+            valid = vis > self.min_visibility  # NaN (persona assente) -> non valido
+
+        if self._x is None or self._x.shape != pos.shape:
+            self._x = np.where(valid[..., None], pos, np.nan)
+            self._dx = np.zeros_like(pos)
+            self._last_seen = np.where(valid, t[..., None], -np.inf)
+            self._t = t
+            return self._output(lm, valid)
+
+        dt = (t - self._t)[..., None, None]
+        step = (dt > 0) & valid[..., None]  # Stesso istante (frame riusato): nessun aggiornamento
+        safe_dt = np.where(dt > 0, dt, 1.0)
+
+        # Punti nuovi o assenti da troppo tempo: ripartono dalla misura grezza
+        restart = valid & (np.isnan(self._x[..., 0]) | (t[..., None] - self._last_seen > self.reset_after))
+        restart3 = restart[..., None]
+
+        raw_dx = (pos - self._x) / safe_dt
+        dx = self._dx + _alpha(self.d_cutoff, safe_dt) * (raw_dx - self._dx)
+        speed = np.linalg.norm(dx, axis=-1, keepdims=True)
+        alpha = _alpha(self.min_cutoff + self.beta * speed, safe_dt)
+        # Le misure poco affidabili pesano meno (smorzamento maggiore)
+        weight = np.clip((vis - self.min_visibility) / (self.full_confidence - self.min_visibility),
+                         self.min_weight, 1.0)[..., None]
+        x = self._x + alpha * weight * (pos - self._x)
+
+        update = step & ~restart3
+        self._x = np.where(restart3, pos, np.where(update, x, self._x))
+        self._dx = np.where(restart3, 0.0, np.where(update, dx, self._dx))
+        self._last_seen = np.where(valid, t[..., None], self._last_seen)
+        self._t = np.where(t > self._t, t, self._t)
+        return self._output(lm, valid)
+
+    def _output(self, lm, valid):
+        out = np.array(lm, copy=True)
+        out[..., :3] = np.where(valid[..., None], self._x, lm[..., :3])
+        return out
+
+
+def filter_sequence(landmarks, fps=30.0, timestamps=None, **filter_kwargs):
+    """
+    Filtra una sessione (n, 33, 4) o un batch di sessioni (..., n, 33, 4) con NaN dove manca la
+    persona. Il tempo scorre sull'asse n; ogni passo aggiorna insieme tutti i landmark e tutte le
+    sessioni. timestamps (n,) in secondi, altrimenti frame equispaziati a 'fps'.
+    """
+    landmarks = np.asarray(landmarks)
+    n = landmarks.shape[-3]
+    if timestamps is None:
+        timestamps = np.arange(n) / fps
+    one_euro = OneEuroFilter(**filter_kwargs)
+    out = np.empty_like(landmarks)
+    for i in range(n):
+        out[..., i, :, :] = one_euro.update(landmarks[..., i, :, :], timestamps[i])
+    return out
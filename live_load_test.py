@@ -0,0 +1,122 @@
+# live_load_test.py
+"""
+Prova di carico del server di visione live (live_server.py): misura la postazione (FitnessCoachApp
+sotto Qt offscreen, come benchmark_app.py) senza spettatori e poi con N spettatori MJPEG locali,
+di cui una parte volutamente lenta. Gli spettatori girano in processi separati, come su altri
+dispositivi. Fallisce (codice di uscita 1) se FPS o latenza p95 della postazione peggiorano oltre
+la tolleranza.
+
+Esempio:
+    python live_load_test.py --source synthetic:Squat --viewers 8 --slow 3 --duration 15
+"""
+import argparse
+import http.client
+import multiprocessing
+import os
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+from benchmark_app import AppBenchmark
+from live_server import LiveViewServer
+
+
+def viewer(port, stop, frames, delay_s):
+    """Spettatore MJPEG: legge i frame dallo stream; delay_s > 0 simula una connessione lenta."""
+    while not stop.is_set():
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            conn.request('GET', '/stream.mjpg')
+            response = conn.getresponse()
+            while not stop.is_set():
+                line = response.fp.readline()
+                if not line:
+                    break
+                if line.lower().startswith(b'content-length:'):
+                    length = int(line.split(b':', 1)[1])
+                    response.fp.readline()
+                    response.fp.read(length)
+                    with frames.get_lock():
+                        frames.value += 1
+                    if delay_s:
+                        time.sleep(delay_s)
+            conn.close()
+        except OSError:
+            time.sleep(0.1)
+
+
+def run_station(args, server):
+    bench = AppBenchmark(args.source, pacing=args.pacing, loop=True, duration_s=args.duration,
+                         warmup_frames=30, live_server=server)
+    return bench.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prova di carico della visione live della postazione.")
+    parser.add_argument('--source', default='synthetic:Squat')
+    # In tempo reale: con 'fast' la latenza comprende l'attesa dei frame in coda e segue il throughput
+    parser.add_argument('--pacing', choices=('realtime', 'fast'), default='realtime')
+    parser.add_argument('--duration', type=float, default=15.0, help="Secondi per ciascuna misura")
+    parser.add_argument('--viewers', type=int, default=8)
+    parser.add_argument('--slow', type=int, default=2, help="Quanti spettatori sono lenti")
+    parser.add_argument('--slow-delay', type=float, default=0.5, help="Pausa per frame degli spettatori lenti (s)")
+    parser.add_argument('--max-fps', type=float, default=15.0, help="Frame pubblicati al secondo")
+    parser.add_argument('--fps-tolerance', type=float, default=0.1, help="Calo relativo massimo degli FPS")
+    parser.add_argument('--p95-tolerance-ms', type=float, default=1.0, help="Aumento massimo della latenza p95")
+    args = parser.parse_args()
+
+    server = LiveViewServer('127.0.0.1', 0, max_fps=args.max_fps)
+    server.start()
+    try:
+        alone = run_station(args, server)
+
+        ctx = multiprocessing.get_context('spawn')
+        stop = ctx.Event()
+        counters = [ctx.Value('l', 0) for _ in range(args.viewers)]
+        procs = [ctx.Process(target=viewer, daemon=True,
+                             args=(server.port, stop, counters[i], args.slow_delay if i < args.slow else 0.0))
+                 for i in range(args.viewers)]
+        for p in procs:
+            p.start()
+        # La postazione parte quando tutti sono collegati (publish() lavora solo con spettatori)
+        deadline = time.perf_counter() + 30.0
+        while server.viewers < args.viewers and time.perf_counter() < deadline:
+            time.sleep(0.05)
+        before = server.stats()
+        watched = run_station(args, server)
+        after = server.stats()
+        received = [c.value for c in counters]
+        stop.set()
+        for p in procs:
+            p.join(timeout=5)
+            if p.is_alive():
+                p.terminate()
+    finally:
+        server.close()
+
+    encoded = after['encoded'] - before['encoded']
+    print(f"{'':<22}{'FPS':>8}{'p50 ms':>9}{'p95 ms':>9}{'CPU ms':>9}")
+    for label, stats in (("senza spettatori", alone), (f"{args.viewers} spettatori", watched)):
+        print(f"{label:<22}{stats['sustained_fps']:>8.1f}{stats['latency_p50_ms']:>9.2f}"
+              f"{stats['latency_p95_ms']:>9.2f}{stats['cpu_ms_per_frame']:>9.2f}")
+    print(f"Frame codificati: {encoded} ({after['encode_ms']:.2f} ms ciascuno, una volta sola per tutti)")
+    fast = received[args.slow:]
+    slow = received[:args.slow]
+    if fast:
+        print(f"Spettatori normali: {min(fast)}-{max(fast)} frame ricevuti su {encoded}")
+    if slow:
+        print(f"Spettatori lenti: {min(slow)}-{max(slow)} frame ricevuti (gli altri saltati)")
+
+    failures = []
+    if watched['sustained_fps'] < alone['sustained_fps'] * (1.0 - args.fps_tolerance):
+        failures.append(f"FPS {alone['sustained_fps']:.1f} -> {watched['sustained_fps']:.1f}")
+    if watched['latency_p95_ms'] > alone['latency_p95_ms'] + args.p95_tolerance_ms:
+        failures.append(f"p95 {alone['latency_p95_ms']:.2f} -> {watched['latency_p95_ms']:.2f} ms")
+    if failures:
+        print("FALLITO: " + '; '.join(failures))
+        raise SystemExit(1)
+    print("SUPERATO: nessun effetto misurabile degli spettatori sulla postazione")
+
+
+if __name__ == '__main__':
+    main()
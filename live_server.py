@@ -0,0 +1,246 @@
+# live_server.py
+"""
+Server HTTP locale per seguire una postazione da un altro dispositivo (es. il tablet del coach).
+
+Percorsi:
+    /              pagina con il video e lo stato
+    /stream.mjpg   video annotato in MJPEG (multipart/x-mixed-replace)
+    /snapshot.jpg  ultimo frame codificato
+    /status.json   esercizio, ripetizioni, obiettivo, feedback, somiglianza
+
+publish() viene chiamato dal ciclo di cattura: copia il frame in un doppio buffer e ritorna
+subito (nulla da fare se nessuno guarda il video). Un unico thread di codifica rasterizza
+l'overlay e produce il JPEG una volta per frame pubblicato, qualunque sia il numero di
+spettatori; ogni spettatore ha il suo thread che invia sempre l'ultimo JPEG disponibile, quindi
+uno spettatore lento salta frame invece di rallentare la cattura o gli altri spettatori.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from pose_overlay import rasterize_overlay
+
+BOUNDARY = 'frame'
+
+INDEX_HTML = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><meta name="viewport" content="width=device-width, initial-scale=1">
+<title>Fitness Coach AR - Live</title>
+<style>body{margin:0;background:#222;color:#eee;font-family:sans-serif}
+img{width:100%;max-width:960px;display:block;margin:auto}
+#s{max-width:960px;margin:auto;padding:8px;font-size:20px;white-space:pre-line}</style></head>
+<body><img src="/stream.mjpg"><div id="s"></div>
+<script>
+async function poll(){try{const r=await fetch('/status.json');const s=await r.json();
+document.getElementById('s').textContent=(s.exercise||'')+'  RIPETIZIONI: '+s.reps+
+(s.target?' / '+s.target:'')+'\\n'+(s.feedback||'');}catch(e){}setTimeout(poll,500);}
+poll();
+</script></body></html>
+"""
+
+
+class LiveViewServer:
+    """
+    Pubblicazione del video annotato e dello stato di una postazione.
+    - max_fps: frame pubblicati al secondo al massimo (la cattura può andare più veloce)
+    - max_width: i frame più larghi vengono ridotti prima della codifica
+    - quality: qualità JPEG
+    """
+    def __init__(self, host='0.0.0.0', port=8080, max_fps=15.0, max_width=960, quality=75, send_timeout=10.0):
+        self.host = host
+        self.port = port
+        self.max_fps = max_fps
+        self.max_width = max_width
+        self.quality = quality
+        self.send_timeout = send_timeout
+
+        self._input = threading.Condition()   # publish() -> thread di codifica
+        self._output = threading.Condition()  # thread di codifica -> spettatori
+        self._buffers = [None, None]
+        self._pending = None  # Indice del buffer in attesa di codifica
+        self._busy = None     # Indice del buffer in codifica
+        self._pending_overlay = None
+        self._last_publish = float('-inf')
+
+        self._jpeg = None
+        self._seq = 0
+        self._status = {}
+        self._running = False
+        self._httpd = None
+        self._threads = []
+
+        self.viewers = 0
+        self.counts = {'published': 0, 'encoded': 0, 'sent': 0, 'dropped': 0}
+        self.encode_seconds = 0.0
+
+    @property
+    def url(self):
+        host = 'localhost' if self.host in ('', '0.0.0.0') else self.host
+        return f"http://{host}:{self.port}/"
+
+    # --- Lato cattura ---
+
+    def publish(self, frame, overlay=None, status=None):
+        """Consegna il frame BGR corrente (e il suo overlay). Costo: una copia, solo se qualcuno guarda."""
+        if status is not None:
+            self._status = status
+        if not self.viewers or frame is None:
+            return False
+        now = time.perf_counter()
+        if now - self._last_publish < 1.0 / self.max_fps:
+            return False
+        self._last_publish = now
+        with self._input:
+            index = 1 if self._busy == 0 else 0
+            buf = self._buffers[index]
+            if buf is None or buf.shape != frame.shape:
+                buf = self._buffers[index] = np.empty_like(frame)
+            np.copyto(buf, frame)
+            self._pending = index
+            self._pending_overlay = overlay
+            self.counts['published'] += 1
+            self._input.notify()
+        return True
+
+    def update_status(self, status):
+        self._status = status
+
+    # --- Codifica ---
+
+    def _encode_loop(self):
+        while True:
+            with self._input:
+                while self._running and self._pending is None:
+                    self._input.wait()
+                if not self._running:
+                    return
+                self._busy, self._pending = self._pending, None
+                overlay = self._pending_overlay
+            t0 = time.perf_counter()
+            img = self._buffers[self._busy]
+            if overlay is not None and len(overlay):
+                rasterize_overlay(img, overlay)
+            h, w = img.shape[:2]
+            if w > self.max_width:
+                img = cv2.resize(img, (self.max_width, int(round(h * self.max_width / w))),
+                                 interpolation=cv2.INTER_AREA)
+            ok, jpeg = cv2.imencode('.jpg', img, [cv2.IMWRITE_JPEG_QUALITY, self.quality])
+            self.encode_seconds += time.perf_counter() - t0
+            with self._input:
+                self._busy = None
+            if not ok:
+                continue
+            with self._output:
+                self._jpeg = jpeg.tobytes()
+                self._seq += 1
+                self.counts['encoded'] += 1
+                self._output.notify_all()
+
+    def _next_jpeg(self, last_seq, timeout=1.0):
+        # Attende un JPEG più recente di last_seq: (seq, jpeg), o (last_seq, None) allo scadere
+        with self._output:
+            if self._seq <= last_seq:
+                self._output.wait_for(lambda: self._seq > last_seq or not self._running, timeout)
+            if self._seq <= last_seq or not self._running:
+                return last_seq, None
+            return self._seq, self._jpeg
+
+    # --- Lato HTTP ---
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            timeout = server.send_timeout
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/':
+                    self._send(200, 'text/html; charset=utf-8', INDEX_HTML.encode('utf-8'))
+                elif path == '/status.json':
+                    status = {**server._status, 'viewers': server.viewers}
+                    self._send(200, 'application/json', json.dumps(status).encode('utf-8'))
+                elif path == '/snapshot.jpg':
+                    jpeg = server._jpeg
+                    if jpeg is None:
+                        self._send(503, 'text/plain', b'Nessun frame disponibile')
+                    else:
+                        self._send(200, 'image/jpeg', jpeg)
+                elif path == '/stream.mjpg':
+                    self._stream()
+                else:
+                    self._send(404, 'text/plain', b'Non trovato')
+
+            def _send(self, code, content_type, body):
+                self.send_response(code)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.send_header('Cache-Control', 'no-store')
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _stream(self):
+                self.send_response(200)
+                self.send_header('Content-Type', f'multipart/x-mixed-replace; boundary={BOUNDARY}')
+                self.send_header('Cache-Control', 'no-store')
+                self.end_headers()
+                with server._output:
+                    server.viewers += 1
+                last_seq = server._seq - 1 if server._jpeg is not None else server._seq
+                try:
+                    while server._running:
+                        seq, jpeg = server._next_jpeg(last_seq)
+                        if jpeg is None:
+                            continue
+                        if last_seq >= 0 and seq > last_seq + 1:
+                            server.counts['dropped'] += seq - last_seq - 1
+                        last_seq = seq
+                        self.wfile.write(f'--{BOUNDARY}\r\nContent-Type: image/jpeg\r\n'
+                                         f'Content-Length: {len(jpeg)}\r\n\r\n'.encode('ascii'))
+                        self.wfile.write(jpeg)
+                        self.wfile.write(b'\r\n')
+                        server.counts['sent'] += 1
+                except (OSError, ValueError):
+                    pass  # Spettatore disconnesso o troppo lento (timeout di invio)
+                finally:
+                    with server._output:
+                        server.viewers -= 1
+
+        return Handler
+
+    def start(self):
+        if self._running:
+            return
+        self._httpd = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self._httpd.daemon_threads = True
+        self.port = self._httpd.server_address[1]  # Con port=0 la porta scelta dal sistema
+        self._running = True
+        self._threads = [threading.Thread(target=self._encode_loop, name='live-encoder', daemon=True),
+                         threading.Thread(target=self._httpd.serve_forever, name='live-http', daemon=True)]
+        for thread in self._threads:
+            thread.start()
+
+    def close(self):
+        if not self._running:
+            return
+        self._running = False
+        with self._input:
+            self._input.notify()
+        with self._output:
+            self._output.notify_all()
+        self._httpd.shutdown()
+        self._httpd.server_close()
+        for thread in self._threads:
+            thread.join(timeout=2.0)
+        self._threads = []
+
+    def stats(self):
+        encoded = self.counts['encoded']
+        return {**self.counts, 'viewers': self.viewers,
+                'encode_ms': self.encode_seconds / encoded * 1000.0 if encoded else 0.0}
@@ -1,68 +1,110 @@
 # main.py
+import math
+import os
+import signal
+import socket
 import sys
+import time
 import cv2
 import numpy as np
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout,
                              QHBoxLayout, QComboBox, QPushButton, QLabel, QSpinBox,
-                             QSizePolicy, QDialog)
-from PyQt6.QtCore import Qt, QTimer, QUrl
-from PyQt6.QtGui import QImage, QPixmap, QFont
-from PyQt6.QtMultimedia import QSoundEffect
+                             QSizePolicy, QDialog, QSlider)
+from PyQt6.QtCore import Qt, QTimer, QSocketNotifier, pyqtSignal
+from PyQt6.QtGui import QImage, QPixmap, QFont, QKeySequence, QShortcut
 
-from pose_detector import PoseDetector
+from audio_engine import AudioEngine
+from error_clips import ErrorClipRecorder
+from pose_detector import PoseDetector, skeleton_overlay
 from exercise_analyzer import ExerciseAnalyzer
+from exercise_definitions import exercise_names, get_exercise
+from frame_pipeline import FramePipeline
+from frame_pool import FramePool
+from ghost_guide import GhostGuide
+from ghost_scorer import GhostSimilarityScorer
+from pose_overlay import Overlay
+from overlay_widget import OverlayVideoLabel
+from landmark_corpus import CorpusWriter
+from landmark_filter import OneEuroFilter
+from live_server import LiveViewServer
+from profile_capture import ProfileCapture
+from result_bus import ResultBus
+from presence_gate import GATE_INFER, GATE_REUSE, PresenceGate
+from frame_sources import WebcamSource, create_frame_source
+from ui_updates import TextUpdater
 
 class ErrorReviewDialog(QDialog):
     """
-    Una finestra di dialogo per rivedere le schermate degli errori catturate
-    durante l'esercizio, con il feedback testuale associato.
-    Mostra due immagini: la visuale originale e lo scheletro dell'errore evidenziato.
+    Una finestra di dialogo per rivedere gli errori catturati durante l'esercizio, con il
+    feedback testuale associato. Per ogni errore riproduce in loop la clip del movimento
+    (error_clips.ErrorClip): a sinistra il video, a destra lo scheletro dell'errore evidenziato.
+    I frame vengono decodificati solo quando vengono mostrati.
     """
-    def __init__(self, error_data, parent=None):
+    def __init__(self, error_clips, parent=None):
         super().__init__(parent)
         self.setWindowTitle('Revisione Errori di Postura')
-        self.error_data = error_data
+        self.error_data = list(error_clips)
         self.current_index = 0
+        self.frame_index = 0
+        self.current_pixmap = None
+        self.play_timer = QTimer(self)
+        self.play_timer.timeout.connect(self.advance_frame)
         
         self.setMinimumSize(1000, 700)
         main_layout = QVBoxLayout(self)
         main_layout.setSpacing(15)
         main_layout.setContentsMargins(15, 15, 15, 15)
 
-        # Layout per le due immagini
+        # Layout per le due viste della clip
         images_layout = QHBoxLayout()
         images_layout.setSpacing(10)
 
-        # --- Pannello Immagine 1 (Originale) ---
+        # --- Pannello 1 (Video) ---
         view1_container = QWidget()
         view1_layout = QVBoxLayout(view1_container)
         view1_layout.setContentsMargins(0, 0, 0, 0)
-        title1 = QLabel("Visuale Originale Errore")
+        title1 = QLabel("Movimento prima e dopo l'errore")
         title1.setAlignment(Qt.AlignmentFlag.AlignCenter)
         title1.setStyleSheet("font-size: 14px; font-weight: bold; color: #333;")
-        self.image_label_1 = QLabel("Nessuna immagine da mostrare.")
+        self.image_label_1 = QLabel("Nessuna clip da mostrare.")
         self.image_label_1.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.image_label_1.setStyleSheet("background-color: black; border-radius: 8px;")
         view1_layout.addWidget(title1)
         view1_layout.addWidget(self.image_label_1, 1)
         
-        # --- Pannello Immagine 2 (Scheletro Evidenziato) ---
+        # --- Pannello 2 (Scheletro Evidenziato, overlay dipinto alla risoluzione del display) ---
         view2_container = QWidget()
         view2_layout = QVBoxLayout(view2_container)
         view2_layout.setContentsMargins(0, 0, 0, 0)
         title2 = QLabel("Scheletro Evidenziato (Rosso)")
         title2.setAlignment(Qt.AlignmentFlag.AlignCenter)
         title2.setStyleSheet("font-size: 14px; font-weight: bold; color: #c0392b;")
-        self.image_label_2 = QLabel("Nessuna immagine da mostrare.")
+        self.image_label_2 = OverlayVideoLabel()
+        self.image_label_2.setText("Nessuna clip da mostrare.")
         self.image_label_2.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.image_label_2.setStyleSheet("background-color: black; border-radius: 8px;")
         view2_layout.addWidget(title2)
         view2_layout.addWidget(self.image_label_2, 1)
 
+        for label in (self.image_label_1, self.image_label_2):
+            label.setSizePolicy(QSizePolicy.Policy.Ignored, QSizePolicy.Policy.Ignored)
         images_layout.addWidget(view1_container)
         images_layout.addWidget(view2_container)
         main_layout.addLayout(images_layout, 1)
 
+        # --- Riproduzione: play/pausa, posizione e tempo rispetto all'errore ---
+        playback_layout = QHBoxLayout()
+        self.play_button = QPushButton("Pausa")
+        self.play_button.clicked.connect(self.toggle_playback)
+        self.position_slider = QSlider(Qt.Orientation.Horizontal)
+        self.position_slider.valueChanged.connect(self.seek)
+        self.time_label = QLabel("")
+        self.time_label.setMinimumWidth(190)
+        playback_layout.addWidget(self.play_button)
+        playback_layout.addWidget(self.position_slider, 1)
+        playback_layout.addWidget(self.time_label)
+        main_layout.addLayout(playback_layout)
+
         self.feedback_display_label = QLabel("")
         self.feedback_display_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.feedback_display_label.setWordWrap(True)
@@ -96,23 +138,72 @@ class ErrorReviewDialog(QDialog):
     def update_view(self):
         if not self.error_data: return
         
-        pixmap_orig, pixmap_skeleton, feedback_text = self.error_data[self.current_index]
-
-        # Aggiorna entrambe le immagini
-        self.set_image(self.image_label_1, pixmap_orig)
-        self.set_image(self.image_label_2, pixmap_skeleton)
-
-        self.feedback_display_label.setText(feedback_text)
+        clip = self.error_data[self.current_index]
+        self.feedback_display_label.setText(clip.feedback)
         self.info_label.setText(f"Errore {self.current_index + 1} di {len(self.error_data)}")
         self.prev_button.setEnabled(self.current_index > 0)
         self.next_button.setEnabled(self.current_index < len(self.error_data) - 1)
 
+        self.position_slider.blockSignals(True)
+        self.position_slider.setRange(0, len(clip) - 1)
+        self.position_slider.blockSignals(False)
+        self.play_timer.setInterval(int(1000 / clip.fps))
+        self.show_frame(0)
+        self.play_timer.start()
+        self.play_button.setText("Pausa")
+
+    def show_frame(self, index):
+        if not self.error_data: return
+        clip = self.error_data[self.current_index]
+        self.frame_index = index
+        frame = clip.frame(index)  # Decodifica solo del frame mostrato
+        h, w, _ = frame.shape
+        qt_image = QImage(frame.data, w, h, frame.strides[0], QImage.Format.Format_BGR888)
+        self.current_pixmap = QPixmap.fromImage(qt_image)
+        self.render_frame()
+
+        self.position_slider.blockSignals(True)
+        self.position_slider.setValue(index)
+        self.position_slider.blockSignals(False)
+        dt = clip.timestamps[index]
+        self.time_label.setText("momento dell'errore" if index == clip.event_index else f"{dt:+.2f} s dall'errore")
+
+    def render_frame(self):
+        if self.current_pixmap is None:
+            return
+        clip = self.error_data[self.current_index]
+        self.set_image(self.image_label_1, self.current_pixmap)
+        overlay = skeleton_overlay(clip.landmarks[self.frame_index], Overlay(), (0, 0, 255),
+                                   landmark_thickness=2, circle_radius=4, connection_thickness=3)
+        # Il bordo rosso segna il frame dell'errore
+        if self.frame_index == clip.event_index:
+            overlay.add_rect(0.0, 0.0, 1.0, 1.0, (0, 0, 255), thickness=10)
+        self.image_label_2.set_frame(self.scaled(self.image_label_2, self.current_pixmap), overlay)
+
+    def advance_frame(self):
+        if not self.error_data: return
+        clip = self.error_data[self.current_index]
+        self.show_frame((self.frame_index + 1) % len(clip))
+
+    def seek(self, index):
+        self.show_frame(index)
+
+    def toggle_playback(self):
+        if self.play_timer.isActive():
+            self.play_timer.stop()
+            self.play_button.setText("Riproduci")
+        else:
+            self.play_timer.start()
+            self.play_button.setText("Pausa")
+
+    @staticmethod
+    def scaled(label, pixmap):
+        return pixmap.scaled(label.size(), Qt.AspectRatioMode.KeepAspectRatio,
+                             Qt.TransformationMode.SmoothTransformation)
+
     def set_image(self, label, pixmap):
         """Funzione helper per scalare e impostare una QPixmap su una QLabel."""
-        scaled_pixmap = pixmap.scaled(label.size(), 
-                                      Qt.AspectRatioMode.KeepAspectRatio, 
-                                      Qt.TransformationMode.SmoothTransformation)
-        label.setPixmap(scaled_pixmap)
+        label.setPixmap(self.scaled(label, pixmap))
 
     def show_prev_image(self):
         if self.current_index > 0:
@@ -126,19 +217,91 @@ class ErrorReviewDialog(QDialog):
             
     def resizeEvent(self, event):
         super().resizeEvent(event)
-        self.update_view()
+        self.render_frame()
+
+    def done(self, result):
+        self.play_timer.stop()
+        super().done(result)
+
+def print_session_stats(stats):
+    """Stampa le statistiche di fine allenamento raccolte da FitnessCoachApp.session_stats()."""
+    if 'display' in stats:
+        s = stats['display']
+        print(f"Display: {s['displayed']} frame mostrati, {s['presented']} analizzati, "
+              f"{s['replaced']} sostituiti in cattura; latenza cattura -> display "
+              f"p50 {s['display_latency_p50_ms']:.1f} ms, p95 {s['display_latency_p95_ms']:.1f} ms")
+    if 'gate' in stats:
+        s = stats['gate']
+        print(f"Gate di presenza: {s['inferred']} inferenze, {s['reused']} riusi, "
+              f"{s['idle']} frame in idle, CPU risparmiata {s['cpu_saved_fraction']:.0%}")
+    if 'audio' in stats:
+        s = stats['audio']
+        print(f"Audio ({s['output']}): {s['played']} segnali, latenza p50 {s['latency_p50_ms']:.1f} ms, "
+              f"p95 {s['latency_p95_ms']:.1f} ms, max {s['latency_max_ms']:.1f} ms")
+    if 'bus' in stats:
+        s = stats['bus']
+        print(f"Bus dei risultati: {s['published']} record, {s['publish_us']:.0f} us per record, "
+              f"{s['consumers']} consumatori, espulsi {s['evicted_lag']} in ritardo e "
+              f"{s['evicted_timeout']} inattivi")
 
 class FitnessCoachApp(QMainWindow):
-    def __init__(self):
+    result_ready = pyqtSignal()  # Emesso dal thread di elaborazione a ogni risultato
+    frame_updated = pyqtSignal()  # Emesso dopo ogni aggiornamento del display (benchmark)
+
+    def __init__(self, source_factory=None, countdown_seconds=3, review_errors_on_stop=True, live_server=None,
+                 profile_capture=None, corpus_writer=None, result_bus=None, stats_report=None):
+        """
+        source_factory: funzione senza argomenti che crea la sorgente dei frame (default: webcam 0).
+        countdown_seconds = 0 avvia subito l'analisi; review_errors_on_stop = False non apre la
+        revisione modale degli errori (esecuzioni automatiche, benchmark).
+        live_server: LiveViewServer (live_server.py) a cui pubblicare video annotato e stato.
+        profile_capture: impostazioni di ProfileCapture (output_dir, duration_s, mode) per il profilo
+        a richiesta con Ctrl+Shift+P.
+        corpus_writer: CorpusWriter (landmark_corpus.py) in cui registrare landmark e stati di ogni allenamento.
+        result_bus: ResultBus (result_bus.py) su cui pubblicare landmark, angoli e stato di ogni frame analizzato
+        per altri thread e processi.
+        stats_report: funzione chiamata a fine allenamento con session_stats() (print_session_stats
+        le stampa); None per nessun resoconto.
+        """
         super().__init__()
         self.setWindowTitle('Fitness Coach AR')
         self.setGeometry(50, 50, 1600, 900)
 
-        self.pose_detector = PoseDetector()
+        self.source_factory = source_factory if source_factory is not None else (lambda: WebcamSource(0))
+        self.countdown_seconds = countdown_seconds
+        self.review_errors_on_stop = review_errors_on_stop
+        self.live_server = live_server
+        self.corpus_writer = corpus_writer
+        self.result_bus = result_bus
+        self.stats_report = stats_report
+        self.corpus_recording = False  # Sessione dell'archivio aperta al primo frame analizzato
+        self.pose_detector = None  # Creato al primo avvio (o a ogni avvio se la sorgente ha un suo backend)
+        self.pose_backend_paired = False
         self.ex_analyzer = ExerciseAnalyzer()
+        self.ghost_guide = GhostGuide()
+        self.ghost_scorer = None  # Creato al primo frame, quando è nota l'area video
         self.cap = None
+        # Pool di buffer dimensionato sulla risoluzione della camera al primo frame
+        self.frame_pool = FramePool()
+        # Pre-stadio che salta l'inferenza quando nessuno si muove o la postazione è vuota
+        self.presence_gate = PresenceGate()
+        # Filtro temporale dei landmark tra l'inferenza e l'analizzatore (meno tremolio sulle soglie)
+        self.landmark_filter = OneEuroFilter()
+        # Cattura e riconoscimento girano su thread propri (frame_pipeline.py); il display viene
+        # aggiornato all'arrivo dei risultati, al massimo una volta per refresh dello schermo
+        self.pipeline = FramePipeline()
+        self.result_ready.connect(self._schedule_render)
+        self.refresh_interval_s = 1.0 / 60.0
+        self._last_render = 0.0
+        # Orologio del display (attivo durante l'allenamento): recupera i risultati rimasti in attesa
         self.timer = QTimer(self)
-        self.timer.timeout.connect(self.update_frame)
+        self.timer.setTimerType(Qt.TimerType.PreciseTimer)
+        self.timer.timeout.connect(self._schedule_render)
+        self.render_timer = QTimer(self)
+        self.render_timer.setSingleShot(True)
+        self.render_timer.setTimerType(Qt.TimerType.PreciseTimer)
+        # Risolto a ogni scadenza: profile_capture può sostituire update_frame sull'istanza
+        self.render_timer.timeout.connect(lambda: self.update_frame())
         self.last_rep = 0
         self.target_reps = 0
 
@@ -146,22 +309,35 @@ class FitnessCoachApp(QMainWindow):
         self.target_sound_played = False
         self.error_sound_played = False
 
-        self.one_rep_sound = self.load_sound("sounds/oneRep.wav")
-        self.start_sound = self.load_sound("sounds/start.wav")
-        self.target_reached_sound = self.load_sound("sounds/obbiettivo.wav")
-        self.form_error_sound = self.load_sound("sounds/redflag.wav")
+        # Segnali sonori precaricati, miscelati e riprodotti da un thread proprio (audio_engine.py)
+        self.audio = AudioEngine()
+        self.audio.start()
 
-        self.countdown_timer = None
+        # Un solo timer per il conto alla rovescia, riusato a ogni avvio
+        self.countdown_timer = QTimer(self)
+        self.countdown_timer.timeout.connect(self.update_countdown)
         self.countdown_value = 0
         self.exercise_started = False
         
-        self.error_screenshots = []
+        # Clip degli errori: buffer circolare degli ultimi secondi (ridotti) e codifica su un thread
+        # separato; memoria fissa, solo le ultime clip vengono tenute
+        self.MAX_ERROR_CLIPS = 20
+        self.error_clips = ErrorClipRecorder(max_clips=self.MAX_ERROR_CLIPS)
+        self.error_clips.start()
         
         self.is_on_error_cooldown = False
         self.error_cooldown_timer = QTimer(self)
         self.error_cooldown_timer.setSingleShot(True)
         self.error_cooldown_timer.timeout.connect(self.end_error_cooldown)
         self.COOLDOWN_DURATION_MS = 1000
+        self.FEEDBACK_MIN_INTERVAL_MS = 300
+
+        # Profilo a richiesta: nulla di installato finché non viene avviato
+        self.profile_capture = ProfileCapture(self, **(profile_capture or {}))
+        self.profile_timer = QTimer(self)
+        self.profile_timer.setSingleShot(True)
+        self.profile_timer.timeout.connect(self.stop_profile)
+        QShortcut(QKeySequence('Ctrl+Shift+P'), self).activated.connect(self.toggle_profile)
 
         self.setup_ui()
         self.update_feedback_and_reps()
@@ -169,15 +345,16 @@ class FitnessCoachApp(QMainWindow):
     def end_error_cooldown(self):
         self.is_on_error_cooldown = False
 
-    def load_sound(self, file_path):
-        sound_effect = QSoundEffect(self)
-        qurl_sound = QUrl.fromLocalFile(file_path)
-        if not qurl_sound.isValid() or qurl_sound.isEmpty():
-            print(f"Errore: File audio non trovato o percorso non valido: {file_path}")
-            return None
-        sound_effect.setSource(qurl_sound)
-        sound_effect.setVolume(0.8)
-        return sound_effect
+    def toggle_profile(self):
+        if self.profile_capture.active:
+            self.stop_profile()
+            return
+        self.profile_capture.start()
+        self.profile_timer.start(int(self.profile_capture.duration_s * 1000))
+
+    def stop_profile(self):
+        self.profile_timer.stop()
+        self.profile_capture.stop()
 
     def setup_ui(self):
         central_widget = QWidget()
@@ -213,7 +390,7 @@ class FitnessCoachApp(QMainWindow):
         left_layout.addWidget(exercise_label_title)
 
         self.exercise_selector = QComboBox()
-        self.exercise_selector.addItems(['Squat', 'Lunge'])
+        self.exercise_selector.addItems(exercise_names())
         self.exercise_selector.setStyleSheet('font-size: 14px;')
         left_layout.addWidget(self.exercise_selector)
 
@@ -237,9 +414,15 @@ class FitnessCoachApp(QMainWindow):
         self.rep_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         left_layout.addWidget(self.rep_label)
 
+        self.similarity_label = QLabel('SOMIGLIANZA: --')
+        self.similarity_label.setStyleSheet('font-size: 18px; color: #16a085; font-weight: bold;')
+        self.similarity_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        left_layout.addWidget(self.similarity_label)
+
         left_layout.addStretch()
 
-        self.image_label = QLabel()
+        # Il video scalato viene mostrato così com'è; l'overlay è dipinto sopra alla risoluzione del display
+        self.image_label = OverlayVideoLabel()
         self.image_label.setStyleSheet("background-color: #222; border-radius: 10px;")
         self.image_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
         self.image_label.setSizePolicy(QSizePolicy.Policy.Expanding, QSizePolicy.Policy.Expanding)
@@ -266,6 +449,12 @@ class FitnessCoachApp(QMainWindow):
         v_main_layout.setStretchFactor(top_container_widget, 2)
         v_main_layout.setStretchFactor(self.feedback_label, 1)
 
+        # Le etichette vengono aggiornate solo quando il testo cambia; il feedback di forma,
+        # che può cambiare a ogni frame, al massimo ogni FEEDBACK_MIN_INTERVAL_MS
+        self.rep_text = TextUpdater(self.rep_label)
+        self.similarity_text = TextUpdater(self.similarity_label)
+        self.feedback_text = TextUpdater(self.feedback_label, min_interval_ms=self.FEEDBACK_MIN_INTERVAL_MS)
+
     def toggle_exercise(self):
         if self.timer.isActive():
             self.stop_exercise()
@@ -274,9 +463,10 @@ class FitnessCoachApp(QMainWindow):
 
     def start_exercise(self):
         if self.cap is None:
-            self.cap = cv2.VideoCapture(0)
+            self.cap = self.source_factory()
             if not self.cap.isOpened():
-                self.update_feedback_and_reps(feedback_text='Errore: Webcam non disponibile.')
+                self.update_feedback_and_reps(feedback_text='Errore: Sorgente video non disponibile.')
+                self.cap.release()
                 self.cap = None
                 return
 
@@ -286,10 +476,24 @@ class FitnessCoachApp(QMainWindow):
         else:
             initial_feedback = f"Obiettivo: {self.target_reps} ripetizioni. Forza!\nIn attesa di stabilizzazione..."
 
-        self.pose_detector = PoseDetector()
+        # Il modello di default viene caricato una volta e riusato tra un allenamento e l'altro;
+        # un backend abbinato alla sorgente vive quanto la sorgente
+        backend = self.cap.create_pose_backend()
+        if backend is not None or self.pose_detector is None:
+            if self.pose_detector is not None:
+                self.pose_detector.release()
+            self.pose_detector = PoseDetector(backend=backend)
+        self.pose_backend_paired = backend is not None
+        self.pose_detector.landmarks = None
         self.ex_analyzer.reset_counter()
+        self.ghost_scorer = None
+        self.similarity_text.set_text('SOMIGLIANZA: --')
+        self.presence_gate.reset()
+        self.landmark_filter.reset()
         self.last_rep = 0
-        self.error_screenshots = []
+        self.error_clips.reset()
+        if self.result_bus is not None:
+            self.result_bus.begin_session()
 
         self.start_sound_played = False
         self.target_sound_played = False
@@ -303,35 +507,69 @@ class FitnessCoachApp(QMainWindow):
         self.exercise_selector.setEnabled(False)
         self.target_reps_input.setEnabled(False)
 
-        self.countdown_value = 3
-        self.countdown_timer = QTimer(self)
-        self.countdown_timer.timeout.connect(self.update_countdown)
-        self.countdown_timer.start(1000)
-        self.update_feedback_and_reps(feedback_text=f'Preparati! {self.countdown_value}')
-        self.start_button.setEnabled(False)
         self.exercise_started = False
-        self.timer.start(33)
+        if self.countdown_seconds > 0:
+            self.countdown_value = self.countdown_seconds
+            self.countdown_timer.start(1000)
+            self.update_feedback_and_reps(feedback_text=f'Preparati! {self.countdown_value}')
+            self.audio.trigger('countdown')
+            self.start_button.setEnabled(False)
+        else:
+            self.exercise_started = True
+            self.audio.trigger('start')
+            self.update_feedback_and_reps(feedback_text='In attesa di stabilizzazione...')
+        # Con una sorgente 'fast' nessun frame viene scartato: è l'elaborazione a dettare il ritmo
+        self.refresh_interval_s = self._refresh_interval_s()
+        self.pipeline.start(self._capture_frame, self._infer_frame, capture_interval=self._capture_interval,
+                            lossless=getattr(self.cap, 'pacing', None) == 'fast', on_result=self.result_ready.emit)
+        self.timer.start(max(1, int(self.refresh_interval_s * 1000)))
+
+    def _capture_interval(self):
+        # La cattura segue il ritmo della sorgente; solo in idle il gate la rallenta (secondi)
+        if getattr(self.cap, 'pacing', None) == 'fast' or self.presence_gate.mode != 'idle':
+            return None
+        return self.presence_gate.capture_interval_ms() / 1000.0
+
+    def _refresh_interval_s(self):
+        # Periodo di refresh dello schermo della finestra (60 Hz se la frequenza non è nota)
+        screen = self.screen()
+        rate = screen.refreshRate() if screen is not None else 0.0
+        return 1.0 / rate if rate > 0 else 1.0 / 60.0
 
     def update_countdown(self):
         self.countdown_value -= 1
         if self.countdown_value > 0:
             self.update_feedback_and_reps(feedback_text=f'Preparati! {self.countdown_value}')
+            self.audio.trigger('countdown')
         elif self.countdown_value == 0:
              self.update_feedback_and_reps(feedback_text='VIA!')
+             self.audio.trigger('start')
         else:
             self.countdown_timer.stop()
-            self.countdown_timer = None
             self.exercise_started = True
             self.update_feedback_and_reps(feedback_text='In attesa di stabilizzazione...')
             self.start_button.setEnabled(True)
 
     def stop_exercise(self):
+        was_running = self.timer.isActive()
         self.timer.stop()
+        self.render_timer.stop()
+        self.countdown_timer.stop()
+        # I thread di cattura ed elaborazione si fermano prima di rilasciare sorgente e detector
+        self.pipeline.stop()
+        if was_running and self.stats_report is not None:
+            self.stats_report(self.session_stats())
+        if self.corpus_recording:
+            # La sessione entra nell'archivio a fine allenamento (scrittura dello shard aperto)
+            self.corpus_writer.end_session()
+            self.corpus_writer.flush()
+            self.corpus_recording = False
         if self.cap is not None:
             self.cap.release()
             self.cap = None
-        if self.pose_detector is not None:
+        if self.pose_detector is not None and self.pose_backend_paired:
             self.pose_detector.release()
+            self.pose_detector = None
 
         self.start_button.setText('Inizia Allenamento')
         self.exercise_selector.setEnabled(True)
@@ -342,30 +580,49 @@ class FitnessCoachApp(QMainWindow):
 
         cleaned_image = QPixmap(self.image_label.size())
         cleaned_image.fill(Qt.GlobalColor.black)
-        self.image_label.setPixmap(cleaned_image)
+        self.image_label.set_frame(cleaned_image)
 
         final_message = 'Allenamento terminato. Imposta un nuovo obiettivo e riavvia!'
         self.update_feedback_and_reps(feedback_text=final_message)
         self.last_rep = 0
+        if self.live_server is not None:
+            self.live_server.update_status(self._live_status())
         
-        if self.error_screenshots:
-            error_dialog = ErrorReviewDialog(self.error_screenshots, self)
+        # Le clip ancora in raccolta si chiudono qui; si attende la loro codifica
+        clips = self.error_clips.finish() if was_running else []
+        if clips and self.review_errors_on_stop:
+            error_dialog = ErrorReviewDialog(clips, self)
             error_dialog.exec()
-
-    def update_feedback_and_reps(self, feedback_text=None, rep_count=None):
+            error_dialog.deleteLater()
+
+    def session_stats(self):
+        """Statistiche dei componenti che hanno lavorato nell'allenamento: display, gate, audio, bus."""
+        stats = {}
+        if self.pipeline.counts['displayed']:
+            stats['display'] = self.pipeline.stats()
+        if self.presence_gate.counts[GATE_INFER]:
+            stats['gate'] = self.presence_gate.stats()
+        if self.audio.counts['played']:
+            stats['audio'] = self.audio.stats()
+        if self.result_bus is not None and self.result_bus.counts['published']:
+            stats['bus'] = self.result_bus.stats()
+        return stats
+
+    def update_feedback_and_reps(self, feedback_text=None, rep_count=None, immediate=True):
+        # immediate=False per gli aggiornamenti a ogni frame: i cambi di feedback vengono accorpati
         form_feedback = feedback_text if feedback_text is not None else self.ex_analyzer.feedback
         actual_reps = rep_count if rep_count is not None else self.ex_analyzer.get_rep_count()
 
-        self.rep_label.setText(f'RIPETIZIONI: {actual_reps}')
+        self.rep_text.set_text(f'RIPETIZIONI: {actual_reps}')
         motivational_text = ""
         target = self.target_reps
 
         if target > 0 and actual_reps >= target and not self.target_sound_played:
             motivational_text = f"\nCOMPLIMENTI! OBIETTIVO DI {target} RAGGIUNTO E SUPERATO! SEI GRANDE!"
-            if self.target_reached_sound: self.target_reached_sound.play()
+            self.audio.trigger('target')
             self.target_sound_played = True
-            self.feedback_label.setText(form_feedback + motivational_text)
-            QApplication.processEvents()
+            # Il messaggio viene disegnato al ritorno nel ciclo degli eventi, prima dello stop
+            self.feedback_text.set_text(form_feedback + motivational_text, immediate=True)
             QTimer.singleShot(2000, self.stop_exercise)
             return
 
@@ -377,46 +634,167 @@ class FitnessCoachApp(QMainWindow):
             elif actual_reps > 0: motivational_text = f"\nBENE! Procedi verso {target} ({actual_reps}/{target})."
         
         final_feedback_display = form_feedback + motivational_text
-        self.feedback_label.setText(final_feedback_display)
+        self.feedback_text.set_text(final_feedback_display, immediate=immediate)
 
         if actual_reps > self.last_rep:
-            if self.one_rep_sound: self.one_rep_sound.play()
+            self.audio.trigger('rep')
             self.last_rep = actual_reps
             self.error_sound_played = False
 
-    def update_frame(self):
-        if not self.timer.isActive() or self.cap is None or not self.cap.isOpened(): return
-
-        ret, frame = self.cap.read()
-        if not ret or frame is None:
-            self.update_feedback_and_reps(feedback_text='Errore: Nessun frame dalla webcam.')
-            self.stop_exercise()
+    def update_similarity(self, landmarks, exercise_type, video_shape):
+        # Confronto in streaming con il fantasma: costo per frame limitato dalla banda del DTW
+        if not landmarks or exercise_type not in self.ghost_guide.keyframes:
             return
+        if self.ghost_scorer is None or self.ghost_scorer.exercise_type != exercise_type:
+            h_vid, w_vid = video_shape[:2]
+            self.ghost_scorer = GhostSimilarityScorer(self.ghost_guide, exercise_type, aspect_ratio=w_vid / h_vid)
+        result = self.ghost_scorer.update(landmarks)
+        if result and result['rep_complete']:
+            self.similarity_text.set_text(f"SOMIGLIANZA: {result['rep_score']:.0f}%")
+
+    def _read_frame(self):
+        """
+        Legge il frame successivo direttamente in un buffer del pool e lo specchia
+        in un secondo buffer (cv2.flip con dst=). Restituisce il FrameBuffer o None.
+        """
+        raw = self.frame_pool.acquire() if self.frame_pool.shape is not None else None
+        try:
+            ret, frame = self.cap.read(raw.array) if raw is not None else self.cap.read()
+            if not ret or frame is None:
+                return None
+            if raw is None or frame is not raw.array:
+                # Primo frame o risoluzione cambiata: ridimensiona il pool e copia una sola volta
+                self.frame_pool.ensure_shape(frame.shape)
+                if raw is not None:
+                    raw.release()
+                raw = self.frame_pool.acquire()
+                np.copyto(raw.array, frame)
+            flipped = self.frame_pool.acquire()
+            cv2.flip(raw.array, 1, dst=flipped.array)
+            return flipped
+        finally:
+            if raw is not None:
+                raw.release()
+
+    def _buffer_to_qpixmap(self, cv_img):
+        # QImage legge direttamente il buffer BGR (nessuna conversione colore);
+        # QPixmap.fromImage ne fa la copia, dopo la quale il buffer può tornare al pool
+        h_img, w_img, ch = cv_img.shape
+        qt_image = QImage(cv_img.data, w_img, h_img, cv_img.strides[0], QImage.Format.Format_BGR888)
+        return QPixmap.fromImage(qt_image)
+
+    def _capture_frame(self):
+        """Thread di cattura: (frame specchiato, timestamp della sorgente, istante di cattura) o None."""
+        frame_buf = self._read_frame()
+        if frame_buf is None:
+            return None
+        timestamp = getattr(self.cap, 'timestamp', None)
+        capture_time = getattr(self.cap, 'capture_time', None)
+        return (frame_buf, time.monotonic() if timestamp is None else timestamp,
+                time.perf_counter() if capture_time is None else capture_time)
+
+    def _infer_frame(self, item):
+        """
+        Thread di elaborazione: gate, posa, filtro e posizioni dei landmark del frame catturato.
+        I risultati restano nell'item insieme al frame: la GUI non legge lo stato del detector.
+        """
+        item['analyzed'] = self.exercise_started
+        item['landmarks'] = None
+        item['pose_landmarks'] = None
+        if not item['analyzed']:
+            return
+        frame = item['frame'].array
+        video_area_frame = frame[:, :int(frame.shape[1]*0.8)]
+        self._gated_find_pose(video_area_frame, item['timestamp'])
+        item['landmarks'] = self.pose_detector.find_position(video_area_frame)
+        # Copia: i backend riusano lo stesso array a ogni inferenza
+        pose_landmarks = self.pose_detector.landmarks
+        item['pose_landmarks'] = None if pose_landmarks is None else pose_landmarks.copy()
+
+    def _schedule_render(self):
+        """
+        Aggiornamento del display guidato dai risultati: subito se dall'ultimo è passato almeno un
+        refresh dello schermo, altrimenti allo scadere del refresh (i risultati nel frattempo si accumulano).
+        """
+        if not self.timer.isActive() or self.render_timer.isActive():
+            return
+        if not self.pipeline.pending and not self.pipeline.finished:
+            return
+        wait_ms = (self._last_render + self.refresh_interval_s - time.perf_counter()) * 1000.0
+        if wait_ms <= 0:
+            self.update_frame()
+        else:
+            self.render_timer.start(math.ceil(wait_ms))
 
-        frame = cv2.flip(frame, 1)
-        output_frame = frame.copy()
+    def update_frame(self):
+        """
+        Aggiornamento del display: tutti i risultati arrivati vengono analizzati in ordine, solo
+        l'ultimo viene disegnato (con il frame da cui è stato ottenuto, quindi con i suoi landmark).
+        """
+        if not self.timer.isActive() or self.cap is None: return
+
+        results = self.pipeline.take_results()
+        if not results:
+            if self.pipeline.finished:
+                finished = getattr(self.cap, 'finished', False)
+                self.stop_exercise()
+                if finished:
+                    self.update_feedback_and_reps(feedback_text='Video terminato.')
+                else:
+                    self.update_feedback_and_reps(feedback_text='Errore: Nessun frame dalla sorgente video.')
+            return
 
-        if self.exercise_started:
+        # I frame dei risultati passano a questo aggiornamento: vengono tutti rilasciati al termine
+        self._last_render = time.perf_counter()
+        try:
+            for result in results:
+                self._process_frame(result, display=result is results[-1])
+        finally:
+            for result in results:
+                result['frame'].release()
+        self.frame_updated.emit()
+
+    def _gated_find_pose(self, video_area_frame, timestamp):
+        """
+        Esegue l'inferenza solo quando il gate lo richiede: con la scena ferma restano validi
+        gli ultimi landmark, in idle non c'è nessuno e la cattura viene rallentata.
+        """
+        decision = self.presence_gate.update(video_area_frame)
+        if decision == GATE_INFER:
+            # Tempo CPU del solo thread di elaborazione
+            t0 = time.thread_time()
+            self.pose_detector.find_pose(video_area_frame, timestamp)
+            self.presence_gate.record_inference(self.pose_detector.landmarks, time.thread_time() - t0)
+            # Solo le nuove misure passano dal filtro: con REUSE restano i landmark già filtrati
+            self.pose_detector.landmarks = self.landmark_filter.update(self.pose_detector.landmarks, timestamp)
+        elif decision != GATE_REUSE:
+            self.pose_detector.landmarks = None
+
+    def _process_frame(self, result, display=True):
+        # Il frame resta pulito: widget, scheletro e mirini diventano primitive vettoriali
+        frame = result['frame'].array
+        overlay = Overlay()
+
+        if result['analyzed']:
             h, w, _ = frame.shape
             video_area_frame = frame[:, :int(w*0.8)]
-            
-            self.pose_detector.find_pose(video_area_frame)
-            landmarks = self.pose_detector.find_position(video_area_frame)
+            landmarks = result['landmarks']
+            pose_landmarks = result['pose_landmarks']
+            # Frame pulito nel buffer circolare delle clip degli errori
+            self.error_clips.push(frame, pose_landmarks, result['timestamp'])
 
             analysis_success = False
             current_form_feedback = self.ex_analyzer.feedback
             exercise_type = self.exercise_selector.currentText()
             is_error_to_capture = False
+            was_stable = self.ex_analyzer.landmarks_stable
 
             if landmarks:
                 try:
-                    if exercise_type == 'Squat':
-                        analysis_success, current_form_feedback = self.ex_analyzer.analyze_squat(landmarks)
-                    elif exercise_type == 'Lunge':
-                        analysis_success, current_form_feedback = self.ex_analyzer.analyze_lunge(landmarks)
+                    analysis_success, current_form_feedback = self.ex_analyzer.analyze_frame(exercise_type, landmarks)
 
                     if not analysis_success and self.ex_analyzer.landmarks_stable and not self.error_sound_played and not self.is_on_error_cooldown:
-                        if self.form_error_sound: self.form_error_sound.play()
+                        self.audio.trigger('error')
                         self.error_sound_played = True
                         
                         self.is_on_error_cooldown = True
@@ -432,64 +810,137 @@ class FitnessCoachApp(QMainWindow):
                 _, visibility_feedback = self.ex_analyzer._handle_landmark_visibility_and_stability(landmarks, [])
                 current_form_feedback = visibility_feedback
 
-            self.update_feedback_and_reps(feedback_text=current_form_feedback)
+            if was_stable and not self.ex_analyzer.landmarks_stable:
+                self.audio.trigger('visibility_lost')  # Persona uscita dall'inquadratura
 
-            if exercise_type == 'Squat':
-                output_frame = self.pose_detector.draw_squat_depth_widget(output_frame, self.ex_analyzer.squat_range_info)
+            if self.corpus_writer is not None:
+                self._record_corpus_frame(landmarks, analysis_success, exercise_type, video_area_frame.shape)
+            if self.result_bus is not None:
+                # Una scrittura in memoria condivisa: i consumatori leggono al proprio ritmo, senza attese
+                video_h, video_w = video_area_frame.shape[:2]
+                self.result_bus.publish(landmarks, self.ex_analyzer, analysis_success, exercise_type,
+                                        (video_w, video_h), result['timestamp'], result['captured'],
+                                        getattr(self.cap, 'fps', 30.0))
 
-            is_stable = self.ex_analyzer.landmarks_stable
-            output_frame = self.pose_detector.draw_user_pose(output_frame, exercise_success=analysis_success if is_stable else None)
-            
-            if self.ex_analyzer.target_pose_landmarks:
-                output_frame = self.pose_detector.draw_target_landmarks(output_frame, self.ex_analyzer.target_pose_landmarks)
+            self.update_feedback_and_reps(feedback_text=current_form_feedback, immediate=False)
+            self.update_similarity(landmarks, exercise_type, video_area_frame.shape)
+
+            if display:
+                if get_exercise(exercise_type).depth_widget is not None:
+                    self.pose_detector.squat_depth_overlay(self.ex_analyzer.squat_range_info, overlay)
+
+                is_stable = self.ex_analyzer.landmarks_stable
+                self.pose_detector.user_pose_overlay(analysis_success if is_stable else None, overlay,
+                                                     landmarks=pose_landmarks)
+
+                if self.ex_analyzer.target_pose_landmarks:
+                    self.pose_detector.target_overlay(self.ex_analyzer.target_pose_landmarks, overlay)
             
-            # --- NUOVA LOGICA DI CATTURA ERRORE (MODIFICATA) ---
-            # Cattura le immagini DOPO il rendering, ma generandole dal frame pulito per escludere il widget dello squat.
+            # Cattura dell'errore: la clip (secondi precedenti e successivi) viene congelata e
+            # codificata fuori dal thread della GUI
             if is_error_to_capture:
-                # Immagine 1: Frame pulito + overlay standard (rosso per errore)
-                image_1_final = frame.copy()
-
-                # Immagine 2: Frame pulito + scheletro rosso marcato
-                image_2_base = frame.copy()
-                image_2_final = self.pose_detector.draw_error_skeleton(image_2_base)
-
-                # Funzione helper per convertire cv2 image a QPixmap
-                def to_qpixmap(cv_img):
-                    rgb_image = cv2.cvtColor(cv_img, cv2.COLOR_BGR2RGB)
-                    h_img, w_img, ch = rgb_image.shape
-                    bytes_per_line = ch * w_img
-                    qt_image = QImage(rgb_image.data, w_img, h_img, bytes_per_line, QImage.Format.Format_RGB888)
-                    return QPixmap.fromImage(qt_image)
-
-                pixmap1 = to_qpixmap(image_1_final)
-                pixmap2 = to_qpixmap(image_2_final)
-                self.error_screenshots.append((pixmap1, pixmap2, current_form_feedback))
-        else:
-            font = cv2.FONT_HERSHEY_SIMPLEX
+                self.error_clips.trigger(current_form_feedback)
+        elif display:
             text_to_display = str(self.countdown_value) if self.countdown_value > 0 else 'VIA!'
-            text_size = 3
-            (text_w, text_h), _ = cv2.getTextSize(text_to_display, font, text_size, 5)
-            text_x = (frame.shape[1] - text_w) // 2
-            text_y = (frame.shape[0] + text_h) // 2
-            cv2.putText(output_frame, text_to_display, (text_x, text_y), font, text_size, (255, 255, 255), 5, cv2.LINE_AA)
+            overlay.add_text(text_to_display, 0.5, 0.5, (255, 255, 255), height=0.15)
+
+        if not display:
+            self.pipeline.record(result)
+            return
 
         try:
-            rgb_image = cv2.cvtColor(output_frame, cv2.COLOR_BGR2RGB)
-            h, w, ch = rgb_image.shape
-            bytes_per_line = ch * w
-            qt_image = QImage(rgb_image.data, w, h, bytes_per_line, QImage.Format.Format_RGB888)
-            pixmap = QPixmap.fromImage(qt_image)
+            pixmap = self._buffer_to_qpixmap(frame)
             scaled_pixmap = pixmap.scaled(self.image_label.size(), Qt.AspectRatioMode.KeepAspectRatio, Qt.TransformationMode.SmoothTransformation)
-            self.image_label.setPixmap(scaled_pixmap)
+            self.image_label.set_frame(scaled_pixmap, overlay)
         except Exception as e:
             print(f"Errore conversione/visualizzazione frame: {e}")
+        self.pipeline.record(result, time.perf_counter())
+
+        if self.live_server is not None:
+            # Copia e ritorno immediato: codifica e invio avvengono sui thread del server
+            self.live_server.publish(frame, overlay, self._live_status())
+
+    def _record_corpus_frame(self, landmarks, analysis_success, exercise_type, video_shape):
+        if not self.corpus_recording:
+            self.corpus_writer.begin_session(exercise_type, (video_shape[1], video_shape[0]),
+                                             fps=getattr(self.cap, 'fps', 30.0), source=type(self.cap).__name__)
+            self.corpus_recording = True
+        self.corpus_writer.add_frame(landmarks, self.ex_analyzer, analysis_success)
+
+    def _live_status(self):
+        return {
+            'exercise': self.exercise_selector.currentText(),
+            'running': self.timer.isActive(),
+            'reps': self.ex_analyzer.get_rep_count(),
+            'target': self.target_reps,
+            'feedback': self.feedback_text.text,
+            'similarity': self.similarity_text.text,
+        }
 
     def closeEvent(self, event):
         self.stop_exercise()
+        self.stop_profile()
+        if self.pose_detector is not None:
+            self.pose_detector.release()
+            self.pose_detector = None
+        self.audio.close()
+        self.error_clips.close()
+        if self.corpus_writer is not None:
+            self.corpus_writer.close()
+        if self.result_bus is not None:
+            self.result_bus.close()
         event.accept()
 
 if __name__ == '__main__':
-    app = QApplication(sys.argv)
-    window = FitnessCoachApp()
+    import argparse
+    parser = argparse.ArgumentParser(description='Fitness Coach AR')
+    parser.add_argument('--source', default='webcam:0',
+                        help="webcam:N, file video, cartella/glob di immagini o synthetic:Squat|Lunge")
+    parser.add_argument('--pacing', choices=('realtime', 'fast'), default='realtime')
+    parser.add_argument('--loop', action='store_true', help='Riparte dall\'inizio a fine sorgente')
+    parser.add_argument('--live-port', type=int, default=None,
+                        help='Pubblica video e stato su un server HTTP locale a questa porta')
+    parser.add_argument('--live-host', default='0.0.0.0')
+    parser.add_argument('--profile-dir', default='profiles', help='Cartella dei profili a richiesta')
+    parser.add_argument('--profile-seconds', type=float, default=10.0)
+    parser.add_argument('--profile-mode', choices=('sampling', 'deterministic'), default='sampling')
+    parser.add_argument('--corpus', default=None, help='Archivio dei landmark in cui registrare gli allenamenti')
+    parser.add_argument('--bus', default=None, metavar='NOME',
+                        help='Pubblica i risultati di ogni frame sul bus in memoria condivisa con questo nome')
+    parser.add_argument('--stats', action='store_true',
+                        help='A fine allenamento stampa latenze e contatori di display, gate, audio e bus')
+    args, qt_args = parser.parse_known_args()
+
+    app = QApplication(sys.argv[:1] + qt_args)
+    live_server = None
+    if args.live_port is not None:
+        live_server = LiveViewServer(args.live_host, args.live_port)
+        live_server.start()
+        print(f"Visione live: {live_server.url}")
+    result_bus = None
+    if args.bus:
+        result_bus = ResultBus(args.bus)
+        print(f"Bus dei risultati: {result_bus.name} (python result_bus.py {result_bus.name} monitor)")
+    window = FitnessCoachApp(lambda: create_frame_source(args.source, pacing=args.pacing, loop=args.loop),
+                             live_server=live_server,
+                             corpus_writer=CorpusWriter(args.corpus) if args.corpus else None,
+                             result_bus=result_bus,
+                             stats_report=print_session_stats if args.stats else None,
+                             profile_capture={'output_dir': args.profile_dir, 'duration_s': args.profile_seconds,
+                                              'mode': args.profile_mode})
     window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+
+    if hasattr(signal, 'SIGUSR1'):
+        # Comando locale: `kill -USR1 <pid>` avvia/ferma il profilo. Il segnale sveglia il ciclo
+        # degli eventi tramite una coppia di socket, senza timer di polling
+        wakeup_read, wakeup_write = socket.socketpair()
+        wakeup_write.setblocking(False)
+        signal.set_wakeup_fd(wakeup_write.fileno())
+        wakeup = QSocketNotifier(wakeup_read.fileno(), QSocketNotifier.Type.Read)
+        wakeup.activated.connect(lambda: wakeup_read.recv(64))
+        signal.signal(signal.SIGUSR1, lambda signum, frame: QTimer.singleShot(0, window.toggle_profile))
+        print(f"Profilo a richiesta: Ctrl+Shift+P o kill -USR1 {os.getpid()}")
+    code = app.exec()
+    if live_server is not None:
+        live_server.close()
+    sys.exit(code)
\ No newline at end of file
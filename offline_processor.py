@@ -0,0 +1,383 @@
+# offline_processor.py
+"""
+Elaborazione offline di un video lungo, suddiviso in blocchi temporali elaborati in parallelo.
+
+Ogni worker apre il video, si posiziona (seek) poco prima del proprio blocco, esegue
+l'inferenza della posa e un'analisi speculativa partendo da un analizzatore azzerato. I frame
+di sovrapposizione iniziali servono a far convergere il tracking di MediaPipe e la macchina a
+stati. Il processo principale ricuce i blocchi in ordine: riesegue l'analisi reale del blocco
+(costo trascurabile rispetto all'inferenza) solo finché il suo stato non coincide con quello
+speculativo, poi adotta i risultati speculativi correggendo il contatore delle ripetizioni.
+L'analisi ricucita coincide con un'analisi sequenziale degli stessi landmark; i landmark dei
+blocchi (seek e riscaldamento del tracking) coincidono con un'unica passata di inferenza entro
+una tolleranza, verificata con --verify.
+
+Esempio:
+    python offline_processor.py lezione.mp4 --exercise Squat --workers 8 --output lezione.npz
+"""
+import argparse
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from exercise_analyzer import ExerciseAnalyzer
+from exercise_definitions import exercise_names
+from landmark_cache import LandmarkCache
+from landmark_corpus import CorpusWriter
+from pose_backends import NUM_LANDMARKS, MediaPipeBackend
+from pose_detector import PoseDetector, landmarks_to_positions
+
+VIDEO_FRACTION = 0.8  # Area video dell'app (80% sinistro del frame)
+
+
+def video_info(video_path):
+    """Restituisce (numero di frame, FPS) del video."""
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise IOError(f"Impossibile aprire il video: {video_path}")
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    cap.release()
+    return total, fps
+
+
+def plan_chunks(total_frames, num_chunks, overlap_frames):
+    """
+    Divide [0, total_frames) in blocchi contigui. Ogni blocco è (start, end, warmup_start):
+    i frame [warmup_start, start) vengono decodificati solo per il riscaldamento.
+    """
+    num_chunks = max(1, min(num_chunks, total_frames))
+    bounds = np.linspace(0, total_frames, num_chunks + 1).astype(int)
+    return [(int(s), int(e), max(0, int(s) - overlap_frames)) for s, e in zip(bounds[:-1], bounds[1:]) if e > s]
+
+
+def preprocess_frame(frame, mirror=True, video_fraction=VIDEO_FRACTION):
+    """Stessa preparazione dell'app: specchiatura e area video (80% sinistro del frame)."""
+    if mirror:
+        frame = cv2.flip(frame, 1)
+    return frame[:, :int(frame.shape[1] * video_fraction)]
+
+
+def _analysis_record(analyzer, exercise_type, landmarks):
+    success, _ = analyzer.analyze_frame(exercise_type, landmarks)
+    return success, analyzer.landmarks_stable, analyzer.rep_count
+
+
+def speculate_chunk(landmarks, warmup, exercise_type, frame_size):
+    """
+    Analisi speculativa di un blocco partendo da un analizzatore azzerato. landmarks contiene
+    prima i 'warmup' frame di riscaldamento (analizzati ma non restituiti), poi quelli del blocco.
+    """
+    analyzer = ExerciseAnalyzer()
+    analyzer.reset_counter()
+    n = len(landmarks) - warmup
+    keys = [None] * n
+    success = np.zeros(n, dtype=bool)
+    stable = np.zeros(n, dtype=bool)
+    rep_count = np.zeros(n, dtype=np.int32)
+    for j in range(len(landmarks)):
+        positions = landmarks_to_positions(landmarks[j], *frame_size)
+        record = _analysis_record(analyzer, exercise_type, positions)
+        i = j - warmup
+        if i >= 0:
+            success[i], stable[i], rep_count[i] = record
+            keys[i] = analyzer.state_key()
+    return {'keys': keys, 'success': success, 'stable': stable, 'rep_count': rep_count,
+            'final_state': analyzer.get_state()}
+
+
+def infer_range(video_path, warmup_start, end, detector_kwargs, mirror):
+    """
+    Decodifica i frame [warmup_start, end) con seek ed esegue l'inferenza.
+    Restituisce (landmark (n, 33, 4) con NaN se assenti, frame decodificati, dimensione dell'area video).
+    """
+    cap = cv2.VideoCapture(video_path)
+    if warmup_start > 0:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, warmup_start)
+    detector = PoseDetector(backend=MediaPipeBackend(**detector_kwargs))
+    landmarks = np.full((end - warmup_start, NUM_LANDMARKS, 4), np.nan, dtype=np.float32)
+    frame_size = None
+    decoded = 0
+    try:
+        while decoded < len(landmarks):
+            ret, frame = cap.read()
+            if not ret:
+                break
+            video = preprocess_frame(frame, mirror)
+            frame_size = (video.shape[1], video.shape[0])
+            detector.find_pose(video)
+            if detector.landmarks is not None:
+                landmarks[decoded] = detector.landmarks
+            decoded += 1
+    finally:
+        cap.release()
+        detector.release()
+    return landmarks, decoded, frame_size
+
+
+def process_chunk(task):
+    """
+    Worker: ottiene i landmark del blocco (dalla cache o con l'inferenza) ed esegue l'analisi
+    speculativa. Restituisce i landmark (n, 33, 4) dei frame del blocco (NaN se assenti) e i
+    risultati speculativi per frame (stato, esito, stabilità, contatore).
+    """
+    video_path, (start, end, warmup_start), exercise_type, detector_kwargs, mirror, cache_spec = task
+    t0 = time.perf_counter()
+    entry = None
+    landmarks = None
+    if cache_spec is not None:
+        cache_root, video_hash, settings = cache_spec
+        entry = LandmarkCache(cache_root).entry(video_hash, settings, drop_stale=False)
+        landmarks = entry.get(warmup_start, end)
+    cache_hit = landmarks is not None
+    if cache_hit:
+        decoded, frame_size = len(landmarks), entry.frame_size
+    else:
+        landmarks, decoded, frame_size = infer_range(video_path, warmup_start, end, detector_kwargs, mirror)
+        if entry is not None and decoded:
+            entry.put(warmup_start, landmarks[:decoded], frame_size)
+
+    warmup = start - warmup_start
+    # Il conteggio dei frame nei metadati può essere impreciso: il blocco finisce all'ultimo frame letto
+    end = max(start, warmup_start + decoded)
+    chunk = {'start': start, 'end': end, 'landmarks': landmarks[warmup:decoded],
+             'frame_size': frame_size, 'decoded': 0 if cache_hit else decoded, 'cache_hit': cache_hit}
+    if end > start:
+        chunk.update(speculate_chunk(landmarks[:decoded], warmup, exercise_type, frame_size))
+    chunk['seconds'] = time.perf_counter() - t0
+    return chunk
+
+
+def stitch_chunks(chunks, exercise_type, frame_size):
+    """
+    Ricuce i blocchi in ordine a partire dallo stato reale dell'analizzatore.
+    Restituisce i risultati per frame e il numero di frame rianalizzati.
+    """
+    total = chunks[-1]['end']
+    success = np.zeros(total, dtype=bool)
+    stable = np.zeros(total, dtype=bool)
+    rep_count = np.zeros(total, dtype=np.int32)
+    analyzer = ExerciseAnalyzer()
+    analyzer.reset_counter()
+    reanalyzed = 0
+
+    for chunk in chunks:
+        start, landmarks = chunk['start'], chunk['landmarks']
+        converged = None
+        for i in range(len(landmarks)):
+            positions = landmarks_to_positions(landmarks[i], *frame_size)
+            success[start + i], stable[start + i], rep_count[start + i] = \
+                _analysis_record(analyzer, exercise_type, positions)
+            reanalyzed += 1
+            if analyzer.state_key() == chunk['keys'][i]:
+                converged = i
+                break
+        if converged is None:
+            continue  # Nessuna convergenza: il blocco è stato rianalizzato per intero
+        # Da qui lo stato reale coincide con quello speculativo: cambia solo il contatore
+        offset = analyzer.rep_count - int(chunk['rep_count'][converged])
+        rest = slice(start + converged + 1, chunk['end'])
+        success[rest] = chunk['success'][converged + 1:]
+        stable[rest] = chunk['stable'][converged + 1:]
+        rep_count[rest] = chunk['rep_count'][converged + 1:] + offset
+        state = dict(chunk['final_state'])
+        state['rep_count'] += offset
+        analyzer.set_state(state)
+    return {'success': success, 'stable': stable, 'rep_count': rep_count}, reanalyzed
+
+
+def analyze_sequential(landmarks, exercise_type, frame_size):
+    """Passata sequenziale di riferimento sui landmark già calcolati."""
+    analyzer = ExerciseAnalyzer()
+    analyzer.reset_counter()
+    total = len(landmarks)
+    success = np.zeros(total, dtype=bool)
+    stable = np.zeros(total, dtype=bool)
+    rep_count = np.zeros(total, dtype=np.int32)
+    for i in range(total):
+        positions = landmarks_to_positions(landmarks[i], *frame_size)
+        success[i], stable[i], rep_count[i] = _analysis_record(analyzer, exercise_type, positions)
+    return {'success': success, 'stable': stable, 'rep_count': rep_count}
+
+
+def verify_sequential(video_path, results, exercise_type, detector_kwargs=None, mirror=True, tolerance=0.02):
+    """
+    Confronto con un'unica passata sequenziale dell'inferenza (nessun seek, tracking continuo
+    dall'inizio del video) e della sua analisi. Il tracking di MediaPipe dopo il riscaldamento
+    converge ma non è identico bit per bit: i landmark devono coincidere entro tolerance
+    (coordinate normalizzate x, y), la presenza della persona e i risultati dell'analisi esattamente.
+    Restituisce un dizionario con le differenze e 'ok'.
+    """
+    landmarks, decoded, frame_size = infer_range(video_path, 0, len(results['landmarks']),
+                                                 detector_kwargs or {}, mirror)
+    n = min(decoded, len(results['landmarks']))
+    sequential, chunked = landmarks[:n], results['landmarks'][:n]
+    present = ~np.isnan(sequential[..., 0, 0]), ~np.isnan(chunked[..., 0, 0])
+    both = present[0] & present[1]
+    diff = np.abs(sequential[both, :, :2] - chunked[both, :, :2]).max(axis=(1, 2)) if both.any() else np.zeros(1)
+    analysis = analyze_sequential(sequential, exercise_type, frame_size)
+    mismatched = {key: int((analysis[key] != results[key][:n]).sum()) for key in ('success', 'stable', 'rep_count')}
+    stitched = analyze_sequential(results['landmarks'], exercise_type, results['frame_size'])
+    check = {
+        'frames': n,
+        'missing_frames': len(results['landmarks']) - n,
+        'presence_mismatch': int((present[0] != present[1]).sum()),
+        'landmark_max_diff': float(diff.max()),
+        'landmark_p99_diff': float(np.percentile(diff, 99)),
+        'frames_over_tolerance': int((diff > tolerance).sum()),
+        'analysis_mismatch': mismatched,
+        'stitch_ok': all(np.array_equal(stitched[k], results[k]) for k in ('success', 'stable', 'rep_count')),
+    }
+    check['ok'] = (not check['missing_frames'] and not check['presence_mismatch'] and not check['frames_over_tolerance']
+                   and not any(mismatched.values()) and check['stitch_ok'])
+    return check
+
+
+def cache_settings(detector_kwargs, mirror=True):
+    # Chiave della cache: impostazioni del backend (senza caricare il modello) e preparazione del frame
+    settings = MediaPipeBackend(lazy=True, **detector_kwargs).settings()
+    settings.update({'mirror': mirror, 'video_fraction': VIDEO_FRACTION})
+    return settings
+
+
+def process_video(video_path, exercise_type, workers=None, num_chunks=None, overlap_frames=30,
+                  detector_kwargs=None, mirror=True, cache_dir=None):
+    """
+    Elabora un video in parallelo. Restituisce un dizionario con landmark e risultati per frame,
+    più le statistiche dell'esecuzione. Con cache_dir i landmark vengono letti dalla cache
+    (e salvati alla prima esecuzione): le esecuzioni successive ripetono solo l'analisi.
+    """
+    workers = workers or os.cpu_count() or 1
+    num_chunks = num_chunks or workers * 2  # Più blocchi che worker per bilanciare il carico
+    detector_kwargs = detector_kwargs or {}
+    total, fps = video_info(video_path)
+    plan = plan_chunks(total, num_chunks, overlap_frames)
+
+    cache_spec = None
+    if cache_dir:
+        cache = LandmarkCache(cache_dir)
+        settings = cache_settings(detector_kwargs, mirror)
+        video_hash = cache.video_hash(video_path)
+        entry = cache.entry(video_hash, settings)
+        cache_spec = (cache_dir, video_hash, settings)
+        if entry.covered(0, total):
+            workers = 1  # Tutto in cache: solo analisi, non servono altri processi
+    tasks = [(video_path, chunk, exercise_type, detector_kwargs, mirror, cache_spec) for chunk in plan]
+
+    t0 = time.perf_counter()
+    if workers == 1:
+        chunks = [process_chunk(task) for task in tasks]
+    else:
+        # 'spawn': MediaPipe e OpenCV non sono sicuri dopo un fork
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            chunks = list(pool.map(process_chunk, tasks))
+    inference_seconds = time.perf_counter() - t0
+
+    results = merge_chunks(plan, chunks, exercise_type, video_path)
+    results['stats'].update({'fps': fps, 'workers': workers, 'inference_seconds': inference_seconds})
+    return results
+
+
+def merge_chunks(plan, chunks, exercise_type, video_path=''):
+    """
+    Unisce i blocchi elaborati (risultati di process_chunk, nell'ordine del piano) nei risultati
+    per frame del video: landmark, esito, stabilità, contatore e frame con errore.
+    """
+    # I blocchi devono essere contigui: ci si ferma al primo blocco troncato
+    contiguous = []
+    for (_, planned_end, _), chunk in zip(plan, chunks):
+        if chunk['end'] > chunk['start']:
+            contiguous.append(chunk)
+        if chunk['end'] < planned_end:
+            break
+    chunks = contiguous
+    if not chunks:
+        raise IOError(f"Nessun frame decodificato da {video_path}")
+    frame_size = chunks[0]['frame_size']
+    t1 = time.perf_counter()
+    results, reanalyzed = stitch_chunks(chunks, exercise_type, frame_size)
+    stitch_seconds = time.perf_counter() - t1
+
+    results['landmarks'] = np.concatenate([c['landmarks'] for c in chunks])
+    results['frame_size'] = frame_size
+    results['error_frames'] = ~results['success'] & results['stable']
+    results['stats'] = {
+        'frames': len(results['landmarks']),
+        'chunks': len(chunks),
+        'decoded_frames': sum(c['decoded'] for c in chunks),
+        'cache_hits': sum(c['cache_hit'] for c in chunks),
+        'reanalyzed_frames': reanalyzed,
+        'stitch_seconds': stitch_seconds,
+        'worker_seconds': sum(c['seconds'] for c in chunks),
+    }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analisi offline parallela di un video lungo.")
+    parser.add_argument('video')
+    parser.add_argument('--exercise', default='Squat', choices=exercise_names())
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--chunks', type=int, default=None, help="Numero di blocchi (default: 2 per worker)")
+    parser.add_argument('--overlap', type=int, default=30, help="Frame di riscaldamento prima di ogni blocco")
+    parser.add_argument('--model-complexity', type=int, default=1)
+    parser.add_argument('--no-mirror', action='store_true', help="Non specchiare i frame (video non da webcam)")
+    parser.add_argument('--verify', action='store_true',
+                        help="Confronta con un'unica passata sequenziale di inferenza e analisi (ripete l'inferenza)")
+    parser.add_argument('--verify-tolerance', type=float, default=0.02,
+                        help="Differenza massima ammessa dei landmark (coordinate normalizzate)")
+    parser.add_argument('--output', help="Salva landmark e risultati per frame in un file .npz")
+    parser.add_argument('--cache', help="Cartella della cache dei landmark (riusata tra esecuzioni)")
+    parser.add_argument('--corpus', help="Aggiunge la sessione all'archivio dei landmark in questa cartella")
+    args = parser.parse_args()
+
+    results = process_video(args.video, args.exercise, workers=args.workers, num_chunks=args.chunks,
+                            overlap_frames=args.overlap,
+                            detector_kwargs={'model_complexity': args.model_complexity},
+                            mirror=not args.no_mirror, cache_dir=args.cache)
+    stats = results['stats']
+    rep_frames = np.flatnonzero(np.diff(results['rep_count'], prepend=0) > 0)
+    print(f"Frame: {stats['frames']} in {stats['chunks']} blocchi su {stats['workers']} worker")
+    print(f"Inferenza: {stats['inference_seconds']:.1f}s (somma dei worker {stats['worker_seconds']:.1f}s, "
+          f"parallelismo {stats['worker_seconds'] / max(stats['inference_seconds'], 1e-9):.1f}x)")
+    if args.cache:
+        print(f"Cache: {stats['cache_hits']}/{stats['chunks']} blocchi letti dalla cache, "
+              f"{stats['decoded_frames']} frame decodificati")
+    print(f"Ricucitura: {stats['stitch_seconds'] * 1000:.0f} ms, {stats['reanalyzed_frames']} frame rianalizzati")
+    print(f"Ripetizioni: {int(results['rep_count'][-1])}, frame con errore: {int(results['error_frames'].sum())}")
+    if len(rep_frames):
+        times = ', '.join(f"{f / stats['fps']:.1f}s" for f in rep_frames[:20])
+        print(f"Ripetizioni completate a: {times}{' ...' if len(rep_frames) > 20 else ''}")
+
+    check = None
+    if args.verify:
+        check = verify_sequential(args.video, results, args.exercise, {'model_complexity': args.model_complexity},
+                                  mirror=not args.no_mirror, tolerance=args.verify_tolerance)
+        print(f"Verifica sequenziale: {'OK' if check['ok'] else 'DIVERSA'} - landmark max {check['landmark_max_diff']:.4f}, "
+              f"p99 {check['landmark_p99_diff']:.4f} (tolleranza {args.verify_tolerance:g}, "
+              f"{check['frames_over_tolerance']} frame oltre), presenza diversa in {check['presence_mismatch']} frame, "
+              f"analisi diversa {check['analysis_mismatch']}, ricucitura {'OK' if check['stitch_ok'] else 'DIVERSA'}")
+
+    if args.output:
+        np.savez_compressed(args.output, landmarks=results['landmarks'], frame_size=results['frame_size'],
+                            rep_count=results['rep_count'],
+                            success=results['success'], stable=results['stable'],
+                            error_frames=results['error_frames'])
+
+    if args.corpus:
+        writer = CorpusWriter(args.corpus)
+        session_id = writer.add_session(args.exercise, results['landmarks'], results['frame_size'],
+                                        fps=stats['fps'], source=os.path.abspath(args.video))
+        writer.close()
+        print(f"Archivio {args.corpus}: sessione {session_id} aggiunta")
+    if check is not None and not check['ok']:
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+# overlay_widget.py
+from PyQt6.QtCore import QLineF, QPointF, QRectF, Qt
+from PyQt6.QtGui import QColor, QFont, QPainter, QPen, QPixmap
+from PyQt6.QtWidgets import QLabel
+
+
+def _qcolor(bgr, alpha=1.0):
+    b, g, r = bgr
+    return QColor(int(r), int(g), int(b), int(round(alpha * 255)))
+
+
+def paint_overlay(painter, target_rect, overlay):
+    """
+    Dipinge le primitive di un Overlay con QPainter nel rettangolo target_rect (QRectF) che
+    corrisponde all'intero frame. Le posizioni vengono scalate al rettangolo, gli spessori
+    restano in pixel: il costo dipende dal numero di primitive, non dalla risoluzione.
+    """
+    x0, y0 = target_rect.x(), target_rect.y()
+    w, h = target_rect.width(), target_rect.height()
+
+    def pt(x, y):
+        return QPointF(x0 + x * w, y0 + y * h)
+
+    painter.save()
+    painter.setRenderHint(QPainter.RenderHint.Antialiasing, True)
+    for item in overlay.items:
+        kind = item[0]
+        if kind == 'segments':
+            _, segments, color, thickness = item
+            if len(segments):
+                painter.setPen(QPen(_qcolor(color), thickness))
+                painter.drawLines([QLineF(pt(ax, ay), pt(bx, by)) for (ax, ay), (bx, by) in segments.tolist()])
+        elif kind == 'points':
+            _, points, color, radius, thickness, border_color = item
+            border_radius = max(radius + 1, int(radius * 1.2))
+            centers = [pt(x, y) for x, y in points.tolist()]
+            if border_color is not None:
+                _set_shape_style(painter, border_color, thickness)
+                for c in centers:
+                    painter.drawEllipse(c, border_radius, border_radius)
+            _set_shape_style(painter, color, thickness)
+            for c in centers:
+                painter.drawEllipse(c, radius, radius)
+        elif kind == 'rect':
+            _, (rx0, ry0, rx1, ry1), color, thickness, alpha = item
+            rect = QRectF(pt(rx0, ry0), pt(rx1, ry1))
+            if thickness < 0:
+                painter.fillRect(rect, _qcolor(color, alpha))
+            else:
+                # Strisce interne come in pose_overlay._blend_rect
+                t = min(thickness // 2 + 1, rect.width() / 2, rect.height() / 2)
+                fill = _qcolor(color, alpha)
+                painter.fillRect(QRectF(rect.x(), rect.y(), rect.width(), t), fill)
+                painter.fillRect(QRectF(rect.x(), rect.bottom() - t, rect.width(), t), fill)
+                painter.fillRect(QRectF(rect.x(), rect.y() + t, t, rect.height() - 2 * t), fill)
+                painter.fillRect(QRectF(rect.right() - t, rect.y() + t, t, rect.height() - 2 * t), fill)
+        elif kind == 'line':
+            _, (lx0, ly0, lx1, ly1), color, thickness, _antialias = item
+            pen = QPen(_qcolor(color), thickness)
+            pen.setCapStyle(Qt.PenCapStyle.FlatCap)
+            painter.setPen(pen)
+            painter.drawLine(pt(lx0, ly0), pt(lx1, ly1))
+        elif kind == 'circle':
+            _, (cx, cy), color, radius, thickness, _antialias = item
+            _set_shape_style(painter, color, thickness)
+            painter.drawEllipse(pt(cx, cy), radius, radius)
+        elif kind == 'crosshairs':
+            _, points, color, radius, thickness = item
+            arm = radius - 3
+            _set_shape_style(painter, color, thickness)
+            for x, y in points.tolist():
+                c = pt(x, y)
+                painter.drawEllipse(c, radius, radius)
+                painter.drawLine(QPointF(c.x() - arm, c.y()), QPointF(c.x() + arm, c.y()))
+                painter.drawLine(QPointF(c.x(), c.y() - arm), QPointF(c.x(), c.y() + arm))
+        elif kind == 'text':
+            _, text, (cx, cy), color, height = item
+            font = QFont("Segoe UI")
+            font.setBold(True)
+            font.setPixelSize(max(1, int(height * h)))
+            painter.setFont(font)
+            painter.setPen(_qcolor(color))
+            center = pt(cx, cy)
+            box = QRectF(center.x() - w / 2, center.y() - h / 2, w, h)
+            painter.drawText(box, Qt.AlignmentFlag.AlignCenter, text)
+    painter.restore()
+
+
+def _set_shape_style(painter, color, thickness):
+    # thickness -1 = forma piena (come in cv2), altrimenti solo contorno
+    if thickness < 0:
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(_qcolor(color))
+    else:
+        painter.setPen(QPen(_qcolor(color), thickness))
+        painter.setBrush(Qt.BrushStyle.NoBrush)
+
+
+def render_overlay_pixmap(pixmap, overlay):
+    """
+    Rasterizza off-screen l'overlay su una copia della QPixmap (es. per le immagini degli errori).
+    """
+    result = QPixmap(pixmap)
+    painter = QPainter(result)
+    paint_overlay(painter, QRectF(0, 0, result.width(), result.height()), overlay)
+    painter.end()
+    return result
+
+
+class OverlayVideoLabel(QLabel):
+    """
+    QLabel che mostra il video già scalato e ci dipinge sopra l'overlay vettoriale
+    alla risoluzione del display, in paintEvent.
+    """
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.overlay = None
+
+    def set_frame(self, pixmap, overlay=None):
+        self.overlay = overlay
+        self.setPixmap(pixmap)  # setPixmap pianifica già il ridisegno
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        pixmap = self.pixmap()
+        if not self.overlay or pixmap is None or pixmap.isNull():
+            return
+        # Rettangolo del pixmap centrato (allineamento AlignCenter della QLabel)
+        size = pixmap.deviceIndependentSize()
+        area = QRectF(self.contentsRect())
+        target = QRectF(area.x() + (area.width() - size.width()) / 2,
+                        area.y() + (area.height() - size.height()) / 2,
+                        size.width(), size.height())
+        painter = QPainter(self)
+        paint_overlay(painter, target, self.overlay)
+        painter.end()
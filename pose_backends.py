@@ -0,0 +1,253 @@
+# pose_backends.py
+import hashlib
+from importlib import metadata
+
+import cv2
+import numpy as np
+
+NUM_LANDMARKS = 33
+
+# Connessioni dello scheletro (stesse di mp.solutions.pose.POSE_CONNECTIONS), così disegno e
+# analisi non dipendono dal backend di inferenza
+POSE_CONNECTIONS = frozenset([
+    (0, 1), (1, 2), (2, 3), (3, 7), (0, 4), (4, 5), (5, 6), (6, 8), (9, 10),
+    (11, 12), (11, 13), (13, 15), (15, 17), (15, 19), (15, 21), (17, 19),
+    (12, 14), (14, 16), (16, 18), (16, 20), (16, 22), (18, 20),
+    (11, 23), (12, 24), (23, 24), (23, 25), (24, 26), (25, 27), (26, 28),
+    (27, 29), (28, 30), (29, 31), (30, 32), (27, 31), (28, 32),
+])
+
+
+def _package_version(name):
+    try:
+        return metadata.version(name)
+    except metadata.PackageNotFoundError:
+        return None
+
+
+class PoseBackend:
+    """
+    Interfaccia comune dei motori di inferenza della posa.
+    process() riceve un'immagine RGB e restituisce un array (33, 4) con
+    [x, y, z, visibility] normalizzati all'immagine, oppure None se nessuna persona è rilevata.
+    timestamp è l'istante del frame sulla scala della sorgente (facoltativo: i backend che non ne
+    hanno bisogno lo ignorano).
+    """
+    name = 'base'
+
+    def process(self, img_rgb, timestamp=None):
+        raise NotImplementedError
+
+    def settings(self):
+        """Impostazioni che influenzano i risultati (usate per identificare il backend)."""
+        return {'backend': self.name}
+
+    def close(self):
+        pass
+
+
+class MediaPipeBackend(PoseBackend):
+    """Backend basato su mp.solutions.pose (il percorso originale di PoseDetector)."""
+    name = 'mediapipe'
+
+    def __init__(self, static_image_mode=False, model_complexity=1, smooth_landmarks=True,
+                 enable_segmentation=False, smooth_segmentation=True,
+                 min_detection_confidence=0.5, min_tracking_confidence=0.5, lazy=False):
+        self.static_image_mode = static_image_mode
+        self.model_complexity = model_complexity
+        self.smooth_landmarks = smooth_landmarks
+        self.enable_segmentation = enable_segmentation
+        self.smooth_segmentation = smooth_segmentation
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        self.pose = None
+        self.last_results = None  # Risultato grezzo di MediaPipe dell'ultimo frame
+        self._landmarks = np.empty((NUM_LANDMARKS, 4), dtype=np.float32)
+        # Con lazy=True il grafo viene creato al primo process(): utile quando servono solo le
+        # impostazioni (es. per la chiave della cache) e l'inferenza potrebbe non servire
+        if not lazy:
+            self._load()
+
+    def _load(self):
+        import mediapipe as mp
+        self.pose = mp.solutions.pose.Pose(static_image_mode=self.static_image_mode,
+                                           model_complexity=self.model_complexity,
+                                           smooth_landmarks=self.smooth_landmarks,
+                                           enable_segmentation=self.enable_segmentation,
+                                           smooth_segmentation=self.smooth_segmentation,
+                                           min_detection_confidence=self.min_detection_confidence,
+                                           min_tracking_confidence=self.min_tracking_confidence)
+
+    def process(self, img_rgb, timestamp=None):
+        if self.pose is None:
+            self._load()
+        self.last_results = self.pose.process(img_rgb)
+        if not self.last_results or not self.last_results.pose_landmarks:
+            return None
+        for i, lm in enumerate(self.last_results.pose_landmarks.landmark):
+            self._landmarks[i] = (lm.x, lm.y, lm.z, lm.visibility)
+        return self._landmarks
+
+    def settings(self):
+        return {
+            'backend': self.name,
+            'model_version': _package_version('mediapipe'),
+            'static_image_mode': self.static_image_mode,
+            'model_complexity': self.model_complexity,
+            'smooth_landmarks': self.smooth_landmarks,
+            'min_detection_confidence': self.min_detection_confidence,
+            'min_tracking_confidence': self.min_tracking_confidence,
+        }
+
+    def close(self):
+        if self.pose:
+            self.pose.close()
+            self.pose = None
+
+
+class OnnxPoseBackend(PoseBackend):
+    """
+    Backend CPU per un modello di posa esportato in ONNX (es. il modello landmark di BlazePose
+    convertito da TFLite: ingresso 256x256 RGB in [0, 1], uscita 39 x [x, y, z, visibilità, presenza]
+    in pixel dell'ingresso). Esegue il modello con ONNX Runtime se installato, altrimenti con
+    OpenCV DNN. Il frame viene portato all'ingresso con letterbox: il modello landmark non ha un
+    rilevatore di ROI, quindi la persona deve occupare buona parte dell'inquadratura.
+    """
+    name = 'onnx'
+
+    def __init__(self, model_path, input_size=(256, 256), runtime='auto', num_threads=None,
+                 inter_op_threads=1, input_layout='nhwc', output_name=None,
+                 min_detection_confidence=0.5):
+        self.model_path = model_path
+        self.input_size = tuple(input_size)  # (larghezza, altezza)
+        self.input_layout = input_layout
+        self.output_name = output_name
+        self.num_threads = num_threads
+        self.inter_op_threads = inter_op_threads
+        self.min_detection_confidence = min_detection_confidence
+        self.runtime = self._select_runtime(runtime)
+        self._digest = None
+
+        in_w, in_h = self.input_size
+        self._canvas = np.zeros((in_h, in_w, 3), dtype=np.uint8)  # Buffer letterbox riutilizzato
+        self._blob = np.empty((1, in_h, in_w, 3), dtype=np.float32)
+        self._landmarks = np.empty((NUM_LANDMARKS, 4), dtype=np.float32)
+        self._letterbox = (1.0, 0, 0, 0, 0)  # (scala, pad_x, pad_y, larghezza, altezza) dell'ultimo frame
+
+        if self.runtime == 'onnxruntime':
+            import onnxruntime as ort
+            options = ort.SessionOptions()
+            if num_threads:
+                options.intra_op_num_threads = num_threads
+            options.inter_op_num_threads = inter_op_threads
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+            self.session = ort.InferenceSession(model_path, sess_options=options,
+                                                providers=['CPUExecutionProvider'])
+            self.input_name = self.session.get_inputs()[0].name
+            self.net = None
+        else:
+            # cv2.setNumThreads è globale: vale per tutto il processo
+            if num_threads:
+                cv2.setNumThreads(num_threads)
+            self.net = cv2.dnn.readNetFromONNX(model_path)
+            self.net.setPreferableBackend(cv2.dnn.DNN_BACKEND_OPENCV)
+            self.net.setPreferableTarget(cv2.dnn.DNN_TARGET_CPU)
+            self.session = None
+
+    @staticmethod
+    def _select_runtime(runtime):
+        if runtime not in ('auto', 'onnxruntime', 'opencv'):
+            raise ValueError(f"Runtime non supportato: {runtime}")
+        if runtime in ('auto', 'onnxruntime'):
+            try:
+                import onnxruntime  # noqa: F401
+                return 'onnxruntime'
+            except ImportError:
+                if runtime == 'onnxruntime':
+                    raise
+        return 'opencv'
+
+    def _prepare_input(self, img_rgb):
+        # Letterbox nel buffer preallocato: ridimensiona mantenendo le proporzioni e centra
+        h, w = img_rgb.shape[:2]
+        in_w, in_h = self.input_size
+        scale = min(in_w / w, in_h / h)
+        new_w, new_h = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+        pad_x, pad_y = (in_w - new_w) // 2, (in_h - new_h) // 2
+        self._canvas.fill(0)
+        cv2.resize(img_rgb, (new_w, new_h), dst=self._canvas[pad_y:pad_y + new_h, pad_x:pad_x + new_w],
+                   interpolation=cv2.INTER_LINEAR)
+        np.multiply(self._canvas, 1.0 / 255.0, out=self._blob[0], casting='unsafe')
+        self._letterbox = (scale, pad_x, pad_y, w, h)
+        if self.input_layout == 'nchw':
+            return np.ascontiguousarray(self._blob.transpose(0, 3, 1, 2))
+        return self._blob
+
+    def _run(self, blob):
+        if self.session is not None:
+            outputs = self.session.run(None if self.output_name is None else [self.output_name],
+                                       {self.input_name: blob})
+        else:
+            self.net.setInput(blob)
+            if self.output_name is None:
+                outputs = self.net.forward(self.net.getUnconnectedOutLayersNames())
+            else:
+                outputs = [self.net.forward(self.output_name)]
+        return [np.asarray(o) for o in outputs]
+
+    def process(self, img_rgb, timestamp=None):
+        outputs = self._run(self._prepare_input(img_rgb))
+        # Uscita dei landmark: il primo tensore con almeno 33 x 5 valori
+        raw = next((o.reshape(-1) for o in outputs if o.size >= NUM_LANDMARKS * 5), None)
+        if raw is None:
+            raise RuntimeError("Il modello ONNX non produce un tensore di landmark riconoscibile.")
+        # Uscita di presenza della persona (tensore con un solo valore), se disponibile
+        flags = [o.reshape(-1)[0] for o in outputs if o.size == 1]
+        if flags and float(flags[0]) < self.min_detection_confidence:
+            return None
+
+        # BlazePose produce 39 punti (33 + 6 ausiliari), altri modelli esattamente 33
+        num_points = 39 if raw.size % 39 == 0 and raw.size // 39 >= 3 else NUM_LANDMARKS
+        per_point = raw.size // num_points
+        points = raw[:NUM_LANDMARKS * per_point].reshape(NUM_LANDMARKS, per_point)
+        scale, pad_x, pad_y, w, h = self._letterbox
+        lm = self._landmarks
+        lm[:, 0] = (points[:, 0] - pad_x) / (scale * w)
+        lm[:, 1] = (points[:, 1] - pad_y) / (scale * h)
+        lm[:, 2] = points[:, 2] / (scale * w)
+        # La visibilità è prodotta come logit
+        lm[:, 3] = 1.0 / (1.0 + np.exp(-points[:, 3])) if per_point > 3 else 1.0
+        return lm
+
+    def settings(self):
+        return {
+            'backend': self.name,
+            'model_path': self.model_path,
+            'model_sha256': self._model_digest(),
+            'input_size': list(self.input_size),
+            'runtime': self.runtime,
+            'min_detection_confidence': self.min_detection_confidence,
+        }
+
+    def _model_digest(self):
+        # Impronta del file del modello: cambia se il modello viene sostituito allo stesso percorso
+        if self._digest is None:
+            digest = hashlib.sha256()
+            with open(self.model_path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(block)
+            self._digest = digest.hexdigest()
+        return self._digest
+
+    def close(self):
+        self.session = None
+        self.net = None
+
+
+def create_backend(name='mediapipe', **kwargs):
+    """Crea un backend per nome ('mediapipe' oppure 'onnx')."""
+    if name == 'mediapipe':
+        return MediaPipeBackend(**kwargs)
+    if name == 'onnx':
+        return OnnxPoseBackend(**kwargs)
+    raise ValueError(f"Backend di posa sconosciuto: {name}")
@@ -1,11 +1,53 @@
 # pose_detector.py
 import cv2
-import mediapipe as mp
 import numpy as np
 
+from pose_backends import POSE_CONNECTIONS, MediaPipeBackend
+from pose_overlay import Overlay, rasterize_overlay
+
+def landmarks_to_positions(landmarks, width, height, visibility_threshold=0.3):
+    """
+    Converte un array (33, 4) di landmark normalizzati nel dizionario usato da ExerciseAnalyzer,
+    {id: [cx, cy, z, visibility, x, y]}, tenendo solo i punti abbastanza visibili.
+    Le righe NaN (landmark mancanti) vengono scartate.
+    """
+    landmarks_list = {}
+    if landmarks is not None:
+        for id, (x, y, z, visibility) in enumerate(landmarks.tolist()):
+            if visibility > visibility_threshold:
+                cx, cy = int(x * width), int(y * height)
+                landmarks_list[id] = [cx, cy, z, visibility, x, y]
+    return landmarks_list
+
+
+_CONNECTION_ARRAY = np.array(sorted(POSE_CONNECTIONS), dtype=np.intp)
+
+
+def skeleton_overlay(landmarks, overlay, color, landmark_thickness, circle_radius, connection_thickness,
+                     visibility_threshold=0.5):
+    """
+    Aggiunge connessioni e landmark da un array (33, 4) del backend, con lo stesso stile di
+    mp_draw.draw_landmarks (bordo bianco attorno ai punti). Costo proporzionale ai landmark.
+    Coordinate normalizzate sull'intero frame (area video = 80% sinistro).
+    """
+    lm = landmarks
+    with np.errstate(invalid='ignore'):
+        visible = lm[:, 3] >= visibility_threshold
+        # Solo i punti dentro l'immagine, come in mediapipe.drawing_utils
+        inside = (lm[:, 0] >= 0) & (lm[:, 0] <= 1) & (lm[:, 1] >= 0) & (lm[:, 1] <= 1)
+    drawable = visible & inside
+    points = np.column_stack((lm[:, 0] * 0.8, lm[:, 1]))
+    conn = _CONNECTION_ARRAY
+    keep = drawable[conn[:, 0]] & drawable[conn[:, 1]]
+    overlay.add_segments(points[conn[keep]], color, connection_thickness)
+    overlay.add_points(points[drawable], color, circle_radius, landmark_thickness,
+                       border_color=(224, 224, 224))
+    return overlay
+
+
 class PoseDetector:
     def __init__(self, mode=False, model_complexity=1, smooth_landmarks=True, enable_segmentation=False, smooth_segmentation=True,
-                 min_detection_confidence=0.5, min_tracking_confidence=0.5):
+                 min_detection_confidence=0.5, min_tracking_confidence=0.5, backend=None):
         # Inizializza i parametri per il rilevamento della posa
         self.mode = mode
         self.model_complexity = model_complexity
@@ -15,14 +57,20 @@ class PoseDetector:
         self.min_detection_confidence = min_detection_confidence
         self.min_tracking_confidence = min_tracking_confidence
 
-        # Configura MediaPipe per il rilevamento della posa
-        self.mp_pose = mp.solutions.pose
-        self.pose = self.mp_pose.Pose(min_detection_confidence=0.5,
-                                     min_tracking_confidence=0.5,
-                                     enable_segmentation=False,
-                                     model_complexity=1)
-        self.mp_draw = mp.solutions.drawing_utils
-        self.results = None
+        # Motore di inferenza: di default MediaPipe, sostituibile con qualsiasi PoseBackend
+        if backend is None:
+            backend = MediaPipeBackend(static_image_mode=mode,
+                                       model_complexity=model_complexity,
+                                       smooth_landmarks=smooth_landmarks,
+                                       enable_segmentation=enable_segmentation,
+                                       smooth_segmentation=smooth_segmentation,
+                                       min_detection_confidence=min_detection_confidence,
+                                       min_tracking_confidence=min_tracking_confidence)
+        self.backend = backend
+        self.pose_connections = POSE_CONNECTIONS
+        self.results = None  # Risultato grezzo del backend (per MediaPipe, l'oggetto results)
+        self.landmarks = None  # Array (33, 4) [x, y, z, visibility] normalizzati, o None
+        self._rgb_buffer = None  # Buffer RGB riutilizzato da find_pose
 
         # Colori per la posa dell'utente
         self.color_correct = (0, 255, 0)      # Verde
@@ -32,177 +80,137 @@ class PoseDetector:
         # Colore per i punti target successivi
         self.color_target = (0, 255, 255) # Giallo/Ciano per i punti target
 
-    def find_pose(self, img):
+    def find_pose(self, img, timestamp=None):
         """
         Elabora l'immagine per trovare i landmark della posa, ma non disegna nulla.
-        Salva i risultati nell'attributo 'self.results'.
+        Salva i landmark in 'self.landmarks' e il risultato grezzo del backend in 'self.results'.
+        timestamp: istante del frame sulla scala della sorgente (per i backend che ne tengono conto).
         """
         # CORREZIONE: Rimosso il doppio ritaglio. Ora 'img' è già l'area video corretta.
-        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)
-        self.results = self.pose.process(img_rgb)
+        # La conversione avviene in un buffer RGB riutilizzato (dst=) invece di allocarne uno nuovo
+        if self._rgb_buffer is None or self._rgb_buffer.shape != img.shape:
+            self._rgb_buffer = np.empty(img.shape, dtype=img.dtype)
+        img_rgb = cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=self._rgb_buffer)
+        self.landmarks = self.backend.process(img_rgb, timestamp=timestamp)
+        self.results = getattr(self.backend, 'last_results', self.landmarks)
         return self.results
 
-    def draw_user_pose(self, img, exercise_success=None):
+    def user_pose_overlay(self, exercise_success=None, overlay=None, landmarks=None):
         """
-        Disegna i landmark dell'utente e un bordo colorato sull'immagine
-        in base ai risultati salvati.
+        Costruisce le primitive vettoriali della posa dell'utente e del bordo colorato
+        (coordinate normalizzate sull'intero frame, area video = 80% sinistro).
+        landmarks: quelli del frame mostrato, se diversi dagli ultimi trovati da find_pose.
         """
-        h, w, _ = img.shape
-        video_width = int(w * 0.8)
-        img_to_draw_on = img[:, :video_width]
-
+        overlay = overlay if overlay is not None else Overlay()
         current_color = self.color_neutral
         if exercise_success is not None:
             current_color = self.color_correct if exercise_success else self.color_incorrect
+            border_thickness = 10
+            overlay.add_rect(0.0, 0.0, 0.8, 1.0, current_color, thickness=border_thickness, alpha=0.3)
 
-        border_thickness = 10
-        if exercise_success is not None:
-            overlay = img_to_draw_on.copy()
-            h_vid, w_vid = img_to_draw_on.shape[:2]
-            cv2.rectangle(overlay, (0, 0), (w_vid, h_vid), current_color, border_thickness)
-            img_to_draw_on = cv2.addWeighted(overlay, 0.3, img_to_draw_on, 0.7, 0)
-
-        if self.results and self.results.pose_landmarks:
-            landmark_drawing_spec = self.mp_draw.DrawingSpec(
-                color=current_color, thickness=1, circle_radius=3
-            )
-            connection_drawing_spec = self.mp_draw.DrawingSpec(
-                color=current_color, thickness=2
-            )
-            self.mp_draw.draw_landmarks(
-                img_to_draw_on,
-                self.results.pose_landmarks,
-                self.mp_pose.POSE_CONNECTIONS,
-                landmark_drawing_spec,
-                connection_drawing_spec
-            )
-        img[:, :video_width] = img_to_draw_on
-        return img
+        landmarks = self.landmarks if landmarks is None else landmarks
+        if landmarks is not None:
+            skeleton_overlay(landmarks, overlay, current_color, landmark_thickness=1,
+                             circle_radius=3, connection_thickness=2)
+        return overlay
 
-    def draw_error_skeleton(self, img):
+    def error_skeleton_overlay(self, overlay=None):
         """
-        Disegna lo scheletro dell'utente (landmark e connessioni) in rosso
-        in modo marcato sull'immagine fornita, limitatamente all'area video.
+        Primitive dello scheletro dell'utente in rosso, marcato, per le immagini degli errori.
         """
-        h, w, _ = img.shape
-        video_width = int(w * 0.8)
-        # Isola l'area video e crea una copia per disegnarci sopra
-        img_to_draw_on = img[:, :video_width].copy()
-
-        if self.results and self.results.pose_landmarks:
+        overlay = overlay if overlay is not None else Overlay()
+        if self.landmarks is not None:
             red_color = (0, 0, 255) # BGR per Rosso
-            landmark_drawing_spec = self.mp_draw.DrawingSpec(
-                color=red_color, thickness=2, circle_radius=4
-            )
-            connection_drawing_spec = self.mp_draw.DrawingSpec(
-                color=red_color, thickness=3
-            )
-            self.mp_draw.draw_landmarks(
-                img_to_draw_on,
-                self.results.pose_landmarks,
-                self.mp_pose.POSE_CONNECTIONS,
-                landmark_drawing_spec,
-                connection_drawing_spec
-            )
-        # Ricombina l'immagine con lo scheletro rosso nell'immagine originale
-        img_with_skeleton = img.copy()
-        img_with_skeleton[:, :video_width] = img_to_draw_on
-        return img_with_skeleton
+            self._skeleton_overlay(overlay, red_color, landmark_thickness=2,
+                                   circle_radius=4, connection_thickness=3)
+        return overlay
 
-    def draw_squat_depth_widget(self, img, squat_range_info):
+    def _skeleton_overlay(self, overlay, color, landmark_thickness, circle_radius, connection_thickness,
+                          visibility_threshold=0.5):
+        skeleton_overlay(self.landmarks, overlay, color, landmark_thickness, circle_radius,
+                         connection_thickness, visibility_threshold)
+
+    def squat_depth_overlay(self, squat_range_info, overlay=None):
         """
-        Disegna un widget sul lato destro per visualizzare la profondità dello squat.
+        Primitive del widget sul lato destro che visualizza la profondità dello squat.
         """
+        overlay = overlay if overlay is not None else Overlay()
         if squat_range_info['current_hip_y'] is None:
-            return img
-
-        h, w, _ = img.shape
-        
-        # Definisci l'area del widget (il 20% destro dello schermo)
-        panel_width = w - int(w * 0.8)
-        panel_x_start = int(w * 0.8)
-        
-        # Disegna lo sfondo nero del pannello
-        cv2.rectangle(img, (panel_x_start, 0), (w, h), (0, 0, 0), -1)
-
-        # Estrai i dati di profondità
+            return overlay
+
+        # Area del widget: il 20% destro dello schermo, con sfondo nero
+        panel_x_start = 0.8
+        overlay.add_rect(panel_x_start, 0.0, 1.0, 1.0, (0, 0, 0))
+
+        # Estrai i dati di profondità (già normalizzati sull'altezza del pannello)
         current_y_norm = squat_range_info['current_hip_y']
         upper_bound_norm = squat_range_info['upper_bound_y']
         lower_bound_norm = squat_range_info['lower_bound_y']
+        correct_bound_norm = squat_range_info['correct_bound_y']
 
-        # Mappa le coordinate normalizzate all'altezza del pannello
-        upper_px = int(upper_bound_norm * h)
-        lower_px = int(lower_bound_norm * h)
-        current_y_px = int(current_y_norm * h)
-
-        # Disegna i rettangoli rossi per i limiti
+        # Barre rosse per i limiti e verde per la profondità corretta (spesse 5 pixel)
         limit_color = (0, 0, 255) # Rosso
-        cv2.rectangle(img, (panel_x_start, upper_px - 2), (w, upper_px + 2), limit_color, -1)
-        cv2.rectangle(img, (panel_x_start, lower_px - 2), (w, lower_px + 2), limit_color, -1)
-
-        # Determina il colore e la posizione del punto
-        dot_color = (255, 255, 255) # Bianco di default
-        is_out_of_bounds = False
-        # NEW: Extract correct bound
-        correct_bound_norm = squat_range_info['correct_bound_y']
-        
-        # MODIFIED: Draw correct bound (green line)
+        overlay.add_line(panel_x_start, upper_bound_norm, 1.0, upper_bound_norm, limit_color, 5)
+        overlay.add_line(panel_x_start, lower_bound_norm, 1.0, lower_bound_norm, limit_color, 5)
         if correct_bound_norm is not None:
-            correct_bound_px = int(correct_bound_norm * h)
-            cv2.rectangle(img, (panel_x_start, correct_bound_px - 2), 
-                         (w, correct_bound_px + 2), (0, 255, 0), -1)  # Green
-        if current_y_norm < upper_bound_norm or current_y_norm > lower_bound_norm:
-            dot_color = (0, 0, 255) # Rosso se fuori dai limiti
-            is_out_of_bounds = True
-            
-        dot_x = panel_x_start + panel_width // 2
-        dot_radius = 8
-        cv2.circle(img, (dot_x, current_y_px), dot_radius, dot_color, -1)
-
-        # Se il punto è fuori, disegna la linea di distanza dal limite più vicino
+            overlay.add_line(panel_x_start, correct_bound_norm, 1.0, correct_bound_norm, (0, 255, 0), 5)
+
+        is_out_of_bounds = current_y_norm < upper_bound_norm or current_y_norm > lower_bound_norm
+        dot_color = (0, 0, 255) if is_out_of_bounds else (255, 255, 255) # Rosso se fuori dai limiti
+        dot_x = (panel_x_start + 1.0) / 2
+
+        overlay.add_circle(dot_x, current_y_norm, 8, dot_color)
+
+        # Se il punto è fuori, linea di distanza dal limite più vicino
         if is_out_of_bounds:
-            line_color = (0, 0, 255) # Rosso
-            line_thickness = 2
-            if current_y_px < upper_px:
-                # Disegna linea verso il limite superiore
-                cv2.line(img, (dot_x, current_y_px), (dot_x, upper_px), line_color, line_thickness)
-            elif current_y_px > lower_px:
-                # Disegna linea verso il limite inferiore
-                cv2.line(img, (dot_x, current_y_px), (dot_x, lower_px), line_color, line_thickness)
+            nearest = upper_bound_norm if current_y_norm < upper_bound_norm else lower_bound_norm
+            overlay.add_line(dot_x, current_y_norm, dot_x, nearest, (0, 0, 255), 2)
+        return overlay
+
+    def target_overlay(self, target_landmarks_dict, overlay=None):
+        """
+        Primitive dei punti chiave target (mirini) nell'area video.
+        """
+        overlay = overlay if overlay is not None else Overlay()
+        # Le coordinate sono normalizzate sull'area video: solo quelle dentro l'area
+        points = [(coords[0] * 0.8, coords[1]) for coords in target_landmarks_dict.values() if coords[0] < 1.0]
+        if points:
+            overlay.add_crosshairs(points, self.color_target, radius=10, thickness=2)
+        return overlay
+
+    # --- Disegno raster con cv2 (per usi senza Qt, es. annotazione offline dei video) ---
 
-        return img
+    def draw_user_pose(self, img, exercise_success=None):
+        """
+        Disegna i landmark dell'utente e un bordo colorato sull'immagine
+        in base ai risultati salvati.
+        """
+        return rasterize_overlay(img, self.user_pose_overlay(exercise_success))
+
+    def draw_error_skeleton(self, img):
+        """
+        Disegna in place lo scheletro dell'utente in rosso in modo marcato,
+        limitatamente all'area video.
+        """
+        return rasterize_overlay(img, self.error_skeleton_overlay())
+
+    def draw_squat_depth_widget(self, img, squat_range_info):
+        """
+        Disegna un widget sul lato destro per visualizzare la profondità dello squat.
+        """
+        return rasterize_overlay(img, self.squat_depth_overlay(squat_range_info))
 
     def draw_target_landmarks(self, img, target_landmarks_dict):
         """
         Disegna i punti chiave target sull'immagine (nell'area video).
         """
-        h, w_total, _ = img.shape
-        w_vid = int(w_total * 0.8)
-        
-        target_radius = 10
-        target_thickness = 2
-
-        for lm_id, coords in target_landmarks_dict.items():
-            # Le coordinate sono normalizzate, quindi le scaliamo per la larghezza del video
-            x = int(coords[0] * w_vid) 
-            y = int(coords[1] * h)
-            
-            if x < w_vid: # Assicurati di disegnare solo nell'area video
-                cv2.circle(img, (x, y), target_radius, self.color_target, target_thickness, cv2.LINE_AA)
-                cv2.line(img, (x - target_radius + 3, y), (x + target_radius - 3, y), self.color_target, target_thickness, cv2.LINE_AA)
-                cv2.line(img, (x, y - target_radius + 3), (x, y + target_radius - 3), self.color_target, target_thickness, cv2.LINE_AA)
-        return img
+        return rasterize_overlay(img, self.target_overlay(target_landmarks_dict))
 
     def find_position(self, img):
         # Estrae le coordinate dei landmark dall'area video
-        landmarks_list = {}
-        if self.results and self.results.pose_landmarks:
-            h, w, _ = img.shape # L'immagine passata è l'area video
-            for id, lm in enumerate(self.results.pose_landmarks.landmark):
-                if lm.visibility > 0.3:
-                    cx, cy = int(lm.x * w), int(lm.y * h)
-                    landmarks_list[id] = [cx, cy, lm.z, lm.visibility, lm.x, lm.y]
-        return landmarks_list
+        # Il formato non dipende dal backend: l'analizzatore riceve sempre lo stesso dizionario
+        h, w, _ = img.shape # L'immagine passata è l'area video
+        return landmarks_to_positions(self.landmarks, w, h)
 
     def calculate_angle(self, p1, p2, p3):
         p1, p2, p3 = np.array(p1[:2]), np.array(p2[:2]), np.array(p3[:2])
@@ -214,6 +222,5 @@ class PoseDetector:
         return angle
 
     def release(self):
-        if hasattr(self, 'pose') and self.pose:
-            self.pose.close()
-            self.pose = None
\ No newline at end of file
+        if hasattr(self, 'backend') and self.backend:
+            self.backend.close()
\ No newline at end of file
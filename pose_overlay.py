@@ -0,0 +1,127 @@
+# pose_overlay.py
+import cv2
+import numpy as np
+
+
+class Overlay:
+    """
+    Elenco di primitive vettoriali (punti, segmenti, rettangoli, cerchi, testo) da disegnare
+    sopra il video. Le posizioni sono normalizzate sull'intero frame ([0, 1] in x e y), gli
+    spessori e i raggi sono in pixel della superficie di destinazione: lo stesso overlay può
+    essere dipinto da Qt alla risoluzione del display o rasterizzato con cv2 su un frame.
+    I colori sono BGR, come nel resto del progetto.
+    """
+    def __init__(self):
+        self.items = []
+
+    def __len__(self):
+        return len(self.items)
+
+    def extend(self, other):
+        self.items.extend(other.items)
+        return self
+
+    def add_segments(self, segments, color, thickness):
+        # segments: array (n, 2, 2) di coppie di punti normalizzati
+        self.items.append(('segments', np.asarray(segments, dtype=np.float32), color, thickness))
+
+    def add_points(self, points, color, radius, thickness, border_color=None):
+        # points: array (n, 2); thickness -1 = pieno. border_color aggiunge l'anello esterno (stile MediaPipe)
+        self.items.append(('points', np.asarray(points, dtype=np.float32), color, radius, thickness, border_color))
+
+    def add_rect(self, x0, y0, x1, y1, color, thickness=-1, alpha=1.0):
+        # Rettangolo normalizzato; thickness -1 = pieno. Con alpha < 1 il colore viene fuso col video
+        self.items.append(('rect', (x0, y0, x1, y1), color, thickness, alpha))
+
+    def add_line(self, x0, y0, x1, y1, color, thickness, antialias=False):
+        self.items.append(('line', (x0, y0, x1, y1), color, thickness, antialias))
+
+    def add_circle(self, cx, cy, radius, color, thickness=-1, antialias=False):
+        self.items.append(('circle', (cx, cy), color, radius, thickness, antialias))
+
+    def add_crosshairs(self, points, color, radius, thickness):
+        # Mirini (cerchio + croce) centrati sui punti normalizzati (n, 2)
+        self.items.append(('crosshairs', np.asarray(points, dtype=np.float32), color, radius, thickness))
+
+    def add_text(self, text, cx, cy, color, height):
+        # Testo centrato su (cx, cy); height è l'altezza in frazione dell'altezza del frame
+        self.items.append(('text', text, (cx, cy), color, height))
+
+
+def rasterize_overlay(img, overlay):
+    """
+    Rasterizza l'overlay in place su un frame BGR con cv2 (per usi senza Qt, es. analisi offline).
+    """
+    h, w = img.shape[:2]
+
+    def px(x, y):
+        return int(x * w), int(y * h)
+
+    for item in overlay.items:
+        kind = item[0]
+        if kind == 'segments':
+            _, segments, color, thickness = item
+            pts = (segments * (w, h)).astype(np.int32)
+            for (x0, y0), (x1, y1) in pts.tolist():
+                cv2.line(img, (x0, y0), (x1, y1), color, thickness)
+        elif kind == 'points':
+            _, points, color, radius, thickness, border_color = item
+            border_radius = max(radius + 1, int(radius * 1.2))
+            for x, y in (points * (w, h)).astype(np.int32).tolist():
+                if border_color is not None:
+                    cv2.circle(img, (x, y), border_radius, border_color, thickness)
+                cv2.circle(img, (x, y), radius, color, thickness)
+        elif kind == 'rect':
+            _, (x0, y0, x1, y1), color, thickness, alpha = item
+            if thickness < 0 and alpha >= 1.0:
+                cv2.rectangle(img, px(x0, y0), px(x1, y1), color, -1)
+            else:
+                _blend_rect(img, px(x0, y0), px(x1, y1), color, thickness, alpha)
+        elif kind == 'line':
+            _, (x0, y0, x1, y1), color, thickness, antialias = item
+            cv2.line(img, px(x0, y0), px(x1, y1), color, thickness,
+                     cv2.LINE_AA if antialias else cv2.LINE_8)
+        elif kind == 'circle':
+            _, (cx, cy), color, radius, thickness, antialias = item
+            cv2.circle(img, px(cx, cy), radius, color, thickness,
+                       cv2.LINE_AA if antialias else cv2.LINE_8)
+        elif kind == 'crosshairs':
+            _, points, color, radius, thickness = item
+            arm = radius - 3
+            for x, y in (points * (w, h)).astype(np.int32).tolist():
+                cv2.circle(img, (x, y), radius, color, thickness, cv2.LINE_AA)
+                cv2.line(img, (x - arm, y), (x + arm, y), color, thickness, cv2.LINE_AA)
+                cv2.line(img, (x, y - arm), (x, y + arm), color, thickness, cv2.LINE_AA)
+        elif kind == 'text':
+            _, text, (cx, cy), color, height = item
+            font = cv2.FONT_HERSHEY_SIMPLEX
+            # La scala 1 del font Hershey corrisponde a circa 22 pixel di altezza
+            scale = height * h / 22.0
+            thickness = max(1, int(round(scale * 5 / 3)))
+            (text_w, text_h), _ = cv2.getTextSize(text, font, scale, thickness)
+            x, y = px(cx, cy)
+            cv2.putText(img, text, (x - text_w // 2, y + text_h // 2), font, scale, color, thickness, cv2.LINE_AA)
+    return img
+
+
+def _blend_rect(img, p0, p1, color, thickness, alpha):
+    """
+    Fonde in place un rettangolo colorato con trasparenza alpha. I contorni sono strisce interne
+    larghe thickness // 2 + 1 pixel (come in paint_overlay): si lavora solo su quelle, senza
+    copiare l'intera immagine.
+    """
+    x0, y0 = max(0, p0[0]), max(0, p0[1])
+    x1, y1 = min(img.shape[1], p1[0]), min(img.shape[0], p1[1])
+    region = img[y0:y1, x0:x1]
+    rh, rw = region.shape[:2]
+    if thickness < 0:
+        strips = (region,)
+    else:
+        t = min(thickness // 2 + 1, rh, rw)
+        strips = (region[:t, :], region[rh - t:, :], region[t:rh - t, :t], region[t:rh - t, rw - t:])
+    scaled_color = tuple(c * alpha for c in color) + (0,)
+    for strip in strips:
+        if strip.size == 0:
+            continue
+        cv2.convertScaleAbs(strip, dst=strip, alpha=1.0 - alpha)
+        cv2.add(strip, scaled_color, dst=strip)
@@ -0,0 +1,165 @@
+# presence_gate.py
+import time
+
+import cv2
+import numpy as np
+
+# Decisioni del gate per il frame corrente
+GATE_INFER = 'infer'   # Inferenza completa della posa
+GATE_REUSE = 'reuse'   # Scena ferma con persona presente: si riusano gli ultimi landmark
+GATE_IDLE = 'idle'     # Nessuno presente e nessun movimento: niente inferenza, cattura rallentata
+
+
+class PresenceGate:
+    """
+    Pre-stadio economico davanti all'inferenza della posa. Confronta frame consecutivi
+    sottocampionati (scala di grigi, thumb_size) e, insieme alla confidenza degli ultimi
+    landmark, decide se eseguire l'inferenza, riusare l'ultimo risultato o andare in idle.
+    Il movimento fa sempre ripartire l'inferenza sul frame stesso in cui viene rilevato.
+    """
+    def __init__(self, thumb_size=(64, 48), pixel_threshold=12, motion_threshold=0.01,
+                 presence_confidence=0.5, static_after=3, max_reuse_frames=10,
+                 idle_after=45, idle_probe_frames=10, active_interval_ms=33, idle_interval_ms=200):
+        self.thumb_size = thumb_size  # (larghezza, altezza) della miniatura per la differenza
+        self.pixel_threshold = pixel_threshold  # Differenza di grigio oltre la quale un pixel "si muove"
+        self.motion_threshold = motion_threshold  # Frazione di pixel in movimento che indica moto
+        self.presence_confidence = presence_confidence  # Visibilità media minima per "persona presente"
+        self.static_after = static_after  # Frame fermi prima di iniziare a riusare i landmark
+        self.max_reuse_frames = max_reuse_frames  # Riusi consecutivi massimi prima di un'inferenza di controllo
+        self.idle_after = idle_after  # Frame fermi senza persona prima di entrare in idle
+        self.idle_probe_frames = idle_probe_frames  # In idle, un'inferenza di controllo ogni N frame catturati
+        self.active_interval_ms = active_interval_ms
+        self.idle_interval_ms = idle_interval_ms
+
+        w, h = thumb_size
+        self._small = np.empty((h, w, 3), dtype=np.uint8)
+        self._gray = np.empty((h, w), dtype=np.uint8)
+        self._prev_gray = np.empty((h, w), dtype=np.uint8)
+        self._diff = np.empty((h, w), dtype=np.uint8)
+        self.reset()
+
+    def reset(self):
+        self._has_prev = False
+        self.present = False  # Esito dell'ultima inferenza
+        self.last_confidence = 0.0
+        self.still_frames = 0
+        self.reused_in_row = 0
+        self.idle_frames = 0
+        self.mode = 'active'  # 'active', 'static' o 'idle'
+        self.last_motion = 0.0
+        self.counts = {GATE_INFER: 0, GATE_REUSE: 0, GATE_IDLE: 0}
+        # Tempo CPU del solo thread che chiama il gate (thread_time), come quello delle inferenze
+        self.gate_cpu = 0.0  # Tempo CPU speso dal gate stesso
+        self.inference_cpu = 0.0  # Tempo CPU delle inferenze eseguite
+        self.idle_wall = 0.0  # Tempo trascorso in idle (cattura rallentata)
+        self.idle_captured = 0  # Frame comunque catturati durante l'idle
+        self._idle_since = None
+
+    def _motion(self, frame):
+        # Miniatura in grigio nei buffer preallocati, poi frazione di pixel cambiati
+        cv2.resize(frame, self.thumb_size, dst=self._small, interpolation=cv2.INTER_AREA)
+        cv2.cvtColor(self._small, cv2.COLOR_BGR2GRAY, dst=self._gray)
+        if not self._has_prev:
+            self._has_prev = True
+            self._prev_gray, self._gray = self._gray, self._prev_gray
+            return 1.0
+        cv2.absdiff(self._gray, self._prev_gray, dst=self._diff)
+        moving = cv2.countNonZero(cv2.threshold(self._diff, self.pixel_threshold, 255,
+                                                cv2.THRESH_BINARY, dst=self._diff)[1])
+        self._prev_gray, self._gray = self._gray, self._prev_gray
+        return moving / self._diff.size
+
+    def update(self, frame):
+        """
+        Valuta il frame (area video BGR) e restituisce GATE_INFER, GATE_REUSE o GATE_IDLE.
+        """
+        t0 = time.thread_time()
+        self.last_motion = self._motion(frame)
+        if self.last_motion >= self.motion_threshold:
+            self.still_frames = 0
+            decision = GATE_INFER
+        else:
+            self.still_frames += 1
+            if self.present:
+                # Persona ferma: riuso, con un'inferenza di controllo ogni max_reuse_frames
+                if self.still_frames >= self.static_after and self.reused_in_row < self.max_reuse_frames:
+                    decision = GATE_REUSE
+                else:
+                    decision = GATE_INFER
+            elif self.still_frames >= self.idle_after:
+                self.idle_frames += 1
+                decision = GATE_INFER if self.idle_frames % self.idle_probe_frames == 0 else GATE_IDLE
+                self._set_mode('idle')
+            else:
+                decision = GATE_INFER
+
+        if decision == GATE_REUSE:
+            self.reused_in_row += 1
+            self._set_mode('static')
+        elif decision == GATE_INFER:
+            self.reused_in_row = 0
+            if self.last_motion >= self.motion_threshold or self.present:
+                self._set_mode('active')
+        self.counts[decision] += 1
+        if self.mode == 'idle':
+            self.idle_captured += 1
+        self.gate_cpu += time.thread_time() - t0
+        return decision
+
+    def record_inference(self, landmarks, cpu_seconds):
+        """
+        Registra l'esito di un'inferenza: landmark (33, 4) o None e tempo CPU impiegato
+        (time.thread_time() del thread che la esegue, lo stesso orologio del gate).
+        """
+        self.inference_cpu += cpu_seconds
+        if landmarks is None:
+            self.last_confidence = 0.0
+        else:
+            self.last_confidence = float(landmarks[:, 3].mean())
+        self.present = self.last_confidence >= self.presence_confidence
+        if self.present:
+            self.idle_frames = 0
+            self._set_mode('active')
+
+    def _set_mode(self, mode):
+        if mode == self.mode:
+            return
+        now = time.perf_counter()
+        if self.mode == 'idle' and self._idle_since is not None:
+            self.idle_wall += now - self._idle_since
+            self._idle_since = None
+        if mode == 'idle':
+            self._idle_since = now
+        self.mode = mode
+
+    def capture_interval_ms(self):
+        """Intervallo di cattura consigliato: rallentato in idle."""
+        return self.idle_interval_ms if self.mode == 'idle' else self.active_interval_ms
+
+    def stats(self):
+        """
+        Statistiche del gate. cpu_saved_fraction è la stima del tempo CPU risparmiato rispetto
+        all'inferenza su ogni frame, includendo i frame non catturati durante l'idle:
+        risparmio / (costo senza gate), con il costo medio misurato di un'inferenza.
+        """
+        inferred = self.counts[GATE_INFER]
+        skipped = self.counts[GATE_REUSE] + self.counts[GATE_IDLE]
+        idle_wall = self.idle_wall
+        if self.mode == 'idle' and self._idle_since is not None:
+            idle_wall += time.perf_counter() - self._idle_since
+        # Frame che a piena cadenza sarebbero stati catturati in più durante l'idle
+        uncaptured = max(0.0, idle_wall * 1000.0 / self.active_interval_ms - self.idle_captured)
+        mean_inference = self.inference_cpu / inferred if inferred else 0.0
+        baseline = (inferred + skipped + uncaptured) * mean_inference
+        spent = self.inference_cpu + self.gate_cpu
+        saved_fraction = max(0.0, 1.0 - spent / baseline) if baseline > 0 else 0.0
+        return {
+            'frames': inferred + skipped,
+            'inferred': inferred,
+            'reused': self.counts[GATE_REUSE],
+            'idle': self.counts[GATE_IDLE],
+            'uncaptured': int(uncaptured),
+            'mean_inference_ms': mean_inference * 1000.0,
+            'gate_ms_per_frame': self.gate_cpu * 1000.0 / max(1, inferred + skipped),
+            'cpu_saved_fraction': saved_fraction,
+        }
@@ -0,0 +1,263 @@
+# profile_capture.py
+"""
+Profilo a richiesta dell'app in esecuzione (scorciatoia Ctrl+Shift+P o `kill -USR1 <pid>`).
+
+Per duration_s secondi registra:
+- il profilo a campionamento (default: pile Python dei thread della GUI, di cattura e di
+  elaborazione ogni interval_s da un thread separato, con il nome del thread in radice) oppure
+  deterministico con cProfile (solo thread della GUI). I campioni di un thread fermo in attesa
+  (Condition/Event.wait, ritmo della sorgente, ciclo degli eventi senza lavoro) finiscono con la
+  foglia "(in attesa)" e restano fuori dal tempo proprio delle funzioni nel riepilogo;
+- i tempi per chiamata delle fasi (lettura, inferenza, filtro, analisi, etichette, disegno, ...),
+  su qualunque thread vengano eseguite; l'attesa di ritmo della sorgente è una fase a sé
+  ('ritmo') e non viene contata nelle fasi che la contengono (la lettura);
+- la differenza tra due istantanee tracemalloc, inizio e fine della cattura.
+Scrive in output_dir un file in formato "collapsed stacks" (flamegraph.pl, speedscope,
+inferno) o .prof (pstats, snakeviz) e un riepilogo .txt. A cattura spenta non resta installato
+nulla: le fasi sono misurate sostituendo temporaneamente i metodi delle istanze.
+"""
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+import numpy as np
+
+from frame_sources import FrameSource
+
+FRAME_STAGE = 'lettura'  # Una lettura per frame catturato
+WAIT_STAGES = ('ritmo',)  # Attese: tolte dal tempo delle fasi in cui sono annidate
+IDLE_LEAF = '(in attesa)'
+# Funzioni Python in cui un thread resta fermo (il blocco vero è in C, sotto di esse)
+_IDLE_CODES = {threading.Condition.wait.__code__, FrameSource._frames_to_skip.__code__}
+
+
+def _stage_targets(window):
+    # (fase, oggetto, metodo) misurati durante la cattura; gli oggetti assenti vengono saltati
+    return [
+        ('lettura', window, '_read_frame'),
+        ('ritmo', FrameSource, '_frames_to_skip'),  # Sulla classe: la sorgente cambia a ogni avvio
+        ('riconoscimento', getattr(window, 'pipeline', None), '_process'),  # _infer_frame, sul thread di elaborazione
+        ('inferenza', window.pose_detector, 'find_pose'),
+        ('filtro', window.landmark_filter, 'update'),
+        ('posizioni', window.pose_detector, 'find_position'),
+        ('display', window, 'update_frame'),
+        ('elaborazione', window, '_process_frame'),
+        ('analisi', window.ex_analyzer, 'analyze_frame'),
+        ('etichette', window, 'update_feedback_and_reps'),
+        ('somiglianza', window, 'update_similarity'),
+        ('disegno', window.image_label, 'set_frame'),
+        ('clip', window.error_clips, 'push'),
+        ('archivio', window.corpus_writer, 'add_frame'),
+        ('live', window.live_server, 'publish'),
+        ('bus', window.result_bus, 'publish'),
+    ]
+
+
+def _frame_label(code):
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{os.path.basename(code.co_filename)}:{name}"
+
+
+class ProfileCapture:
+    """
+    Cattura a tempo di un profilo di FitnessCoachApp (da usare nel thread della GUI).
+    mode = 'sampling' | 'deterministic'.
+    """
+    def __init__(self, window, output_dir='profiles', duration_s=10.0, mode='sampling', interval_s=0.005):
+        if mode not in ('sampling', 'deterministic'):
+            raise ValueError(f"Modalità di profilo non supportata: {mode}")
+        self.window = window
+        self.output_dir = output_dir
+        self.duration_s = duration_s
+        self.mode = mode
+        self.interval_s = interval_s
+        self.active = False
+        self._patched = []
+        self._samples = {}
+        self._stacks = Counter()
+        self._sampler = None
+        self._profiler = None
+        self._stop_sampling = threading.Event()
+        self._waited = threading.local()
+        self._started_tracemalloc = False
+        self._snapshot = None
+        self._t0 = None
+
+    def toggle(self):
+        if self.active:
+            return self.stop()
+        self.start()
+        return None
+
+    def start(self):
+        if self.active:
+            return
+        self.active = True
+        self._samples = {}
+        self._stacks = Counter()
+        self._t0 = time.perf_counter()
+        self._started_tracemalloc = not tracemalloc.is_tracing()
+        if self._started_tracemalloc:
+            tracemalloc.start()  # Un solo livello: il confronto è per riga
+        self._snapshot = tracemalloc.take_snapshot()
+        for stage, owner, name in _stage_targets(self.window):
+            if owner is not None and hasattr(owner, name):
+                self._instrument(stage, owner, name)
+        if self.mode == 'sampling':
+            self._stop_sampling.clear()
+            self._sampler = threading.Thread(target=self._sample_loop, args=(threading.get_ident(),),
+                                             name='profile-sampler', daemon=True)
+            self._sampler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        print(f"Profilo avviato ({self.mode}, {self.duration_s:g} s)...")
+
+    def stop(self):
+        """Termina la cattura e scrive i file: restituisce i percorsi (profilo, riepilogo)."""
+        if not self.active:
+            return None
+        elapsed = time.perf_counter() - self._t0
+        if self._profiler is not None:
+            self._profiler.disable()
+        if self._sampler is not None:
+            self._stop_sampling.set()
+            self._sampler.join()
+            self._sampler = None
+        for owner, name, original in reversed(self._patched):
+            if original is None:
+                delattr(owner, name)
+            else:
+                setattr(owner, name, original)
+        self._patched = []
+        # Le allocazioni della cattura stessa (pile campionate, tempi) non interessano
+        own = [tracemalloc.Filter(False, __file__), tracemalloc.Filter(False, tracemalloc.__file__)]
+        memory_diff = tracemalloc.take_snapshot().filter_traces(own).compare_to(
+            self._snapshot.filter_traces(own), 'lineno')
+        self._snapshot = None
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+        self.active = False
+
+        os.makedirs(self.output_dir, exist_ok=True)
+        base = os.path.join(self.output_dir, time.strftime('profilo_%Y%m%d_%H%M%S'))
+        if self.mode == 'sampling':
+            profile_path = base + '.collapsed'
+            with open(profile_path, 'w', encoding='utf-8') as f:
+                for stack, count in self._stacks.most_common():
+                    f.write(f"{stack} {count}\n")
+        else:
+            profile_path = base + '.prof'
+            self._profiler.dump_stats(profile_path)
+        summary_path = base + '.txt'
+        with open(summary_path, 'w', encoding='utf-8') as f:
+            f.write(self.summary(elapsed, memory_diff))
+        self._profiler = None
+        print(f"Profilo salvato: {profile_path} (riepilogo: {summary_path})")
+        return profile_path, summary_path
+
+    # --- Misura ---
+
+    def _instrument(self, stage, owner, name):
+        original = owner.__dict__.get(name) if hasattr(owner, '__dict__') else None
+        method = getattr(owner, name)
+        # Un tempo per chiamata: le fasi girano su thread diversi, anche su frame diversi
+        samples = self._samples.setdefault(stage, [])
+        waits = stage in WAIT_STAGES
+        local = self._waited
+
+        def timed(*args, **kwargs):
+            waited = getattr(local, 'total', 0.0)
+            t0 = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - t0
+                if waits:
+                    local.total = waited + elapsed
+                    samples.append(elapsed)
+                else:
+                    # Senza le attese annidate, misurate dalla loro fase sullo stesso thread
+                    samples.append(elapsed - (getattr(local, 'total', 0.0) - waited))
+
+        setattr(owner, name, timed)
+        self._patched.append((owner, name, original))
+
+    def _sample_loop(self, gui_thread_id):
+        pipeline = getattr(self.window, 'pipeline', None)
+        while not self._stop_sampling.wait(self.interval_s):
+            # I thread del ciclo dei frame cambiano a ogni avvio dell'allenamento
+            threads = {gui_thread_id: 'gui', **(pipeline.thread_ids() if pipeline is not None else {})}
+            current = sys._current_frames()
+            for thread_id, thread_name in threads.items():
+                frame = current.get(thread_id)
+                idle = frame is not None and frame.f_code in _IDLE_CODES
+                stack = []
+                while frame is not None:
+                    if frame.f_code.co_filename != __file__:  # Senza i wrapper delle fasi
+                        stack.append(_frame_label(frame.f_code))
+                    frame = frame.f_back
+                if not stack:
+                    continue
+                # Nella GUI il ciclo degli eventi è in C: resta solo il modulo principale
+                if idle or (thread_id == gui_thread_id and len(stack) == 1):
+                    stack.insert(0, IDLE_LEAF)
+                stack.append(thread_name)
+                self._stacks[';'.join(reversed(stack))] += 1
+
+    # --- Riepilogo ---
+
+    def stage_table(self):
+        """Per fase: (nome, chiamate, media, p50, p95, max) in ms."""
+        rows = []
+        for stage, _, _ in _stage_targets(self.window):
+            values = np.array(self._samples.get(stage, [])) * 1000.0
+            if len(values):
+                rows.append((stage, len(values), values.mean(), np.percentile(values, 50),
+                             np.percentile(values, 95), values.max()))
+        return rows
+
+    def summary(self, elapsed, memory_diff, top=15):
+        out = io.StringIO()
+        frames = len(self._samples.get(FRAME_STAGE, []))
+        out.write(f"Profilo {self.mode}: {elapsed:.1f} s, {frames} frame letti ({frames / elapsed:.1f} FPS)\n\n")
+        out.write(f"{'fase':<16}{'chiamate':>9}{'media':>9}{'p50':>9}{'p95':>9}{'max':>9}  (ms)\n")
+        for name, count, mean, p50, p95, peak in self.stage_table():
+            out.write(f"{name:<16}{count:>9}{mean:>9.2f}{p50:>9.2f}{p95:>9.2f}{peak:>9.2f}\n")
+
+        if self.mode == 'sampling':
+            leaves = Counter()
+            threads = {}
+            for stack, count in self._stacks.items():
+                thread_name, leaf = stack.split(';', 1)[0], stack.rsplit(';', 1)[-1]
+                busy_idle = threads.setdefault(thread_name, [0, 0])
+                if leaf == IDLE_LEAF:
+                    busy_idle[1] += count
+                else:
+                    busy_idle[0] += count
+                    leaves[leaf] += count
+            busy = sum(leaves.values())
+            out.write(f"\nCampioni dei thread della GUI e dei frame: {sum(self._stacks.values())} "
+                      f"(ogni {self.interval_s * 1000:g} ms), in attesa per thread: "
+                      + ', '.join(f"{name} {i / max(b + i, 1):.0%}" for name, (b, i) in sorted(threads.items()))
+                      + f"\nFunzioni con più tempo proprio (su {busy} campioni di lavoro):\n")
+            for label, count in leaves.most_common(top):
+                out.write(f"{count / max(busy, 1):>7.1%}  {label}\n")
+        else:
+            out.write(f"\nFunzioni con più tempo cumulativo:\n")
+            stats = pstats.Stats(self._profiler, stream=out)
+            stats.sort_stats('cumulative').print_stats(top)
+
+        growth = [stat for stat in memory_diff if stat.size_diff != 0][:10]
+        out.write("\nMemoria Python durante la cattura (tracemalloc):\n")
+        for stat in growth:
+            frame = stat.traceback[0]
+            out.write(f"{stat.size_diff / 1024:>+10.1f} KB {stat.count_diff:>+7d}  "
+                      f"{os.path.basename(frame.filename)}:{frame.lineno}\n")
+        return out.getvalue()
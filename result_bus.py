@@ -0,0 +1,575 @@
+# result_bus.py
+"""
+Bus dei risultati in memoria condivisa: l'app scrive una sola volta per frame landmark, angoli
+e stato dell'analizzatore in un buffer circolare (multiprocessing.shared_memory); registratori,
+streamer, analisi e punteggi li leggono dallo stesso processo o da altri, ognuno al proprio ritmo,
+senza rallentare il ciclo dei frame.
+
+Struttura del segmento (array numpy strutturati sulla stessa memoria):
+    intestazione    magic, versione, record pubblicati, processo e heartbeat del produttore
+    meta            JSON scritto alla creazione: esercizi con stati e misure, dimensioni
+    consumatori     max_consumers posti: token, modo, record letti, heartbeat, stato
+    record          slots posti: il record n sta nel posto n % slots
+
+Nessun lock tra produttore e consumatori. Ogni posto ha un numero di sequenza (seqlock): dispari
+durante la scrittura, 2 * (n + 1) a record n completo. Il lettore ottiene una vista del posto
+(nessuna copia) e con valid() verifica, dopo averla usata, che non sia stata riscritta nel
+frattempo; copy() copia e verifica in un passo. Il seqlock si basa sull'ordine delle scritture
+in memoria (x86-64): su CPU a ordinamento debole la verifica resta la stessa ma non è garantita.
+
+Consumatori:
+- modo 'latest': ogni read() restituisce solo il record più recente non ancora visto (display,
+  streamer); non resta mai indietro.
+- modo 'all': read() restituisce in ordine tutti i record arrivati (registratori, analisi). Le
+  viste dell'ultima read() restano valide fino alla read() successiva, che le conferma.
+Il produttore non attende mai: prima di riscrivere un posto espelle i consumatori 'all' che non
+hanno ancora confermato il record che contiene, e a ogni pubblicazione quelli che non chiamano
+read() da consumer_timeout secondi (processo terminato o bloccato). Il consumatore espulso se ne
+accorge alla read() successiva (evicted) e può rientrare con rejoin(), dal record più recente.
+
+Esempio, con l'app avviata con --bus coach:
+    python result_bus.py coach monitor                            (stato e latenza ogni secondo)
+    python result_bus.py coach monitor --mode all --delay 0.05    (20 record/s: resta indietro, espulso)
+    python result_bus.py coach record archivio/                   (sessioni nell'archivio dei landmark)
+"""
+import json
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from exercise_definitions import exercise_names, get_exercise
+from landmark_corpus import positions_to_landmarks
+from pose_backends import NUM_LANDMARKS
+
+BUS_MAGIC = 0x46434255   # 'FCBU'
+BUS_FORMAT_VERSION = 1
+MAX_MEASURES = 16
+FEEDBACK_BYTES = 160
+META_BYTES = 8192
+
+HEADER_DTYPE = np.dtype([
+    ('magic', np.uint32), ('version', np.uint32), ('slots', np.uint32), ('max_consumers', np.uint32),
+    ('meta_size', np.uint32), ('closed', np.uint32), ('producer_pid', np.int64),
+    ('write_seq', np.uint64), ('session', np.uint64), ('heartbeat', np.float64),
+], align=True)
+
+CONSUMER_FREE, CONSUMER_ACTIVE, CONSUMER_EVICTED = 0, 1, 2
+EVICTED_LAG, EVICTED_TIMEOUT = 1, 2
+MODES = ('latest', 'all')
+
+CONSUMER_DTYPE = np.dtype([
+    ('token', np.uint64), ('read_seq', np.uint64), ('heartbeat', np.float64), ('pid', np.int64),
+    ('state', np.uint8), ('mode', np.uint8), ('reason', np.uint8), ('name', 'S32'),
+], align=True)
+
+RECORD_DTYPE = np.dtype([
+    ('seq', np.uint64), ('session', np.uint64),
+    ('timestamp', np.float64),   # Secondi della sorgente
+    ('captured', np.float64),    # perf_counter della cattura (stesso orologio per tutti i processi)
+    ('published', np.float64),   # perf_counter della pubblicazione
+    ('fps', np.float32), ('width', np.uint16), ('height', np.uint16),
+    ('exercise', np.int8), ('state', np.int8), ('stable', np.bool_), ('success', np.bool_),
+    ('has_pose', np.bool_), ('rep_count', np.int32),
+    ('landmarks', np.float32, (NUM_LANDMARKS, 4)),   # Normalizzati sull'area video, NaN se mancanti
+    ('measures', np.float32, (MAX_MEASURES,)),       # Nell'ordine di measure_names dell'esercizio
+    ('feedback', f'S{FEEDBACK_BYTES}'),
+], align=True)
+
+
+def _layout(slots, max_consumers):
+    # Offset di intestazione, meta, consumatori e record (allineati a 64 byte) e dimensione totale
+    align = lambda n: (n + 63) // 64 * 64
+    meta = align(HEADER_DTYPE.itemsize)
+    consumers = align(meta + META_BYTES)
+    records = align(consumers + CONSUMER_DTYPE.itemsize * max_consumers)
+    return meta, consumers, records, records + RECORD_DTYPE.itemsize * slots
+
+
+def _bus_meta(slots, max_consumers):
+    exercises = [{'name': name, 'states': get_exercise(name).state_names[1:],
+                  'measures': get_exercise(name).measure_names[:MAX_MEASURES]} for name in exercise_names()]
+    return {'version': BUS_FORMAT_VERSION, 'slots': slots, 'max_consumers': max_consumers,
+            'landmarks': NUM_LANDMARKS, 'exercises': exercises}
+
+
+def _pid_alive(pid):
+    if os.name != 'posix':
+        return True  # Fuori da POSIX il segmento sparisce con l'ultimo processo: non ne restano orfani
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _attach(name):
+    # Il resource_tracker di Python < 3.13 distruggerebbe il segmento all'uscita di ogni processo
+    # che lo apre: solo il produttore ne è proprietario (nel suo processo la registrazione resta)
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        shm = shared_memory.SharedMemory(name=name)
+        if int(np.ndarray((), HEADER_DTYPE, shm.buf, 0)['producer_pid']) != os.getpid():
+            resource_tracker.unregister(shm._name, 'shared_memory')
+        return shm
+
+
+class _BusMemory:
+    """Viste numpy delle parti del segmento."""
+    def __init__(self, shm, slots, max_consumers):
+        self.shm = shm
+        meta, consumers, records, _ = _layout(slots, max_consumers)
+        self.header = np.ndarray((), HEADER_DTYPE, shm.buf, 0)
+        self.meta = np.ndarray((META_BYTES,), np.uint8, shm.buf, meta)
+        self.consumers = np.ndarray((max_consumers,), CONSUMER_DTYPE, shm.buf, consumers)
+        self.records = np.ndarray((slots,), RECORD_DTYPE, shm.buf, records)
+        self.seq = self.records['seq']
+
+    def close(self):
+        self.header = self.meta = self.consumers = self.records = self.seq = None
+        try:
+            self.shm.close()
+        except BufferError:
+            pass  # Viste dei record ancora in uso: il segmento viene chiuso quando vengono liberate
+
+
+class ResultBus:
+    """
+    Produttore del bus (thread della GUI dell'app).
+    - name: nome del segmento (None: generato, vedi .name); un segmento rimasto da un'app terminata
+      senza chiuderlo viene ricreato
+    - slots: record nel buffer circolare (256: ~8 s a 30 FPS)
+    - consumer_timeout: secondi senza read() oltre i quali un consumatore viene espulso
+    """
+    def __init__(self, name=None, slots=256, max_consumers=16, consumer_timeout=2.0):
+        self.slots = slots
+        self.max_consumers = max_consumers
+        self.consumer_timeout = consumer_timeout
+        size = _layout(slots, max_consumers)[3]
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            self._remove_stale(name)
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.name = shm.name
+        self._mem = _BusMemory(shm, slots, max_consumers)
+        meta = json.dumps(_bus_meta(slots, max_consumers)).encode('utf-8')
+        if len(meta) > META_BYTES:
+            raise ValueError(f"Descrizione degli esercizi troppo grande per il bus ({len(meta)} byte)")
+        self._mem.meta[:len(meta)] = np.frombuffer(meta, dtype=np.uint8)
+        self._exercise_index = {name: i for i, name in enumerate(exercise_names())}
+        self._write_seq = 0
+        self._session = 0
+        self.publish_seconds = 0.0
+        self.counts = {'published': 0, 'evicted_lag': 0, 'evicted_timeout': 0}
+        header = self._mem.header
+        header['slots'], header['max_consumers'] = slots, max_consumers
+        header['meta_size'], header['producer_pid'] = len(meta), os.getpid()
+        header['heartbeat'] = time.monotonic()
+        header['version'] = BUS_FORMAT_VERSION
+        header['magic'] = BUS_MAGIC  # Per ultimo: il segmento è pronto
+
+    @staticmethod
+    def _remove_stale(name):
+        shm = shared_memory.SharedMemory(name=name)  # Registrato: unlink() lo toglie dal resource_tracker
+        try:
+            header = np.ndarray((), HEADER_DTYPE, shm.buf, 0)
+            owner = int(header['producer_pid']) if int(header['magic']) == BUS_MAGIC else 0
+            del header
+            if owner and _pid_alive(owner) and owner != os.getpid():
+                raise FileExistsError(f"Bus '{name}' già in uso dal processo {owner}")
+            shm.unlink()
+        finally:
+            shm.close()
+
+    def begin_session(self):
+        """Nuovo allenamento: i record successivi hanno un nuovo numero di sessione."""
+        self._session += 1
+        self._mem.header['session'] = self._session
+
+    def publish(self, positions, analyzer, success, exercise, frame_size, timestamp=0.0, captured=0.0, fps=30.0):
+        """
+        Un frame analizzato: dizionario di find_position (anche vuoto), ExerciseAnalyzer dopo
+        l'analisi del frame, esito, nome dell'esercizio e dimensioni (w, h) dell'area video.
+        """
+        t0 = time.perf_counter()
+        mem = self._mem
+        n = self._write_seq
+        index = n % self.slots
+        self._check_consumers(n)
+
+        compiled = get_exercise(exercise)
+        landmarks = positions_to_landmarks(positions)
+        measures = np.full(MAX_MEASURES, np.nan, dtype=np.float32)
+        if positions:
+            values = compiled.measure(landmarks, frame_size)
+            measures[:len(values)] = [values[name] for name in compiled.measure_names[:MAX_MEASURES]]
+
+        mem.seq[index] = 2 * n + 1  # Posto in scrittura
+        record = mem.records[index:index + 1]
+        record['session'] = self._session
+        record['timestamp'], record['captured'], record['published'] = timestamp, captured, t0
+        record['fps'], record['width'], record['height'] = fps, frame_size[0], frame_size[1]
+        record['exercise'] = self._exercise_index.get(exercise, -1)
+        record['state'] = compiled.state_codes.get(analyzer.pos_state, 0)
+        record['stable'] = analyzer.landmarks_stable
+        record['success'] = bool(success) and analyzer.landmarks_stable
+        record['has_pose'] = bool(positions)
+        record['rep_count'] = analyzer.rep_count
+        record['landmarks'][0] = landmarks
+        record['measures'][0] = measures
+        record['feedback'] = (analyzer.feedback or '').encode('utf-8')[:FEEDBACK_BYTES]
+        mem.seq[index] = 2 * n + 2  # Record completo
+        self._write_seq = n + 1
+        mem.header['write_seq'] = n + 1
+        mem.header['heartbeat'] = time.monotonic()
+        self.counts['published'] += 1
+        self.publish_seconds += time.perf_counter() - t0
+
+    def _check_consumers(self, n):
+        consumers = self._mem.consumers
+        active = consumers['state'] == CONSUMER_ACTIVE
+        if not active.any():
+            return
+        # Il record n riscrive il record n - slots: chi in modo 'all' non l'ha ancora confermato resta indietro
+        lagging = active & (consumers['mode'] == MODES.index('all')) & \
+            (consumers['read_seq'].astype(np.int64) <= n - self.slots)
+        stale = active & ~lagging & (time.monotonic() - consumers['heartbeat'] > self.consumer_timeout)
+        for mask, reason, key in ((lagging, EVICTED_LAG, 'evicted_lag'), (stale, EVICTED_TIMEOUT, 'evicted_timeout')):
+            for i in np.flatnonzero(mask):
+                consumers['reason'][i] = reason
+                consumers['state'][i] = CONSUMER_EVICTED
+                self.counts[key] += 1
+
+    def consumers(self):
+        """Consumatori registrati: nome, pid, modo, stato, record di ritardo."""
+        rows = []
+        for consumer in (self._mem.consumers if self._mem is not None else ()):
+            if consumer['state'] != CONSUMER_FREE:
+                rows.append({'name': consumer['name'].decode('utf-8', 'replace'), 'pid': int(consumer['pid']),
+                             'mode': MODES[consumer['mode']], 'evicted': bool(consumer['state'] == CONSUMER_EVICTED),
+                             'lag': self._write_seq - int(consumer['read_seq'])})
+        return rows
+
+    def stats(self):
+        published = self.counts['published']
+        return {**self.counts, 'consumers': sum(not c['evicted'] for c in self.consumers()),
+                'publish_us': self.publish_seconds / published * 1e6 if published else 0.0}
+
+    def close(self):
+        """Segnala la chiusura ai consumatori e rimuove il segmento (chi lo ha aperto lo vede fino alla chiusura)."""
+        if self._mem is None:
+            return
+        self._mem.header['closed'] = 1
+        shm = self._mem.shm
+        self._mem.close()
+        self._mem = None
+        try:
+            # Di nuovo registrato (un consumatore in un processo figlio può averlo tolto): unlink() lo toglie
+            resource_tracker.register(shm._name, 'shared_memory')
+            shm.unlink()
+        except FileNotFoundError:
+            pass
+
+
+class BusRecord:
+    """
+    Vista di un record del bus, senza copie: i valori si leggono dal segmento al momento. Dopo
+    averli usati, valid() dice se il produttore ha nel frattempo riscritto il posto.
+    """
+    __slots__ = ('_reader', 'index', '_slot')
+
+    def __init__(self, reader, index):
+        self._reader = reader
+        self.index = index
+        self._slot = index % reader.slots
+
+    def _field(self, name):
+        return self._reader._mem.records[name][self._slot]
+
+    def valid(self):
+        mem = self._reader._mem
+        return mem is not None and int(mem.seq[self._slot]) == 2 * self.index + 2
+
+    @property
+    def landmarks(self):
+        """(33, 4) float32 [x, y, z, visibility] normalizzati sull'area video: vista del segmento."""
+        return self._field('landmarks')
+
+    @property
+    def exercise(self):
+        index = int(self._field('exercise'))
+        return self._reader.exercises[index]['name'] if index >= 0 else None
+
+    @property
+    def state(self):
+        index = int(self._field('exercise'))
+        code = int(self._field('state'))
+        return self._reader.exercises[index]['states'][code - 1] if index >= 0 and code > 0 else None
+
+    @property
+    def measures(self):
+        """{nome: valore} degli angoli e delle grandezze dell'esercizio (NaN se non calcolabili)."""
+        index = int(self._field('exercise'))
+        if index < 0:
+            return {}
+        names = self._reader.exercises[index]['measures']
+        values = self._field('measures')
+        return {name: float(values[i]) for i, name in enumerate(names)}
+
+    @property
+    def feedback(self):
+        return self._field('feedback').decode('utf-8', 'ignore')
+
+    @property
+    def frame_size(self):
+        return int(self._field('width')), int(self._field('height'))
+
+    def __getattr__(self, name):
+        # session, timestamp, captured, published, fps, rep_count, stable, success, has_pose
+        if name in RECORD_DTYPE.names:
+            return self._field(name).item()
+        raise AttributeError(name)
+
+    def copy(self):
+        """Dizionario con i valori copiati, o None se il posto è stato riscritto durante la copia."""
+        data = {name: self._field(name).item() for name in ('session', 'timestamp', 'captured', 'published', 'fps',
+                                                             'rep_count', 'stable', 'success', 'has_pose')}
+        data.update(exercise=self.exercise, state=self.state, measures=self.measures, feedback=self.feedback,
+                    frame_size=self.frame_size, landmarks=self.landmarks.copy(), index=self.index)
+        return data if self.valid() else None
+
+
+class ResultBusReader:
+    """
+    Consumatore del bus, in un altro thread o processo. mode = 'latest' | 'all' (vedi il modulo).
+    read() va chiamata almeno ogni consumer_timeout secondi del produttore.
+    """
+    def __init__(self, name, mode='latest', consumer_name=''):
+        if mode not in MODES:
+            raise ValueError(f"Modo del consumatore non supportato: {mode}")
+        self.name = name
+        self.mode = mode
+        self.consumer_name = consumer_name or f'pid {os.getpid()}'
+        shm = _attach(name)
+        header = np.ndarray((), HEADER_DTYPE, shm.buf, 0)
+        if int(header['magic']) != BUS_MAGIC or int(header['version']) != BUS_FORMAT_VERSION:
+            del header
+            shm.close()
+            raise ValueError(f"'{name}' non è un bus dei risultati (versione {BUS_FORMAT_VERSION})")
+        self.slots, self.max_consumers = int(header['slots']), int(header['max_consumers'])
+        del header
+        self._mem = _BusMemory(shm, self.slots, self.max_consumers)
+        meta = json.loads(self._mem.meta[:int(self._mem.header['meta_size'])].tobytes())
+        self.exercises = meta['exercises']
+        self._slot = None
+        self._token = 0
+        self._next = 0       # Prossimo record da leggere
+        self.evicted = False
+        self.counts = {'records': 0, 'skipped': 0, 'evictions': 0}
+        self._register()
+
+    def _register(self):
+        # Registrazione ottimistica (senza lock): si scrive il token in un posto libero e lo si rilegge
+        consumers = self._mem.consumers
+        token = int.from_bytes(os.urandom(8), 'little') >> 1 | 1
+        for _ in range(3):
+            now = time.monotonic()
+            free = [i for i in range(self.max_consumers)
+                    if consumers['state'][i] == CONSUMER_FREE or
+                    (consumers['state'][i] == CONSUMER_EVICTED and now - consumers['heartbeat'][i] > 1.0)]
+            for i in free:
+                consumers['token'][i] = token
+                time.sleep(0.002)
+                if int(consumers['token'][i]) != token:
+                    continue  # Preso da un altro consumatore nello stesso momento
+                write_seq = int(self._mem.header['write_seq'])
+                self._next = write_seq if self.mode == 'all' else max(write_seq - 1, 0)
+                consumers['read_seq'][i] = self._next
+                consumers['heartbeat'][i] = time.monotonic()
+                consumers['pid'][i] = os.getpid()
+                consumers['name'][i] = self.consumer_name.encode('utf-8')[:32]
+                consumers['mode'][i] = MODES.index(self.mode)
+                consumers['reason'][i] = 0
+                consumers['state'][i] = CONSUMER_ACTIVE
+                self._slot, self._token = i, token
+                self.evicted = False
+                return
+        raise RuntimeError(f"Nessun posto libero per un consumatore sul bus '{self.name}'")
+
+    @property
+    def closed(self):
+        """True quando il produttore ha chiuso il bus."""
+        return bool(self._mem.header['closed'])
+
+    @property
+    def producer_age(self):
+        """Secondi dall'ultima pubblicazione del produttore."""
+        return time.monotonic() - float(self._mem.header['heartbeat'])
+
+    @property
+    def lag(self):
+        return int(self._mem.header['write_seq']) - self._next
+
+    def _still_registered(self):
+        consumers = self._mem.consumers
+        i = self._slot
+        if int(consumers['token'][i]) == self._token and consumers['state'][i] == CONSUMER_ACTIVE:
+            return True
+        if not self.evicted:
+            self.evicted = True
+            self.counts['evictions'] += 1
+        return False
+
+    def read(self, max_records=None):
+        """
+        Record nuovi (BusRecord), dal più vecchio: con mode='latest' al più uno, il più recente.
+        Lista vuota se non ce ne sono o se il consumatore è stato espulso (vedi evicted).
+        """
+        if self.evicted or not self._still_registered():
+            return []
+        consumers = self._mem.consumers
+        consumers['heartbeat'][self._slot] = time.monotonic()
+        write_seq = int(self._mem.header['write_seq'])
+        if write_seq <= self._next:
+            return []
+        if self.mode == 'latest':
+            self.counts['skipped'] += write_seq - 1 - self._next
+            self._next = write_seq - 1
+        stop = write_seq if max_records is None else min(write_seq, self._next + max_records)
+        records = [BusRecord(self, n) for n in range(self._next, stop)]
+        if not records[0].valid():
+            # Riscritto prima della lettura: il produttore non ha (ancora) visto il ritardo
+            self.evicted = True
+            self.counts['evictions'] += 1
+            return []
+        # Conferma dei record precedenti: le viste appena restituite restano valide fino alla prossima read()
+        consumers['read_seq'][self._slot] = self._next
+        self._next = stop
+        self.counts['records'] += len(records)
+        return records
+
+    def rejoin(self):
+        """Dopo un'espulsione: nuova registrazione, si riparte dal record più recente."""
+        self._release_slot()
+        self._register()
+
+    def _release_slot(self):
+        if self._slot is not None and int(self._mem.consumers['token'][self._slot]) == self._token:
+            self._mem.consumers['state'][self._slot] = CONSUMER_FREE
+        self._slot = None
+
+    def close(self):
+        if self._mem is None:
+            return
+        self._release_slot()
+        self._mem.close()
+        self._mem = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+# --- Consumatori da riga di comando ---
+
+def _monitor(reader, delay):
+    last_report = time.monotonic()
+    latencies, records = [], 0
+    while not reader.closed:
+        batch = reader.read()
+        if reader.evicted:
+            print("Espulso dal bus (consumatore troppo lento): rientro dal record più recente")
+            reader.rejoin()
+            continue
+        now_pc = time.perf_counter()
+        for record in batch:
+            latencies.append((now_pc - record.published) * 1000.0)
+        records += len(batch)
+        latest = batch[-1].copy() if batch else None
+        if latest is not None:
+            measures = ', '.join(f"{k} {v:.0f}" for k, v in latest['measures'].items() if v == v)
+            status = (f"{latest['exercise']} rip. {latest['rep_count']} {latest['state'] or '-'} "
+                      f"{'stabile' if latest['stable'] else 'non stabile'} [{measures}] {latest['feedback'][:40]!r}")
+        now = time.monotonic()
+        if now - last_report >= 1.0:
+            p50 = np.percentile(latencies, 50) if latencies else float('nan')
+            print(f"{records / (now - last_report):5.1f} record/s, ritardo {reader.lag}, latenza p50 {p50:.2f} ms"
+                  + (f" | {status}" if records else ''))
+            last_report, latencies, records = now, [], 0
+        time.sleep(max(delay * len(batch), 0.01))
+    print("Bus chiuso dal produttore.")
+
+
+def _record(reader, root):
+    from landmark_corpus import CorpusWriter
+
+    writer = CorpusWriter(root)
+    session = {'key': None, 'landmarks': []}
+
+    def flush():
+        if len(session['landmarks']) > 1:
+            exercise, frame_size, fps = session['key'][1:]
+            session_id = writer.add_session(exercise, np.stack(session['landmarks']), frame_size, fps=fps,
+                                            source='result_bus')
+            writer.flush()
+            print(f"Sessione {session_id}: {exercise}, {len(session['landmarks'])} frame")
+        session['key'], session['landmarks'] = None, []
+
+    try:
+        while not reader.closed:
+            batch = reader.read()
+            if reader.evicted:
+                print("Espulso dal bus: la sessione in corso viene chiusa con i frame ricevuti")
+                flush()
+                reader.rejoin()
+                continue
+            for record in batch:
+                key = (record.session, record.exercise, record.frame_size, round(record.fps, 3))
+                landmarks = record.landmarks.copy()  # Unica copia: i frame restano all'archivio
+                if not record.valid():
+                    continue
+                if key != session['key']:
+                    flush()
+                    session['key'] = key
+                session['landmarks'].append(landmarks)
+            time.sleep(0.05)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        flush()
+        writer.close()
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Consumatori del bus dei risultati dell'app (--bus NOME).")
+    parser.add_argument('name', help="Nome del bus")
+    sub = parser.add_subparsers(dest='command', required=True)
+    monitor = sub.add_parser('monitor', help="Stato e latenza del bus ogni secondo")
+    monitor.add_argument('--mode', choices=MODES, default='latest')
+    monitor.add_argument('--delay', type=float, default=0.0, help="Secondi di lavoro simulato per record (consumatore lento)")
+    record = sub.add_parser('record', help="Registra le sessioni nell'archivio dei landmark")
+    record.add_argument('root', help="Cartella dell'archivio")
+    args = parser.parse_args()
+
+    if args.command == 'monitor':
+        with ResultBusReader(args.name, mode=args.mode, consumer_name='monitor') as reader:
+            try:
+                _monitor(reader, args.delay)
+            except KeyboardInterrupt:
+                pass
+    else:
+        with ResultBusReader(args.name, mode='all', consumer_name='record') as reader:
+            _record(reader, args.root)
+
+
+if __name__ == '__main__':
+    main()
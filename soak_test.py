@@ -0,0 +1,295 @@
+# soak_test.py
+"""
+Test di durata (soak) di FitnessCoachApp sotto la piattaforma Qt offscreen: ore di input
+sintetico o registrato, con molti cicli di avvio/arresto dell'allenamento. A intervalli regolari
+campiona RSS, memoria Python (tracemalloc, con i principali allocatori cresciuti dall'inizio),
+numero di oggetti Qt e latenza per frame; alla fine confronta l'inizio (dopo il riscaldamento)
+con la fine e fallisce (codice di uscita 1) se memoria, oggetti Qt o latenza p95 sono cresciuti
+oltre i limiti.
+
+Esempi:
+    python soak_test.py --source synthetic:Squat --duration 2h --cycle 5m --csv soak.csv
+    python soak_test.py --source sessione.mp4 --duration 30m --cycle 60 --review-errors
+"""
+import argparse
+import gc
+import os
+import resource
+import sys
+import time
+import tracemalloc
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+from PyQt6.QtCore import QObject, QTimer
+from PyQt6.QtWidgets import QApplication
+
+from benchmark_app import AppBenchmark
+from exercise_definitions import exercise_names
+from main import FitnessCoachApp
+
+
+def parse_duration(text):
+    """Secondi da '90', '90s', '15m' o '2h'."""
+    text = str(text).strip().lower()
+    units = {'s': 1, 'm': 60, 'h': 3600}
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+
+def current_rss_mb():
+    # RSS attuale da /proc (Linux); altrove il picco, che almeno non decresce
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError, IndexError):
+        scale = 1 if sys.platform == 'darwin' else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20
+
+
+class SoakTest(AppBenchmark):
+    """
+    Cicli di allenamento (cycle_s attivi, poi gap_s fermo) per duration_s, con un campione ogni
+    sample_s. I limiti sono sulla crescita tra la mediana dei primi e degli ultimi 'window'
+    campioni successivi al riscaldamento.
+    """
+    def __init__(self, source_spec, pacing='realtime', exercise=None, duration_s=3600.0, cycle_s=300.0,
+                 gap_s=1.0, countdown_seconds=1, sample_s=10.0, warmup_s=60.0, window=6,
+                 trace_memory=True, snapshot_every=6, top_allocators=5, review_errors=False,
+                 max_rss_growth_mb=50.0, max_traced_growth_mb=20.0, max_qt_object_growth=20,
+                 max_p95_drift=0.5, csv_path=None):
+        super().__init__(source_spec, pacing=pacing, loop=True, exercise=exercise,
+                         duration_s=duration_s, warmup_frames=0, trace_memory=trace_memory)
+        self.cycle_s = cycle_s
+        self.gap_s = gap_s
+        self.countdown_seconds = countdown_seconds
+        self.sample_s = sample_s
+        self.warmup_s = warmup_s
+        self.median_window = window
+        self.snapshot_every = snapshot_every
+        self.top_allocators = top_allocators
+        self.review_errors = review_errors
+        self.budgets = {
+            'rss_mb': max_rss_growth_mb,
+            'traced_mb': max_traced_growth_mb,
+            'qt_objects': max_qt_object_growth,
+        }
+        self.max_p95_drift = max_p95_drift
+        self.csv_path = csv_path
+
+        self.samples = []
+        self.cycles = 0
+        self._stopping = False
+        self._baseline_snapshot = None
+        self._csv = None
+        self._start = None
+
+    # --- Cicli di avvio/arresto ---
+
+    def _start_cycle(self):
+        if self._stopping:
+            return
+        self.cycles += 1
+        self.window.start_exercise()
+        self._cycle_timer.start(int((self.countdown_seconds + self.cycle_s) * 1000))
+
+    def _end_cycle(self):
+        if self.window.timer.isActive() or self.window.countdown_timer.isActive():
+            if self.review_errors:
+                # La finestra di revisione è modale: la si chiude appena aperta
+                QTimer.singleShot(200, self._close_review)
+            self.window.stop_exercise()
+        if not self._stopping:
+            QTimer.singleShot(int(self.gap_s * 1000), self._start_cycle)
+
+    @staticmethod
+    def _close_review():
+        dialog = QApplication.activeModalWidget()
+        if dialog is not None:
+            dialog.accept()
+
+    def _poll(self):
+        # Una sorgente finita termina da sola l'allenamento: si passa al ciclo successivo
+        if (not self._stopping and self._cycle_timer.isActive() and not self.window.timer.isActive()
+                and not self.window.countdown_timer.isActive()):
+            self._cycle_timer.stop()
+            self._end_cycle()
+
+    def _finish(self):
+        self._stopping = True
+        self._cycle_timer.stop()
+        if self.window.timer.isActive() or self.window.countdown_timer.isActive():
+            self.window.stop_exercise()
+        self.app.quit()
+
+    # --- Campionamento ---
+
+    def _sample(self):
+        gc.collect()
+        elapsed = time.perf_counter() - self._start
+        latencies = np.array(self.latencies or [0.0]) * 1000.0
+        frames = len(self.latencies)
+        self.latencies.clear()
+        self.cpu_times.clear()
+        self.frame_times.clear()
+        sample = {
+            't_s': elapsed,
+            'cycles': self.cycles,
+            'frames': frames,
+            'latency_p50_ms': float(np.percentile(latencies, 50)),
+            'latency_p95_ms': float(np.percentile(latencies, 95)),
+            'rss_mb': current_rss_mb(),
+            'traced_mb': tracemalloc.get_traced_memory()[0] / 2**20 if self.trace_memory else 0.0,
+            'qt_objects': len(self.window.findChildren(QObject)) + len(QApplication.topLevelWidgets()),
+            'top_growth': '',
+        }
+        if self.trace_memory and elapsed >= self.warmup_s:
+            if self._baseline_snapshot is None:
+                self._baseline_snapshot = tracemalloc.take_snapshot()
+            elif len(self.samples) % self.snapshot_every == 0:
+                sample['top_growth'] = ' | '.join(self._format_stat(stat) for stat in self._top_growth(3))
+        self.samples.append(sample)
+        self._report_sample(sample)
+
+    def _top_growth(self, limit):
+        snapshot = tracemalloc.take_snapshot()
+        stats = snapshot.compare_to(self._baseline_snapshot, 'lineno')
+        return [stat for stat in stats if stat.size_diff > 0][:limit]
+
+    @staticmethod
+    def _format_stat(stat):
+        frame = stat.traceback[0]
+        return f"{os.path.basename(frame.filename)}:{frame.lineno} +{stat.size_diff / 1024:.0f} KB ({stat.count_diff:+d})"
+
+    def _report_sample(self, sample):
+        print(f"[{sample['t_s'] / 60:7.1f} min] cicli {sample['cycles']:4d}  frame {sample['frames']:5d}  "
+              f"p95 {sample['latency_p95_ms']:6.2f} ms  RSS {sample['rss_mb']:7.1f} MB  "
+              f"Python {sample['traced_mb']:6.1f} MB  oggetti Qt {sample['qt_objects']}")
+        if sample['top_growth']:
+            print(f"    crescita: {sample['top_growth']}")
+        if self._csv is not None:
+            self._csv.write(','.join(str(sample[k]) if k != 'top_growth' else f'"{sample[k]}"'
+                                     for k in sample) + '\n')
+            self._csv.flush()
+
+    # --- Esecuzione e verdetto ---
+
+    def run(self):
+        self.app = QApplication.instance() or QApplication(sys.argv[:1])
+        if self.trace_memory:
+            tracemalloc.start()
+        self.window = FitnessCoachApp(self._create_source, countdown_seconds=self.countdown_seconds,
+                                      review_errors_on_stop=self.review_errors)
+        self.window.exercise_selector.setCurrentText(self.exercise)
+        self.window.show()
+        self.window.frame_updated.connect(self._tick)
+
+        if self.csv_path:
+            self._csv = open(self.csv_path, 'w', encoding='utf-8')
+            self._csv.write('t_s,cycles,frames,latency_p50_ms,latency_p95_ms,rss_mb,traced_mb,qt_objects,top_growth\n')
+        self._cycle_timer = QTimer()
+        self._cycle_timer.setSingleShot(True)
+        self._cycle_timer.timeout.connect(self._end_cycle)
+        poll = QTimer()
+        poll.timeout.connect(self._poll)
+        poll.start(100)
+        sampler = QTimer()
+        sampler.timeout.connect(self._sample)
+        sampler.start(int(self.sample_s * 1000))
+        QTimer.singleShot(int(self.duration_s * 1000), self._finish)
+
+        self._start = time.perf_counter()
+        QTimer.singleShot(0, self._start_cycle)
+        self.app.exec()
+        poll.stop()
+        sampler.stop()
+
+        top = self._top_growth(self.top_allocators) if self.trace_memory and self._baseline_snapshot else []
+        if self.trace_memory:
+            tracemalloc.stop()
+        if self._csv is not None:
+            self._csv.close()
+        self.window.close()
+        return self.verdict(top)
+
+    def verdict(self, top=()):
+        """Confronto inizio/fine: {'passed', 'failures', 'baseline', 'final', 'top_growth'}."""
+        measured = [s for s in self.samples if s['t_s'] >= self.warmup_s and s['frames']]
+        result = {'passed': True, 'failures': [], 'baseline': None, 'final': None,
+                  'top_growth': [self._format_stat(stat) for stat in top], 'cycles': self.cycles}
+        if len(measured) < 2 * self.median_window:
+            result['failures'].append(f"Campioni insufficienti dopo il riscaldamento: {len(measured)} "
+                                      f"(servono {2 * self.median_window})")
+            result['passed'] = False
+            return result
+
+        keys = ('rss_mb', 'traced_mb', 'qt_objects', 'latency_p95_ms')
+        baseline = {k: float(np.median([s[k] for s in measured[:self.median_window]])) for k in keys}
+        final = {k: float(np.median([s[k] for s in measured[-self.median_window:]])) for k in keys}
+        result['baseline'], result['final'] = baseline, final
+        for key, budget in self.budgets.items():
+            if key == 'traced_mb' and not self.trace_memory:
+                continue
+            growth = final[key] - baseline[key]
+            if growth > budget:
+                result['failures'].append(f"{key}: +{growth:.1f} (limite +{budget:g})")
+        p95_limit = baseline['latency_p95_ms'] * (1.0 + self.max_p95_drift)
+        if final['latency_p95_ms'] > p95_limit:
+            result['failures'].append(f"latency_p95_ms: {baseline['latency_p95_ms']:.2f} -> "
+                                      f"{final['latency_p95_ms']:.2f} ms (limite {p95_limit:.2f})")
+        result['passed'] = not result['failures']
+        return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Test di durata di FitnessCoachApp (Qt offscreen).")
+    parser.add_argument('--source', default='synthetic:Squat',
+                        help="webcam:N, file video, cartella/glob di immagini o synthetic:Squat|Lunge")
+    parser.add_argument('--pacing', choices=('realtime', 'fast'), default='realtime')
+    parser.add_argument('--exercise', choices=exercise_names(), default=None)
+    parser.add_argument('--duration', default='1h', help="Durata totale (es. 90s, 15m, 2h)")
+    parser.add_argument('--cycle', default='5m', help="Durata di ogni allenamento prima dell'arresto")
+    parser.add_argument('--gap', default='1s', help="Pausa tra arresto e nuovo avvio")
+    parser.add_argument('--countdown', type=int, default=1, help="Secondi di conto alla rovescia a ogni avvio")
+    parser.add_argument('--sample', default='10s', help="Intervallo di campionamento")
+    parser.add_argument('--warmup', default='1m', help="Campioni iniziali esclusi dal confronto")
+    parser.add_argument('--window', type=int, default=6, help="Campioni mediati all'inizio e alla fine")
+    parser.add_argument('--no-tracemalloc', action='store_true', help="Niente memoria Python né allocatori")
+    parser.add_argument('--review-errors', action='store_true',
+                        help="Apre (e chiude) la revisione degli errori a ogni arresto")
+    parser.add_argument('--max-rss-growth', type=float, default=50.0, help="MB")
+    parser.add_argument('--max-traced-growth', type=float, default=20.0, help="MB")
+    parser.add_argument('--max-qt-growth', type=int, default=20, help="Oggetti Qt")
+    parser.add_argument('--max-p95-drift', type=float, default=0.5, help="Crescita relativa della latenza p95")
+    parser.add_argument('--csv', help="Salva i campioni in CSV (scritto man mano)")
+    args = parser.parse_args()
+
+    soak = SoakTest(args.source, pacing=args.pacing, exercise=args.exercise,
+                    duration_s=parse_duration(args.duration), cycle_s=parse_duration(args.cycle),
+                    gap_s=parse_duration(args.gap), countdown_seconds=args.countdown,
+                    sample_s=parse_duration(args.sample), warmup_s=parse_duration(args.warmup),
+                    window=args.window, trace_memory=not args.no_tracemalloc,
+                    review_errors=args.review_errors, max_rss_growth_mb=args.max_rss_growth,
+                    max_traced_growth_mb=args.max_traced_growth, max_qt_object_growth=args.max_qt_growth,
+                    max_p95_drift=args.max_p95_drift, csv_path=args.csv)
+    result = soak.run()
+
+    print(f"\nCicli completati: {result['cycles']}")
+    if result['baseline']:
+        for key in result['baseline']:
+            print(f"  {key}: {result['baseline'][key]:.2f} -> {result['final'][key]:.2f}")
+    if result['top_growth']:
+        print("Allocatori cresciuti di più:")
+        for line in result['top_growth']:
+            print(f"  {line}")
+    if result['passed']:
+        print("SUPERATO")
+    else:
+        print("FALLITO: " + '; '.join(result['failures']))
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,457 @@
+# synthetic_landmarks.py
+import numpy as np
+
+from ghost_guide import GhostGuide
+
+# Codici dei difetti di forma etichettati per ogni ripetizione
+FAULT_NONE = 0
+FAULT_BAD_TORSO = 1
+FAULT_TOO_DEEP = 2
+FAULT_HALF_REP = 3
+FAULT_NAMES = {
+    FAULT_NONE: 'none',
+    FAULT_BAD_TORSO: 'bad_torso',
+    FAULT_TOO_DEEP: 'too_deep',
+    FAULT_HALF_REP: 'half_rep',
+}
+# Difetti che l'analizzatore segnala come errore di forma
+ERROR_FAULTS = (FAULT_BAD_TORSO, FAULT_TOO_DEEP)
+# Difetti per cui l'analizzatore non deve contare la ripetizione
+UNCOUNTED_FAULTS = (FAULT_HALF_REP,)
+
+NUM_LANDMARKS = 33
+VISIBILITY_THRESHOLD = 0.3  # Stessa soglia usata da PoseDetector.find_position
+
+# Indici dei landmark (convenzione MediaPipe)
+UPPER_BODY = np.arange(0, 23)
+HIP_L, HIP_R, KNEE_L, KNEE_R, ANKLE_L, ANKLE_R = 23, 24, 25, 26, 27, 28
+FOOT_POINTS = (29, 30, 31, 32)
+
+# Angoli (gradi) del ginocchio e del busto in cima e in fondo alla ripetizione, per esercizio e difetto.
+# Per l'affondo la coppia del ginocchio è (gamba anteriore, gamba posteriore).
+SQUAT_PROFILE = {
+    'knee_top': 172.0,
+    'knee_bottom': {FAULT_NONE: 120.0, FAULT_BAD_TORSO: 121.0, FAULT_TOO_DEEP: 95.0, FAULT_HALF_REP: 146.0},
+    'torso_top': 178.0,
+    'torso_bottom': {FAULT_NONE: 155.0, FAULT_BAD_TORSO: 32.0, FAULT_TOO_DEEP: 150.0, FAULT_HALF_REP: 165.0},
+}
+LUNGE_PROFILE = {
+    'knee_top': (172.0, 172.0),
+    'knee_bottom': {FAULT_NONE: (95.0, 110.0), FAULT_BAD_TORSO: (95.0, 110.0),
+                    FAULT_TOO_DEEP: (55.0, 58.0), FAULT_HALF_REP: (140.0, 152.0)},
+    'torso_top': 178.0,
+    'torso_bottom': {FAULT_NONE: 170.0, FAULT_BAD_TORSO: 140.0, FAULT_TOO_DEEP: 165.0, FAULT_HALF_REP: 172.0},
+}
+# Difetti supportati: l'analizzatore dell'affondo non valuta il busto
+SUPPORTED_FAULTS = {
+    'Squat': (FAULT_NONE, FAULT_BAD_TORSO, FAULT_TOO_DEEP, FAULT_HALF_REP),
+    'Lunge': (FAULT_NONE, FAULT_TOO_DEEP, FAULT_HALF_REP),
+}
+
+
+class SyntheticSession:
+    """
+    Sessione sintetica generata: landmark nel formato di find_position più le etichette
+    di verità a terra per frame e per ripetizione.
+    """
+    def __init__(self, exercise_type, frames, labels, reps, frame_size, fps):
+        self.exercise_type = exercise_type
+        # (n, 33, 6) float32: [cx, cy, z, visibility, x_norm, y_norm]. cx e cy non sono troncati;
+        # frame_to_landmarks li converte in interi come find_position.
+        self.frames = frames
+        self.labels = labels  # dict di array per frame
+        self.reps = reps  # dict di array per ripetizione: 'start', 'end', 'fault'
+        self.frame_size = frame_size  # (larghezza, altezza) dell'area video in pixel
+        self.fps = fps
+
+    def __len__(self):
+        return len(self.frames)
+
+    @property
+    def expected_rep_count(self):
+        return int(np.count_nonzero(~np.isin(self.reps['fault'], UNCOUNTED_FAULTS)))
+
+    @property
+    def expected_error_reps(self):
+        return int(np.count_nonzero(np.isin(self.reps['fault'], ERROR_FAULTS)))
+
+    def landmarks_at(self, index):
+        """Restituisce il frame come dizionario identico all'output di find_position."""
+        return frame_to_landmarks(self.frames[index])
+
+    def iter_landmarks(self):
+        for row in self.frames:
+            yield frame_to_landmarks(row)
+
+
+def frame_to_landmarks(row, visibility_threshold=VISIBILITY_THRESHOLD):
+    """Converte una riga (33, 6) nel dizionario {id: [cx, cy, z, visibility, x, y]}."""
+    landmarks_list = {}
+    for lm_id in np.flatnonzero(row[:, 3] > visibility_threshold):
+        cx, cy, z, vis, x, y = row[lm_id].tolist()
+        landmarks_list[int(lm_id)] = [int(cx), int(cy), z, vis, x, y]
+    return landmarks_list
+
+
+def _solve_leg(ankle_x, ankle_y, hip_x, shin, thigh, knee_angle_deg):
+    """
+    Cinematica inversa planare di una gamba, vettorizzata.
+    Con la caviglia fissa, trova l'inclinazione della tibia tale che l'anca, posta a distanza
+    'thigh' dal ginocchio con angolo al ginocchio pari a knee_angle, cada sull'ascissa hip_x.
+    Restituisce (knee_x, knee_y, hip_x, hip_y) in pixel.
+    """
+    # Lavora come gamba destra (anca verso -x) e poi specchia se necessario
+    side = np.where(ankle_x >= hip_x, 1.0, -1.0)
+    a = np.abs(ankle_x - hip_x)
+    theta = np.radians(knee_angle_deg)
+    c1 = shin - thigh * np.cos(theta)
+    c2 = thigh * np.sin(theta)
+    r = np.hypot(c1, c2)
+    delta = np.arctan2(c2, c1)
+    beta = delta + np.arcsin(np.clip(-a / r, -1.0, 1.0))
+    knee_x = ankle_x + side * shin * np.sin(beta)
+    knee_y = ankle_y - shin * np.cos(beta)
+    gamma = np.pi / 2 + beta + theta
+    hip_out_x = knee_x + side * thigh * np.cos(gamma)
+    hip_out_y = knee_y + thigh * np.sin(gamma)
+    return knee_x, knee_y, hip_out_x, hip_out_y
+
+
+class SyntheticLandmarkGenerator:
+    """
+    Generatore vettorizzato di traiettorie di landmark costruito sulle pose chiave di GhostGuide.
+    Produce flussi nel formato di PoseDetector.find_position con tempo, proporzioni del corpo,
+    rumore, buchi di occlusione e difetti di forma controllabili, etichettati per frame e per
+    ripetizione. Serve sia come sorgente di carico sia come verità a terra per ExerciseAnalyzer.
+    """
+    PHASE_LEVELS = 1024  # Risoluzione della griglia di fasi (errore sugli angoli < 0.1°)
+    CHUNK_FRAMES = 8192  # Frame elaborati per blocco, per restare in cache
+    def __init__(self, exercise_type='Squat', frame_width=512, frame_height=480, fps=30,
+                 ghost_guide=None, seed=None):
+        if exercise_type not in SUPPORTED_FAULTS:
+            raise ValueError(f"Esercizio non supportato: {exercise_type}")
+        ghost_guide = ghost_guide if ghost_guide is not None else GhostGuide()
+        self.exercise_type = exercise_type
+        self.frame_width = frame_width
+        self.frame_height = frame_height
+        self.fps = fps
+        self.keyframes = ghost_guide.get_keyframes_array(exercise_type)
+        self.rng = np.random.default_rng(seed)
+        self._table_cache = None
+        self._bank_cache = None
+
+    # --- Pianificazione temporale ---
+
+    def _schedule(self, num_reps, rep_frames, tempo_jitter, hold_frames, lead_in_frames, faults):
+        """
+        Costruisce, per ogni frame, l'indice della ripetizione e la fase alpha (0 = in piedi,
+        1 = massima profondità) con un profilo cosinusoidale; le pause hanno alpha = 0.
+        """
+        rng = self.rng
+        durations = np.maximum(8, np.round(rep_frames * (1 + tempo_jitter * rng.uniform(-1, 1, num_reps)))).astype(np.int64)
+        holds = rng.integers(hold_frames[0], hold_frames[1] + 1, num_reps)
+        # Ogni ripetizione è seguita da una pausa in piedi; il lead-in serve alla stabilizzazione
+        seg_lengths = np.empty(2 * num_reps + 1, dtype=np.int64)
+        seg_lengths[0] = lead_in_frames
+        seg_lengths[1::2] = durations
+        seg_lengths[2::2] = holds
+        total = int(seg_lengths.sum())
+        seg_ids = np.repeat(np.arange(len(seg_lengths)), seg_lengths)
+        seg_starts = np.concatenate(([0], np.cumsum(seg_lengths)[:-1]))
+        local = np.arange(total) - seg_starts[seg_ids]
+        is_rep = (seg_ids % 2) == 1
+        rep_index = np.where(is_rep, (seg_ids - 1) // 2, -1)
+        seg_len_per_frame = seg_lengths[seg_ids]
+        u = np.where(is_rep, local / np.maximum(seg_len_per_frame - 1, 1), 0.0)
+        alpha = 0.5 * (1.0 - np.cos(2.0 * np.pi * u))
+        rep_starts = seg_starts[1::2]
+        reps = {
+            'start': rep_starts,
+            'end': rep_starts + durations,
+            'bottom': rep_starts + durations // 2,
+            'fault': faults,
+        }
+        return alpha, rep_index, reps
+
+    def _draw_faults(self, num_reps, fault_probs, faults):
+        supported = SUPPORTED_FAULTS[self.exercise_type]
+        if faults is not None:
+            faults = np.asarray(faults, dtype=np.int8)
+            if len(faults) != num_reps:
+                raise ValueError("La lista dei difetti deve avere una voce per ripetizione.")
+            if not np.isin(faults, supported).all():
+                raise ValueError(f"Difetti non supportati per {self.exercise_type}.")
+            return faults
+        fault_probs = fault_probs or {}
+        probs = np.array([fault_probs.get(f, 0.0) for f in supported[1:]])
+        probs = np.concatenate(([max(0.0, 1.0 - probs.sum())], probs))
+        return self.rng.choice(np.array(supported, dtype=np.int8), size=num_reps, p=probs / probs.sum())
+
+    # --- Geometria ---
+
+    def _base_pose(self, alpha, body_scale, body_width, offset):
+        """Interpola le pose chiave di GhostGuide e le porta in pixel con le proporzioni richieste."""
+        kf = np.nan_to_num(self.keyframes, nan=0.0)
+        pose = kf[0][None] + alpha[:, None, None] * (kf[1] - kf[0])[None]
+        w, h = self.frame_width, self.frame_height
+        anchor = (kf[0, ANKLE_L, :2] + kf[0, ANKLE_R, :2]) / 2
+        xy = pose[..., :2] - anchor
+        xy[..., 0] *= body_scale * body_width
+        xy[..., 1] *= body_scale
+        xy += anchor + np.asarray(offset)
+        xy[..., 0] *= w
+        xy[..., 1] *= h
+        return xy, pose[..., 2].copy()
+
+    def _segment_lengths(self, xy0):
+        # Lunghezze (pixel) di tibia e coscia ricavate dalla pose iniziale
+        shin = np.hypot(*(xy0[KNEE_R] - xy0[ANKLE_R]))
+        hip_mid = (xy0[HIP_L] + xy0[HIP_R]) / 2
+        thigh = np.hypot(*(xy0[KNEE_R] - hip_mid))
+        return shin, thigh
+
+    def _place_upper_body(self, xy, hip_mid_old, hip_mid_new, torso_angle):
+        """
+        Ruota il busto (landmark 0-22) attorno all'anca e lo trasla sulla nuova anca,
+        in modo che l'angolo spalle-anca-ginocchia valga torso_angle.
+        """
+        rel = xy[:, UPPER_BODY] - hip_mid_old[:, None]
+        delta = np.radians(180.0 - torso_angle)
+        cos_d, sin_d = np.cos(delta)[:, None], np.sin(delta)[:, None]
+        rx = cos_d * rel[..., 0] + sin_d * rel[..., 1]
+        ry = -sin_d * rel[..., 0] + cos_d * rel[..., 1]
+        xy[:, UPPER_BODY, 0] = hip_mid_new[:, 0, None] + rx
+        xy[:, UPPER_BODY, 1] = hip_mid_new[:, 1, None] + ry
+
+    def _squat_geometry(self, xy, alpha, knee_bottom, torso_bottom):
+        profile = SQUAT_PROFILE
+        shin, thigh = self._segment_lengths(xy[0])
+        knee_angle = profile['knee_top'] + (knee_bottom - profile['knee_top']) * alpha
+        torso_angle = profile['torso_top'] + (torso_bottom - profile['torso_top']) * alpha
+        ankle_l, ankle_r = xy[:, ANKLE_L].copy(), xy[:, ANKLE_R].copy()
+        center_x = (ankle_l[:, 0] + ankle_r[:, 0]) / 2
+        hip_half_width = np.abs(xy[0, HIP_R, 0] - xy[0, HIP_L, 0]) / 2
+        knee_r_x, knee_r_y, hip_x, hip_y = _solve_leg(ankle_r[:, 0], ankle_r[:, 1], center_x, shin, thigh, knee_angle)
+        knee_l_x, knee_l_y, _, _ = _solve_leg(ankle_l[:, 0], ankle_l[:, 1], center_x, shin, thigh, knee_angle)
+        hip_mid_old = (xy[:, HIP_L] + xy[:, HIP_R]) / 2
+        self._place_upper_body(xy, hip_mid_old, np.stack([hip_x, hip_y], axis=-1), torso_angle)
+        xy[:, KNEE_R] = np.stack([knee_r_x, knee_r_y], axis=-1)
+        xy[:, KNEE_L] = np.stack([knee_l_x, knee_l_y], axis=-1)
+        xy[:, HIP_R] = np.stack([hip_x + hip_half_width, hip_y], axis=-1)
+        xy[:, HIP_L] = np.stack([hip_x - hip_half_width, hip_y], axis=-1)
+        return knee_angle, torso_angle
+
+    def _lunge_geometry(self, xy, alpha, knee_bottom, torso_bottom):
+        profile = LUNGE_PROFILE
+        shin, thigh = self._segment_lengths(xy[0])
+        front_top, back_top = profile['knee_top']
+        front_angle = front_top + (knee_bottom[:, 0] - front_top) * alpha
+        back_angle = back_top + (knee_bottom[:, 1] - back_top) * alpha
+        torso_angle = profile['torso_top'] + (torso_bottom - profile['torso_top']) * alpha
+        hip_mid_old = (xy[:, HIP_L] + xy[:, HIP_R]) / 2
+        # Gamba anteriore: sinistra (25/27 avanzano nelle pose chiave); posteriore: destra
+        legs = ((HIP_L, KNEE_L, ANKLE_L, front_angle), (HIP_R, KNEE_R, ANKLE_R, back_angle))
+        for hip_id, knee_id, ankle_id, angle in legs:
+            knee_x, knee_y, hip_x, hip_y = _solve_leg(xy[:, ankle_id, 0], xy[:, ankle_id, 1],
+                                                      xy[:, hip_id, 0], shin, thigh, angle)
+            xy[:, knee_id] = np.stack([knee_x, knee_y], axis=-1)
+            xy[:, hip_id] = np.stack([hip_x, hip_y], axis=-1)
+        hip_mid_new = (xy[:, HIP_L] + xy[:, HIP_R]) / 2
+        self._place_upper_body(xy, hip_mid_old, hip_mid_new, torso_angle)
+        return np.stack([front_angle, back_angle], axis=-1), torso_angle
+
+    # --- API pubblica ---
+
+    def generate(self, num_reps=10, rep_frames=60, tempo_jitter=0.15, hold_frames=(5, 15),
+                 lead_in_frames=30, body_scale=1.0, body_width=1.0, offset=(0.0, 0.0),
+                 noise_std=0.002, occlusion_rate=0.0, occlusion_length=(5, 20),
+                 fault_probs=None, faults=None):
+        """
+        Genera una sessione sintetica completa.
+        - rep_frames/tempo_jitter: durata media di una ripetizione e variazione relativa
+        - hold_frames: intervallo (min, max) della pausa in piedi dopo ogni ripetizione
+        - body_scale/body_width/offset: proporzioni e posizione del corpo (coordinate normalizzate)
+        - noise_std: deviazione standard del rumore gaussiano, in coordinate normalizzate
+        - occlusion_rate: probabilità per frame che inizi un buco di occlusione
+        - fault_probs: {codice_difetto: probabilità} per ripetizione, oppure faults: lista esplicita
+        """
+        rng = self.rng
+        faults = self._draw_faults(num_reps, fault_probs, faults)
+        alpha, rep_index, reps = self._schedule(num_reps, rep_frames, tempo_jitter, hold_frames,
+                                                lead_in_frames, faults)
+        n = len(alpha)
+        frame_fault = np.where(rep_index >= 0, faults[np.maximum(rep_index, 0)], FAULT_NONE).astype(np.int8)
+
+        # La geometria dipende solo da (difetto, fase): si calcola una volta su una griglia
+        # di fasi nel formato a 6 canali, e ogni frame è un'indicizzazione della tabella più
+        # un blocco del banco di rumore/visibilità (nessun campionamento per frame)
+        table, table_knee, table_torso = self._pose_table(body_scale, body_width, offset)
+        levels = table.shape[1]
+        phase_idx = np.rint(alpha * (levels - 1)).astype(np.int32)
+        flat_idx = frame_fault.astype(np.int32) * levels + phase_idx
+        flat_table = table.reshape(-1, NUM_LANDMARKS, 6)
+        bank = self._noise_bank(noise_std)
+
+        frames = np.empty((n, NUM_LANDMARKS, 6), dtype=np.float32)
+        for start in range(0, n, self.CHUNK_FRAMES):
+            end = min(n, start + self.CHUNK_FRAMES)
+            bank_start = int(rng.integers(0, len(bank) - (end - start) + 1))
+            np.add(flat_table[flat_idx[start:end]], bank[bank_start:bank_start + end - start],
+                   out=frames[start:end])
+
+        occluded = self._apply_occlusions(frames[..., 3], occlusion_rate, occlusion_length)
+
+        labels = {
+            'timestamp': np.arange(n) / self.fps,
+            'rep_index': rep_index.astype(np.int32),
+            'phase': alpha.astype(np.float32),
+            'fault': frame_fault,
+            'knee_angle': table_knee[frame_fault, phase_idx],
+            'torso_angle': table_torso[frame_fault, phase_idx],
+            'occluded': occluded,
+        }
+        return SyntheticSession(self.exercise_type, frames, labels, reps,
+                                (self.frame_width, self.frame_height), self.fps)
+
+    def _pose_table(self, body_scale, body_width, offset):
+        """
+        Calcola la geometria per ogni difetto su una griglia di PHASE_LEVELS fasi.
+        Restituisce (tabella (difetti, fasi, 33, 6), angolo_ginocchio, angolo_busto),
+        indicizzabili per [difetto, fase]. Il canale di visibilità contiene solo lo scostamento
+        dei landmark mai rilevati; il valore base arriva dal banco di rumore.
+        """
+        key = (body_scale, body_width, tuple(offset))
+        if self._table_cache is not None and self._table_cache[0] == key:
+            return self._table_cache[1]
+        num_faults = len(FAULT_NAMES)
+        alpha = np.tile(np.linspace(0.0, 1.0, self.PHASE_LEVELS), num_faults)
+        fault = np.repeat(np.arange(num_faults), self.PHASE_LEVELS)
+        xy, z = self._base_pose(alpha, body_scale, body_width, offset)
+        profile = SQUAT_PROFILE if self.exercise_type == 'Squat' else LUNGE_PROFILE
+        knee_bottom = np.array([profile['knee_bottom'][f] for f in range(num_faults)])[fault]
+        torso_bottom = np.array([profile['torso_bottom'][f] for f in range(num_faults)])[fault]
+        if self.exercise_type == 'Squat':
+            knee_angle, torso_angle = self._squat_geometry(xy, alpha, knee_bottom, torso_bottom)
+        else:
+            knee_angle, torso_angle = self._lunge_geometry(xy, alpha, knee_bottom, torso_bottom)
+
+        table = np.zeros((len(alpha), NUM_LANDMARKS, 6), dtype=np.float32)
+        table[..., 0:2] = xy
+        table[..., 2] = z
+        # I landmark non definiti nelle pose chiave non vengono mai rilevati
+        table[:, np.isnan(self.keyframes[0, :, 0]), 3] = -0.8
+        table[..., 4] = xy[..., 0] / self.frame_width
+        table[..., 5] = xy[..., 1] / self.frame_height
+        shape = (num_faults, self.PHASE_LEVELS)
+        result = (
+            table.reshape(shape + table.shape[1:]),
+            np.asarray(knee_angle, dtype=np.float32).reshape(shape + np.shape(knee_angle)[1:]),
+            np.asarray(torso_angle, dtype=np.float32).reshape(shape),
+        )
+        self._table_cache = (key, result)
+        return result
+
+    def _noise_bank(self, noise_std):
+        """
+        Banco precalcolato di rumore gaussiano (coerente tra pixel e coordinate normalizzate)
+        e di visibilità di base. I frame ne usano blocchi a partire da offset casuali.
+        """
+        if self._bank_cache is not None and self._bank_cache[0] == noise_std:
+            return self._bank_cache[1]
+        rng = self.rng
+        size = 2 * self.CHUNK_FRAMES
+        bank = np.zeros((size, NUM_LANDMARKS, 6), dtype=np.float32)
+        if noise_std > 0:
+            noise = rng.standard_normal((size, NUM_LANDMARKS, 2), dtype=np.float32) * np.float32(noise_std)
+            bank[..., 4:6] = noise
+            bank[..., 0] = noise[..., 0] * self.frame_width
+            bank[..., 1] = noise[..., 1] * self.frame_height
+        bank[..., 3] = rng.uniform(0.85, 0.99, (size, NUM_LANDMARKS))
+        self._bank_cache = (noise_std, bank)
+        return bank
+
+    def _apply_occlusions(self, visibility, occlusion_rate, occlusion_length):
+        """
+        Inserisce buchi di occlusione: per la durata del buco un gruppo di landmark
+        (una gamba, il busto o tutto il corpo) scende sotto la soglia di visibilità.
+        """
+        n = visibility.shape[0]
+        occluded = np.zeros(n, dtype=bool)
+        if occlusion_rate <= 0:
+            return occluded
+        rng = self.rng
+        starts = np.flatnonzero(rng.random(n) < occlusion_rate)
+        if len(starts) == 0:
+            return occluded
+        lengths = rng.integers(occlusion_length[0], occlusion_length[1] + 1, len(starts))
+        groups = (
+            np.array([HIP_L, KNEE_L, ANKLE_L, 29, 31]),
+            np.array([HIP_R, KNEE_R, ANKLE_R, 30, 32]),
+            np.arange(0, 25),
+            np.arange(NUM_LANDMARKS),
+        )
+        group_choice = rng.integers(0, len(groups), len(starts))
+        # Per ogni gruppo, maschera dei frame coperti costruita con una somma cumulativa 1D
+        for g, group in enumerate(groups):
+            sel = group_choice == g
+            if not sel.any():
+                continue
+            delta = np.zeros(n + 1, dtype=np.int32)
+            np.add.at(delta, starts[sel], 1)
+            np.add.at(delta, np.minimum(starts[sel] + lengths[sel], n), -1)
+            rows = np.flatnonzero(np.cumsum(delta[:-1]) > 0)
+            if len(rows) == 0:
+                continue
+            visibility[np.ix_(rows, group)] = rng.uniform(0.0, VISIBILITY_THRESHOLD * 0.8, (len(rows), len(group)))
+            occluded[rows] = True
+        return occluded
+
+    def iter_sessions(self, num_sessions, **kwargs):
+        """Genera più sessioni indipendenti (sorgente di carico)."""
+        for _ in range(num_sessions):
+            yield self.generate(**kwargs)
+
+
+def replay_session(analyzer, session):
+    """
+    Riproduce una sessione sintetica attraverso ExerciseAnalyzer frame per frame.
+    Restituisce un dizionario con ripetizioni contate, attese e frame con errore di forma.
+    """
+    analyzer.reset_counter()
+    error_frames = np.zeros(len(session), dtype=bool)
+    for i, landmarks in enumerate(session.iter_landmarks()):
+        success, _ = analyzer.analyze_frame(session.exercise_type, landmarks)
+        error_frames[i] = (not success) and analyzer.landmarks_stable
+    return {
+        'rep_count': analyzer.get_rep_count(),
+        'expected_rep_count': session.expected_rep_count,
+        'error_frames': error_frames,
+    }
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+    from exercise_analyzer import ExerciseAnalyzer
+
+    parser = argparse.ArgumentParser(description="Genera landmark sintetici e verifica ExerciseAnalyzer.")
+    parser.add_argument('--exercise', default='Squat', choices=sorted(SUPPORTED_FAULTS))
+    parser.add_argument('--reps', type=int, default=20000, help="Ripetizioni per il test di throughput")
+    parser.add_argument('--replay-reps', type=int, default=200, help="Ripetizioni riprodotte nell'analizzatore")
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    generator = SyntheticLandmarkGenerator(args.exercise, seed=args.seed)
+    generator.generate(num_reps=1)  # Prepara tabella e banco di rumore
+    t0 = time.perf_counter()
+    session = generator.generate(num_reps=args.reps, occlusion_rate=0.001)
+    elapsed = time.perf_counter() - t0
+    print(f"Generati {len(session)} frame in {elapsed:.2f}s ({len(session) / elapsed:,.0f} frame/s)")
+
+    fault_probs = {f: 0.1 for f in SUPPORTED_FAULTS[args.exercise][1:]}
+    session = generator.generate(num_reps=args.replay_reps, fault_probs=fault_probs)
+    t0 = time.perf_counter()
+    result = replay_session(ExerciseAnalyzer(), session)
+    elapsed = time.perf_counter() - t0
+    print(f"Analizzatore: {len(session) / elapsed:,.0f} frame/s, ripetizioni contate "
+          f"{result['rep_count']} / attese {result['expected_rep_count']}")
@@ -0,0 +1,54 @@
+# test_app.py
+"""
+FitnessCoachApp completa sotto la piattaforma Qt offscreen, alimentata da una sorgente sintetica
+(landmark di verità, nessuna camera né modello): python -m pytest test_app.py
+"""
+import os
+import time
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import pytest
+from PyQt6.QtWidgets import QApplication
+
+from frame_sources import create_frame_source
+from main import FitnessCoachApp
+
+
+@pytest.fixture(scope='session')
+def qapp():
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def app_window(qapp):
+    """Finestra dell'app con una sessione sintetica di squat letta il più velocemente possibile."""
+    sources = []
+
+    def create_source():
+        sources.append(create_frame_source('synthetic:Squat', pacing='fast'))
+        return sources[-1]
+
+    window = FitnessCoachApp(create_source, countdown_seconds=0, review_errors_on_stop=False)
+    window.exercise_selector.setCurrentText('Squat')
+    window.target_reps_input.setValue(0)  # Nessun obiettivo: l'allenamento dura quanto la sorgente
+    window.sources = sources
+    window.show()
+    yield window
+    window.close()
+
+
+def run_until_stopped(qapp, window, timeout_s=120.0):
+    # La sorgente finita ferma l'allenamento da sola (timer del display spento)
+    deadline = time.monotonic() + timeout_s
+    while window.timer.isActive() and time.monotonic() < deadline:
+        qapp.processEvents()
+        time.sleep(0.001)
+    return not window.timer.isActive()
+
+
+def test_counts_synthetic_squat_reps(qapp, app_window):
+    app_window.start_exercise()
+    assert run_until_stopped(qapp, app_window), "La sessione sintetica non è terminata"
+    session = app_window.sources[-1].session
+    assert app_window.ex_analyzer.get_rep_count() == session.expected_rep_count
@@ -0,0 +1,332 @@
+# threshold_sweep.py
+"""
+Ricerca parallela delle soglie di ExerciseAnalyzer su sequenze di landmark etichettate.
+
+Le regole non sono riscritte qui: ogni sequenza viene valutata con CompiledExercise.evaluate
+(la stessa definizione dell'analizzatore) per molte configurazioni insieme, con le soglie in
+forma (C, 1) estese sui frame; i blocchi di configurazioni sono distribuiti sui core. Lo spazio
+di ricerca nasce dalle soglie di default della definizione (default ± SEARCH_WIDTH), quindi
+anche un esercizio registrato in seguito si può esplorare senza altro codice. Le configurazioni
+sono ordinate per errore sul conteggio delle ripetizioni, poi per tasso di falsi errori.
+
+max_unstable_frames incide solo sul testo del feedback (non su conteggio ed errori):
+non fa parte dello spazio di ricerca.
+
+Esempi:
+    python threshold_sweep.py --exercise Squat --samples 5000 --workers 8
+    python threshold_sweep.py --exercise Squat --grid squat_min_angle=100,105,110 squat_max_angle=125,130,135
+    python threshold_sweep.py --exercise Lunge --recorded lezione.npz --expected-reps 42 --samples 2000
+"""
+import argparse
+import itertools
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from exercise_analyzer import ExerciseAnalyzer
+from exercise_definitions import exercise_names, get_exercise
+from exercise_engine import STABILITY_THRESHOLDS
+from synthetic_landmarks import ERROR_FAULTS, SUPPORTED_FAULTS, SyntheticLandmarkGenerator, replay_session
+
+# Soglie della definizione (angoli in gradi): da default - SEARCH_WIDTH a default + SEARCH_WIDTH
+SEARCH_WIDTH = 15
+SEARCH_STEP = 5
+# Soglie comuni nello spazio di ricerca: (minimo, massimo, passo)
+STABILITY_SEARCH = {'req_stable_frames': (5, 40, 5)}
+
+
+def search_space(exercise_type):
+    """Spazio di ricerca di un esercizio registrato: {soglia: (minimo, massimo, passo)}."""
+    space = {name: (max(0, default - SEARCH_WIDTH), min(180, default + SEARCH_WIDTH), SEARCH_STEP)
+             for name, default in get_exercise(exercise_type).thresholds.items()}
+    space.update(STABILITY_SEARCH)
+    return space
+
+
+def default_config(exercise_type):
+    """Soglie di default dell'esercizio per i parametri dello spazio di ricerca."""
+    defaults = {**get_exercise(exercise_type).thresholds, **STABILITY_THRESHOLDS}
+    return {name: defaults[name] for name in search_space(exercise_type)}
+
+
+class LabelledSequence:
+    """
+    Sequenza pronta per la ricerca: landmark normalizzati (n, 33, 4), NaN dove manca la persona,
+    con la dimensione del frame e le etichette (ripetizioni attese, ripetizione e difetto di ogni
+    frame se disponibili).
+    """
+    def __init__(self, exercise_type, landmarks, frame_size, expected_rep_count, rep_index=None,
+                 rep_fault=None, name=''):
+        self.exercise_type = exercise_type
+        self.name = name
+        self.landmarks = landmarks
+        self.frame_size = tuple(int(v) for v in frame_size)
+        self.expected_rep_count = int(expected_rep_count)
+        self.rep_index = rep_index  # (n,) indice della ripetizione etichettata, -1 fuori
+        self.rep_fault = rep_fault  # (r,) difetto di ogni ripetizione
+
+    def __len__(self):
+        return len(self.landmarks)
+
+    @property
+    def has_rep_labels(self):
+        return self.rep_index is not None and self.rep_fault is not None
+
+
+def sequence_from_session(session, name=''):
+    """Sequenza etichettata da una SyntheticSession."""
+    return LabelledSequence(session.exercise_type, session.frames[:, :, [4, 5, 2, 3]], session.frame_size,
+                            session.expected_rep_count, session.labels['rep_index'], session.reps['fault'], name)
+
+
+def sequence_from_recording(path, exercise_type, expected_rep_count=None):
+    """
+    Sequenza da un file .npz con 'landmarks' (n, 33, 4) normalizzati e 'frame_size'
+    (es. l'output di offline_processor.py). Le etichette 'expected_rep_count', 'rep_index' e
+    'rep_fault' sono lette dal file se presenti; il numero di ripetizioni può essere passato a parte.
+    """
+    with np.load(path) as data:
+        landmarks = data['landmarks']
+        frame_size = data['frame_size']
+        if expected_rep_count is None:
+            if 'expected_rep_count' not in data:
+                raise ValueError(f"{path}: manca 'expected_rep_count' (indicare --expected-reps)")
+            expected_rep_count = int(data['expected_rep_count'])
+        rep_index = data['rep_index'] if 'rep_index' in data else None
+        rep_fault = data['rep_fault'] if 'rep_fault' in data else None
+    return LabelledSequence(exercise_type, landmarks, frame_size, expected_rep_count, rep_index, rep_fault,
+                            os.path.basename(path))
+
+
+def simulate(sequence, params):
+    """
+    Valuta l'esercizio su una sequenza per C configurazioni insieme (CompiledExercise.evaluate).
+    params: dict di array (C,). Restituisce (ripetizioni contate (C,), ripetizioni etichettate
+    con almeno un frame di errore (C, r) oppure None, frame con errore (C,)).
+    """
+    c = len(params['req_stable_frames'])
+    if len(sequence) == 0:
+        rep_errors = np.zeros((c, len(sequence.rep_fault)), dtype=bool) if sequence.has_rep_labels else None
+        return np.zeros(c, dtype=np.int64), rep_errors, np.zeros(c, dtype=np.int64)
+    thresholds = {name: np.asarray(values)[:, None] for name, values in params.items()}
+    evaluation = get_exercise(sequence.exercise_type).evaluate(sequence.landmarks, sequence.frame_size, thresholds)
+    # Come replay_session: errore = frame stabile con esito negativo
+    error = evaluation.stable & ~evaluation.success
+    rep_errors = None
+    if sequence.has_rep_labels:
+        labelled = sequence.rep_index >= 0
+        hits = np.zeros((c, len(sequence.rep_fault)), dtype=np.int64)
+        np.add.at(hits, (slice(None), sequence.rep_index[labelled]), error[:, labelled])
+        rep_errors = hits > 0
+    return evaluation.rep_count[:, -1], rep_errors, error.sum(axis=1)
+
+
+# --- Esecuzione parallela ---
+
+_SEQUENCES = None
+
+
+def _init_worker(sequences):
+    global _SEQUENCES
+    _SEQUENCES = sequences
+
+
+def _evaluate_batch(params):
+    """Valuta un blocco di configurazioni su tutte le sequenze (eseguito nei worker)."""
+    c = len(params['req_stable_frames'])
+    counted = np.zeros((c, len(_SEQUENCES)), dtype=np.int64)
+    clean_reps = error_reps = 0
+    false_errors = np.zeros(c, dtype=np.int64)
+    detected = np.zeros(c, dtype=np.int64)
+    error_frames = np.zeros(c, dtype=np.int64)
+    for s, sequence in enumerate(_SEQUENCES):
+        reps, rep_errors, errors = simulate(sequence, params)
+        counted[:, s] = reps
+        error_frames += errors
+        if rep_errors is not None:
+            faulty = np.isin(sequence.rep_fault, ERROR_FAULTS)
+            clean_reps += int((~faulty).sum())
+            error_reps += int(faulty.sum())
+            false_errors += rep_errors[:, ~faulty].sum(axis=1)
+            detected += rep_errors[:, faulty].sum(axis=1)
+    return counted, false_errors, detected, error_frames, clean_reps, error_reps
+
+
+def sample_configs(exercise_type, samples, seed=0, include_default=True):
+    """Configurazioni casuali sulla griglia di search_space(), nel rispetto dei vincoli tra soglie."""
+    rng = np.random.default_rng(seed)
+    space = search_space(exercise_type)
+    names = list(space)
+    values = {name: np.arange(lo, hi + step, step) for name, (lo, hi, step) in space.items()}
+    configs = [default_config(exercise_type)] if include_default else []
+    while len(configs) < samples:
+        batch = {n: rng.choice(v, size=samples) for n, v in values.items()}
+        valid = _valid_mask(exercise_type, batch)
+        for i in np.flatnonzero(valid)[:samples - len(configs)]:
+            configs.append({n: int(batch[n][i]) for n in names})
+    return configs
+
+
+def grid_configs(exercise_type, grid):
+    """Prodotto cartesiano dei valori indicati; le altre soglie restano ai valori di default."""
+    defaults = default_config(exercise_type)
+    names = list(defaults)
+    unknown = set(grid) - set(names)
+    if unknown:
+        raise ValueError(f"Soglie non valide per {exercise_type}: {', '.join(sorted(unknown))}")
+    keys = list(grid)
+    configs = []
+    for combo in itertools.product(*(grid[k] for k in keys)):
+        config = dict(defaults)
+        config.update(zip(keys, combo))
+        configs.append(config)
+    batch = {n: np.array([c[n] for c in configs]) for n in names}
+    return [c for c, ok in zip(configs, _valid_mask(exercise_type, batch)) if ok]
+
+
+def _valid_mask(exercise_type, batch):
+    # Gli intervalli 'between' della definizione devono restare non vuoti
+    valid = np.ones(len(next(iter(batch.values()))), dtype=bool)
+    for lo, hi in get_exercise(exercise_type).threshold_ranges:
+        if lo in batch and hi in batch:
+            valid &= batch[lo] < batch[hi]
+    return valid
+
+
+def run_sweep(sequences, configs, workers=None, batch_size=256):
+    """
+    Valuta tutte le configurazioni in parallelo. Restituisce un dizionario di metriche per
+    configurazione e l'ordine di classifica (indici, dal migliore).
+    """
+    names = list(configs[0])
+    params = {n: np.array([c[n] for c in configs]) for n in names}
+    batches = [{n: v[i:i + batch_size] for n, v in params.items()} for i in range(0, len(configs), batch_size)]
+    workers = workers or os.cpu_count() or 1
+    if workers == 1:
+        _init_worker(sequences)
+        outputs = [_evaluate_batch(b) for b in batches]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(sequences,)) as pool:
+            outputs = list(pool.map(_evaluate_batch, batches))
+
+    counted = np.concatenate([o[0] for o in outputs])
+    false_errors = np.concatenate([o[1] for o in outputs])
+    detected = np.concatenate([o[2] for o in outputs])
+    error_frames = np.concatenate([o[3] for o in outputs])
+    clean_reps, error_reps = outputs[0][4], outputs[0][5]
+    expected = np.array([s.expected_rep_count for s in sequences])
+    metrics = {
+        'rep_error_rate': np.abs(counted - expected).sum(axis=1) / max(1, expected.sum()),
+        'exact_sequences': (counted == expected).mean(axis=1),
+        'false_error_rate': false_errors / clean_reps if clean_reps else np.zeros(len(configs)),
+        'detection_rate': detected / error_reps if error_reps else np.ones(len(configs)),
+        'error_frames': error_frames,
+        'counted': counted,
+    }
+    # Classifica: errore sul conteggio, poi falsi errori, poi errori reali mancati
+    order = np.lexsort((-metrics['detection_rate'], metrics['false_error_rate'], metrics['rep_error_rate']))
+    return metrics, order
+
+
+def verify(sequence, session, configs):
+    """Confronta la simulazione vettorizzata con ExerciseAnalyzer reale su alcune configurazioni."""
+    names = list(configs[0])
+    reps, rep_errors, _ = simulate(sequence, {n: np.array([c[n] for c in configs]) for n in names})
+    for i, config in enumerate(configs):
+        result = replay_session(ExerciseAnalyzer(thresholds=config), session)
+        frames = np.flatnonzero(result['error_frames'])
+        rep_idx = session.labels['rep_index'][frames]
+        expected_rep_errors = np.zeros(len(session.reps['fault']), dtype=bool)
+        expected_rep_errors[rep_idx[rep_idx >= 0]] = True
+        if result['rep_count'] != reps[i] or not np.array_equal(expected_rep_errors, rep_errors[i]):
+            return False
+    return True
+
+
+def build_synthetic(exercise_type, sessions, reps, seed):
+    faults = SUPPORTED_FAULTS[exercise_type][1:]
+    sequences, raw = [], []
+    for k in range(sessions):
+        generator = SyntheticLandmarkGenerator(exercise_type, seed=seed + k)
+        session = generator.generate(num_reps=reps, occlusion_rate=0.002,
+                                     fault_probs={f: 0.1 for f in faults})
+        raw.append(session)
+        sequences.append(sequence_from_session(session, name=f'sintetica-{k}'))
+    return sequences, raw
+
+
+def _parse_grid(items):
+    grid = {}
+    for item in items:
+        name, _, values = item.partition('=')
+        grid[name] = [int(v) for v in values.split(',') if v]
+    return grid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ricerca parallela delle soglie di ExerciseAnalyzer.")
+    parser.add_argument('--exercise', default='Squat', choices=exercise_names())
+    parser.add_argument('--samples', type=int, default=2000, help="Configurazioni casuali da valutare")
+    parser.add_argument('--grid', nargs='*', help="Griglia esplicita: soglia=v1,v2,... (sostituisce --samples)")
+    parser.add_argument('--synthetic-sessions', type=int, default=8)
+    parser.add_argument('--synthetic-reps', type=int, default=40)
+    parser.add_argument('--recorded', nargs='*', default=[], help="File .npz di landmark registrati")
+    parser.add_argument('--expected-reps', type=int, nargs='*', help="Ripetizioni attese per ogni file registrato")
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--verify', type=int, default=0, help="Verifica N configurazioni con ExerciseAnalyzer")
+    parser.add_argument('--csv', help="Salva tutte le configurazioni e le metriche in CSV")
+    args = parser.parse_args()
+
+    # Il generatore sintetico conosce solo alcuni esercizi: per gli altri servono registrazioni
+    sequences, sessions = build_synthetic(args.exercise, args.synthetic_sessions, args.synthetic_reps, args.seed) \
+        if args.exercise in SUPPORTED_FAULTS else ([], [])
+    expected_reps = args.expected_reps or [None] * len(args.recorded)
+    for path, expected in zip(args.recorded, expected_reps):
+        sequences.append(sequence_from_recording(path, args.exercise, expected))
+    if not sequences:
+        parser.error(f"Nessuna sequenza per {args.exercise}: indicare --recorded")
+    configs = grid_configs(args.exercise, _parse_grid(args.grid)) if args.grid else \
+        sample_configs(args.exercise, args.samples, seed=args.seed)
+    total_frames = sum(len(s) for s in sequences)
+    print(f"{len(configs)} configurazioni su {len(sequences)} sequenze ({total_frames} frame)")
+
+    if args.verify and sessions:
+        ok = verify(sequences[0], sessions[0], configs[:args.verify])
+        print("Verifica con ExerciseAnalyzer:", "OK" if ok else "DIVERSA")
+
+    t0 = time.perf_counter()
+    metrics, order = run_sweep(sequences, configs, workers=args.workers)
+    elapsed = time.perf_counter() - t0
+    print(f"Valutate in {elapsed:.1f}s ({len(configs) * total_frames / elapsed / 1e6:.1f} M config-frame/s)")
+
+    names = list(configs[0])
+    default = default_config(args.exercise)
+    header = f"{'#':>4} {'err.rip':>8} {'esatte':>7} {'falsi':>7} {'rilev.':>7}  " + ' '.join(names)
+    print(header)
+    for rank, i in enumerate(order[:args.top], 1):
+        tag = ' (default)' if configs[i] == default else ''
+        print(f"{rank:>4} {metrics['rep_error_rate'][i]:>8.1%} {metrics['exact_sequences'][i]:>7.0%} "
+              f"{metrics['false_error_rate'][i]:>7.1%} {metrics['detection_rate'][i]:>7.0%}  "
+              + ' '.join(f"{n}={configs[i][n]}" for n in names) + tag)
+    default_rank = next((r for r, i in enumerate(order, 1)
+                         if configs[i] == default), None)
+    if default_rank:
+        print(f"Configurazione di default: posizione {default_rank} di {len(configs)}")
+
+    if args.csv:
+        with open(args.csv, 'w', encoding='utf-8') as f:
+            f.write(','.join(['rank', 'rep_error_rate', 'exact_sequences', 'false_error_rate',
+                              'detection_rate', 'error_frames'] + names) + '\n')
+            for rank, i in enumerate(order, 1):
+                row = [rank, metrics['rep_error_rate'][i], metrics['exact_sequences'][i],
+                       metrics['false_error_rate'][i], metrics['detection_rate'][i],
+                       metrics['error_frames'][i]] + [configs[i][n] for n in names]
+                f.write(','.join(str(v) for v in row) + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+# tradeoff_eval.py
+"""
+Valutazione accuratezza/velocità della pipeline PoseDetector -> ExerciseAnalyzer su registrazioni
+etichettate, al variare delle impostazioni che ne riducono il costo:
+  - complessità del modello MediaPipe (0, 1, 2);
+  - risoluzione di inferenza (scala dell'area video prima del modello);
+  - salto di frame (inferenza un frame ogni k, negli altri si riusano gli ultimi landmark);
+  - ritaglio ROI (inferenza sul riquadro della persona al frame precedente);
+  - filtro temporale One Euro sui landmark (landmark_filter.py), che compensa il rumore dei
+    modelli più leggeri e delle risoluzioni ridotte.
+Ogni combinazione (impostazioni, registrazione) è un lavoro eseguito in parallelo. Il risultato è
+una tabella con latenza, throughput e CPU contro accuratezza delle ripetizioni e precisione /
+richiamo nel rilevamento degli errori di forma, con le combinazioni Pareto-ottimali marcate.
+
+Etichette: file JSON con un oggetto (o una lista di oggetti) del tipo
+    {"video": "squat_01.mp4", "exercise": "Squat", "reps": 12, "errors": [3.2, 10.5], "mirror": true}
+dove "errors" sono gli istanti (secondi) degli errori di forma e "video" è relativo al file JSON.
+
+Esempio:
+    python tradeoff_eval.py etichette/*.json --complexity 0 1 2 --scale 1 0.75 0.5 --skip 1 2 3 --roi off on --filter off on
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from exercise_analyzer import ExerciseAnalyzer
+from landmark_filter import OneEuroFilter
+from offline_processor import preprocess_frame
+from pose_backends import MediaPipeBackend
+from pose_detector import PoseDetector, landmarks_to_positions
+
+ERROR_COOLDOWN_S = 1.0  # Come COOLDOWN_DURATION_MS dell'app
+ROI_MARGIN = 0.25  # Margine del riquadro ROI, in frazione del lato maggiore della persona
+ROI_MIN_VISIBLE = 4
+
+
+class Recording:
+    """Registrazione etichettata: video, esercizio, ripetizioni attese e istanti degli errori."""
+    def __init__(self, video, exercise_type, reps, errors=(), mirror=True, name=None):
+        self.video = video
+        self.exercise_type = exercise_type
+        self.reps = int(reps)
+        self.errors = sorted(float(t) for t in errors)
+        self.mirror = mirror
+        self.name = name or os.path.basename(video)
+
+
+def load_recordings(paths):
+    recordings = []
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        for item in data if isinstance(data, list) else [data]:
+            video = os.path.join(os.path.dirname(os.path.abspath(path)), item['video'])
+            recordings.append(Recording(video, item['exercise'], item['reps'], item.get('errors', ()),
+                                        item.get('mirror', True)))
+    return recordings
+
+
+def settings_grid(complexities=(1,), scales=(1.0,), skips=(1,), rois=(False,), filters=(False,)):
+    return [{'model_complexity': c, 'scale': s, 'skip': k, 'roi': r, 'filter': f}
+            for c, s, k, r, f in itertools.product(complexities, scales, skips, rois, filters)]
+
+
+def settings_label(settings):
+    return (f"c={settings['model_complexity']} x{settings['scale']:g} "
+            f"skip={settings['skip']} roi={'on' if settings['roi'] else 'off'}"
+            f"{' filtro' if settings.get('filter') else ''}")
+
+
+def default_backend(settings):
+    return MediaPipeBackend(model_complexity=settings['model_complexity'])
+
+
+def roi_box(landmarks, margin=ROI_MARGIN):
+    """Riquadro normalizzato (x0, y0, x1, y1) attorno ai landmark visibili, o None."""
+    if landmarks is None:
+        return None
+    visible = landmarks[:, 3] > 0.5
+    if visible.sum() < ROI_MIN_VISIBLE:
+        return None
+    lo = landmarks[visible, :2].min(axis=0)
+    hi = landmarks[visible, :2].max(axis=0)
+    pad = margin * float((hi - lo).max())
+    x0, y0 = np.clip(lo - pad, 0.0, 1.0)
+    x1, y1 = np.clip(hi + pad, 0.0, 1.0)
+    if x1 - x0 < 0.05 or y1 - y0 < 0.05:
+        return None
+    return float(x0), float(y0), float(x1), float(y1)
+
+
+class TradeoffPipeline:
+    """
+    Pipeline dell'app con le impostazioni di velocità. process() riceve l'area video (BGR) e
+    restituisce le posizioni in pixel per l'analizzatore, come find_position sull'area intera.
+    """
+    def __init__(self, settings, backend, fps=30.0):
+        self.settings = settings
+        self.detector = PoseDetector(backend=backend)
+        self.fps = fps
+        self.landmark_filter = OneEuroFilter() if settings.get('filter') else None
+        self.frame_index = 0
+        self.landmarks = None  # Landmark normalizzati all'area video intera
+        self.inferences = 0
+
+    def process(self, video):
+        h, w = video.shape[:2]
+        if self.frame_index % self.settings['skip'] == 0:
+            self.landmarks = self._infer(video)
+            if self.landmark_filter is not None:
+                self.landmarks = self.landmark_filter.update(self.landmarks, self.frame_index / self.fps)
+            self.inferences += 1
+        self.frame_index += 1
+        if self.landmarks is None:
+            return []
+        return landmarks_to_positions(self.landmarks, w, h)
+
+    def _infer(self, video):
+        box = roi_box(self.landmarks) if self.settings['roi'] else None
+        h, w = video.shape[:2]
+        if box is not None:
+            x0, y0 = int(box[0] * w), int(box[1] * h)
+            x1, y1 = max(x0 + 1, int(np.ceil(box[2] * w))), max(y0 + 1, int(np.ceil(box[3] * h)))
+            image = video[y0:y1, x0:x1]
+        else:
+            x0, y0, x1, y1 = 0, 0, w, h
+            image = video
+        scale = self.settings['scale']
+        if scale != 1.0:
+            image = cv2.resize(image, (max(1, int(round(image.shape[1] * scale))),
+                                       max(1, int(round(image.shape[0] * scale)))),
+                               interpolation=cv2.INTER_AREA)
+        self.detector.find_pose(image)
+        landmarks = self.detector.landmarks
+        if landmarks is None:
+            return None  # Persona persa: al frame successivo si torna all'area intera
+        landmarks = np.array(landmarks, dtype=np.float32)
+        if box is not None:
+            # Dal riquadro all'area video intera
+            landmarks[:, 0] = (x0 + landmarks[:, 0] * (x1 - x0)) / w
+            landmarks[:, 1] = (y0 + landmarks[:, 1] * (y1 - y0)) / h
+        return landmarks
+
+    def release(self):
+        self.detector.release()
+
+
+def evaluate_recording(recording, settings, backend_factory=None, max_frames=None):
+    """
+    Esegue la pipeline su una registrazione. Gli eventi di errore seguono la logica dell'app:
+    primo frame stabile con esito negativo, riarmato da un frame corretto o da una nuova
+    ripetizione, con un intervallo minimo di ERROR_COOLDOWN_S.
+    """
+    backend_factory = backend_factory or default_backend
+    cap = cv2.VideoCapture(recording.video)
+    if not cap.isOpened():
+        raise IOError(f"Impossibile aprire il video: {recording.video}")
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    pipeline = TradeoffPipeline(settings, backend_factory(settings), fps)
+    analyzer = ExerciseAnalyzer()
+    analyzer.reset_counter()
+
+    latencies = []
+    cpu = 0.0
+    events = []
+    error_flag = False
+    cooldown_until = float('-inf')
+    last_rep = 0
+    try:
+        while max_frames is None or len(latencies) < max_frames:
+            ret, frame = cap.read()
+            if not ret:
+                break
+            video = preprocess_frame(frame, recording.mirror)
+            t0, c0 = time.perf_counter(), time.process_time()
+            positions = pipeline.process(video)
+            success, _ = analyzer.analyze_frame(recording.exercise_type, positions)
+            latencies.append(time.perf_counter() - t0)
+            cpu += time.process_time() - c0
+
+            t = (len(latencies) - 1) / fps
+            if not success and analyzer.landmarks_stable and not error_flag and t >= cooldown_until:
+                events.append(t)
+                error_flag = True
+                cooldown_until = t + ERROR_COOLDOWN_S
+            elif success and error_flag:
+                error_flag = False
+            if analyzer.rep_count > last_rep:
+                last_rep = analyzer.rep_count
+                error_flag = False
+    finally:
+        cap.release()
+        pipeline.release()
+
+    return {
+        'frames': len(latencies),
+        'latencies': np.array(latencies, dtype=np.float32),
+        'cpu_seconds': cpu,
+        'inferences': pipeline.inferences,
+        'reps': analyzer.rep_count,
+        'events': events,
+    }
+
+
+def match_events(predicted, labelled, tolerance):
+    """Abbinamento uno a uno (greedy in ordine di tempo) entro la tolleranza: numero di abbinati."""
+    used = [False] * len(labelled)
+    matched = 0
+    for t in predicted:
+        best = None
+        for j, u in enumerate(labelled):
+            if not used[j] and abs(u - t) <= tolerance and (best is None or abs(u - t) < abs(labelled[best] - t)):
+                best = j
+        if best is not None:
+            used[best] = True
+            matched += 1
+    return matched
+
+
+def _run_job(job):
+    recording, settings, max_frames = job
+    return evaluate_recording(recording, settings, max_frames=max_frames)
+
+
+def summarize(settings, recordings, results, tolerance):
+    """Metriche aggregate di un'impostazione su tutte le registrazioni."""
+    latencies = np.concatenate([r['latencies'] for r in results]) * 1000.0
+    frames = int(sum(r['frames'] for r in results))
+    expected = sum(rec.reps for rec in recordings)
+    rep_error = sum(abs(r['reps'] - rec.reps) for r, rec in zip(results, recordings))
+    predicted = sum(len(r['events']) for r in results)
+    labelled = sum(len(rec.errors) for rec in recordings)
+    matched = sum(match_events(r['events'], rec.errors, tolerance) for r, rec in zip(results, recordings))
+    precision = matched / predicted if predicted else (1.0 if not labelled else 0.0)
+    recall = matched / labelled if labelled else 1.0
+    return {
+        'settings': settings,
+        'frames': frames,
+        'latency_p50_ms': float(np.percentile(latencies, 50)) if frames else float('nan'),
+        'latency_p95_ms': float(np.percentile(latencies, 95)) if frames else float('nan'),
+        'throughput_fps': frames / max(float(latencies.sum()) / 1000.0, 1e-9),
+        'cpu_ms_per_frame': 1000.0 * sum(r['cpu_seconds'] for r in results) / max(frames, 1),
+        'inference_fraction': sum(r['inferences'] for r in results) / max(frames, 1),
+        'rep_accuracy': max(0.0, 1.0 - rep_error / max(expected, 1)),
+        'exact_recordings': float(np.mean([r['reps'] == rec.reps for r, rec in zip(results, recordings)])),
+        'error_precision': precision,
+        'error_recall': recall,
+    }
+
+
+def pareto_mask(rows):
+    """
+    True per le righe non dominate: costo (latenza p50, CPU per frame) da minimizzare,
+    qualità (accuratezza ripetizioni, precisione, richiamo) da massimizzare.
+    """
+    values = np.array([[r['latency_p50_ms'], r['cpu_ms_per_frame'], -r['rep_accuracy'],
+                        -r['error_precision'], -r['error_recall']] for r in rows])
+    mask = np.ones(len(rows), dtype=bool)
+    for i in range(len(rows)):
+        dominated = (values <= values[i]).all(axis=1) & (values < values[i]).any(axis=1)
+        mask[i] = not dominated.any()
+    return mask
+
+
+def run_evaluation(recordings, settings_list, workers=None, tolerance=1.0, max_frames=None):
+    """Valuta tutte le combinazioni in parallelo. Restituisce le righe e la maschera Pareto."""
+    jobs = [(rec, settings, max_frames) for settings in settings_list for rec in recordings]
+    workers = workers or max(1, (os.cpu_count() or 2) // 2)
+    if workers == 1:
+        outputs = [_run_job(job) for job in jobs]
+    else:
+        # 'spawn': MediaPipe e OpenCV non sono sicuri dopo un fork
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            outputs = list(pool.map(_run_job, jobs))
+    n = len(recordings)
+    rows = [summarize(settings, recordings, outputs[i * n:(i + 1) * n], tolerance)
+            for i, settings in enumerate(settings_list)]
+    return rows, pareto_mask(rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Valutazione accuratezza/velocità della pipeline di posa.")
+    parser.add_argument('labels', nargs='+', help="File JSON di etichette")
+    parser.add_argument('--complexity', type=int, nargs='+', default=[0, 1])
+    parser.add_argument('--scale', type=float, nargs='+', default=[1.0, 0.5])
+    parser.add_argument('--skip', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--roi', choices=('off', 'on'), nargs='+', default=['off'])
+    parser.add_argument('--filter', choices=('off', 'on'), nargs='+', default=['off'],
+                        help="Filtro temporale One Euro sui landmark")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="Processi paralleli (default: metà dei core; 1 per latenze senza contesa)")
+    parser.add_argument('--tolerance', type=float, default=1.0, help="Tolleranza (s) per abbinare gli errori")
+    parser.add_argument('--max-frames', type=int, default=None, help="Limite di frame per registrazione")
+    parser.add_argument('--pareto-only', action='store_true')
+    parser.add_argument('--csv', help="Salva tutte le righe in CSV")
+    args = parser.parse_args()
+
+    recordings = load_recordings(args.labels)
+    settings_list = settings_grid(args.complexity, args.scale, args.skip, [r == 'on' for r in args.roi],
+                                  [f == 'on' for f in args.filter])
+    print(f"{len(settings_list)} impostazioni su {len(recordings)} registrazioni")
+    t0 = time.perf_counter()
+    rows, pareto = run_evaluation(recordings, settings_list, workers=args.workers,
+                                  tolerance=args.tolerance, max_frames=args.max_frames)
+    print(f"Valutazione completata in {time.perf_counter() - t0:.1f}s")
+
+    order = sorted(range(len(rows)), key=lambda i: rows[i]['latency_p50_ms'])
+    print(f"{'P':>2} {'impostazioni':<36}{'p50 ms':>8}{'p95 ms':>8}{'FPS':>8}{'CPU ms':>8}"
+          f"{'infer.':>8}{'rip.':>7}{'esatte':>8}{'prec.':>7}{'rich.':>7}")
+    for i in order:
+        if args.pareto_only and not pareto[i]:
+            continue
+        r = rows[i]
+        print(f"{'*' if pareto[i] else '':>2} {settings_label(r['settings']):<36}"
+              f"{r['latency_p50_ms']:>8.2f}{r['latency_p95_ms']:>8.2f}{r['throughput_fps']:>8.1f}"
+              f"{r['cpu_ms_per_frame']:>8.2f}{r['inference_fraction']:>8.0%}{r['rep_accuracy']:>7.0%}"
+              f"{r['exact_recordings']:>8.0%}{r['error_precision']:>7.0%}{r['error_recall']:>7.0%}")
+    print("* = Pareto-ottimale (nessun'altra impostazione è più veloce e più accurata insieme)")
+
+    if args.csv:
+        columns = ['latency_p50_ms', 'latency_p95_ms', 'throughput_fps', 'cpu_ms_per_frame',
+                   'inference_fraction', 'rep_accuracy', 'exact_recordings', 'error_precision',
+                   'error_recall', 'frames']
+        with open(args.csv, 'w', encoding='utf-8') as f:
+            f.write(','.join(['pareto', 'model_complexity', 'scale', 'skip', 'roi', 'filter'] + columns) + '\n')
+            for i in order:
+                s = rows[i]['settings']
+                row = [int(pareto[i]), s['model_complexity'], s['scale'], s['skip'], int(s['roi']),
+                       int(s['filter'])] + \
+                      [rows[i][c] for c in columns]
+                f.write(','.join(str(v) for v in row) + '\n')
+
+
+if __name__ == '__main__':
+    main()
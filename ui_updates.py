@@ -0,0 +1,65 @@
+# ui_updates.py
+import time
+
+from PyQt6.QtCore import QTimer
+
+
+class TextUpdater:
+    """
+    Aggiorna il testo di una QLabel solo quando cambia davvero (setText rifà il layout del
+    testo, costoso per le etichette grandi con a capo automatico). Con min_interval_ms i cambi
+    ravvicinati vengono accorpati: resta visibile ogni testo per almeno quell'intervallo e al
+    termine viene applicato solo l'ultimo arrivato. Non rientra mai nel ciclo degli eventi:
+    l'applicazione differita usa un QTimer single-shot.
+    """
+    def __init__(self, label, min_interval_ms=0):
+        self.label = label
+        self.min_interval_ms = min_interval_ms
+        self._applied = label.text()
+        self._pending = None
+        self._last_apply = float('-inf')
+        self._timer = QTimer(label)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.flush)
+        # Statistiche: testi applicati, invariati (nessun setText) e accorpati (mai mostrati)
+        self.applied = 0
+        self.unchanged = 0
+        self.merged = 0
+
+    @property
+    def text(self):
+        """Ultimo testo richiesto (anche se non ancora mostrato)."""
+        return self._pending if self._pending is not None else self._applied
+
+    def set_text(self, text, immediate=False):
+        if text == self._applied:
+            if self._pending is not None:
+                # Si torna al testo già visibile: il cambio in attesa non serve più
+                self._pending = None
+                self._timer.stop()
+                self.merged += 1
+            else:
+                self.unchanged += 1
+            return
+        elapsed_ms = (time.monotonic() - self._last_apply) * 1000.0
+        if immediate or elapsed_ms >= self.min_interval_ms:
+            self._apply(text)
+            return
+        if self._pending is not None:
+            self.merged += 1
+        self._pending = text
+        if not self._timer.isActive():
+            self._timer.start(max(1, int(self.min_interval_ms - elapsed_ms) + 1))
+
+    def flush(self):
+        """Applica subito l'eventuale testo in attesa."""
+        if self._pending is not None:
+            self._apply(self._pending)
+
+    def _apply(self, text):
+        self._timer.stop()
+        self._pending = None
+        self.label.setText(text)
+        self._applied = text
+        self._last_apply = time.monotonic()
+        self.applied += 1
@@ -0,0 +1,503 @@
+# work_queue.py
+"""
+Rielaborazione dell'archivio video distribuita su più processi e più macchine tramite una coda
+di lavoro su file system (una cartella condivisa, es. NFS, vista da tutti i nodi allo stesso
+percorso, come i video e l'eventuale cache dei landmark).
+
+Ogni video viene diviso in blocchi di chunk_seconds (offline_processor.plan_chunks): ogni blocco
+è un'unità di lavoro elaborata da process_chunk (inferenza di PoseDetector e analisi speculativa
+di ExerciseAnalyzer). Le unità passano tra le cartelle della coda con rinomine atomiche:
+
+    pending/<unità>.json   da fare
+    leased/<unità>.json    in carico a un worker, che ne aggiorna la data di modifica (heartbeat)
+    done/<unità>.json      finita: il risultato è in results/<unità>.npz
+    failed/<unità>.json    fallita max_attempts volte (con gli errori)
+
+Un worker che si blocca o termina smette di rinnovare il lease: scaduto lease_seconds, la sua
+unità torna in pending (lo fa qualsiasi worker) e viene ripresa da un altro. I risultati sono
+checkpoint per unità: un'unità con il risultato già scritto non viene rielaborata, anche dopo un
+riavvio dell'intera coda. Il report unisce i blocchi di ogni video con la ricucitura dello stato
+di offline_processor (risultato identico a una passata sequenziale). Le scadenze si basano sulle
+date di modifica dei file: gli orologi dei nodi devono essere sincronizzati (NTP).
+
+Esempio su una sola macchina:
+    python work_queue.py submit coda/ archivio/*.mp4 --exercise Squat --chunk-seconds 60
+    python work_queue.py worker coda/ &   (uno per processo o nodo, quanti se ne vuole)
+    python work_queue.py report coda/ --output report.json
+oppure `python work_queue.py local coda/ --workers 4` per avviare i worker e attendere il report.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from landmark_cache import LandmarkCache
+from offline_processor import cache_settings, merge_chunks, plan_chunks, process_chunk, video_info
+
+QUEUE_FORMAT_VERSION = 1
+STATES = ('pending', 'leased', 'done', 'failed')
+
+
+def _write_atomic(path, data):
+    # File temporaneo nella stessa cartella e rinomina: gli altri processi vedono il file completo o niente
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix='.tmp_')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _read_json(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_chunk(path, chunk):
+    """Risultato di process_chunk in un .npz (array più metadati JSON), scritto in modo atomico."""
+    meta = {key: chunk[key] for key in ('start', 'end', 'frame_size', 'decoded', 'cache_hit', 'seconds')}
+    meta['frame_size'] = list(meta['frame_size']) if meta['frame_size'] else None
+    arrays = {'landmarks': chunk['landmarks']}
+    if 'keys' in chunk:
+        meta['keys'] = [list(key) for key in chunk['keys']]
+        meta['final_state'] = chunk['final_state']
+        arrays.update({key: chunk[key] for key in ('success', 'stable', 'rep_count')})
+    buffer = io.BytesIO()
+    np.savez_compressed(buffer, meta=np.array(json.dumps(meta)), **arrays)
+    _write_atomic(path, buffer.getvalue())
+
+
+def load_chunk(path):
+    with np.load(path) as data:
+        chunk = json.loads(str(data['meta']))
+        chunk.update({key: data[key] for key in data.files if key != 'meta'})
+    chunk['frame_size'] = tuple(chunk['frame_size']) if chunk['frame_size'] else None
+    if 'keys' in chunk:
+        chunk['keys'] = [tuple(key) for key in chunk['keys']]
+    return chunk
+
+
+class FileWorkQueue:
+    """
+    Coda di unità di lavoro in una cartella. Ogni passaggio di stato è una rinomina atomica,
+    quindi più processi (anche su nodi diversi) possono prendere unità senza altri lock.
+    """
+    def __init__(self, root):
+        self.root = root
+        for state in STATES + ('results',):
+            os.makedirs(os.path.join(root, state), exist_ok=True)
+        self._job_path = os.path.join(root, 'job.json')
+
+    def job(self):
+        if not os.path.exists(self._job_path):
+            raise IOError(f"Nessun lavoro nella coda {self.root} (usare 'submit')")
+        return _read_json(self._job_path)
+
+    def _path(self, state, unit_id):
+        return os.path.join(self.root, state, unit_id + '.json')
+
+    def result_path(self, unit_id):
+        return os.path.join(self.root, 'results', unit_id + '.npz')
+
+    def units(self, state):
+        names = sorted(os.listdir(os.path.join(self.root, state)))
+        return [name[:-5] for name in names if name.endswith('.json') and not name.startswith('.')]
+
+    def counts(self):
+        return {state: len(self.units(state)) for state in STATES}
+
+    def submit(self, job, units):
+        """
+        Scrive il lavoro e le sue unità. Ripetere submit con lo stesso lavoro non cambia nulla
+        (le unità già presenti, in qualsiasi stato, restano dove sono).
+        """
+        if os.path.exists(self._job_path):
+            if self.job()['videos'] != job['videos']:
+                raise ValueError(f"La coda {self.root} contiene già un altro lavoro")
+        else:
+            _write_atomic(self._job_path, json.dumps(job, indent=1).encode('utf-8'))
+        known = {unit_id for state in STATES for unit_id in self.units(state)}
+        added = 0
+        for unit in units:
+            if unit['id'] not in known:
+                _write_atomic(self._path('pending', unit['id']), json.dumps(unit).encode('utf-8'))
+                added += 1
+        return added
+
+    def acquire(self, worker_id):
+        """Prende in carico la prima unità disponibile: dizionario dell'unità, o None se non ce ne sono."""
+        self.reap()
+        for unit_id in self.units('pending'):
+            leased = self._path('leased', unit_id)
+            try:
+                os.rename(self._path('pending', unit_id), leased)  # Vince un solo worker
+                # La rinomina conserva la data di modifica del file in pending: senza aggiornarla
+                # un'unità rimasta in coda più di lease_seconds sembrerebbe già scaduta a reap()
+                os.utime(leased)
+            except FileNotFoundError:
+                continue
+            try:
+                unit = _read_json(leased)
+            except FileNotFoundError:
+                continue  # Già scaduta e ripresa da altri (lease brevissimo)
+            unit['attempts'] = unit.get('attempts', 0) + 1
+            unit.update({'worker': worker_id, 'leased_at': time.time()})
+            _write_atomic(leased, json.dumps(unit).encode('utf-8'))
+            if os.path.exists(self.result_path(unit_id)):
+                self._finish(unit)  # Risultato già scritto da un worker con il lease scaduto
+                continue
+            return unit
+        return None
+
+    def heartbeat(self, unit):
+        """Rinnova il lease; False se è scaduto e l'unità è stata ripresa da altri."""
+        try:
+            if _read_json(self._path('leased', unit['id'])).get('worker') != unit['worker']:
+                return False
+            os.utime(self._path('leased', unit['id']))
+            return True
+        except (FileNotFoundError, ValueError):
+            return False
+
+    def complete(self, unit, chunk):
+        """Salva il risultato dell'unità (checkpoint) e la segna come finita."""
+        save_chunk(self.result_path(unit['id']), chunk)
+        unit['seconds'] = chunk['seconds']
+        self._finish(unit)
+
+    def _finish(self, unit):
+        unit['finished_at'] = time.time()
+        _write_atomic(self._path('done', unit['id']), json.dumps(unit).encode('utf-8'))
+        # Il lease si toglie solo se è ancora nostro; una copia tornata in pending non serve più
+        leased = self._path('leased', unit['id'])
+        try:
+            if _read_json(leased).get('worker') == unit['worker']:
+                os.remove(leased)
+        except (FileNotFoundError, ValueError):
+            pass
+        try:
+            os.remove(self._path('pending', unit['id']))
+        except FileNotFoundError:
+            pass
+
+    def fail(self, unit, error, max_attempts):
+        """
+        Errore durante l'elaborazione: l'unità torna in pending o, finiti i tentativi, in failed.
+        False se il lease non è più nostro (scaduto e ripreso da altri): l'errore viene ignorato.
+        """
+        leased = self._path('leased', unit['id'])
+        try:
+            if _read_json(leased).get('worker') != unit['worker']:
+                return False
+        except (FileNotFoundError, ValueError):
+            return False
+        unit.setdefault('errors', []).append(f"{unit['worker']}: {error}")
+        self._release(unit, leased, max_attempts)
+        return True
+
+    def retry_failed(self):
+        """Rimette in coda le unità fallite con i tentativi azzerati (es. dopo aver corretto la causa)."""
+        retried = 0
+        for unit_id in self.units('failed'):
+            pending = self._path('pending', unit_id)
+            try:
+                os.rename(self._path('failed', unit_id), pending)
+            except FileNotFoundError:
+                continue
+            unit = _read_json(pending)
+            _write_atomic(pending, json.dumps({**unit, 'attempts': 0}).encode('utf-8'))
+            retried += 1
+        return retried
+
+    def reap(self):
+        """Rimette in coda le unità con il lease scaduto (worker terminato o bloccato)."""
+        job = self.job()
+        now = time.time()
+        for unit_id in self.units('leased'):
+            leased = self._path('leased', unit_id)
+            try:
+                expired = now - os.stat(leased).st_mtime > job['lease_seconds']
+                unit = _read_json(leased) if expired else None
+                if unit is not None and unit.get('worker') is None:
+                    # Lease appena preso e non ancora scritto (ha il contenuto di pending): la data
+                    # letta può precedere la rinomina, conta solo se è ancora scaduta adesso
+                    expired = time.time() - os.stat(leased).st_mtime > job['lease_seconds']
+            except (FileNotFoundError, ValueError):
+                continue
+            if expired and unit is not None:
+                unit.setdefault('errors', []).append(f"{unit.get('worker')}: lease scaduto")
+                self._release(unit, leased, job['max_attempts'])
+
+    def _release(self, unit, leased, max_attempts):
+        state = 'failed' if unit.get('attempts', 0) >= max_attempts else 'pending'
+        # Prima la rinomina (atomica, un solo processo la fa), poi il contenuto aggiornato
+        target = self._path(state, unit['id'])
+        try:
+            os.rename(leased, target)
+        except FileNotFoundError:
+            return
+        _write_atomic(target, json.dumps({**unit, 'worker': None}).encode('utf-8'))
+
+
+class QueueWorker:
+    """
+    Processo di elaborazione: prende unità dalla coda finché ce ne sono, rinnovando il lease
+    da un thread separato mentre process_chunk lavora.
+    """
+    def __init__(self, queue, worker_id=None, poll_s=2.0):
+        self.queue = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.poll_s = poll_s
+        self.job = queue.job()
+        self._current = None
+        self._lost = False
+        self._stop = threading.Event()
+        self.counts = {'done': 0, 'failed': 0, 'lost_leases': 0}
+
+    def _heartbeat_loop(self):
+        interval = self.job['lease_seconds'] / 4.0
+        while not self._stop.wait(interval):
+            unit = self._current
+            if unit is not None and not self.queue.heartbeat(unit):
+                self._lost = True
+
+    def _task(self, unit):
+        job = self.job
+        video = job['videos'][unit['video']]
+        cache_spec = None
+        if job['cache_dir']:
+            cache_spec = (job['cache_dir'], video['hash'], job['settings'])
+        return (video['path'], tuple(unit['chunk']), video['exercise'], job['detector_kwargs'], job['mirror'],
+                cache_spec)
+
+    def run(self, max_units=None):
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name='queue-heartbeat', daemon=True)
+        heartbeat.start()
+        processed = 0
+        try:
+            while max_units is None or processed < max_units:
+                unit = self.queue.acquire(self.worker_id)
+                if unit is None:
+                    counts = self.queue.counts()
+                    if not counts['pending'] and not counts['leased']:
+                        break  # Tutto finito (o fallito)
+                    time.sleep(self.poll_s)  # Unità in carico ad altri: potrebbero scadere
+                    continue
+                self._current, self._lost = unit, False
+                try:
+                    chunk = process_chunk(self._task(unit))
+                except Exception as e:
+                    self._current = None
+                    print(f"[{self.worker_id}] Errore nell'unità {unit['id']}: {e}")
+                    if self.queue.fail(unit, f"{type(e).__name__}: {e}", self.job['max_attempts']):
+                        self.counts['failed'] += 1
+                    else:
+                        self.counts['lost_leases'] += 1  # Lease ripreso da altri: l'unità resta loro
+                    continue
+                self._current = None
+                if self._lost:
+                    # Il risultato vale comunque: chi ha ripreso l'unità lo troverà e non la rifarà
+                    self.counts['lost_leases'] += 1
+                self.queue.complete(unit, chunk)
+                self.counts['done'] += 1
+                processed += 1
+                print(f"[{self.worker_id}] Unità {unit['id']} finita in {chunk['seconds']:.1f}s "
+                      f"(tentativo {unit['attempts']})")
+        finally:
+            self._stop.set()
+            heartbeat.join()
+        return self.counts
+
+
+def submit_videos(queue, videos, exercise, chunk_seconds=60.0, overlap_frames=30, detector_kwargs=None,
+                  mirror=True, cache_dir=None, lease_seconds=120.0, max_attempts=3):
+    """Prepara il lavoro (un'unità per blocco di ogni video) e lo mette in coda. Restituisce le unità aggiunte."""
+    detector_kwargs = detector_kwargs or {}
+    settings = cache_settings(detector_kwargs, mirror) if cache_dir else None
+    cache = LandmarkCache(cache_dir) if cache_dir else None
+    job_videos = []
+    units = []
+    for v, path in enumerate(videos):
+        total, fps = video_info(path)
+        plan = plan_chunks(total, math.ceil(total / (chunk_seconds * fps)), overlap_frames)
+        job_videos.append({'path': os.path.abspath(path), 'exercise': exercise, 'frames': total, 'fps': fps,
+                           'hash': cache.video_hash(path) if cache else None, 'plan': [list(c) for c in plan]})
+        units.extend({'id': f"v{v:04d}_c{c:04d}", 'video': v, 'chunk': list(chunk), 'attempts': 0}
+                     for c, chunk in enumerate(plan))
+    job = {'version': QUEUE_FORMAT_VERSION, 'videos': job_videos, 'detector_kwargs': detector_kwargs,
+           'mirror': mirror, 'cache_dir': os.path.abspath(cache_dir) if cache_dir else None,
+           'settings': settings, 'lease_seconds': lease_seconds, 'max_attempts': max_attempts}
+    return queue.submit(job, units)
+
+
+def build_report(queue, corpus_dir=None):
+    """
+    Report unico del lavoro: per video ripetizioni, frame con errore e tempi (se tutte le sue
+    unità sono finite), per worker unità e secondi, tentativi ripetuti e unità fallite.
+    Con corpus_dir le sessioni complete vengono aggiunte all'archivio dei landmark.
+    """
+    job = queue.job()
+    done = {unit_id: _read_json(queue._path('done', unit_id)) for unit_id in queue.units('done')}
+    failed = {unit_id: _read_json(queue._path('failed', unit_id)) for unit_id in queue.units('failed')}
+    writer = None
+    if corpus_dir:
+        from landmark_corpus import CorpusWriter
+        writer = CorpusWriter(corpus_dir)
+
+    videos = []
+    for v, video in enumerate(job['videos']):
+        ids = [f"v{v:04d}_c{c:04d}" for c in range(len(video['plan']))]
+        entry = {'path': video['path'], 'exercise': video['exercise'], 'units': len(ids),
+                 'done': sum(unit_id in done for unit_id in ids),
+                 'failed': [unit_id for unit_id in ids if unit_id in failed]}
+        if entry['done'] == len(ids):
+            chunks = [load_chunk(queue.result_path(unit_id)) for unit_id in ids]
+            results = merge_chunks(video['plan'], chunks, video['exercise'], video['path'])
+            rep_frames = np.flatnonzero(np.diff(results['rep_count'], prepend=0) > 0)
+            entry.update({
+                'status': 'completo',
+                'frames': results['stats']['frames'],
+                'reps': int(results['rep_count'][-1]),
+                'error_frames': int(results['error_frames'].sum()),
+                'rep_times_s': [round(f / video['fps'], 2) for f in rep_frames.tolist()],
+                'reanalyzed_frames': results['stats']['reanalyzed_frames'],
+                'cache_hits': results['stats']['cache_hits'],
+                'worker_seconds': round(results['stats']['worker_seconds'], 2),
+            })
+            if writer is not None:
+                entry['corpus_session'] = writer.add_session(video['exercise'], results['landmarks'],
+                                                             results['frame_size'], fps=video['fps'],
+                                                             source=video['path'])
+        else:
+            entry['status'] = 'fallito' if entry['failed'] else 'incompleto'
+        videos.append(entry)
+    if writer is not None:
+        writer.close()
+
+    workers = {}
+    for unit in done.values():
+        stats = workers.setdefault(unit['worker'], {'units': 0, 'seconds': 0.0})
+        stats['units'] += 1
+        stats['seconds'] = round(stats['seconds'] + unit.get('seconds', 0.0), 2)
+    return {
+        'queue': queue.counts(),
+        'videos': videos,
+        'workers': workers,
+        'retried_units': sorted(unit_id for unit_id, unit in done.items() if unit.get('attempts', 1) > 1),
+        'failed_units': {unit_id: unit.get('errors', []) for unit_id, unit in failed.items()},
+    }
+
+
+def print_report(report):
+    counts = report['queue']
+    print(f"Unità: {counts['done']} finite, {counts['pending']} in coda, {counts['leased']} in carico, "
+          f"{counts['failed']} fallite")
+    print(f"{'video':<40}{'stato':>12}{'frame':>9}{'rip.':>6}{'errori':>8}{'s worker':>10}")
+    for video in report['videos']:
+        name = os.path.basename(video['path'])
+        if video['status'] == 'completo':
+            print(f"{name:<40}{video['status']:>12}{video['frames']:>9}{video['reps']:>6}"
+                  f"{video['error_frames']:>8}{video['worker_seconds']:>10.1f}")
+        else:
+            print(f"{name:<40}{video['status']:>12}   {video['done']}/{video['units']} unità")
+    for worker, stats in sorted(report['workers'].items()):
+        print(f"  {worker}: {stats['units']} unità, {stats['seconds']:.1f} s")
+    if report['retried_units']:
+        print(f"Unità ripetute dopo un errore o un lease scaduto: {', '.join(report['retried_units'])}")
+    for unit_id, errors in report['failed_units'].items():
+        print(f"FALLITA {unit_id}: {errors[-1] if errors else ''}")
+
+
+def run_local(queue, workers, kill_after=None):
+    """
+    Avvia 'workers' processi worker su questa macchina e attende la fine. kill_after (s) termina
+    di colpo il primo worker (SIGKILL) per provare il recupero tramite la scadenza del lease.
+    """
+    command = [sys.executable, os.path.abspath(__file__), 'worker', queue.root]
+    procs = [subprocess.Popen(command + ['--id', f"{socket.gethostname()}-w{i}"]) for i in range(workers)]
+    if kill_after is not None:
+        time.sleep(kill_after)
+        if procs[0].poll() is None:
+            procs[0].send_signal(signal.SIGKILL)
+            print(f"Worker 0 terminato con SIGKILL dopo {kill_after:g}s")
+    for proc in procs:
+        proc.wait()
+    # Se tutti i worker rimasti hanno finito prima della scadenza del lease, ne serve uno in più
+    while queue.counts()['leased'] or queue.counts()['pending']:
+        QueueWorker(queue, f"{socket.gethostname()}-recupero").run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rielaborazione distribuita dell'archivio video tramite coda su file.")
+    sub = parser.add_subparsers(dest='command', required=True)
+    submit = sub.add_parser('submit', help="Mette in coda i video")
+    submit.add_argument('queue')
+    submit.add_argument('videos', nargs='+')
+    submit.add_argument('--exercise', default='Squat')
+    submit.add_argument('--chunk-seconds', type=float, default=60.0, help="Durata di un'unità di lavoro")
+    submit.add_argument('--overlap', type=int, default=30, help="Frame di riscaldamento prima di ogni blocco")
+    submit.add_argument('--model-complexity', type=int, default=1)
+    submit.add_argument('--no-mirror', action='store_true', help="Non specchiare i frame (video non da webcam)")
+    submit.add_argument('--cache', help="Cache dei landmark condivisa (stesso percorso su tutti i nodi)")
+    submit.add_argument('--lease', type=float, default=120.0, help="Secondi senza heartbeat prima di riprendere un'unità")
+    submit.add_argument('--max-attempts', type=int, default=3)
+    worker = sub.add_parser('worker', help="Elabora unità finché la coda non è vuota")
+    worker.add_argument('queue')
+    worker.add_argument('--id', default=None, help="Nome del worker (default: host-pid)")
+    worker.add_argument('--poll', type=float, default=2.0)
+    worker.add_argument('--max-units', type=int, default=None)
+    status = sub.add_parser('status', help="Stato delle unità")
+    status.add_argument('queue')
+    retry = sub.add_parser('retry', help="Rimette in coda le unità fallite")
+    retry.add_argument('queue')
+    report = sub.add_parser('report', help="Unisce i risultati in un report")
+    report.add_argument('queue')
+    report.add_argument('--output', help="Salva il report in JSON")
+    report.add_argument('--corpus', help="Aggiunge i video completi all'archivio dei landmark")
+    local = sub.add_parser('local', help="Avvia più worker su questa macchina e stampa il report")
+    local.add_argument('queue')
+    local.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    local.add_argument('--kill-after', type=float, default=None, help="Termina il primo worker dopo N secondi")
+    args = parser.parse_args()
+
+    queue = FileWorkQueue(args.queue)
+    if args.command == 'submit':
+        added = submit_videos(queue, args.videos, args.exercise, args.chunk_seconds, args.overlap,
+                              {'model_complexity': args.model_complexity}, not args.no_mirror, args.cache,
+                              args.lease, args.max_attempts)
+        print(f"{added} unità aggiunte; coda: {queue.counts()}")
+    elif args.command == 'worker':
+        counts = QueueWorker(queue, args.id, args.poll).run(args.max_units)
+        print(f"Worker terminato: {counts}")
+    elif args.command == 'retry':
+        print(f"{queue.retry_failed()} unità rimesse in coda")
+    elif args.command == 'status':
+        print(queue.counts())
+        for unit_id in queue.units('leased'):
+            unit = _read_json(queue._path('leased', unit_id))
+            age = time.time() - os.stat(queue._path('leased', unit_id)).st_mtime
+            print(f"  {unit_id}: {unit['worker']} (tentativo {unit['attempts']}, heartbeat {age:.0f}s fa)")
+    else:
+        if args.command == 'local':
+            run_local(queue, args.workers, args.kill_after)
+        result = build_report(queue, getattr(args, 'corpus', None))
+        print_report(result)
+        if getattr(args, 'output', None):
+            _write_atomic(os.path.abspath(args.output), json.dumps(result, indent=1).encode('utf-8'))
+
+
+if __name__ == '__main__':
+    main()